@@ -9,6 +9,8 @@ from db import get_player
 from views import NameRequestView
 
 from runtime_settings import NOTIFY_CHANNEL_ID
+from bot_state import attach_bot_state
+from adventure_threads import adventure_threads
 from bot_utils import check_ban, is_guild_admin, try_get_existing_adventure_thread
 
 logger = logging.getLogger("rpgbot")
@@ -56,7 +58,7 @@ def _missing_thread_mode_permissions(guild: discord.Guild, channel: discord.Text
 
 
 def setup_adventure_commands(bot: commands.Bot):
-    user_processing = getattr(bot, "user_processing", {})
+    user_processing = attach_bot_state(bot)
 
     @bot.command(name="set")
     @check_ban()
@@ -129,11 +131,10 @@ def setup_adventure_commands(bot: commands.Bot):
 
         user = ctx.author
 
-        if user_processing.get(user.id):
+        if not await user_processing.acquire(user.id, ctx.command.name):
             await ctx.send("⚠️ 別の処理が実行中です。完了するまでお待ちください。", delete_after=5)
             return
 
-        user_processing[user.id] = True
         try:
             player = await get_player(user.id)
             if not player:
@@ -155,6 +156,7 @@ def setup_adventure_commands(bot: commands.Bot):
                 await ctx.send(f"⚠️ スレッド削除に失敗しました: {e}")
                 return
 
+            adventure_threads.mark_dead(thread.id)
             await db.clear_adventure_thread(user.id)
             await ctx.send("✅ 冒険スレッドを削除しました。データは保持されています。必要なら `!start` で復活できます。")
         finally:
@@ -166,11 +168,10 @@ def setup_adventure_commands(bot: commands.Bot):
         user = ctx.author
         user_id = str(user.id)
 
-        if user_processing.get(user.id):
+        if not await user_processing.acquire(user.id, ctx.command.name):
             await ctx.send("⚠️ 別の処理が実行中です。完了するまでお待ちください。", delete_after=5)
             return
 
-        user_processing[user.id] = True
         try:
             if ctx.guild is None:
                 await ctx.send("❌ DMでは開始できません。サーバー内で実行してください。")
@@ -0,0 +1,165 @@
+"""冒険スレッドの解決キャッシュ
+
+!start / !close のたびに、db.get_adventure_thread_id（= get_player の全列取得）で
+スレッドIDを引き、ゲートウェイのキャッシュに無ければ guild.fetch_channel（REST）を叩いていた。
+
+- ユーザー → (スレッドID, ギルドID) の対応をメモリに持つ
+  （get_player / update_player の milestone_flags、set_adventure_thread / clear_adventure_thread で更新）
+- アーカイブ済みスレッドはゲートウェイのキャッシュに載らないため、取得した Thread をLRUで保持する
+  （on_thread_update / 削除イベントで更新・破棄）
+- 削除済みスレッドIDは否定キャッシュに入れ、以降は問い合わせない（NotFound / 削除イベントで登録）
+- 別ギルドのスレッドは fetch しても取得できないため、ギルドIDが違えば問い合わせない
+
+戻ってきたプレイヤーのスレッド解決は、通常 REST 0 回で済む。
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+from typing import Any, Optional
+
+import discord
+
+from runtime_settings import THREAD_CACHE_SIZE
+
+logger = logging.getLogger("rpgbot")
+
+_THREAD_KEY = "_adventure_thread_id"
+_GUILD_KEY = "_adventure_guild_id"
+
+
+def _to_int(raw: Any) -> Optional[int]:
+    try:
+        return int(raw) if raw is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class AdventureThreadCache:
+    def __init__(self, size: int = THREAD_CACHE_SIZE):
+        self.size = max(1, int(size))
+        # user_id -> (thread_id, guild_id)。None は「スレッドを持たない」ことが分かっている
+        self._threads: dict[str, Optional[tuple[int, Optional[int]]]] = {}
+        self._archived: OrderedDict[int, discord.Thread] = OrderedDict()
+        self._dead: OrderedDict[int, None] = OrderedDict()
+
+        self.hits = 0
+        self.fetches = 0
+
+    # -------------------------
+    # ユーザー → スレッド
+    # -------------------------
+
+    def lookup(self, user_id: Any) -> tuple[bool, Optional[tuple[int, Optional[int]]]]:
+        """(既知か, (thread_id, guild_id) / None)"""
+        key = str(user_id)
+        if key not in self._threads:
+            return False, None
+        return True, self._threads[key]
+
+    def remember(self, user_id: Any, thread_id: Any, guild_id: Any = None) -> None:
+        thread_id = _to_int(thread_id)
+        self._threads[str(user_id)] = (thread_id, _to_int(guild_id)) if thread_id is not None else None
+        if thread_id is not None:
+            self._dead.pop(thread_id, None)
+
+    def remember_flags(self, user_id: Any, flags: Any) -> None:
+        """milestone_flags（全体）から対応を更新する"""
+        if isinstance(flags, dict):
+            self.remember(user_id, flags.get(_THREAD_KEY), flags.get(_GUILD_KEY))
+
+    def forget(self, user_id: Any) -> None:
+        """未知に戻す（プレイヤー削除時など）"""
+        self._threads.pop(str(user_id), None)
+
+    # -------------------------
+    # スレッドID → Thread
+    # -------------------------
+
+    def _remember_archived(self, thread: discord.Thread) -> None:
+        self._archived[thread.id] = thread
+        self._archived.move_to_end(thread.id)
+        while len(self._archived) > self.size:
+            self._archived.popitem(last=False)
+
+    def mark_dead(self, thread_id: int) -> None:
+        self._archived.pop(thread_id, None)
+        self._dead[thread_id] = None
+        self._dead.move_to_end(thread_id)
+        while len(self._dead) > self.size:
+            self._dead.popitem(last=False)
+
+    def is_dead(self, thread_id: int) -> bool:
+        return thread_id in self._dead
+
+    async def fetch_thread(self, guild: discord.Guild, thread_id: int) -> Optional[discord.Thread]:
+        """ゲートウェイ → アーカイブLRU → REST の順で探す（削除済みは問い合わせない）"""
+        if thread_id in self._dead:
+            self.hits += 1
+            return None
+        thread = guild.get_thread(thread_id) or self._archived.get(thread_id)
+        if thread is not None:
+            self.hits += 1
+            return thread
+
+        self.fetches += 1
+        try:
+            ch = await guild.fetch_channel(thread_id)
+        except discord.NotFound:
+            self.mark_dead(thread_id)
+            return None
+        except Exception:
+            return None
+        if not isinstance(ch, discord.Thread):
+            return None
+        if ch.archived:
+            self._remember_archived(ch)
+        return ch
+
+    async def resolve(self, guild: discord.Guild, user_id: int) -> Optional[discord.Thread]:
+        """プレイヤーの冒険スレッドを返す（無ければ None）"""
+        known, entry = self.lookup(user_id)
+        if not known:
+            import db
+
+            # get_player のフックで対応が記録される
+            thread_id = await db.get_adventure_thread_id(user_id)
+            known, entry = self.lookup(user_id)
+            if not known:
+                entry = (thread_id, None) if thread_id else None
+        if entry is None:
+            return None
+
+        thread_id, guild_id = entry
+        if guild_id is not None and guild_id != guild.id:
+            return None
+        return await self.fetch_thread(guild, thread_id)
+
+    # -------------------------
+    # ゲートウェイイベント
+    # -------------------------
+
+    async def on_thread_update(self, before: discord.Thread, after: discord.Thread) -> None:
+        if after.archived:
+            self._remember_archived(after)
+        else:
+            # アクティブなスレッドはゲートウェイのキャッシュから引ける
+            self._archived.pop(after.id, None)
+
+    async def on_raw_thread_delete(self, payload: discord.RawThreadDeleteEvent) -> None:
+        self.mark_dead(payload.thread_id)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "users": len(self._threads),
+            "archived": len(self._archived),
+            "dead": len(self._dead),
+            "hits": self.hits,
+            "fetches": self.fetches,
+        }
+
+
+adventure_threads = AdventureThreadCache()
+
+__all__ = ["AdventureThreadCache", "adventure_threads"]
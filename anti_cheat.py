@@ -6,6 +6,7 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import db
+from player_state import PlayerState
 
 logger = logging.getLogger("rpgbot")
 
@@ -13,6 +14,9 @@ logger = logging.getLogger("rpgbot")
 # Detection Configuration
 # ==============================
 
+# Player columns the detectors read (fetched once per analysis)
+PLAYER_FIELDS = ("level", "distance", "upgrade_points", "equipped_weapon", "equipped_armor", "equipped_shield")
+
 # Thresholds for anomaly scoring
 SCORE_THRESHOLDS = {
     "auto_ban": 70,      # Automatic ban threshold
@@ -63,8 +67,10 @@ async def analyze_player_behavior(user_id: int) -> Dict:
             "recommend_action": "monitor"
         }
     
+    player = await db.get_player(user_id, fields=PLAYER_FIELDS)
+
     # Detection 1: No-equipment grinding for extended periods
-    if await detect_no_equipment_grinding(user_id, stats):
+    if await detect_no_equipment_grinding(user_id, stats, player):
         score = ANOMALY_WEIGHTS["no_equipment_grinding"]
         total_score += score
         anomalies.append({
@@ -75,7 +81,7 @@ async def analyze_player_behavior(user_id: int) -> Dict:
         })
     
     # Detection 2: Unused upgrade points hoarding
-    if await detect_unused_upgrade_points(user_id, stats):
+    if await detect_unused_upgrade_points(user_id, stats, player):
         score = ANOMALY_WEIGHTS["unused_upgrade_points"]
         total_score += score
         anomalies.append({
@@ -129,7 +135,7 @@ async def analyze_player_behavior(user_id: int) -> Dict:
         "recommend_action": recommend_action
     }
 
-async def detect_no_equipment_grinding(user_id: int, stats: Dict) -> bool:
+async def detect_no_equipment_grinding(user_id: int, stats: Dict, player: Optional[PlayerState] = None) -> bool:
     """
     Detect if player is grinding for 8+ hours with no equipment
     """
@@ -139,7 +145,8 @@ async def detect_no_equipment_grinding(user_id: int, stats: Dict) -> bool:
         return False
     
     # Check if player has no equipment
-    player = await db.get_player(user_id)
+    if player is None:
+        player = await db.get_player(user_id, fields=PLAYER_FIELDS)
     if not player:
         return False
     
@@ -153,11 +160,12 @@ async def detect_no_equipment_grinding(user_id: int, stats: Dict) -> bool:
     
     return False
 
-async def detect_unused_upgrade_points(user_id: int, stats: Dict) -> bool:
+async def detect_unused_upgrade_points(user_id: int, stats: Dict, player: Optional[PlayerState] = None) -> bool:
     """
     Detect if player has 50+ upgrade points and hasn't used them
     """
-    player = await db.get_player(user_id)
+    if player is None:
+        player = await db.get_player(user_id, fields=PLAYER_FIELDS)
     if not player:
         return False
     
@@ -302,6 +310,10 @@ async def handle_auto_ban(user_id: int, analysis: Dict, bot=None):
     Handle automatic ban for high-risk players
     """
     try:
+        # Block further commands immediately, even before the DB write lands
+        from ban_cache import ban_cache
+        ban_cache.mark_banned(user_id)
+
         # Ban the player
         await db.ban_player(user_id, reason=f"Auto-ban: Anomaly score {analysis['total_score']}")
         
@@ -375,7 +387,7 @@ async def manual_review_player(user_id: int) -> Dict:
     analysis = await analyze_player_behavior(user_id)
     
     # Get additional context
-    player = await db.get_player(user_id)
+    player = await db.get_player(user_id, fields=PLAYER_FIELDS)
     stats = await db.get_user_behavior_stats(user_id)
     recent_logs = await db.get_recent_anti_cheat_logs(user_id, limit=10)
     
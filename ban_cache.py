@@ -0,0 +1,127 @@
+"""BAN状態のメモリキャッシュ
+
+check_ban はコマンド毎に db.is_player_banned（= get_player の全列取得）を呼んでいたが、
+必要なのは真偽値 1 つだけなので、BAN中ユーザーIDの集合をメモリに持つ。
+
+- 起動時に `is_banned=eq.true` の 1 クエリで集合を読み込む
+- db.ban_player / unban_player / anti_cheat.handle_auto_ban が同期的に更新する
+- クラスタモードでは、ban/unban を他のワーカーへ配信して即時に反映する（cogs/cluster.py）
+- DB を直接書き換えた BAN（Web 管理画面・SQL など）は、バックグラウンドで
+  BAN_CACHE_RECONCILE_INTERVAL 秒毎に再読み込みして取り込む
+- 読み込み前（起動直後やDB障害で初回読み込みに失敗した場合）は従来通り DB に問い合わせる
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+from runtime_settings import BAN_CACHE_RECONCILE_INTERVAL
+
+logger = logging.getLogger("rpgbot")
+
+
+class BanCache:
+    """BAN中ユーザーIDの集合（O(1) 判定）"""
+
+    def __init__(self):
+        self._banned: set[str] = set()
+        # 再読み込み中に行われたローカル変更（再読み込み結果より優先する）
+        self._local_changes: dict[str, bool] | None = None
+        self._task: asyncio.Task | None = None
+        self.loaded = False
+        self.last_sync: float = 0.0
+
+    def __len__(self) -> int:
+        return len(self._banned)
+
+    def is_banned(self, user_id) -> bool:
+        return str(user_id) in self._banned
+
+    async def check(self, user_id) -> bool:
+        """BAN判定（読み込み済みならネットワークを使わない）"""
+        if self.loaded:
+            return str(user_id) in self._banned
+
+        import db
+
+        return bool(await db.is_player_banned(user_id))
+
+    def _set(self, user_id, banned: bool) -> None:
+        key = str(user_id)
+        if banned:
+            self._banned.add(key)
+        else:
+            self._banned.discard(key)
+        if self._local_changes is not None:
+            self._local_changes[key] = banned
+
+    def _publish(self, user_id, banned: bool) -> None:
+        from cluster.client import publish_nowait
+
+        publish_nowait("ban", {"user_id": str(user_id), "banned": banned})
+
+    def mark_banned(self, user_id) -> None:
+        self._set(user_id, True)
+        self._publish(user_id, True)
+
+    def mark_unbanned(self, user_id) -> None:
+        self._set(user_id, False)
+        self._publish(user_id, False)
+
+    def apply_remote(self, user_id, banned: bool) -> None:
+        """他のワーカーで行われた ban/unban を反映する（再配信はしない）"""
+        self._set(user_id, banned)
+
+    async def refresh(self) -> bool:
+        """DB から BAN 中ユーザーを読み直す（失敗時は現在の集合を維持）"""
+        import db
+
+        self._local_changes = {}
+        try:
+            user_ids = await db.get_banned_user_ids()
+        except Exception as e:
+            logger.warning("ban_cache.refresh failed; keeping current set: size=%s err=%s", len(self._banned), e)
+            return False
+        else:
+            banned = set(user_ids)
+            # 取得中に ban/unban された分は、取得結果より新しいので上書きする
+            for key, is_banned in self._local_changes.items():
+                if is_banned:
+                    banned.add(key)
+                else:
+                    banned.discard(key)
+
+            added = banned - self._banned
+            removed = self._banned - banned
+            if self.loaded and (added or removed):
+                logger.info("ban_cache reconciled: +%s -%s (size=%s)", len(added), len(removed), len(banned))
+            self._banned = banned
+            self.loaded = True
+            self.last_sync = time.time()
+            return True
+        finally:
+            self._local_changes = None
+
+    async def _reconcile_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.refresh()
+
+    async def start(self, interval: float = BAN_CACHE_RECONCILE_INTERVAL) -> None:
+        """初回読み込みとバックグラウンド再同期を開始する"""
+        if await self.refresh():
+            logger.info("✅ BAN cache loaded: %s users", len(self._banned))
+        if interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._reconcile_loop(float(interval)))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+ban_cache = BanCache()
+
+__all__ = ["BanCache", "ban_cache"]
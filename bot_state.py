@@ -2,16 +2,21 @@ from __future__ import annotations
 
 from discord.ext import commands
 
+from user_concurrency import UserConcurrency
 
-def attach_bot_state(bot: commands.Bot):
+
+def attach_bot_state(bot: commands.Bot) -> UserConcurrency:
     """cogs間で共有する状態を bot にぶら下げる（無ければ作る）。
 
-    戻り値として (user_processing, user_locks) の参照も返す。
+    戻り値として user_processing（UserConcurrency）の参照も返す。
+    以前の user_locks（ユーザー毎の asyncio.Lock）も同じリースで置き換える。
     """
 
-    if not hasattr(bot, "user_processing") or bot.user_processing is None:
-        bot.user_processing = {}
-    if not hasattr(bot, "user_locks") or bot.user_locks is None:
-        bot.user_locks = {}
+    if not isinstance(getattr(bot, "user_processing", None), UserConcurrency):
+        from cluster.client import ClusterUserConcurrency, get_client
+
+        # クラスタモードではリースをランチャーの状態サービスで取り、ワーカー間で排他する
+        client = get_client()
+        bot.user_processing = ClusterUserConcurrency(client) if client is not None else UserConcurrency()
 
-    return bot.user_processing, bot.user_locks
+    return bot.user_processing
@@ -4,7 +4,9 @@ import discord
 from discord.ext import commands
 from functools import wraps
 
-import db
+from adventure_threads import adventure_threads
+from ban_cache import ban_cache
+from leaderboard import leaderboard
 
 
 def is_guild_admin(ctx: commands.Context) -> bool:
@@ -18,19 +20,8 @@ async def try_get_existing_adventure_thread(
     guild: discord.Guild,
     user_id: int,
 ) -> discord.Thread | None:
-    thread_id = await db.get_adventure_thread_id(user_id)
-    if not thread_id:
-        return None
-    thread = guild.get_thread(thread_id)
-    if thread is not None:
-        return thread
-    try:
-        ch = await guild.fetch_channel(thread_id)
-        if isinstance(ch, discord.Thread):
-            return ch
-    except Exception:
-        return None
-    return None
+    # 対応・アーカイブ済みスレッド・削除済みIDをキャッシュしているので、通常はRESTを叩かない
+    return await adventure_threads.resolve(guild, user_id)
 
 
 def check_ban():
@@ -41,7 +32,8 @@ def check_ban():
         async def wrapper(ctx: commands.Context, *args, **kwargs):
             user_id = str(ctx.author.id)
 
-            if await db.is_player_banned(user_id):
+            # 読み込み済みならメモリ上の集合を引くだけ（DBには問い合わせない）
+            if await ban_cache.check(user_id):
                 embed = discord.Embed(
                     title="❌ BOT利用禁止",
                     description="あなたはBOT利用禁止処分を受けています。\n\n運営チームにお問い合わせください。",
@@ -50,8 +42,34 @@ def check_ban():
                 await ctx.send(embed=embed)
                 return
 
+            # チャンネル運用のギルドは所属がDBに残らないため、コマンド実行時に覚える（ギルド別ランキング用）
+            if ctx.guild is not None:
+                leaderboard.note_guild(user_id, ctx.guild.id)
+
             return await func(ctx, *args, **kwargs)
 
         return wrapper
 
     return decorator
+
+
+class DegradedModeError(commands.CheckFailure):
+    """縮退モード中に書き込みを伴うコマンドが実行された"""
+
+
+async def degraded_mode_check(ctx: commands.Context) -> bool:
+    """DBの障害中（players のブレーカーが開いている間）は、読み取り専用のコマンドだけを通す"""
+    import db
+    from runtime_settings import DEBUG_ADMIN_IDS, DEGRADED_READONLY_COMMANDS
+
+    if not db.is_degraded() or ctx.command is None:
+        return True
+    # 管理者は障害の調査（!admin_stats 等）のために常に実行できる
+    if ctx.author.id in DEBUG_ADMIN_IDS:
+        return True
+    if ctx.command.root_parent is None and ctx.command.name in DEGRADED_READONLY_COMMANDS:
+        return True
+    raise DegradedModeError(
+        "⚠️ 現在データベースに接続しづらくなっているため、進行を保存するコマンドを一時停止しています。\n"
+        "`!status` と `!inventory` は最後に保存された内容で確認できます。しばらくしてからもう一度お試しください。"
+    )
@@ -0,0 +1,297 @@
+"""お知らせ（!notice）の一斉送信エンジン
+
+以前は RPG カテゴリ内の全チャンネルの topic を調べ、1件ずつ asyncio.sleep(0.5) を挟んで
+直列に送っていたため、5,000 チャンネルで 40 分以上かかり、スレッド運用のギルドには届かなかった。
+
+- 送信先はレジストリから作る
+  - スレッド運用: guild_settings に登録されたギルドの、プレイヤーの冒険スレッド
+    （milestone_flags の _adventure_thread_id / _adventure_guild_id）
+  - チャンネル運用: チャンネルIDがDBに保存されていないため、Botのキャッシュ上の
+    RPG カテゴリから topic に "UserID:" を含むチャンネルを集める（APIは叩かない）
+- 送信は BROADCAST_CONCURRENCY 並列。全体の送信レートはトークンバケットで
+  BROADCAST_GLOBAL_RATE 件/秒（Discord のグローバル上限 50 req/s 未満）に抑える。
+  チャンネル毎のルートバケット（429）は discord.py 側が retry_after に従って待つ
+- 進捗は BROADCAST_STATE_DIR に定期的にチェックポイントし、中断しても
+  `!notice_resume` で未送信分だけ再開できる
+- 進捗は on_progress コールバックで随時通知する（確認メッセージをライブ更新）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+import discord
+
+from runtime_settings import (
+    BROADCAST_CHECKPOINT_INTERVAL,
+    BROADCAST_CONCURRENCY,
+    BROADCAST_GLOBAL_RATE,
+    BROADCAST_STATE_DIR,
+)
+
+logger = logging.getLogger("rpgbot")
+
+ProgressCallback = Callable[["BroadcastJob"], Awaitable[None]]
+
+
+# ==============================
+# 送信先レジストリ
+# ==============================
+
+async def collect_targets(bot: discord.Client) -> list[int]:
+    """全ギルドのプレイヤー用スレッド/チャンネルのIDを重複なしで集める"""
+    import db
+
+    targets: dict[int, None] = {}
+
+    # スレッド運用のギルド（guild_settings）に属する冒険スレッド
+    thread_guilds = {str(row.get("guild_id")) for row in await db.list_guild_settings()}
+    async for _user_id, thread_id, guild_id in db.iter_adventure_threads():
+        if guild_id is None or str(guild_id) in thread_guilds:
+            targets[thread_id] = None
+
+    # チャンネル運用: キャッシュ上の RPG カテゴリを走査（チャンネルIDはDBに無い）
+    for guild in bot.guilds:
+        category = discord.utils.get(guild.categories, name="RPG")
+        if category is None:
+            continue
+        for channel in category.text_channels:
+            if channel.topic and "UserID:" in channel.topic:
+                targets[channel.id] = None
+
+    return list(targets)
+
+
+# ==============================
+# レート制御
+# ==============================
+
+class TokenBucket:
+    """rate 件/秒、最大 burst 件のトークンバケット"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = max(0.1, float(rate))
+        self.capacity = max(1.0, float(burst if burst is not None else rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def take(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# ==============================
+# ジョブ
+# ==============================
+
+@dataclass
+class BroadcastJob:
+    job_id: str
+    message: str
+    admin_id: int
+    targets: list[int]
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    sent: list[int] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)  # channel_id -> error
+    done: bool = False
+    cancelled: bool = False
+    started_monotonic: float = field(default=0.0, repr=False)
+
+    @property
+    def processed(self) -> int:
+        return len(self.sent) + len(self.failed)
+
+    @property
+    def total(self) -> int:
+        return len(self.targets)
+
+    def pending(self) -> list[int]:
+        finished = set(self.sent)
+        finished.update(int(k) for k in self.failed)
+        return [t for t in self.targets if t not in finished]
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started_monotonic if self.started_monotonic else 0.0
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def to_json(self) -> dict[str, Any]:
+        data = asdict(self)
+        data.pop("started_monotonic", None)
+        return data
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> "BroadcastJob":
+        data = dict(data)
+        data.pop("started_monotonic", None)
+        return cls(**data)
+
+
+def _state_path(job_id: str) -> Path:
+    return Path(BROADCAST_STATE_DIR) / f"{job_id}.json"
+
+
+def save_checkpoint(job: BroadcastJob) -> None:
+    """進捗をアトミックに書き出す（失敗してもログのみ）"""
+    path = _state_path(job.job_id)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(job.to_json(), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    except Exception as e:
+        logger.warning("broadcast checkpoint failed: job_id=%s err=%s", job.job_id, e)
+
+
+def load_checkpoint(job_id: str) -> Optional[BroadcastJob]:
+    try:
+        return BroadcastJob.from_json(json.loads(_state_path(job_id).read_text(encoding="utf-8")))
+    except FileNotFoundError:
+        return None
+
+
+def list_unfinished_jobs() -> list[BroadcastJob]:
+    """中断された（done でない）ジョブを新しい順に返す"""
+    state_dir = Path(BROADCAST_STATE_DIR)
+    if not state_dir.exists():
+        return []
+    jobs = []
+    for path in state_dir.glob("*.json"):
+        try:
+            job = BroadcastJob.from_json(json.loads(path.read_text(encoding="utf-8")))
+        except Exception:
+            continue
+        if not job.done:
+            jobs.append(job)
+    return sorted(jobs, key=lambda j: j.created_at, reverse=True)
+
+
+def new_job(message: str, admin_id: int, targets: list[int]) -> BroadcastJob:
+    job = BroadcastJob(job_id=uuid.uuid4().hex[:8], message=message, admin_id=admin_id, targets=targets)
+    save_checkpoint(job)
+    return job
+
+
+def build_notice_embed(message: str) -> discord.Embed:
+    embed = discord.Embed(
+        title="📢 運営からのお知らせ",
+        description=message,
+        color=discord.Color.blue(),
+        timestamp=datetime.now()
+    )
+    embed.set_footer(text="イニシエダンジョン運営チーム")
+    return embed
+
+
+# ==============================
+# 送信
+# ==============================
+
+_RUNNING: dict[str, BroadcastJob] = {}
+
+
+def running_jobs() -> list[BroadcastJob]:
+    return list(_RUNNING.values())
+
+
+async def run_broadcast(
+    bot: discord.Client,
+    job: BroadcastJob,
+    *,
+    on_progress: Optional[ProgressCallback] = None,
+    progress_interval: float = 3.0,
+) -> BroadcastJob:
+    """未送信の送信先へ並列に送り、チェックポイントしながら完了まで待つ"""
+    if job.job_id in _RUNNING:
+        raise RuntimeError(f"broadcast {job.job_id} is already running")
+    _RUNNING[job.job_id] = job
+
+    bucket = TokenBucket(BROADCAST_GLOBAL_RATE)
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for target in job.pending():
+        queue.put_nowait(target)
+
+    embed = build_notice_embed(job.message)
+    job.started_monotonic = time.monotonic()
+    last_checkpoint = time.monotonic()
+
+    async def _send_one(channel_id: int) -> None:
+        await bucket.take()
+        try:
+            # fetch せずに送る（存在しなければ NotFound が返る）
+            await bot.get_partial_messageable(channel_id).send(embed=embed)
+            job.sent.append(channel_id)
+        except Exception as e:
+            job.failed[str(channel_id)] = str(e)[:100]
+
+    async def _worker() -> None:
+        nonlocal last_checkpoint
+        while not job.cancelled:
+            try:
+                channel_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await _send_one(channel_id)
+            if time.monotonic() - last_checkpoint >= BROADCAST_CHECKPOINT_INTERVAL:
+                last_checkpoint = time.monotonic()
+                save_checkpoint(job)
+
+    async def _reporter() -> None:
+        while True:
+            await asyncio.sleep(progress_interval)
+            try:
+                await on_progress(job)
+            except Exception as e:
+                logger.debug("broadcast progress callback failed: job_id=%s err=%s", job.job_id, e)
+
+    reporter = asyncio.create_task(_reporter()) if on_progress is not None else None
+    try:
+        workers = [asyncio.create_task(_worker()) for _ in range(max(1, BROADCAST_CONCURRENCY))]
+        await asyncio.gather(*workers)
+        job.done = not job.cancelled
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+        _RUNNING.pop(job.job_id, None)
+        save_checkpoint(job)
+
+    logger.info(
+        "broadcast finished: job_id=%s sent=%s failed=%s total=%s cancelled=%s rate=%.1f/s",
+        job.job_id,
+        len(job.sent),
+        len(job.failed),
+        job.total,
+        job.cancelled,
+        job.rate(),
+    )
+    return job
+
+
+__all__ = [
+    "BroadcastJob",
+    "TokenBucket",
+    "build_notice_embed",
+    "collect_targets",
+    "list_unfinished_jobs",
+    "load_checkpoint",
+    "new_job",
+    "run_broadcast",
+    "running_jobs",
+    "save_checkpoint",
+]
@@ -0,0 +1,53 @@
+"""マルチプロセスのクラスタモード
+
+単一の commands.Bot では全ギルドが 1 つのイベントループ（= 1 コア）を共有するため、
+ランチャー（`python -m cluster`）が N 個のワーカープロセスを起動し、
+各ワーカーがシャードの一部（AutoShardedBot の shard_ids）だけを担当する。
+
+- ランチャー: cluster/launcher.py（ワーカーの起動/再起動、ヘルス/メトリクスの集約）
+- 状態サービス: cluster/service.py（ランチャー内で動く Unix ソケットのロック/状態サーバー）
+- ワーカー側: cluster/client.py（ユーザー単位の状態のクラスタ実装）
+
+ユーザー単位の状態は次のインターフェースの背後にあり、単一プロセスではローカル実装、
+クラスタモードではサービス経由の実装が使われる（bot_state / debug_state が選択する）。
+
+- リース（user_processing）: UserConcurrency / ClusterUserConcurrency
+- スナップショット: SnapshotManager / ClusterSnapshotManager（cluster/snapshots.py）
+- BAN キャッシュ・冒険スレッド・ギルド設定・ランキング: 各プロセスのキャッシュを
+  サービスの pub/sub で同期する（cogs/cluster.py）
+
+ワーカー固有の値（ワーカー番号 / 担当シャード）はランチャーが環境変数で渡す。
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class WorkerConfig:
+    worker_id: int
+    shard_ids: tuple[int, ...]
+    shard_count: int
+    socket_path: str
+
+
+def worker_config() -> Optional[WorkerConfig]:
+    """ランチャーから起動されたワーカーなら設定を返す（単一プロセスでは None）"""
+    raw_ids = (os.getenv("CLUSTER_SHARD_IDS") or "").strip()
+    if not raw_ids:
+        return None
+
+    from runtime_settings import CLUSTER_STATE_SOCKET
+
+    return WorkerConfig(
+        worker_id=int(os.getenv("CLUSTER_WORKER_ID") or 0),
+        shard_ids=tuple(int(s) for s in raw_ids.split(",") if s.strip()),
+        shard_count=int(os.getenv("CLUSTER_SHARD_COUNT") or 1),
+        socket_path=CLUSTER_STATE_SOCKET,
+    )
+
+
+__all__ = ["WorkerConfig", "worker_config"]
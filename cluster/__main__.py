@@ -0,0 +1,3 @@
+from cluster.launcher import main
+
+main()
@@ -0,0 +1,242 @@
+"""ワーカー側: 状態サービスのクライアントと、ユーザー単位の状態のクラスタ実装
+
+サービスとの接続は 1 本を全要求で共有する（要求IDで応答を対応付ける）。
+サービスに届かない間は、ゲームを止めないようにローカル実装の動作に縮退する
+（リースはプロセス内だけで排他し、キャッシュ同期のイベントは捨てる）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+from cluster import WorkerConfig, worker_config
+from cluster.protocol import MAX_LINE, encode, read_message
+from user_concurrency import Lease, UserConcurrency, _key
+
+logger = logging.getLogger("rpgbot")
+
+EventHandler = Callable[[Any], Any]
+
+
+class StateClient:
+    def __init__(self, config: WorkerConfig, *, request_timeout: float = 10.0):
+        self.config = config
+        self.request_timeout = request_timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connect_lock = asyncio.Lock()
+        self._pending: dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._handlers: dict[str, list[EventHandler]] = {}
+        self._background: set[asyncio.Task] = set()
+
+        self.errors_total = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def _connect(self) -> None:
+        async with self._connect_lock:
+            if self.connected:
+                return
+            self._reader, self._writer = await asyncio.open_unix_connection(self.config.socket_path, limit=MAX_LINE)
+            self._reader_task = asyncio.create_task(self._read_loop(self._reader))
+            # 再接続時も識別と購読をやり直す
+            await self._send({"op": "hello", "worker_id": self.config.worker_id})
+            if self._handlers:
+                await self._send({"op": "subscribe", "channels": sorted(self._handlers)})
+            logger.info("✅ Connected to cluster state service: worker=%s", self.config.worker_id)
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                message = await read_message(reader)
+                if message is None:
+                    break
+                if "event" in message:
+                    self._deliver(message["event"], message.get("data"))
+                    continue
+                future = self._pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except Exception as e:
+            logger.warning("cluster state connection lost: err=%s", e)
+        finally:
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                writer.close()
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("cluster state service disconnected"))
+            self._pending.clear()
+
+    def _deliver(self, channel: str, data: Any) -> None:
+        for handler in self._handlers.get(channel, ()):
+            try:
+                result = handler(data)
+                if asyncio.iscoroutine(result):
+                    self._spawn(result)
+            except Exception as e:
+                logger.warning("cluster event handler failed: channel=%s err=%s", channel, e)
+
+    async def _send(self, message: dict[str, Any], *, timeout: Optional[float] = None) -> dict[str, Any]:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(encode({"id": request_id, **message}))
+        try:
+            response = await asyncio.wait_for(future, timeout=timeout or self.request_timeout)
+        finally:
+            self._pending.pop(request_id, None)
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error") or "cluster request failed")
+        return response
+
+    async def request(self, op: str, *, timeout: Optional[float] = None, **fields: Any) -> dict[str, Any]:
+        try:
+            if not self.connected:
+                await self._connect()
+            return await self._send({"op": op, **fields}, timeout=timeout)
+        except Exception:
+            self.errors_total += 1
+            raise
+
+    def _spawn(self, coro: Awaitable[Any]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def post(self, op: str, **fields: Any) -> None:
+        """応答を待たずに送る（同期コードから使う。失敗はログのみ）"""
+
+        async def _run() -> None:
+            try:
+                await self.request(op, **fields)
+            except Exception as e:
+                logger.debug("cluster post failed: op=%s err=%s", op, e)
+
+        try:
+            self._spawn(_run())
+        except RuntimeError:
+            # イベントループ外（起動前など）
+            pass
+
+    # -------------------------
+    # pub/sub
+    # -------------------------
+
+    async def subscribe(self, channel: str, handler: EventHandler) -> None:
+        self._handlers.setdefault(channel, []).append(handler)
+        await self.request("subscribe", channels=[channel])
+
+    def publish(self, channel: str, data: Any) -> None:
+        self.post("publish", channel=channel, data=data)
+
+
+_CLIENT: Optional[StateClient] = None
+
+
+def get_client() -> Optional[StateClient]:
+    """クラスタモードならプロセス共有のクライアントを返す（単一プロセスでは None）"""
+    global _CLIENT
+    if _CLIENT is None:
+        config = worker_config()
+        if config is None:
+            return None
+        _CLIENT = StateClient(config)
+    return _CLIENT
+
+
+def publish_nowait(channel: str, data: Any) -> None:
+    """他のワーカーへイベントを配信する（単一プロセスでは何もしない）"""
+    client = get_client()
+    if client is not None:
+        client.publish(channel, data)
+
+
+# ==============================
+# リース（user_processing）
+# ==============================
+
+class ClusterUserConcurrency(UserConcurrency):
+    """プロセス内の FIFO で順番を取ってから、クラスタ全体のリースを取る。
+
+    同期の `user_processing[uid] = True` は待てないため、クラスタ側の取得は非同期に試みる（ベストエフォート）。
+    """
+
+    def __init__(self, client: StateClient, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.client = client
+        self._tokens = itertools.count(1)
+        self._remote: dict[int, str] = {}  # user_id -> holder
+        self.remote_failures = 0
+
+    def _holder(self) -> str:
+        return f"{self.client.config.worker_id}:{next(self._tokens)}"
+
+    async def acquire(self, user_id: Any, owner: str = "", *, timeout: float | None = None) -> Lease | None:
+        loop = asyncio.get_running_loop()
+        budget = self.queue_timeout if timeout is None else float(timeout)
+        deadline = loop.time() + budget
+
+        lease = await super().acquire(user_id, owner, timeout=budget)
+        if lease is None:
+            return None
+
+        key = lease.user_id
+        holder = self._holder()
+        try:
+            remaining = max(0.0, deadline - loop.time())
+            response = await self.client.request(
+                "lease_acquire",
+                # 要求自体のタイムアウトは、サービス側の待ち時間より少し長くする
+                timeout=remaining + self.client.request_timeout,
+                user_id=key,
+                holder=holder,
+                wait=remaining,
+            )
+        except Exception as e:
+            # サービスに届かない: プロセス内の排他だけで続行する
+            self.remote_failures += 1
+            logger.warning("cluster lease unavailable; using local lease only: user_id=%s err=%s", key, e)
+            return lease
+
+        if not response.get("acquired"):
+            self.timeouts_total += 1
+            super()._release(key, record=False)
+            return None
+        self._remote[key] = holder
+        return lease
+
+    def _release(self, key: int, *, reason: str = "released", record: bool = True) -> None:
+        holder = self._remote.pop(key, None)
+        if holder is not None:
+            self.client.post("lease_release", user_id=key, holder=holder)
+        super()._release(key, reason=reason, record=record)
+
+    def __setitem__(self, user_id: Any, value: Any) -> None:
+        super().__setitem__(user_id, value)
+        key = _key(user_id)
+        if not value:
+            return
+        holder = self._remote.get(key)
+        if holder is None:
+            holder = self._remote[key] = self._holder()
+        # 取得 / 延長（待たない）
+        self.client.post("lease_acquire", user_id=key, holder=holder, wait=0)
+
+    def stats(self) -> dict[str, Any]:
+        return {**super().stats(), "remote_held": len(self._remote), "remote_failures": self.remote_failures}
+
+
+__all__ = [
+    "ClusterUserConcurrency",
+    "StateClient",
+    "get_client",
+    "publish_nowait",
+]
@@ -0,0 +1,276 @@
+"""クラスタランチャー
+
+    python -m cluster
+
+- 総シャード数（CLUSTER_SHARD_COUNT、0 なら /gateway/bot の推奨値）を CLUSTER_WORKERS 個の
+  連続した範囲に分け、ワーカー（main.py）をそれぞれのシャードで起動する
+- IDENTIFY の同時実行上限（max_concurrency）を超えないよう、ワーカーの起動をずらす
+- 状態サービス（cluster/service.py）をこのプロセス内で動かす
+- 落ちたワーカーは指数バックオフで再起動する
+- ワーカーの報告を集約して /health・/metrics を返す（ワーカー自身のヘルスサーバーは無効化）
+
+CLUSTER_WORKERS が 1 以下なら、従来通り main.py をそのまま実行する。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from aiohttp import ClientSession, web
+
+from cluster.service import StateService
+from runtime_settings import (
+    CLUSTER_REPORT_INTERVAL,
+    CLUSTER_SHARD_COUNT,
+    CLUSTER_STATE_SOCKET,
+    CLUSTER_WORKERS,
+)
+
+logger = logging.getLogger("rpgbot")
+
+MAIN_PATH = Path(__file__).resolve().parent.parent / "main.py"
+
+
+async def fetch_gateway_info(token: str) -> dict[str, Any]:
+    """推奨シャード数と IDENTIFY の同時実行上限を取得"""
+    async with ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v10/gateway/bot",
+            headers={"Authorization": f"Bot {token}"},
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
+
+
+def split_shards(shard_count: int, workers: int) -> list[list[int]]:
+    """シャードIDを連続した範囲でワーカーに割り当てる（余りは先頭から 1 つずつ）"""
+    base, extra = divmod(shard_count, workers)
+    ranges, start = [], 0
+    for i in range(workers):
+        size = base + (1 if i < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return [r for r in ranges if r]
+
+
+class _Worker:
+    def __init__(self, worker_id: int, shard_ids: list[int]):
+        self.worker_id = worker_id
+        self.shard_ids = shard_ids
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.started_at = 0.0
+        self.restarts = 0
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+
+class Launcher:
+    def __init__(self, workers: int, shard_count: int, *, max_concurrency: int = 1):
+        self.shard_count = shard_count
+        self.max_concurrency = max(1, max_concurrency)
+        self.workers = [_Worker(i, ids) for i, ids in enumerate(split_shards(shard_count, workers))]
+        self.service = StateService(CLUSTER_STATE_SOCKET)
+        self._stopping = asyncio.Event()
+
+    # -------------------------
+    # ワーカー管理
+    # -------------------------
+
+    async def _spawn(self, worker: _Worker) -> None:
+        env = {
+            **os.environ,
+            "CLUSTER_WORKER_ID": str(worker.worker_id),
+            "CLUSTER_SHARD_IDS": ",".join(str(s) for s in worker.shard_ids),
+            "CLUSTER_SHARD_COUNT": str(self.shard_count),
+            "CLUSTER_STATE_SOCKET": CLUSTER_STATE_SOCKET,
+            # ヘルスチェックはランチャーが集約して返す
+            "ENABLE_HEALTH_SERVER": "0",
+        }
+        worker.process = await asyncio.create_subprocess_exec(sys.executable, str(MAIN_PATH), env=env)
+        worker.started_at = time.monotonic()
+        logger.info(
+            "🚀 worker started: id=%s pid=%s shards=%s-%s",
+            worker.worker_id,
+            worker.process.pid,
+            worker.shard_ids[0],
+            worker.shard_ids[-1],
+        )
+
+    def _identify_delay(self, worker: _Worker) -> float:
+        # IDENTIFY は max_concurrency 件 / 5 秒。前のワーカーのシャードが接続し終わるまで待つ
+        return math.ceil(len(worker.shard_ids) / self.max_concurrency) * 5.0
+
+    async def _supervise(self, worker: _Worker) -> None:
+        while not self._stopping.is_set():
+            code = await worker.process.wait()
+            if self._stopping.is_set():
+                return
+            # 5 分以上動いていたら、連続クラッシュではないとみなしてバックオフを戻す
+            if time.monotonic() - worker.started_at > 300:
+                worker.restarts = 0
+            delay = min(60.0, 2.0 ** worker.restarts)
+            worker.restarts += 1
+            logger.error("❌ worker exited: id=%s code=%s; restarting in %.0fs", worker.worker_id, code, delay)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+            self.service.reports.pop(worker.worker_id, None)
+            await self._spawn(worker)
+
+    async def _stop_workers(self, grace: float = 20.0) -> None:
+        for worker in self.workers:
+            if worker.running:
+                worker.process.terminate()
+        deadline = time.monotonic() + grace
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            try:
+                await asyncio.wait_for(worker.process.wait(), timeout=max(0.1, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                worker.process.kill()
+
+    # -------------------------
+    # ヘルス / メトリクス
+    # -------------------------
+
+    def _worker_status(self, worker: _Worker) -> dict[str, Any]:
+        report = self.service.reports.get(worker.worker_id) or {}
+        age = time.time() - report["received_at"] if report else None
+        healthy = (
+            worker.running
+            and age is not None
+            and age <= CLUSTER_REPORT_INTERVAL * 3
+            and bool(report.get("ready"))
+        )
+        return {
+            "worker_id": worker.worker_id,
+            "pid": worker.process.pid if worker.process else None,
+            "running": worker.running,
+            "restarts": worker.restarts,
+            "shards": [worker.shard_ids[0], worker.shard_ids[-1]],
+            "report_age_s": round(age, 1) if age is not None else None,
+            "healthy": healthy,
+            **{k: v for k, v in report.items() if k != "received_at"},
+        }
+
+    async def _health(self, request: web.Request) -> web.Response:
+        workers = [self._worker_status(w) for w in self.workers]
+        healthy = all(w["healthy"] for w in workers)
+        # ループの遅延は表示だけ（503 にするとワーカー全体が再起動されてしまう）
+        loop_degraded = any(w.get("loop_degraded") for w in workers)
+        body = {"status": "ok" if healthy and not loop_degraded else "degraded", "workers": workers}
+        return web.json_response(body, status=200 if healthy else 503)
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        workers = [self._worker_status(w) for w in self.workers]
+        totals: dict[str, Any] = {}
+        for status in workers:
+            for key, value in (status.get("metrics") or {}).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] = totals.get(key, 0) + value
+        latencies = [w["latency_ms"] for w in workers if isinstance(w.get("latency_ms"), (int, float))]
+        return web.json_response({
+            "shard_count": self.shard_count,
+            "workers": len(workers),
+            "healthy_workers": sum(1 for w in workers if w["healthy"]),
+            "max_latency_ms": max(latencies) if latencies else None,
+            "totals": totals,
+            "service": self.service.stats(),
+            "per_worker": workers,
+        })
+
+    async def _run_health_server(self) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_get("/health", self._health)
+        app.router.add_get("/", self._health)
+        app.router.add_get("/metrics", self._metrics)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        host = os.getenv("HEALTH_HOST", "0.0.0.0")
+        port = int(os.getenv("HEALTH_PORT") or os.getenv("PORT") or "8000")
+        await web.TCPSite(runner, host, port).start()
+        logger.info("✅ cluster health server listening (%s:%s)", host, port)
+        return runner
+
+    # -------------------------
+    # 実行
+    # -------------------------
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stopping.set)
+            except NotImplementedError:
+                pass
+
+        await self.service.start()
+        runner = await self._run_health_server()
+        supervisors = []
+        try:
+            for worker in self.workers:
+                await self._spawn(worker)
+                supervisors.append(asyncio.create_task(self._supervise(worker)))
+                if worker is not self.workers[-1]:
+                    try:
+                        await asyncio.wait_for(self._stopping.wait(), timeout=self._identify_delay(worker))
+                        break
+                    except asyncio.TimeoutError:
+                        pass
+            await self._stopping.wait()
+        finally:
+            logger.info("🛑 stopping cluster...")
+            self._stopping.set()
+            await self._stop_workers()
+            for task in supervisors:
+                task.cancel()
+            await runner.cleanup()
+            await self.service.stop()
+
+
+async def _main() -> None:
+    workers = max(1, CLUSTER_WORKERS)
+    shard_count = CLUSTER_SHARD_COUNT
+    max_concurrency = 1
+    token = os.getenv("DISCORD_BOT_TOKEN")
+    if shard_count <= 0 or token:
+        if not token:
+            raise SystemExit("❌ DISCORD_BOT_TOKEN 環境変数が設定されていません")
+        try:
+            info = await fetch_gateway_info(token)
+            max_concurrency = int((info.get("session_start_limit") or {}).get("max_concurrency") or 1)
+            if shard_count <= 0:
+                shard_count = int(info.get("shards") or 1)
+        except Exception as e:
+            if shard_count <= 0:
+                raise SystemExit(f"❌ 推奨シャード数を取得できませんでした（CLUSTER_SHARD_COUNT を指定してください）: {e}")
+            logger.warning("gateway info unavailable; assuming max_concurrency=1: %s", e)
+    # ワーカー数よりシャードが少ないと空のワーカーができるので、シャード数を合わせる
+    shard_count = max(shard_count, workers)
+
+    logger.info("🤖 cluster: workers=%s shards=%s max_concurrency=%s", workers, shard_count, max_concurrency)
+    await Launcher(workers, shard_count, max_concurrency=max_concurrency).run()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    if CLUSTER_WORKERS <= 1:
+        # 単一プロセス: 従来通りの起動
+        os.execv(sys.executable, [sys.executable, str(MAIN_PATH)])
+    asyncio.run(_main())
+
+
+__all__ = ["Launcher", "fetch_gateway_info", "main", "split_shards"]
@@ -0,0 +1,30 @@
+"""ランチャーとワーカー間の通信形式（1 行 1 メッセージの JSON）
+
+リクエスト: {"id": n, "op": "...", ...}
+レスポンス: {"id": n, "ok": true, ...} / {"id": n, "ok": false, "error": "..."}
+配信:       {"event": "<channel>", "data": {...}}（subscribe したチャンネルのみ）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Optional
+
+# 1 メッセージの上限（スナップショット履歴を載せるため大きめ）
+MAX_LINE = 8 * 1024 * 1024
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[dict[str, Any]]:
+    """次のメッセージを読む（接続が閉じたら None）"""
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def encode(message: dict[str, Any]) -> bytes:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+
+
+__all__ = ["MAX_LINE", "encode", "read_message"]
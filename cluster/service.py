@@ -0,0 +1,223 @@
+"""クラスタのロック/状態サービス（ランチャー内で動く Unix ソケットサーバー）
+
+- lease_acquire / lease_release: ユーザー単位のリース（クラスタ全体で 1 つ）。
+  実体はローカル実装と同じ UserConcurrency で、owner にワーカー側の保持者トークンを入れる。
+  同じ保持者からの lease_acquire は延長として扱う。
+  ワーカーの接続が切れたら、そのワーカーが保持していたリースはすべて解放する
+- kv_get / kv_set / kv_del: 名前空間付きの KV（スナップショット履歴など）。
+  バイト数の予算付き LRU
+- subscribe / publish: キャッシュ無効化などのイベントを他のワーカーへ配信する
+- report: ワーカーのヘルス/メトリクス（ランチャーが集約して /health・/metrics で返す）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from cluster.protocol import MAX_LINE, encode, read_message
+from user_concurrency import UserConcurrency
+
+logger = logging.getLogger("rpgbot")
+
+
+class _Connection:
+    __slots__ = ("writer", "channels", "leases", "worker_id")
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.channels: set[str] = set()
+        self.leases: dict[int, str] = {}  # user_id -> holder
+        self.worker_id: Optional[int] = None
+
+    def send(self, message: dict[str, Any]) -> None:
+        if not self.writer.is_closing():
+            self.writer.write(encode(message))
+
+
+class StateService:
+    def __init__(self, socket_path: str, *, kv_budget_bytes: int = 64 * 1024 * 1024):
+        self.socket_path = socket_path
+        self.kv_budget_bytes = max(0, int(kv_budget_bytes))
+        self.leases = UserConcurrency(history_size=0)
+        self._holders: dict[int, tuple[str, _Connection]] = {}  # user_id -> (holder, 接続)
+        self._kv: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._kv_bytes = 0
+        self._connections: set[_Connection] = set()
+        self.reports: dict[int, dict[str, Any]] = {}  # worker_id -> 最新の報告（received_at 付き）
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    # -------------------------
+    # 起動 / 停止
+    # -------------------------
+
+    async def start(self) -> None:
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path, limit=MAX_LINE)
+        logger.info("✅ Cluster state service listening: %s", self.socket_path)
+
+    async def stop(self) -> None:
+        for conn in list(self._connections):
+            conn.writer.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    # -------------------------
+    # 接続処理
+    # -------------------------
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        conn = _Connection(writer)
+        self._connections.add(conn)
+        tasks: set[asyncio.Task] = set()
+        try:
+            while True:
+                message = await read_message(reader)
+                if message is None:
+                    break
+                # 待ちが発生する要求（lease_acquire）があるので、要求毎にタスクで処理する
+                task = asyncio.create_task(self._dispatch(conn, message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.warning("cluster connection error: worker=%s err=%s", conn.worker_id, e)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._connections.discard(conn)
+            # 落ちたワーカーのリースを解放（他ワーカーの待機者が進める）
+            held = list(conn.leases.items())
+            for user_id, holder in held:
+                self._release(user_id, holder)
+            if held:
+                logger.warning("cluster worker disconnected: worker=%s released_leases=%s", conn.worker_id, len(held))
+            writer.close()
+
+    async def _dispatch(self, conn: _Connection, message: dict[str, Any]) -> None:
+        request_id = message.get("id")
+        op = message.get("op")
+        handler = getattr(self, f"_op_{op}", None)
+        try:
+            if handler is None:
+                raise ValueError(f"unknown op: {op!r}")
+            result = await handler(conn, message)
+            response = {"id": request_id, "ok": True, **(result or {})}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            response = {"id": request_id, "ok": False, "error": str(e)}
+        if request_id is not None:
+            conn.send(response)
+
+    # -------------------------
+    # リース
+    # -------------------------
+
+    def _release(self, user_id: int, holder: str) -> bool:
+        current = self._holders.get(user_id)
+        if current is None or current[0] != holder:
+            return False
+        self._holders.pop(user_id, None)
+        current[1].leases.pop(user_id, None)
+        self.leases.release(user_id)
+        return True
+
+    async def _op_lease_acquire(self, conn: _Connection, message: dict[str, Any]) -> dict[str, Any]:
+        user_id, holder = int(message["user_id"]), str(message["holder"])
+        current = self._holders.get(user_id)
+        if current is not None and current[0] == holder and self.leases.is_busy(user_id):
+            # 同じ保持者の再取得は延長として扱う
+            self.leases[user_id] = True
+            return {"acquired": True}
+
+        lease = await self.leases.acquire(user_id, holder, timeout=float(message.get("wait") or 0))
+        if lease is None:
+            return {"acquired": False, "owner": self.leases.describe(user_id)}
+        self._holders[user_id] = (holder, conn)
+        conn.leases[user_id] = holder
+        return {"acquired": True}
+
+    async def _op_lease_release(self, conn: _Connection, message: dict[str, Any]) -> dict[str, Any]:
+        return {"released": self._release(int(message["user_id"]), str(message["holder"]))}
+
+    # -------------------------
+    # KV
+    # -------------------------
+
+    async def _op_kv_get(self, conn: _Connection, message: dict[str, Any]) -> dict[str, Any]:
+        key = (str(message["ns"]), str(message["key"]))
+        value = self._kv.get(key)
+        if value is not None:
+            self._kv.move_to_end(key)
+        return {"value": value}
+
+    async def _op_kv_set(self, conn: _Connection, message: dict[str, Any]) -> dict[str, Any]:
+        key = (str(message["ns"]), str(message["key"]))
+        value = str(message["value"])
+        old = self._kv.pop(key, None)
+        if old is not None:
+            self._kv_bytes -= len(old)
+        self._kv[key] = value
+        self._kv_bytes += len(value)
+        while self.kv_budget_bytes and self._kv_bytes > self.kv_budget_bytes and len(self._kv) > 1:
+            _, dropped = self._kv.popitem(last=False)
+            self._kv_bytes -= len(dropped)
+        return {}
+
+    async def _op_kv_del(self, conn: _Connection, message: dict[str, Any]) -> dict[str, Any]:
+        old = self._kv.pop((str(message["ns"]), str(message["key"])), None)
+        if old is not None:
+            self._kv_bytes -= len(old)
+        return {}
+
+    # -------------------------
+    # pub/sub・報告
+    # -------------------------
+
+    async def _op_hello(self, conn: _Connection, message: dict[str, Any]) -> dict[str, Any]:
+        conn.worker_id = int(message["worker_id"])
+        return {}
+
+    async def _op_subscribe(self, conn: _Connection, message: dict[str, Any]) -> dict[str, Any]:
+        conn.channels.update(str(c) for c in message.get("channels") or [])
+        return {}
+
+    async def _op_publish(self, conn: _Connection, message: dict[str, Any]) -> dict[str, Any]:
+        channel = str(message["channel"])
+        event = {"event": channel, "data": message.get("data")}
+        delivered = 0
+        for other in self._connections:
+            # 発行元には返さない（発行元はローカルで適用済み）
+            if other is not conn and channel in other.channels:
+                other.send(event)
+                delivered += 1
+        return {"delivered": delivered}
+
+    async def _op_report(self, conn: _Connection, message: dict[str, Any]) -> dict[str, Any]:
+        worker_id = int(message["worker_id"])
+        self.reports[worker_id] = {**(message.get("data") or {}), "received_at": time.time()}
+        return {}
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "connections": len(self._connections),
+            "leases": self.leases.stats(),
+            "kv_entries": len(self._kv),
+            "kv_bytes": self._kv_bytes,
+        }
+
+
+__all__ = ["StateService"]
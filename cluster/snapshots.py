@@ -0,0 +1,60 @@
+"""スナップショット履歴のクラスタ実装（debug_state.SnapshotManager のサービス版）"""
+
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Optional
+
+from cluster.client import StateClient
+from debug_state import SnapshotManager, _SnapshotHistory
+
+logger = logging.getLogger("rpgbot")
+
+
+class ClusterSnapshotManager(SnapshotManager):
+    """スナップショット履歴をサービスの KV に置き、ワーカー間で共有する。
+
+    ローカルの LRU は読み取りキャッシュとして使い、操作の前に refresh_user で最新を取り直す。
+    """
+
+    NAMESPACE = "snapshots"
+
+    def __init__(self, client: StateClient, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.client = client
+
+    def _replace_local(self, user_id: int, history: Optional[_SnapshotHistory]) -> None:
+        self._drop_history(user_id)
+        if history is not None and history.meta:
+            self.snapshots[user_id] = history
+            self._bytes += history.nbytes
+            self._enforce_budget(user_id)
+
+    async def refresh_user(self, user_id: int) -> None:
+        try:
+            response = await self.client.request("kv_get", ns=self.NAMESPACE, key=user_id)
+        except Exception as e:
+            logger.debug("snapshot refresh failed; using local copy: user_id=%s err=%s", user_id, e)
+            return
+        value = response.get("value")
+        self._replace_local(user_id, _SnapshotHistory.from_json(json.loads(value)) if value else None)
+
+    def _push(self, user_id: int) -> None:
+        history = self.snapshots.get(user_id)
+        if history is None or not history.meta:
+            self.client.post("kv_del", ns=self.NAMESPACE, key=user_id)
+        else:
+            self.client.post("kv_set", ns=self.NAMESPACE, key=user_id, value=json.dumps(history.to_json(), default=str))
+
+    async def create_snapshot(self, user_id: int, action_type: str, player_data: dict):
+        await self.refresh_user(user_id)
+        await super().create_snapshot(user_id, action_type, player_data)
+        self._push(user_id)
+
+    def remove_last_snapshot(self, user_id: int):
+        super().remove_last_snapshot(user_id)
+        self._push(user_id)
+
+
+__all__ = ["ClusterSnapshotManager"]
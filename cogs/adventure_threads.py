@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import logging
+from discord.ext import commands
+
+logger = logging.getLogger("rpgbot")
+
+
+async def setup(bot: commands.Bot):
+    """冒険スレッドの解決キャッシュを、スレッドの更新/削除イベントに追従させる。"""
+    from adventure_threads import adventure_threads
+
+    bot.add_listener(adventure_threads.on_thread_update, "on_thread_update")
+    bot.add_listener(adventure_threads.on_raw_thread_delete, "on_raw_thread_delete")
+    bot.adventure_threads = adventure_threads
+    logger.info("✅ Loaded extension: cogs.adventure_threads")
+
+
+async def teardown(bot: commands.Bot):
+    from adventure_threads import adventure_threads
+
+    bot.remove_listener(adventure_threads.on_thread_update, "on_thread_update")
+    bot.remove_listener(adventure_threads.on_raw_thread_delete, "on_raw_thread_delete")
@@ -8,7 +8,8 @@ logger = logging.getLogger("rpgbot")
 
 async def setup(bot: commands.Bot):
     """admin_anti_cheat.py の管理コマンド登録を extension 化。"""
-    import admin_anti_cheat
+    from lazy_commands import register_lazy_group
 
-    admin_anti_cheat.setup_admin_commands(bot)
-    logger.info("✅ Loaded extension: cogs.anti_cheat_admin")
+    # admin_anti_cheat は最初に ac_* コマンドが呼ばれた時点で読み込む
+    register_lazy_group(bot, "anti_cheat_admin")
+    logger.info("✅ Loaded extension: cogs.anti_cheat_admin (lazy)")
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import logging
+from discord.ext import commands
+
+logger = logging.getLogger("rpgbot")
+
+
+async def setup(bot: commands.Bot):
+    """BANキャッシュの初回読み込みとバックグラウンド再同期を開始する。"""
+    from ban_cache import ban_cache
+
+    await ban_cache.start()
+    bot.ban_cache = ban_cache
+    logger.info("✅ Loaded extension: cogs.ban_sync")
+
+
+async def teardown(bot: commands.Bot):
+    from ban_cache import ban_cache
+
+    ban_cache.stop()
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from discord.ext import commands
+
+logger = logging.getLogger("rpgbot")
+
+
+def _apply_player_event(data: dict) -> None:
+    import db
+
+    if data.get("deleted"):
+        db.apply_player_delete(data["user_id"])
+    else:
+        db.apply_player_update(data["user_id"], data.get("payload") or {})
+
+
+def _apply_ban_event(data: dict) -> None:
+    from ban_cache import ban_cache
+
+    ban_cache.apply_remote(data["user_id"], bool(data.get("banned")))
+
+
+def _apply_guild_settings_event(data: dict) -> None:
+    import db
+
+    db.invalidate_guild_settings(data.get("guild_id"))
+
+
+def _collect_report(bot: commands.Bot) -> dict:
+    import db
+    from ban_cache import ban_cache
+    from bot_state import attach_bot_state
+    from debug_state import snapshot_manager
+    from leaderboard import leaderboard
+    from loop_watchdog import loop_watchdog
+    from ui.render_queue import render_queue
+    from write_journal import write_journal
+
+    latency = bot.latency
+    leases = attach_bot_state(bot).stats()
+    db_classes = db.request_scheduler.stats()["classes"]
+    loop_health = loop_watchdog.health()
+    renders = render_queue.stats()
+    return {
+        "ready": bot.is_ready(),
+        "latency_ms": round(latency * 1000, 1) if latency == latency else None,  # 未接続時は NaN
+        "loop_lag_ms": loop_health["loop_lag_ms"],
+        "loop_degraded": loop_health["status"] != "ok",
+        "metrics": {
+            "guilds": len(bot.guilds),
+            "leases_held": leases["held"],
+            "leases_waiting": leases["waiting"],
+            "lease_timeouts_total": leases["timeouts_total"],
+            "snapshot_users": snapshot_manager.stats()["users"],
+            "banned_users": len(ban_cache),
+            "leaderboard_players": leaderboard.stats()["players"],
+            "db_waiting": sum(c["waiting"] for c in db_classes.values()),
+            "db_shed_total": sum(c["shed"] for c in db_classes.values()),
+            "db_breakers_open": len(db.breakers.open_keys()),
+            "db_degraded": int(db.is_degraded()),
+            "journal_pending": write_journal.stats()["pending"],
+            "slow_callbacks_total": loop_health["slow_callbacks"],
+            "message_edits_sent_total": renders["sent"],
+            "message_edits_saved_total": renders["saved"],
+            "message_edits_queued": renders["queued"],
+        },
+    }
+
+
+async def _report_loop(bot: commands.Bot, client, interval: float) -> None:
+    while True:
+        try:
+            await client.request("report", worker_id=client.config.worker_id, data=_collect_report(bot))
+        except Exception as e:
+            logger.debug("cluster report failed: err=%s", e)
+        await asyncio.sleep(interval)
+
+
+async def setup(bot: commands.Bot):
+    """クラスタモードのワーカーなら、状態サービスへ接続してキャッシュ同期と報告を開始する。"""
+    from cluster.client import get_client
+    from runtime_settings import CLUSTER_REPORT_INTERVAL
+
+    client = get_client()
+    if client is None:
+        return
+
+    for channel, handler in (
+        ("player", _apply_player_event),
+        ("ban", _apply_ban_event),
+        ("guild_settings", _apply_guild_settings_event),
+    ):
+        try:
+            await client.subscribe(channel, handler)
+        except Exception as e:
+            # 購読は再接続時にやり直される
+            logger.warning("cluster subscribe failed: channel=%s err=%s", channel, e)
+
+    bot.cluster_report_task = asyncio.create_task(_report_loop(bot, client, CLUSTER_REPORT_INTERVAL))
+    logger.info(
+        "✅ Loaded extension: cogs.cluster (worker=%s shards=%s)",
+        client.config.worker_id,
+        ",".join(str(s) for s in client.config.shard_ids),
+    )
+
+
+async def teardown(bot: commands.Bot):
+    task = getattr(bot, "cluster_report_task", None)
+    if task is not None:
+        task.cancel()
@@ -9,17 +9,20 @@ logger = logging.getLogger("rpgbot")
 async def setup(bot: commands.Bot):
     """debug_commands.py の登録処理を extension 化。
 
-    既存の setup_debug_commands(bot) を呼び出してコマンド登録するだけなので、
-    挙動を変えずに main.py を軽くできる。
+    起動時はスタブコマンドだけを登録し、既存の setup_debug_commands(bot) は
+    最初にコマンドが呼ばれた時点で（lazy_commands 経由で）呼び出す。
     """
-    from debug_commands import setup_debug_commands, error_log_manager, snapshot_manager
+    from debug_state import error_log_manager, snapshot_manager
+    from lazy_commands import register_lazy_group
 
-    # main.py 側で bot.user_processing を共有dictとして設定している前提。
-    if not hasattr(bot, "user_processing"):
-        bot.user_processing = {}
+    from bot_state import attach_bot_state
+
+    # main.py 側で bot.user_processing（UserConcurrency）を設定している前提。
+    attach_bot_state(bot)
 
     bot.error_log_manager = error_log_manager
     bot.snapshot_manager = snapshot_manager
 
-    setup_debug_commands(bot)
-    logger.info("✅ Loaded extension: cogs.debug")
+    # コマンド本体（debug_commands）は最初に呼ばれた時点で読み込む
+    register_lazy_group(bot, "debug")
+    logger.info("✅ Loaded extension: cogs.debug (lazy)")
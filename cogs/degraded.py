@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import logging
+
+from discord.ext import commands
+
+logger = logging.getLogger("rpgbot")
+
+
+async def setup(bot: commands.Bot):
+    """DB障害中（縮退モード）に書き込みを伴うコマンドを止めるグローバルチェックを登録する。"""
+    from bot_utils import degraded_mode_check
+
+    bot.add_check(degraded_mode_check)
+    logger.info("✅ Loaded extension: cogs.degraded")
+
+
+async def teardown(bot: commands.Bot):
+    from bot_utils import degraded_mode_check
+
+    bot.remove_check(degraded_mode_check)
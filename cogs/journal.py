@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import logging
+
+from discord.ext import commands
+
+logger = logging.getLogger("rpgbot")
+
+
+async def setup(bot: commands.Bot):
+    """書き込みジャーナルを開き、前回の未送信分（クラッシュ時の残り）の送り直しを開始する。"""
+    import db  # 送信処理（kind 毎のハンドラ）を登録させる
+    from write_journal import write_journal
+
+    await write_journal.start()
+    logger.info("✅ Loaded extension: cogs.journal (pending=%s)", write_journal.stats()["pending"])
+
+
+async def teardown(bot: commands.Bot):
+    from write_journal import write_journal
+
+    await write_journal.stop()
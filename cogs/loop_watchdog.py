@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import logging
+
+from discord.ext import commands
+
+logger = logging.getLogger("rpgbot")
+
+
+async def setup(bot: commands.Bot):
+    """イベントループの遅延の計測と、遅いコールバックの記録を開始する。"""
+    from loop_watchdog import loop_watchdog
+    from runtime_settings import LOOP_WATCHDOG
+
+    if LOOP_WATCHDOG:
+        loop_watchdog.start()
+    logger.info(
+        "✅ Loaded extension: cogs.loop_watchdog (enabled=%s interval=%ss slow_callback=%sms)",
+        LOOP_WATCHDOG,
+        loop_watchdog.interval,
+        round(loop_watchdog.slow_callback * 1000),
+    )
+
+
+async def teardown(bot: commands.Bot):
+    from loop_watchdog import loop_watchdog
+
+    loop_watchdog.stop()
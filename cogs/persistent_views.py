@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from discord.ext import commands
+
+logger = logging.getLogger("rpgbot")
+
+_purge_task: asyncio.Task | None = None
+
+
+async def setup(bot: commands.Bot):
+    """persistent-view の dispatcher を登録し、期限切れの状態の掃除を開始する。"""
+    global _purge_task
+    from bot_state import attach_bot_state
+    from runtime_settings import PERSISTENT_VIEWS, VIEW_STATE_PURGE_INTERVAL
+    from ui.persistent import PersistentViewDispatcher, purge_loop, view_state_store
+
+    # PERSISTENT_VIEWS=0 にしても、有効だったときに送ったボタンは処理できるよう登録しておく
+    bot.add_dynamic_items(PersistentViewDispatcher)
+    if PERSISTENT_VIEWS:
+        _purge_task = asyncio.create_task(purge_loop(attach_bot_state(bot), VIEW_STATE_PURGE_INTERVAL))
+    logger.info(
+        "✅ Loaded extension: cogs.persistent_views (enabled=%s stored=%s)",
+        PERSISTENT_VIEWS,
+        view_state_store.count() if PERSISTENT_VIEWS else 0,
+    )
+
+
+async def teardown(bot: commands.Bot):
+    global _purge_task
+    from ui.persistent import PersistentViewDispatcher, view_state_store
+
+    bot.remove_dynamic_items(PersistentViewDispatcher)
+    if _purge_task is not None:
+        _purge_task.cancel()
+        _purge_task = None
+    view_state_store.close()
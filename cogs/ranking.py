@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from discord.ext import commands
+
+import ranking_commands
+
+logger = logging.getLogger("rpgbot")
+
+
+async def _rebuild_leaderboard() -> None:
+    from leaderboard import leaderboard
+
+    try:
+        await leaderboard.rebuild()
+    except Exception as e:
+        logger.warning("leaderboard rebuild failed: err=%s", e)
+
+
+async def setup(bot: commands.Bot):
+    """!ranking を登録し、ランキング索引の構築をバックグラウンドで開始する。"""
+    ranking_commands.setup_ranking_commands(bot)
+    bot.leaderboard_task = asyncio.create_task(_rebuild_leaderboard())
+    logger.info("✅ Loaded extension: cogs.ranking")
+
+
+async def teardown(bot: commands.Bot):
+    task = getattr(bot, "leaderboard_task", None)
+    if task is not None:
+        task.cancel()
@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+import logging
+
+from discord.ext import commands
+
+logger = logging.getLogger("rpgbot")
+
+
+async def setup(bot: commands.Bot):
+    """最初の書き込みより前に、Supabase のスキーマ（列・必須列）を読み込む。"""
+    from db_schema import schema
+
+    await schema.load()
+    logger.info("✅ Loaded extension: cogs.schema (source=%s)", schema.source)
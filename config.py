@@ -69,6 +69,31 @@ SUPABASE_RETRY_MAX_ATTEMPTS = max(1, min(10, _safe_int_env("SUPABASE_RETRY_MAX_A
 SUPABASE_RETRY_BASE_DELAY = max(0.05, _safe_float_env("SUPABASE_RETRY_BASE_DELAY", 0.5))
 SUPABASE_RETRY_MAX_DELAY = max(0.1, _safe_float_env("SUPABASE_RETRY_MAX_DELAY", 3.0))
 
+# 優先度スケジューラ（db_scheduler.py）
+# - SUPABASE_MAX_CONCURRENCY: 同時に実行する要求の総数（httpx のコネクション数も合わせる）
+# - SUPABASE_CLASS_LIMITS / SUPABASE_CLASS_WEIGHTS: "interactive=24,telemetry=4" 形式で上書き
+# - SUPABASE_SHED_BACKLOG: interactive/gameplay_write の待ちがこの数以上なら telemetry を捨て、admin を後回し
+SUPABASE_MAX_CONCURRENCY = max(1, _safe_int_env("SUPABASE_MAX_CONCURRENCY", 32))
+SUPABASE_CLASS_LIMITS = (os.getenv("SUPABASE_CLASS_LIMITS") or "").strip()
+SUPABASE_CLASS_WEIGHTS = (os.getenv("SUPABASE_CLASS_WEIGHTS") or "").strip()
+SUPABASE_SHED_BACKLOG = max(1, _safe_int_env("SUPABASE_SHED_BACKLOG", 16))
+SUPABASE_TELEMETRY_QUEUE_MAX = max(1, _safe_int_env("SUPABASE_TELEMETRY_QUEUE_MAX", 256))
+
+# サーキットブレーカー（db_breaker.py）: テーブル毎に、直近 WINDOW 件中の失敗率が FAILURE_RATIO 以上
+# （MIN_CALLS 件以上あるとき）で開き、OPEN_SECONDS 後に 1 件だけ試す（失敗が続くと MAX_OPEN_SECONDS まで延長）
+SUPABASE_BREAKER_WINDOW = max(1, _safe_int_env("SUPABASE_BREAKER_WINDOW", 20))
+SUPABASE_BREAKER_MIN_CALLS = max(1, _safe_int_env("SUPABASE_BREAKER_MIN_CALLS", 5))
+SUPABASE_BREAKER_FAILURE_RATIO = min(1.0, max(0.01, _safe_float_env("SUPABASE_BREAKER_FAILURE_RATIO", 0.5)))
+SUPABASE_BREAKER_SLOW_SECONDS = max(0.1, _safe_float_env("SUPABASE_BREAKER_SLOW_SECONDS", 10.0))
+SUPABASE_BREAKER_OPEN_SECONDS = max(0.1, _safe_float_env("SUPABASE_BREAKER_OPEN_SECONDS", 15.0))
+SUPABASE_BREAKER_MAX_OPEN_SECONDS = max(0.1, _safe_float_env("SUPABASE_BREAKER_MAX_OPEN_SECONDS", 120.0))
+
+# 冪等キー（db_idempotency.py）: これらのテーブルへの INSERT は RPC idempotent_insert 経由で送り、
+# リトライ / ジャーナルの再送で二重に入らないようにする（空にすると無効）
+SUPABASE_IDEMPOTENT_TABLES = (
+    os.getenv("SUPABASE_IDEMPOTENT_TABLES") or "storage,death_history,command_logs,anti_cheat_logs"
+).strip()
+
 if SUPABASE_URL and not SUPABASE_URL.startswith(("http://", "https://")):
     # 例: your-project.supabase.co を https://your-project.supabase.co に正規化
     SUPABASE_URL = "https://" + SUPABASE_URL.lstrip("/")
@@ -3,3 +3,7 @@
 from db_part1 import *  # noqa: F401,F403
 from db_part2 import *  # noqa: F401,F403
 
+# アプリ側からの db 呼び出しを呼び出し元毎に集計する（db_profile.py / !admin_dbprofile）
+from db_profile import instrument as _instrument_db_calls  # noqa: E402
+
+_instrument_db_calls(globals(), ("db_part1", "db_part2"))
@@ -0,0 +1,171 @@
+"""Supabase のテーブル（エンドポイント）単位のサーキットブレーカー
+
+障害中は 1 回の呼び出しごとに SUPABASE_RETRY_MAX_ATTEMPTS 回 × タイムアウトを待ち、
+コルーチンが積み上がっていたため、失敗が続いた対象への要求はすぐに CircuitOpen で失敗させる。
+
+- closed: 直近 SUPABASE_BREAKER_WINDOW 件のうち、失敗（ネットワークエラー / タイムアウト / 429 / 5xx /
+  SUPABASE_BREAKER_SLOW_SECONDS 以上かかった応答）の割合が SUPABASE_BREAKER_FAILURE_RATIO 以上なら open
+- open: 要求を送らずに CircuitOpen。一定時間（失敗が続くほど長く）たったら half_open
+- half_open: 1 件だけ試しに送り、成功すれば closed、失敗すれば再び open
+
+4xx（429 以外）はバックエンドが応答しているので成功として数える。
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger("rpgbot")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """ブレーカーが開いているため、要求を送らずに失敗させた"""
+
+    def __init__(self, key: str, retry_after: float):
+        super().__init__(f"circuit open for {key} (retry in {retry_after:.0f}s)")
+        self.key = key
+        self.retry_after = retry_after
+
+
+def breaker_key(url: str) -> str:
+    """/rest/v1/players → "players"、/rest/v1/rpc/admin_player_stats → "rpc/admin_player_stats" """
+    parts = [p for p in urlsplit(url).path.split("/") if p]
+    if len(parts) >= 3 and parts[0] == "rest":
+        return "/".join(parts[2:4]) if parts[2] == "rpc" else parts[2]
+    return "other"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        key: str,
+        *,
+        window: int,
+        min_calls: int,
+        failure_ratio: float,
+        slow_seconds: float,
+        open_seconds: float,
+        max_open_seconds: float,
+    ):
+        self.key = key
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+
+        self.state = CLOSED
+        self._outcomes: deque[bool] = deque(maxlen=window)  # True = 失敗
+        self._opened_at = 0.0
+        self._cooldown = open_seconds
+        self._probing = False
+        self.opened_total = 0
+        self.rejected_total = 0
+
+    def _retry_after(self, now: float) -> float:
+        return max(0.0, self._opened_at + self._cooldown - now)
+
+    def before_request(self) -> bool:
+        """送ってよければ True（half_open の試行なら結果を必ず record すること）。だめなら CircuitOpen"""
+        now = time.monotonic()
+        if self.state == OPEN and self._retry_after(now) <= 0:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return False
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected_total += 1
+        raise CircuitOpen(self.key, self._retry_after(now))
+
+    def record_response(self, status_code: Optional[int], elapsed: float, *, probe: bool) -> None:
+        """応答（例外なら status_code=None）を記録"""
+        failed = status_code is None or status_code == 429 or status_code >= 500 or elapsed >= self.slow_seconds
+        self.record(failed, probe=probe)
+
+    def record(self, failed: bool, *, probe: bool) -> None:
+        if probe:
+            self._probing = False
+            if failed:
+                # 回復していない: 待ち時間を延ばして開き直す
+                self._open(min(self.max_open_seconds, self._cooldown * 2))
+            else:
+                logger.info("✅ circuit closed: %s", self.key)
+                self.state = CLOSED
+                self._cooldown = self.open_seconds
+                self._outcomes.clear()
+            return
+        if self.state != CLOSED:
+            return
+        self._outcomes.append(failed)
+        if len(self._outcomes) >= self.min_calls:
+            failures = sum(self._outcomes)
+            if failures / len(self._outcomes) >= self.failure_ratio:
+                self._open(self.open_seconds)
+
+    def abandon_probe(self) -> None:
+        """試行が結果を出さずに取り消された"""
+        self._probing = False
+
+    def _open(self, cooldown: float) -> None:
+        if self.state != OPEN:
+            self.opened_total += 1
+        logger.warning("⚠️ circuit open: %s (retry in %.0fs)", self.key, cooldown)
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._cooldown = cooldown
+        self._outcomes.clear()
+
+    def stats(self) -> dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "state": self.state,
+            "retry_after": round(self._retry_after(now), 1) if self.state == OPEN else 0.0,
+            "recent_calls": len(self._outcomes),
+            "recent_failures": sum(self._outcomes),
+            "opened_total": self.opened_total,
+            "rejected_total": self.rejected_total,
+        }
+
+
+class BreakerBoard:
+    """対象（テーブル / RPC）ごとのブレーカー"""
+
+    def __init__(self, **settings: Any):
+        self._settings = settings
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def get(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(key, **self._settings)
+        return breaker
+
+    def state(self, key: str) -> str:
+        breaker = self._breakers.get(key)
+        return breaker.state if breaker is not None else CLOSED
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {key: b.stats() for key, b in sorted(self._breakers.items())}
+
+    def open_keys(self) -> list[str]:
+        return [key for key, b in sorted(self._breakers.items()) if b.state != CLOSED]
+
+
+__all__ = [
+    "BreakerBoard",
+    "CLOSED",
+    "CircuitBreaker",
+    "CircuitOpen",
+    "HALF_OPEN",
+    "OPEN",
+    "breaker_key",
+]
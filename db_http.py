@@ -12,6 +12,19 @@ from typing import Any, Callable, Dict, List, Optional
 import httpx
 
 import config
+from db_breaker import CLOSED, BreakerBoard, CircuitOpen, breaker_key
+from db_idempotency import HEADER as IDEMPOTENCY_HEADER
+from db_idempotency import MUTATING_METHODS, RPC_NAME, idempotent_inserts, new_key
+from db_profile import add_response_bytes
+from db_schema import schema
+from db_scheduler import (
+    PrioritizedTransport,
+    RequestScheduler,
+    RequestShed,
+    class_for_op,
+    current_class,
+    parse_class_map,
+)
 
 logger = logging.getLogger("rpgbot")
 
@@ -35,6 +48,13 @@ __all__ = [
     "_extract_postgrest_error",
     "get_client",
     "close_client",
+    "request_scheduler",
+    "RequestShed",
+    "breakers",
+    "CircuitOpen",
+    "is_degraded",
+    "schema",
+    "idempotent_inserts",
 ]
 
 # command_logs のスキーマ差分を一度検出したらキャッシュして無駄な失敗/警告を出さない
@@ -48,6 +68,36 @@ _MISSING_COLUMNS_LOGGED: set[tuple[str, str]] = set()
 _http_client: Optional[httpx.AsyncClient] = None
 _client_lock = asyncio.Lock()
 
+# 全ての Supabase 要求はこのスケジューラの枠を取ってから送られる（db_scheduler.py）
+request_scheduler = RequestScheduler(
+    total=config.SUPABASE_MAX_CONCURRENCY,
+    limits=parse_class_map(
+        config.SUPABASE_CLASS_LIMITS,
+        {"interactive": 24, "gameplay_write": 16, "telemetry": 4, "admin": 4},
+    ),
+    weights=parse_class_map(
+        config.SUPABASE_CLASS_WEIGHTS,
+        {"interactive": 8, "gameplay_write": 4, "telemetry": 1, "admin": 1},
+    ),
+    shed_backlog=config.SUPABASE_SHED_BACKLOG,
+    telemetry_queue_max=config.SUPABASE_TELEMETRY_QUEUE_MAX,
+)
+
+# テーブル / RPC 毎のサーキットブレーカー（db_breaker.py）
+breakers = BreakerBoard(
+    window=config.SUPABASE_BREAKER_WINDOW,
+    min_calls=config.SUPABASE_BREAKER_MIN_CALLS,
+    failure_ratio=config.SUPABASE_BREAKER_FAILURE_RATIO,
+    slow_seconds=config.SUPABASE_BREAKER_SLOW_SECONDS,
+    open_seconds=config.SUPABASE_BREAKER_OPEN_SECONDS,
+    max_open_seconds=config.SUPABASE_BREAKER_MAX_OPEN_SECONDS,
+)
+
+
+def is_degraded() -> bool:
+    """players のブレーカーが閉じていない間は縮退モード（読み取りはキャッシュ、書き込みは拒否）"""
+    return breakers.state("players") != CLOSED
+
 
 def _get_timeout() -> float:
     try:
@@ -86,6 +136,8 @@ def _compute_backoff(attempt: int, base_delay: float, max_delay: float) -> float
 
 
 def _classify_http_error(exc: Exception) -> str:
+    if isinstance(exc, CircuitOpen):
+        return "circuit_open"
     if isinstance(exc, (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.PoolTimeout)):
         return "timeout"
     if isinstance(exc, (httpx.ConnectError, httpx.NetworkError)):
@@ -110,6 +162,14 @@ def _classify_http_error(exc: Exception) -> str:
     return "other"
 
 
+def _payload_columns(payload: Any) -> set[str]:
+    if isinstance(payload, dict):
+        return set(payload)
+    if isinstance(payload, list):
+        return {key for row in payload if isinstance(row, dict) for key in row}
+    return set()
+
+
 def _should_retry(exc: Exception) -> bool:
     if isinstance(
         exc,
@@ -142,47 +202,96 @@ async def _request_with_retry(
     json: Any = None,
     op: str = "db.request",
     context: Optional[dict] = None,
+    idempotency_key: Optional[str] = None,
 ) -> httpx.Response:
     """Conservative retry wrapper for Supabase REST calls.
 
     Retries only on: 429 / 5xx / network & timeout errors.
     For 4xx (except 429), no retry.
+
+    op may carry a priority class prefix (e.g. "telemetry:db.log_command"); see db_scheduler.
+    Scheduler slots are taken per attempt, so backoff sleeps never hold one.
+    Write bodies are shaped against the introspected schema (db_schema) before sending.
+    Mutations carry one idempotency key for all attempts (db_idempotency); inserts into
+    SUPABASE_IDEMPOTENT_TABLES go through the idempotent_insert RPC so a retry of an
+    insert that already landed returns the original rows instead of inserting twice.
     """
 
-    client = await get_client()
-    max_attempts, base_delay, max_delay = _retry_settings()
+    # breaker_key はテーブル名（RPC は "rpc/..." でスキーマに無いので素通り）
+    table = breaker_key(url)
+    if json is not None and method in ("POST", "PATCH"):
+        await schema.ensure(table, _payload_columns(json))
+        json = schema.shape(table, json)
+
     ctx = context or {}
+    if method in MUTATING_METHODS:
+        idempotency_key = idempotency_key or new_key()
+        headers = {**headers, IDEMPOTENCY_HEADER: idempotency_key}
+        ctx = {**ctx, "idempotency_key": idempotency_key}
+        if json is not None and idempotent_inserts.applies(method, table, params, headers):
+            try:
+                return await _request_with_retry(
+                    "POST",
+                    f"{config.SUPABASE_URL}/rest/v1/rpc/{RPC_NAME}",
+                    headers=headers,
+                    json=idempotent_inserts.wrap(table, idempotency_key, json),
+                    op=op,
+                    context=ctx,
+                    idempotency_key=idempotency_key,
+                )
+            except httpx.HTTPStatusError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                if ((_extract_postgrest_error(e) or {}).get("code") or "PGRST202") != "PGRST202":
+                    raise
+                # RPC が未作成: 以降は直接 INSERT する
+                idempotent_inserts.mark_missing(e)
 
-    last_exc: Exception | None = None
-    for attempt in range(1, max_attempts + 1):
-        try:
-            resp = await client.request(method, url, headers=headers, params=params, json=json)
-            resp.raise_for_status()
-            return resp
-        except Exception as e:
-            last_exc = e
-            category = _classify_http_error(e)
-            retryable = _should_retry(e)
-
-            # Keep logs useful but not too noisy: warn on first + last attempt, debug otherwise.
-            level = logging.WARNING if (attempt == 1 or attempt == max_attempts) else logging.DEBUG
-            logger.log(
-                level,
-                "%s failed attempt=%s/%s category=%s ctx=%s err=%s",
-                op,
-                attempt,
-                max_attempts,
-                category,
-                ctx,
-                _format_httpx_error(e),
-            )
-
-            if not retryable or attempt >= max_attempts:
-                break
-            await asyncio.sleep(_compute_backoff(attempt, base_delay, max_delay))
-
-    assert last_exc is not None
-    raise last_exc
+    client = await get_client()
+    max_attempts, base_delay, max_delay = _retry_settings()
+    token = current_class.set(class_for_op(op))
+    try:
+        last_exc: Exception | None = None
+        for attempt in range(1, max_attempts + 1):
+            try:
+                resp = await client.request(method, url, headers=headers, params=params, json=json)
+                resp.raise_for_status()
+                add_response_bytes(len(resp.content))
+                return resp
+            except RequestShed:
+                # 混雑時に意図して捨てた要求: リトライもしないし警告も出さない
+                logger.debug("%s shed by scheduler ctx=%s", op, ctx)
+                raise
+            except CircuitOpen as e:
+                # 障害中: 待たずに失敗させる（ブレーカーが開いた時点で警告済み）
+                logger.debug("%s rejected: %s ctx=%s", op, e, ctx)
+                raise
+            except Exception as e:
+                last_exc = e
+                category = _classify_http_error(e)
+                retryable = _should_retry(e)
+
+                # Keep logs useful but not too noisy: warn on first + last attempt, debug otherwise.
+                level = logging.WARNING if (attempt == 1 or attempt == max_attempts) else logging.DEBUG
+                logger.log(
+                    level,
+                    "%s failed attempt=%s/%s category=%s ctx=%s err=%s",
+                    op,
+                    attempt,
+                    max_attempts,
+                    category,
+                    ctx,
+                    _LazyHttpxError(e),
+                )
+
+                if not retryable or attempt >= max_attempts:
+                    break
+                await asyncio.sleep(_compute_backoff(attempt, base_delay, max_delay))
+
+        assert last_exc is not None
+        raise last_exc
+    finally:
+        current_class.reset(token)
 
 
 def _get_headers() -> Dict[str, str]:
@@ -195,6 +304,18 @@ def _get_headers() -> Dict[str, str]:
     }
 
 
+class _LazyHttpxError:
+    """ログが実際に出力されるときだけ _format_httpx_error を呼ぶ（DEBUG / 間引きで捨てる場合は読まない）"""
+
+    __slots__ = ("exc",)
+
+    def __init__(self, exc: Exception):
+        self.exc = exc
+
+    def __str__(self) -> str:
+        return _format_httpx_error(self.exc)
+
+
 def _format_httpx_error(exc: Exception) -> str:
     """httpx の例外からレスポンス本文を安全に取り出してログ用に整形。"""
     if isinstance(exc, httpx.HTTPStatusError):
@@ -230,6 +351,10 @@ def _detect_missing_column_from_body(body: str) -> Optional[str]:
         r'column\s+"(?P<col>[a-zA-Z0-9_]+)"\s+of\s+relation\s+"[a-zA-Z0-9_]+"\s+does\s+not\s+exist',
         r"could\s+not\s+find\s+the\s+'(?P<col>[a-zA-Z0-9_]+)'\s+column",
         r"column\s+(?P<col>[a-zA-Z0-9_]+)\s+does\s+not\s+exist",
+        # - column "equipped_shield" does not exist（RPC idempotent_insert 内の INSERT）
+        r'column\s+"(?P<col>[a-zA-Z0-9_]+)"\s+does\s+not\s+exist',
+        # - column players.web_banned does not exist（select= の射影）
+        r"column\s+[a-zA-Z0-9_]+\.(?P<col>[a-zA-Z0-9_]+)\s+does\s+not\s+exist",
     ]
     lower = text.lower()
     for pat in patterns:
@@ -259,7 +384,14 @@ async def get_client() -> httpx.AsyncClient:
     if _http_client is None:
         async with _client_lock:
             if _http_client is None:
-                _http_client = httpx.AsyncClient(timeout=_get_timeout())
+                limits = httpx.Limits(
+                    max_connections=request_scheduler.total,
+                    max_keepalive_connections=request_scheduler.total,
+                )
+                transport = PrioritizedTransport(
+                    request_scheduler, wait_timeout=_get_timeout(), breakers=breakers, limits=limits
+                )
+                _http_client = httpx.AsyncClient(timeout=_get_timeout(), transport=transport)
                 logger.info("✅ HTTPクライアントを初期化しました")
 
     return _http_client
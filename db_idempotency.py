@@ -0,0 +1,79 @@
+"""書き込み要求の冪等キー
+
+_request_with_retry はタイムアウト / 5xx のときに POST / PATCH を再送する。サーバー側では
+1 回目が成功していた場合、INSERT（倉庫・死亡履歴・コマンドログなど）が二重に入っていた。
+
+- 書き込み（POST / PATCH / DELETE）は 1 回の呼び出しにつき 1 つのキーを持ち、
+  すべての再送で同じキーを使う（Idempotency-Key ヘッダーとログの ctx に付く）
+- SUPABASE_IDEMPOTENT_TABLES のテーブルへの INSERT は RPC idempotent_insert
+  （supabase_sql.sql）経由で送る。RPC は request_dedup にキーを記録し、適用済みのキーなら
+  INSERT せずに最初の結果を返す
+- ジャーナル（write_journal）の再送は JournalEntry.key をそのまま使うので、再起動を
+  またいでも二重にならない
+
+PATCH は絶対値（gold=現在値+加算 を計算済みの値）を送るので、同じ本文の再送はもともと冪等。
+RPC が未作成（404）なら、以降は従来通り直接 INSERT する（警告は 1 回だけ）。
+"""
+
+from __future__ import annotations
+
+import logging
+import uuid
+from typing import Any, Optional
+
+logger = logging.getLogger("rpgbot")
+
+RPC_NAME = "idempotent_insert"
+HEADER = "Idempotency-Key"
+MUTATING_METHODS = frozenset({"POST", "PATCH", "DELETE"})
+
+
+def new_key() -> str:
+    return uuid.uuid4().hex
+
+
+class IdempotentInserts:
+    def __init__(self, tables: frozenset[str]):
+        self.tables = tables
+        self.rpc_missing = False
+        self.wrapped = 0
+
+    def applies(self, method: str, table: str, params: Optional[dict], headers: dict) -> bool:
+        """RPC 経由にする INSERT か（upsert や対象外のテーブルはそのまま送る）"""
+        if method != "POST" or self.rpc_missing or table not in self.tables:
+            return False
+        if params:
+            # on_conflict / columns などを使う要求は PostgREST にそのまま任せる
+            return False
+        return "resolution=" not in (headers.get("Prefer") or "")
+
+    def wrap(self, table: str, key: str, body: Any) -> dict[str, Any]:
+        self.wrapped += 1
+        return {"p_key": key, "p_table": table, "p_rows": body}
+
+    def mark_missing(self, exc: Exception) -> None:
+        self.rpc_missing = True
+        logger.warning(
+            "db: RPC %s unavailable; inserts are sent without idempotency keys (apply supabase_sql.sql) err=%s",
+            RPC_NAME,
+            exc,
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "tables": len(self.tables),
+            "rpc": "missing" if self.rpc_missing else "ok",
+            "wrapped": self.wrapped,
+        }
+
+
+def _create_idempotent_inserts() -> IdempotentInserts:
+    import config
+
+    tables = frozenset(t.strip() for t in config.SUPABASE_IDEMPOTENT_TABLES.split(",") if t.strip())
+    return IdempotentInserts(tables)
+
+
+idempotent_inserts = _create_idempotent_inserts()
+
+__all__ = ["HEADER", "IdempotentInserts", "MUTATING_METHODS", "RPC_NAME", "idempotent_inserts", "new_key"]
@@ -2,14 +2,74 @@
 
 from db_http import *
 
-async def get_player(user_id):
-    """プレイヤーデータを取得"""
-    client = await get_client()
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping
+
+from db_idempotency import new_key
+from player_state import Inventory, PlayerState, select_clause
+
+# 縮退モード（is_degraded）用: 最後に読んだ / 書いたプレイヤー状態（user_id -> row、LRU）
+_LAST_PLAYER_STATE: OrderedDict[str, dict] = OrderedDict()
+
+
+def _remember_player_state(user_id, row: dict) -> None:
+    from runtime_settings import DEGRADED_PLAYER_CACHE_SIZE
+
+    key = str(user_id)
+    _LAST_PLAYER_STATE[key] = dict(row)
+    _LAST_PLAYER_STATE.move_to_end(key)
+    while len(_LAST_PLAYER_STATE) > DEGRADED_PLAYER_CACHE_SIZE:
+        _LAST_PLAYER_STATE.popitem(last=False)
+
+
+def get_cached_player(user_id, fields=None) -> Optional[PlayerState]:
+    """最後に分かっているプレイヤー状態（古い可能性がある。縮退モードの表示用）"""
+    import copy
+
+    row = _LAST_PLAYER_STATE.get(str(user_id))
+    if row is None:
+        return None
+    if fields:
+        row = {k: row[k] for k in ("user_id", *fields) if k in row}
+    return PlayerState(copy.deepcopy(row))
+
+
+def _player_fields(fields: Optional[Iterable[str]]) -> Optional[tuple[str, ...]]:
+    """select する列からスキーマに無い列を除く（None / 空なら全列）"""
+    if not fields:
+        return None
+    known = schema.columns("players")
+    missing = _get_missing_columns("players")
+    kept = tuple(f for f in fields if f not in missing and (known is None or f in known))
+    return kept or ("user_id",)
+
+
+def _missing_column_from_error(exc: Exception) -> Optional[str]:
+    if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 400:
+        try:
+            return _detect_missing_column_from_body(exc.response.text)
+        except Exception:
+            return None
+    return None
+
+
+async def get_player(user_id, fields: Optional[Iterable[str]] = None) -> Optional[PlayerState]:
+    """プレイヤーデータを取得
+
+    fields を渡すとその列だけを取得する（PostgREST の select= 射影。user_id は常に含む）。
+    戻り値は PlayerState（dict と同じように使える）。取得しなかった列は「無いキー」になる。
+
+    players のブレーカーが開いている（縮退モード）間は、最後に分かっている状態を返す。
+    """
     url = f"{config.SUPABASE_URL}/rest/v1/players"
-    params = {"user_id": f"eq.{str(user_id)}", "select": "*"}
+    if fields:
+        fields = tuple(fields)
+        await schema.ensure("players", fields)
+    fields = _player_fields(fields)
+    params = {"user_id": f"eq.{str(user_id)}", "select": select_clause(fields)}
 
     if config.VERBOSE_DEBUG:
-        logger.debug("db.get_player: user_id=%s", user_id)
+        logger.debug("db.get_player: user_id=%s select=%s", user_id, params["select"])
     try:
         response = await _request_with_retry(
             "GET",
@@ -22,8 +82,41 @@ async def get_player(user_id):
         data = response.json()
         if config.VERBOSE_DEBUG:
             logger.debug("db.get_player: user_id=%s found=%s", user_id, bool(data))
-        return data[0] if data else None
+        if not data:
+            return None
+        row = data[0]
+        from write_journal import write_journal
+
+        if write_journal.has_pending(user_id):
+            # まだ送れていない書き込みを重ねる（読んだ値で書き戻して進行を失わないように）
+            for entry in write_journal.pending_for(user_id, "players.update"):
+                row.update(entry.data if fields is None else {k: v for k, v in entry.data.items() if k in row})
+        if "milestone_flags" in row:
+            from adventure_threads import adventure_threads
+
+            adventure_threads.remember_flags(user_id, row.get("milestone_flags") or {})
+        if fields is None:
+            _remember_player_state(user_id, row)
+        else:
+            # 一部の列だけの行は新規には覚えない（縮退時に欠けた行を返さないように）
+            cached = _LAST_PLAYER_STATE.get(str(user_id))
+            if cached is not None:
+                cached.update(row)
+        return PlayerState(row)
     except Exception as e:
+        missing = _missing_column_from_error(e) if fields else None
+        if missing and missing in fields:
+            # 古いスキーマに無い列を select した: 覚えて除いた列で取り直す
+            _get_missing_columns("players").add(missing)
+            logger.warning("db.get_player: column missing; dropping from select col=%s", missing)
+            return await get_player(user_id, fields)
+        if is_degraded():
+            cached = get_cached_player(user_id, fields)
+            if cached is not None:
+                logger.debug("db.get_player: serving cached state (degraded) user_id=%s", user_id)
+                return cached
+        if isinstance(e, CircuitOpen):
+            raise
         logger.warning("db.get_player failed: user_id=%s err=%s", user_id, _format_httpx_error(e))
         raise
 
@@ -54,26 +147,89 @@ async def create_player(user_id: int):
         logger.warning("db.create_player failed: user_id=%s err=%s", user_id, _format_httpx_error(e))
         raise
 
+def apply_player_update(user_id, payload: dict) -> None:
+    """書き込みをこのプロセスのメモリ上の索引（冒険スレッド / ランキング）へ反映"""
+    from adventure_threads import adventure_threads
+    from leaderboard import WATCHED_COLUMNS, leaderboard
+
+    if "milestone_flags" in payload:
+        adventure_threads.remember_flags(user_id, payload["milestone_flags"] or {})
+    cached = _LAST_PLAYER_STATE.get(str(user_id))
+    if cached is not None:
+        cached.update(payload)
+    if WATCHED_COLUMNS.intersection(payload):
+        try:
+            leaderboard.on_player_update(user_id, payload)
+        except Exception as e:
+            logger.warning("leaderboard update failed: user_id=%s err=%s", user_id, e)
+
+
+def apply_player_delete(user_id) -> None:
+    from adventure_threads import adventure_threads
+    from leaderboard import leaderboard
+
+    _LAST_PLAYER_STATE.pop(str(user_id), None)
+    adventure_threads.forget(user_id)
+    leaderboard.on_player_delete(user_id)
+
+
+def _notify_player_update(user_id, payload: dict) -> None:
+    """索引へ反映し、クラスタモードなら他のワーカーにも配信する"""
+    from cluster.client import publish_nowait
+    from leaderboard import WATCHED_COLUMNS
+
+    apply_player_update(user_id, payload)
+
+    shared = {k: v for k, v in payload.items() if k in WATCHED_COLUMNS and k != "milestone_flags"}
+    flags = payload.get("milestone_flags")
+    if isinstance(flags, dict):
+        # 他のワーカーが必要とするのは冒険スレッド/ギルドのキーだけ
+        shared["milestone_flags"] = {k: flags[k] for k in (_ADVENTURE_THREAD_KEY, _ADVENTURE_GUILD_KEY) if k in flags}
+    if shared:
+        publish_nowait("player", {"user_id": str(user_id), "payload": shared})
+
 async def update_player(user_id, **kwargs):
-    """プレイヤーデータを更新"""
-    client = await get_client()
+    """プレイヤーデータを更新
+
+    送信前にローカルジャーナルへ記録する（write_journal.py）。Supabase が一時的に応答しないときは
+    後で送り直すことにして、ローカルの状態だけ先に反映して返す（戻り値は空リスト）。
+    """
+    from write_journal import DEFERRED, write_journal
+
+    result = await write_journal.submit("players.update", user_id, kwargs)
+    if result is DEFERRED:
+        _notify_player_update(user_id, kwargs)
+        return []
+    return result
+
+
+async def _replay_player_update(entry, replay: bool):
+    # リプレイ時は、ローカルの状態（後続の書き込みを反映済み）を古い値で戻さないよう通知しない
+    return await _send_player_update(entry.user_id, entry.data, notify=not replay)
+
+
+async def _send_player_update(user_id, payload: dict, *, notify: bool = True):
     url = f"{config.SUPABASE_URL}/rest/v1/players"
     params = {"user_id": f"eq.{str(user_id)}"}
 
     if config.VERBOSE_DEBUG:
-        logger.debug("db.update_player: user_id=%s keys=%s", user_id, sorted(kwargs.keys()))
+        logger.debug("db.update_player: user_id=%s keys=%s", user_id, sorted(payload.keys()))
     def _looks_like_missing_column_error(text: str) -> bool:
         # Supabase(PostgREST)はカラム不一致等で400を返すことがある
         t = (text or "").lower()
         return any(s in t for s in ["column", "does not exist", "schema cache", "pgrst"])
 
-    payload = dict(kwargs)
+    # 起動時に読んだスキーマ（db_schema）に無い列は送らない（知らない列なら先に 1 回読み直す）
+    await schema.ensure("players", payload.keys())
+    payload = dict(schema.shape("players", payload))
 
     # Compatibility: if we already know some columns are missing, strip them up-front.
     missing_cols = _get_missing_columns("players")
     if missing_cols:
         for c in list(missing_cols):
             payload.pop(c, None)
+    if not payload:
+        return []
 
     try:
         response = await _request_with_retry(
@@ -87,6 +243,8 @@ async def update_player(user_id, **kwargs):
         )
         if config.VERBOSE_DEBUG:
             logger.debug("db.update_player: user_id=%s ok", user_id)
+        if notify:
+            _notify_player_update(user_id, payload)
         return response.json()
     except httpx.HTTPStatusError as e:
         # Compatibility: missing columns (old schema). Cache and retry without them.
@@ -137,6 +295,8 @@ async def update_player(user_id, **kwargs):
                         op="db.update_player.retry_without_missing_column",
                         context={"user_id": str(user_id), "keys": sorted(payload.keys()), "dropped": missing},
                     )
+                    if notify:
+                        _notify_player_update(user_id, payload)
                     return response2.json()
                 except httpx.HTTPStatusError as e2:
                     # If another missing column exists, loop again; else rethrow.
@@ -151,6 +311,9 @@ async def update_player(user_id, **kwargs):
 
         logger.warning("db.update_player failed: user_id=%s err=%s", user_id, _format_httpx_error(e))
         raise
+    except CircuitOpen:
+        # 障害中の書き込みは待たずに失敗させる（ブレーカーが開いた時点で警告済み）
+        raise
     except Exception as e:
         logger.warning("db.update_player failed: user_id=%s err=%s", user_id, _format_httpx_error(e))
         raise
@@ -168,6 +331,11 @@ async def delete_player(user_id):
         response.raise_for_status()
         if config.VERBOSE_DEBUG:
             logger.debug("db.delete_player: user_id=%s ok", user_id)
+
+        from cluster.client import publish_nowait
+
+        apply_player_delete(user_id)
+        publish_nowait("player", {"user_id": str(user_id), "deleted": True})
     except Exception as e:
         logger.warning("db.delete_player failed: user_id=%s err=%s", user_id, _format_httpx_error(e))
         raise
@@ -177,11 +345,45 @@ async def delete_player(user_id):
 # Guild settings (server-scoped)
 # ==============================
 
+# guild_id -> (expires_at, settings / None)。設定なし（None）もキャッシュする
+_GUILD_SETTINGS_CACHE: dict[str, tuple[float, Optional[dict]]] = {}
+
+
+def _cache_guild_settings(guild_id, settings: Optional[dict]) -> None:
+    import time
+
+    from runtime_settings import GUILD_SETTINGS_CACHE_TTL
+
+    if GUILD_SETTINGS_CACHE_TTL > 0:
+        _GUILD_SETTINGS_CACHE[str(guild_id)] = (time.monotonic() + GUILD_SETTINGS_CACHE_TTL, settings)
+
+
+def invalidate_guild_settings(guild_id=None) -> None:
+    """ギルド設定キャッシュを破棄（guild_id 省略で全件）"""
+    if guild_id is None:
+        _GUILD_SETTINGS_CACHE.clear()
+    else:
+        _GUILD_SETTINGS_CACHE.pop(str(guild_id), None)
+
+
+def _publish_guild_settings_changed(guild_id) -> None:
+    from cluster.client import publish_nowait
+
+    publish_nowait("guild_settings", {"guild_id": str(guild_id)})
+
+
 async def get_guild_settings(guild_id: int) -> Optional[dict]:
     """ギルド（サーバー）単位の設定を取得。
 
-    注意: Supabase側に `guild_settings` テーブルが無い場合でもBOTが落ちないように None を返す。
+    GUILD_SETTINGS_CACHE_TTL 秒キャッシュする（set_guild_adventure_parent_channel / clear_guild_settings で更新）。
+    注意: Supabase側に `guild_settings` テーブルが無い場合でもBOTが落ちないように None を返す（この場合はキャッシュしない）。
     """
+    import time
+
+    cached = _GUILD_SETTINGS_CACHE.get(str(guild_id))
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
     client = await get_client()
     url = f"{config.SUPABASE_URL}/rest/v1/guild_settings"
     params = {"guild_id": f"eq.{str(guild_id)}", "select": "*"}
@@ -196,7 +398,9 @@ async def get_guild_settings(guild_id: int) -> Optional[dict]:
         data = response.json()
         if config.VERBOSE_DEBUG:
             logger.debug("db.get_guild_settings: guild_id=%s found=%s", guild_id, bool(data))
-        return data[0] if data else None
+        settings = data[0] if data else None
+        _cache_guild_settings(guild_id, settings)
+        return settings
     except Exception as e:
         logger.warning("db.get_guild_settings exception: guild_id=%s err=%s", guild_id, _format_httpx_error(e))
         return None
@@ -236,8 +440,18 @@ async def set_guild_adventure_parent_channel(guild_id: int, channel_id: int) ->
             return False
         if config.VERBOSE_DEBUG:
             logger.debug("db.set_guild_adventure_parent_channel: guild_id=%s ok", guild_id)
+        try:
+            rows = response.json()
+        except Exception:
+            rows = None
+        if rows:
+            _cache_guild_settings(guild_id, rows[0])
+        else:
+            invalidate_guild_settings(guild_id)
+        _publish_guild_settings_changed(guild_id)
         return True
     except Exception as e:
+        invalidate_guild_settings(guild_id)
         logger.warning("db.set_guild_adventure_parent_channel exception: guild_id=%s err=%s", guild_id, _format_httpx_error(e))
         return False
 
@@ -261,8 +475,11 @@ async def clear_guild_settings(guild_id: int) -> bool:
             return False
         if config.VERBOSE_DEBUG:
             logger.debug("db.clear_guild_settings: guild_id=%s ok", guild_id)
+        _cache_guild_settings(guild_id, None)
+        _publish_guild_settings_changed(guild_id)
         return True
     except Exception as e:
+        invalidate_guild_settings(guild_id)
         logger.warning("db.clear_guild_settings exception: guild_id=%s err=%s", guild_id, _format_httpx_error(e))
         return False
 
@@ -276,8 +493,17 @@ _ADVENTURE_GUILD_KEY = "_adventure_guild_id"
 
 
 async def get_adventure_thread_id(user_id: int) -> Optional[int]:
-    """プレイヤーに紐づく冒険スレッドIDを取得（保存先は milestone_flags を利用）。"""
-    player = await get_player(user_id)
+    """プレイヤーに紐づく冒険スレッドIDを取得（保存先は milestone_flags を利用）。
+
+    一度読み込んだ（または保存した）対応はメモリから返す。
+    """
+    from adventure_threads import adventure_threads
+
+    known, entry = adventure_threads.lookup(user_id)
+    if known:
+        return entry[0] if entry else None
+
+    player = await get_player(user_id, fields=("milestone_flags",))
     if not player:
         return None
     flags = player.get("milestone_flags", {}) or {}
@@ -290,7 +516,7 @@ async def get_adventure_thread_id(user_id: int) -> Optional[int]:
 
 async def set_adventure_thread(user_id: int, thread_id: int, guild_id: int) -> None:
     """冒険スレッドIDを保存（milestone_flags）。"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("milestone_flags",))
     flags = (player.get("milestone_flags", {}) if player else {}) or {}
     flags[_ADVENTURE_THREAD_KEY] = str(thread_id)
     flags[_ADVENTURE_GUILD_KEY] = str(guild_id)
@@ -299,7 +525,7 @@ async def set_adventure_thread(user_id: int, thread_id: int, guild_id: int) -> N
 
 async def clear_adventure_thread(user_id: int) -> None:
     """冒険スレッドIDを削除（milestone_flags）。"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("milestone_flags",))
     if not player:
         return
     flags = player.get("milestone_flags", {}) or {}
@@ -313,37 +539,171 @@ async def clear_adventure_thread(user_id: int) -> None:
     if changed:
         await update_player(user_id, milestone_flags=flags)
 
-async def add_item_to_inventory(user_id, item_name):
+async def list_guild_settings() -> list[dict]:
+    """guild_settings を全件取得（スレッド運用しているギルドの一覧）。テーブルが無ければ空リスト。"""
+    url = f"{config.SUPABASE_URL}/rest/v1/guild_settings"
+    params = {"select": "guild_id,adventure_parent_channel_id"}
+    try:
+        response = await _request_with_retry(
+            "GET",
+            url,
+            headers=_get_headers(),
+            params=params,
+            op="admin:db.list_guild_settings",
+        )
+        return response.json() or []
+    except Exception as e:
+        logger.warning("db.list_guild_settings failed: err=%s", _format_httpx_error(e))
+        return []
+
+
+async def iter_adventure_threads(page_size: int = 1000):
+    """冒険スレッドを持つプレイヤーを (user_id, thread_id, guild_id) で順に返す。
+
+    milestone_flags 全体は取得せず、JSONパスで2つのキーだけを選択する。
+    user_id のキーセットページングなので、途中で行が増減しても取りこぼさない。
+    """
+    url = f"{config.SUPABASE_URL}/rest/v1/players"
+    last_user_id: Optional[str] = None
+    while True:
+        params = {
+            "select": (
+                f"user_id,thread_id:milestone_flags->>{_ADVENTURE_THREAD_KEY},"
+                f"guild_id:milestone_flags->>{_ADVENTURE_GUILD_KEY}"
+            ),
+            f"milestone_flags->>{_ADVENTURE_THREAD_KEY}": "not.is.null",
+            "order": "user_id.asc",
+            "limit": str(page_size),
+        }
+        if last_user_id is not None:
+            params["user_id"] = f"gt.{last_user_id}"
+        response = await _request_with_retry(
+            "GET",
+            url,
+            headers=_get_headers(),
+            params=params,
+            op="admin:db.iter_adventure_threads",
+            context={"after": last_user_id},
+        )
+        rows = response.json() or []
+        for row in rows:
+            try:
+                yield str(row["user_id"]), int(row["thread_id"]), int(row["guild_id"]) if row.get("guild_id") else None
+            except (KeyError, TypeError, ValueError):
+                continue
+        if len(rows) < page_size:
+            return
+        last_user_id = str(rows[-1]["user_id"])
+
+# RPC apply_inventory_delta が未作成なら、以降は get_player + update_player で反映する
+_INVENTORY_RPC_MISSING = False
+
+
+def _clean_inventory_delta(delta: Optional[Mapping[str, int]]) -> dict[str, int]:
+    cleaned: dict[str, int] = {}
+    for item, change in (delta or {}).items():
+        change = int(change or 0)
+        if item and item != "none" and change:
+            cleaned[str(item)] = cleaned.get(str(item), 0) + change
+    return {item: change for item, change in cleaned.items() if change}
+
+
+async def apply_inventory_delta(user_id, delta: Optional[Mapping[str, int]] = None, gold_delta: int = 0) -> Optional[dict]:
+    """所持品の増減（{アイテム名: ±個数}）とゴールドの増減を 1 回でまとめて反映
+
+    個数やゴールドが足りなければ何も変更せず None を返す（プレイヤーが居ない場合も None）。
+    成功時は {"inventory": Inventory, "gold": int}。
+
+    通常は RPC apply_inventory_delta（supabase_sql.sql）が行ロックの中で検証と更新を行う。
+    ジャーナルに未送信の書き込みがある / 障害中 / RPC が一時的に失敗した / RPC が未作成のときは、
+    get_player + update_player（ジャーナル経由）で同じ検証をして反映する。
+    """
+    global _INVENTORY_RPC_MISSING
+    from write_journal import is_transient, write_journal
+
+    delta = _clean_inventory_delta(delta)
+    gold_delta = int(gold_delta or 0)
+
+    if not _INVENTORY_RPC_MISSING and not write_journal.has_pending(user_id):
+        key = new_key()
+        try:
+            response = await _request_with_retry(
+                "POST",
+                f"{config.SUPABASE_URL}/rest/v1/rpc/apply_inventory_delta",
+                headers=_get_headers(),
+                json={"p_user_id": str(user_id), "p_delta": delta, "p_gold_delta": gold_delta, "p_key": key},
+                op="db.apply_inventory_delta",
+                context={"user_id": str(user_id), "items": len(delta), "gold_delta": gold_delta},
+                idempotency_key=key,
+            )
+            result = response.json() or {}
+        except Exception as e:
+            rpc_missing = (
+                isinstance(e, httpx.HTTPStatusError)
+                and e.response is not None
+                and e.response.status_code == 404
+                and ((_extract_postgrest_error(e) or {}).get("code") or "PGRST202") == "PGRST202"
+            )
+            if rpc_missing:
+                _INVENTORY_RPC_MISSING = True
+                logger.warning("db.apply_inventory_delta: RPC unavailable; falling back to read-modify-write")
+            elif is_transient(e):
+                # 障害中 / リトライ後も続くタイムアウトや 5xx: 獲得品を失わないようジャーナル経由で反映する
+                logger.warning("db.apply_inventory_delta: RPC failed transiently; using journaled fallback err=%s", e)
+            else:
+                raise
+            result = None
+        if result is not None:
+            if not result.get("ok"):
+                logger.info(
+                    "db.apply_inventory_delta rejected: user_id=%s reason=%s item=%s",
+                    user_id,
+                    result.get("reason"),
+                    result.get("item"),
+                )
+                return None
+            applied = {"inventory": Inventory.parse(result.get("inventory")), "gold": int(result.get("gold") or 0)}
+            _notify_player_update(user_id, applied)
+            return applied
+
+    player = await get_player(user_id, fields=("inventory", "gold"))
+    if not player:
+        return None
+    inventory = Inventory.parse(player.get("inventory"))
+    gold = int(player.get("gold", 0) or 0)
+    short = inventory.shortfall(delta)
+    if short is not None or gold + gold_delta < 0:
+        logger.info("db.apply_inventory_delta rejected: user_id=%s item=%s gold=%s", user_id, short, gold)
+        return None
+    inventory.apply(delta)
+    updates: dict = {}
+    if delta:
+        updates["inventory"] = inventory
+    if gold_delta:
+        updates["gold"] = gold + gold_delta
+    if updates:
+        await update_player(user_id, **updates)
+    return {"inventory": inventory, "gold": gold + gold_delta}
+
+
+async def add_item_to_inventory(user_id, item_name, count: int = 1):
     """インベントリにアイテムを追加"""
     if item_name == "none":
         """アイテムがnoneの場合は何もせず終了"""
         return
+    await apply_inventory_delta(user_id, {item_name: count})
 
-    player = await get_player(user_id)
-    if player:
-        inventory = player.get("inventory", [])
-        inventory.append(item_name)
-        await update_player(user_id, inventory=inventory)
-
-async def remove_item_from_inventory(user_id, item_name):
-    """インベントリからアイテムを削除"""
-    player = await get_player(user_id)
-    if player:
-        inventory = player.get("inventory", [])
-        if item_name in inventory:
-            inventory.remove(item_name)
-            await update_player(user_id, inventory=inventory)
+async def remove_item_from_inventory(user_id, item_name, count: int = 1):
+    """インベントリからアイテムを削除（足りなければ何もしない）"""
+    return await apply_inventory_delta(user_id, {item_name: -count}) is not None
 
 async def add_gold(user_id, amount):
     """ゴールドを追加"""
-    player = await get_player(user_id)
-    if player:
-        current_gold = player.get("gold", 0)
-        await update_player(user_id, gold=current_gold + amount)
+    await apply_inventory_delta(user_id, gold_delta=amount)
 
 async def get_player_distance(user_id):
     """プレイヤーの現在距離を取得"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("distance",))
     return player.get("distance", 0) if player else 0
 
 async def update_player_distance(user_id, distance):
@@ -353,8 +713,10 @@ async def update_player_distance(user_id, distance):
     await update_player(user_id, distance=distance, current_floor=floor, current_stage=stage)
 
 async def add_player_distance(user_id, increment):
-    """プレイヤーの距離を加算"""
-    player = await get_player(user_id)
+    """プレイヤーの距離を加算（距離スキルの解放も同じ 1 回の書き込みで行う）"""
+    from rpg.progression import progress
+
+    player = await get_player(user_id, fields=("distance", "unlocked_skills"))
     if not player:
         return 0
 
@@ -365,24 +727,25 @@ async def add_player_distance(user_id, increment):
     stage = new_distance // 1000
 
     # スキル解放チェック（1000m毎）
-    await check_and_unlock_distance_skills(user_id, new_distance)
+    result = progress(player, old_distance=current_distance, new_distance=new_distance)
 
     # 新しい距離を設定
     await update_player(user_id, 
                   distance=new_distance, 
                   current_floor=floor, 
-                  current_stage=stage)
+                  current_stage=stage,
+                  **result.updates)
 
     return new_distance
 
 async def get_previous_distance(user_id):
     """前回の距離を取得（現在の距離を返す）"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("distance",))
     return player.get("distance", 0) if player else 0
 
 async def get_milestone_flag(user_id, flag_name):
     """マイルストーンフラグを取得"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("milestone_flags",))
     if player:
         flags = player.get("milestone_flags", {})
         return flags.get(flag_name, False)
@@ -390,7 +753,7 @@ async def get_milestone_flag(user_id, flag_name):
 
 async def set_milestone_flag(user_id, flag_name, value=True):
     """マイルストーンフラグを設定"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("milestone_flags",))
     if player:
         flags = player.get("milestone_flags", {})
         flags[flag_name] = value
@@ -398,7 +761,7 @@ async def set_milestone_flag(user_id, flag_name, value=True):
 
 async def is_boss_defeated(user_id, boss_id):
     """ボスが倒されたかチェック"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("boss_defeated_flags",))
     if player:
         boss_flags = player.get("boss_defeated_flags", {})
         return boss_flags.get(str(boss_id), False)
@@ -406,7 +769,7 @@ async def is_boss_defeated(user_id, boss_id):
 
 async def set_boss_defeated(user_id, boss_id):
     """ボス撃破フラグを設定"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("boss_defeated_flags",))
     if player:
         boss_flags = player.get("boss_defeated_flags", {})
         boss_flags[str(boss_id)] = True
@@ -414,7 +777,7 @@ async def set_boss_defeated(user_id, boss_id):
 
 async def get_tutorial_flag(user_id, tutorial_name):
     """チュートリアルフラグを取得"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("tutorial_flags",))
     if player:
         flags = player.get("tutorial_flags", {})
         return flags.get(tutorial_name, False)
@@ -422,7 +785,7 @@ async def get_tutorial_flag(user_id, tutorial_name):
 
 async def set_tutorial_flag(user_id, tutorial_name):
     """チュートリアルフラグを設定"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("tutorial_flags",))
     if player:
         flags = player.get("tutorial_flags", {})
         flags[tutorial_name] = True
@@ -430,7 +793,7 @@ async def set_tutorial_flag(user_id, tutorial_name):
 
 async def add_secret_weapon(user_id, weapon_id):
     """シークレット武器を追加"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("secret_weapon_ids",))
     if player:
         secret_weapons = player.get("secret_weapon_ids", [])
         if weapon_id not in secret_weapons:
@@ -441,7 +804,7 @@ async def add_secret_weapon(user_id, weapon_id):
 
 async def get_death_count(user_id):
     """死亡回数を取得"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("death_count",))
     return player.get("death_count", 0) if player else 0
 
 async def equip_weapon(user_id, weapon_name):
@@ -456,9 +819,23 @@ async def equip_shield(user_id, shield_name):
     """盾を装備"""
     await update_player(user_id, equipped_shield=shield_name)
 
+def equipped_items_from_player(player):
+    """取得済みのプレイヤー行から装備スロットを取り出す（DBアクセスなし）"""
+    if not player:
+        return {"weapon": None, "armor": None, "shield": None}
+    weapon = player.get("equipped_weapon")
+    armor = player.get("equipped_armor")
+    shield = player.get("equipped_shield")
+
+    # 互換: 以前は盾が防具枠(equipped_armor)で保存されていた
+    if (not shield) and isinstance(armor, str) and "盾" in armor:
+        shield = armor
+        armor = None
+    return {"weapon": weapon, "armor": armor, "shield": shield}
+
 async def get_equipped_items(user_id):
     """装備中のアイテムを取得"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("equipped_weapon", "equipped_armor", "equipped_shield"))
     if player:
         weapon = player.get("equipped_weapon")
         armor = player.get("equipped_armor")
@@ -479,14 +856,14 @@ async def get_equipped_items(user_id):
 
 async def add_upgrade_points(user_id, points):
     """アップグレードポイントを追加"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("upgrade_points",))
     if player:
         current_points = player.get("upgrade_points", 0)
         await update_player(user_id, upgrade_points=current_points + points)
 
 async def spend_upgrade_points(user_id, points):
     """アップグレードポイントを消費"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("upgrade_points",))
     if player:
         current_points = player.get("upgrade_points", 0)
         if current_points >= points:
@@ -496,7 +873,7 @@ async def spend_upgrade_points(user_id, points):
 
 async def increment_death_count(user_id):
     """死亡回数を増やす"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("death_count",))
     if player:
         death_count = player.get("death_count", 0)
         await update_player(user_id, death_count=death_count + 1)
@@ -505,7 +882,7 @@ async def increment_death_count(user_id):
 
 async def get_upgrade_levels(user_id):
     """アップグレードレベルを取得"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("initial_hp_upgrade", "initial_mp_upgrade", "coin_gain_upgrade", "atk_upgrade", "def_upgrade"))
     if player:
         return {
             "initial_hp": player.get("initial_hp_upgrade", 0),
@@ -544,7 +921,7 @@ async def get_upgrade_cost(upgrade_type, user_id):
 
 async def upgrade_initial_hp(user_id):
     """初期HP最大量をアップグレード"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("initial_hp_upgrade", "max_hp", "hp"))
     if player:
         current_level = player.get("initial_hp_upgrade", 0)
         new_max_hp = player.get("max_hp", 50) + 5
@@ -555,7 +932,7 @@ async def upgrade_initial_hp(user_id):
 
 async def upgrade_initial_mp(user_id):
     """初期MP最大量をアップグレード"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("initial_mp_upgrade", "max_mp", "mp"))
     if player:
         current_level = player.get("initial_mp_upgrade", 0)
         new_max_mp = player.get("max_mp", 20) + 5
@@ -566,7 +943,7 @@ async def upgrade_initial_mp(user_id):
 
 async def upgrade_coin_gain(user_id):
     """コイン取得量をアップグレード"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("coin_gain_upgrade", "coin_multiplier"))
     if player:
         current_level = player.get("coin_gain_upgrade", 0)
         new_multiplier = player.get("coin_multiplier", 1.0) + 0.1
@@ -576,7 +953,7 @@ async def upgrade_coin_gain(user_id):
 
 async def upgrade_atk(user_id):
     """攻撃力初期値をアップグレード（3PT で +1ATK）"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("atk_upgrade", "atk"))
     if player:
         current_level = player.get("atk_upgrade", 0)
         new_atk = player.get("atk", 5) + 1
@@ -586,7 +963,7 @@ async def upgrade_atk(user_id):
 
 async def upgrade_def(user_id):
     """防御力初期値をアップグレード（5PT で +1DEF）"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("def_upgrade", "def"))
     if player:
         current_level = player.get("def_upgrade", 0)
         new_def = player.get("def", 2) + 1
@@ -597,7 +974,7 @@ async def upgrade_def(user_id):
 
 async def handle_player_death(user_id, killed_by_enemy_name=None, enemy_type="normal"):
     """プレイヤー死亡時の処理（ポイント付与、死亡回数増加、全アイテム消失、フラグクリア）"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("distance", "inventory", "story_flags", "max_hp", "max_mp"))
     if player:
         distance = player.get("distance", 0)
         floor = distance // 100
@@ -614,8 +991,8 @@ async def handle_player_death(user_id, killed_by_enemy_name=None, enemy_type="no
         # 死亡時リセット：基本は全アイテム消失。
         # ただしストーリー要件により、特定アイテムは死亡で消えない（例: 魔法のランタン）。
         persistent_items_on_death = {"魔法のランタン"}
-        current_inventory = player.get("inventory", []) if isinstance(player.get("inventory", []), list) else []
-        preserved_inventory = [i for i in current_inventory if i in persistent_items_on_death]
+        current_inventory = Inventory.parse(player.get("inventory"))
+        preserved_inventory = Inventory({i: n for i, n in current_inventory.items() if i in persistent_items_on_death})
 
         # 死亡時リセット：装備解除、ゴールドリセット、ゲームクリア状態リセット
         # 重要: ストーリー既読フラグは死亡でリセットしない。
@@ -626,7 +1003,7 @@ async def handle_player_death(user_id, killed_by_enemy_name=None, enemy_type="no
                       distance=0, 
                       current_floor=0, 
                       current_stage=0,
-                  inventory=preserved_inventory,
+                      inventory=preserved_inventory,
                       equipped_weapon=None,
                       equipped_armor=None,
                       equipped_shield=None,
@@ -651,7 +1028,7 @@ async def handle_boss_clear(user_id):
     注意: この関数ではデータリセットを行わない。
     リセットは!resetコマンドでユーザーが手動で行う。
     """
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("gold",))
     if player:
         # クリア報酬（固定50ポイント）
         await add_upgrade_points(user_id, 50)
@@ -673,7 +1050,7 @@ async def handle_boss_clear(user_id):
 
 async def get_story_flag(user_id, story_id):
     """ストーリー既読フラグを取得"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("story_flags",))
     if player:
         flags = player.get("story_flags", {})
         return flags.get(story_id, False)
@@ -681,7 +1058,7 @@ async def get_story_flag(user_id, story_id):
 
 async def set_story_flag(user_id, story_id):
     """ストーリー既読フラグを設定"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("story_flags",))
     if player:
         flags = player.get("story_flags", {})
         flags[story_id] = True
@@ -691,7 +1068,7 @@ async def set_story_flag_key(user_id, key: str, value: bool = True):
     """story_flags に任意キーを保存（チュートリアル等の進行管理用）。"""
     if not key:
         return
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("story_flags",))
     if player:
         flags = player.get("story_flags", {})
         if not isinstance(flags, dict):
@@ -701,7 +1078,7 @@ async def set_story_flag_key(user_id, key: str, value: bool = True):
 
 async def clear_story_flags(user_id):
     """ストーリーフラグをクリア"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("user_id",))
     if player:
         await update_player(user_id, story_flags={})
 
@@ -767,58 +1144,27 @@ async def get_available_secret_weapons():
 
 def get_required_exp(level):
     """レベルアップに必要なEXPを計算"""
-    return level * 100
+    from rpg.progression import required_exp
+
+    return required_exp(level)
 
 async def add_exp(user_id, amount):
-    """EXPを追加してレベルアップ処理"""
-    player = await get_player(user_id)
+    """EXPを追加してレベルアップ処理（何レベル上がっても読み込み 1 回・書き込み 1 回）"""
+    from rpg.progression import progress
+
+    player = await get_player(user_id, fields=("exp", "level", "hp", "max_hp", "atk", "def"))
     if not player:
         return None
 
-    current_exp = player.get("exp", 0)
-    current_level = player.get("level", 1)
-    new_exp = current_exp + amount
-
-    level_ups = []
-
-    # レベルアップチェック
-    while new_exp >= get_required_exp(current_level):
-        new_exp -= get_required_exp(current_level)
-        current_level += 1
-
-        # ステータス上昇
-        if player:
-            new_hp = player.get("hp", 50) + 5
-            new_max_hp = player.get("max_hp", 50) + 5
-            new_atk = player.get("atk", 5) + 1
-            new_def = player.get("def", 2) + 1
-
-            update_data = {
-                "level": current_level,
-                "hp": new_hp,
-                "max_hp": new_max_hp,
-                "atk": new_atk,
-                "def": new_def
-            }
-            await update_player(user_id, **update_data)
-
-            level_ups.append({
-                "new_level": current_level,
-                "hp_gain": 5,
-                "atk_gain": 1,
-                "def_gain": 1
-            })
-
-            player = await get_player(user_id)
-
-    # 残りEXPを更新
-    await update_player(user_id, exp=new_exp)
+    result = progress(player, exp_gain=amount)
+    if result.updates:
+        await update_player(user_id, **result.updates)
 
     return {
         "exp_gained": amount,
-        "current_exp": new_exp,
-        "current_level": current_level,
-        "level_ups": level_ups
+        "current_exp": result.exp,
+        "current_level": result.level,
+        "level_ups": result.level_ups
     }
 
 # ==============================
@@ -827,7 +1173,7 @@ async def add_exp(user_id, amount):
 
 async def consume_mp(user_id, amount):
     """MPを消費"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("mp",))
     if not player:
         return False
 
@@ -845,7 +1191,7 @@ async def consume_mp(user_id, amount):
 
 async def restore_mp(user_id, amount):
     """MPを回復"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("mp", "max_mp"))
     if not player:
         return 0
 
@@ -862,5 +1208,5 @@ async def set_mp_stunned(user_id, stunned):
 
 async def is_mp_stunned(user_id):
     """MP枯渇チェック"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("mp_stunned",))
     return player.get("mp_stunned", False) if player else False
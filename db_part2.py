@@ -1,7 +1,17 @@
 ﻿from __future__ import annotations
 
 from db_part1 import *  # re-export shared helpers
-from db_part1 import _extract_postgrest_error, _format_httpx_error, _get_headers
+from db_part1 import (
+    _extract_postgrest_error,
+    _format_httpx_error,
+    _get_headers,
+    _replay_player_update,
+    _request_with_retry,
+)
+
+# log_command が判定した command_logs のスキーマ（None: 未判定 / "new" / "legacy"）。
+# global で書き換えるのはこのモジュールなので、ここで持つ
+_COMMAND_LOGS_SCHEMA_MODE: Optional[str] = None
 
 # ==============================
 # スキル システム
@@ -9,14 +19,14 @@ from db_part1 import _extract_postgrest_error, _format_httpx_error, _get_headers
 
 async def get_unlocked_skills(user_id):
     """解放済みスキルリストを取得"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("unlocked_skills",))
     if player:
         return player.get("unlocked_skills", ["体当たり"])
     return ["体当たり"]
 
 async def unlock_skill(user_id, skill_id):
     """スキルを解放"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("unlocked_skills",))
     if player:
         unlocked = player.get("unlocked_skills", ["体当たり"])
         if skill_id not in unlocked:
@@ -26,33 +36,25 @@ async def unlock_skill(user_id, skill_id):
     return False
 
 async def check_and_unlock_distance_skills(user_id, distance):
-    """距離に応じてスキルを自動解放"""
-    skill_unlock_map = {
-        1000: "小火球",
-        2000: "軽傷治癒",
-        3000: "強攻撃",
-        4000: "ファイアボール",
-        5000: "猛攻撃",
-        6000: "中治癒",
-        7000: "爆炎",
-        8000: "完全治癒",
-        9000: "神速の一閃",
-        10000: "究極魔法"
-    }
+    """距離に応じてスキルを自動解放（未解放の分だけ 1 回で書き込む）"""
+    from rpg.progression import progress
 
-    for unlock_distance, skill_id in skill_unlock_map.items():
-        if distance >= unlock_distance:
-            await unlock_skill(user_id, skill_id)
+    player = await get_player(user_id, fields=("unlocked_skills",))
+    if not player:
+        return []
+    result = progress(player, new_distance=distance)
+    if result.updates:
+        await update_player(user_id, **result.updates)
+    return result.new_skills
 
 # ==============================
 # 倉庫システム (Storage System)
 # ==============================
 
 async def add_to_storage(user_id, item_name, item_type):
-    """倉庫にアイテムを追加"""
-    client = await get_client()
-    url = f"{config.SUPABASE_URL}/rest/v1/storage"
-    
+    """倉庫にアイテムを追加（一時的な障害時はジャーナルに残して後で送る）"""
+    from write_journal import write_journal
+
     try:
         storage_data = {
             "user_id": str(user_id),
@@ -60,13 +62,23 @@ async def add_to_storage(user_id, item_name, item_type):
             "item_type": item_type,
             "is_taken": False
         }
-        response = await client.post(url, headers=_get_headers(), json=storage_data)
-        response.raise_for_status()
+        await write_journal.submit("storage.insert", user_id, storage_data)
         return True
     except Exception as e:
         logger.exception("Error adding to storage: %s", e)
         return False
 
+async def _send_storage_insert(entry, replay: bool):
+    await _request_with_retry(
+        "POST",
+        f"{config.SUPABASE_URL}/rest/v1/storage",
+        headers=_get_headers(),
+        json=entry.data,
+        op="db.add_to_storage",
+        context={"user_id": entry.user_id},
+        idempotency_key=entry.key or None,
+    )
+
 async def get_storage_items(user_id, include_taken=False):
     """倉庫のアイテムリストを取得"""
     client = await get_client()
@@ -133,12 +145,12 @@ async def set_game_cleared(user_id, cleared=True):
 
 async def is_game_cleared(user_id):
     """ゲームクリア状態を取得"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("game_cleared",))
     return player.get("game_cleared", False) if player else False
 
 async def is_player_banned(user_id):
     """プレイヤーがBANされているかチェック"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("is_banned",))
     if player:
         bot_banned = player.get("is_banned", False)
         return bot_banned
@@ -146,7 +158,7 @@ async def is_player_banned(user_id):
 
 async def get_ban_status(user_id):
     """BAN状態の詳細を取得"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("is_banned", "web_banned"))
     if player:
         return {
             "bot_banned": player.get("is_banned", False),
@@ -154,13 +166,43 @@ async def get_ban_status(user_id):
         }
     return {"bot_banned": False, "web_banned": False}
 
+async def get_banned_user_ids(page_size: int = 1000) -> list[str]:
+    """BAN中（is_banned=true）のユーザーIDを全件取得（BANキャッシュの読み込み用）
+
+    user_id 列だけを取得し、PostgREST の max-rows に収まるようページングする。
+    失敗時は例外を送出する（呼び出し側で既存キャッシュを維持するため）。
+    """
+    url = f"{config.SUPABASE_URL}/rest/v1/players"
+    user_ids: list[str] = []
+    offset = 0
+    while True:
+        params = {
+            "select": "user_id",
+            "is_banned": "eq.true",
+            "order": "user_id.asc",
+            "limit": str(page_size),
+            "offset": str(offset),
+        }
+        response = await _request_with_retry(
+            "GET",
+            url,
+            headers=_get_headers(),
+            params=params,
+            op="admin:db.get_banned_user_ids",
+            context={"offset": offset},
+        )
+        rows = response.json() or []
+        user_ids.extend(str(row["user_id"]) for row in rows if row.get("user_id") is not None)
+        if len(rows) < page_size:
+            return user_ids
+        offset += page_size
+
 # 死亡履歴システム
 
 async def record_death_history(user_id, enemy_name, distance=0, floor=0, stage=0, enemy_type="normal"):
-    """死亡履歴を記録"""
-    client = await get_client()
-    url = f"{config.SUPABASE_URL}/rest/v1/death_history"
-    
+    """死亡履歴を記録（一時的な障害時はジャーナルに残して後で送る）"""
+    from write_journal import write_journal
+
     try:
         death_data = {
             "user_id": str(user_id),
@@ -170,11 +212,10 @@ async def record_death_history(user_id, enemy_name, distance=0, floor=0, stage=0
             "floor": floor,
             "stage": stage
         }
-        response = await client.post(url, headers=_get_headers(), json=death_data)
-        response.raise_for_status()
+        await write_journal.submit("death_history.insert", user_id, death_data)
 
         # total_deaths カウントアップ（オプション）
-        player = await get_player(user_id)
+        player = await get_player(user_id, fields=("total_deaths",))
         if player:
             total_deaths = player.get("total_deaths", 0) + 1
             await update_player(user_id, total_deaths=total_deaths)
@@ -184,6 +225,17 @@ async def record_death_history(user_id, enemy_name, distance=0, floor=0, stage=0
         logger.exception("Error recording death history: %s", e)
         return False
 
+async def _send_death_history_insert(entry, replay: bool):
+    await _request_with_retry(
+        "POST",
+        f"{config.SUPABASE_URL}/rest/v1/death_history",
+        headers=_get_headers(),
+        json=entry.data,
+        op="db.record_death_history",
+        context={"user_id": entry.user_id},
+        idempotency_key=entry.key or None,
+    )
+
 async def get_death_history(user_id, limit=100):
     """死亡履歴を取得（最新limit件）"""
     client = await get_client()
@@ -343,7 +395,7 @@ async def set_active_title(user_id, title_id):
 
 async def get_active_title(user_id):
     """現在装備中の称号を取得"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("active_title_id",))
     if player:
         title_id = player.get("active_title_id")
         if title_id:
@@ -360,75 +412,147 @@ async def unequip_title(user_id):
     return True
 
 
-_original_update_player = globals().get("update_player")
-if config.VERBOSE_DEBUG and _original_update_player and not getattr(_original_update_player, "_is_wrapped_logger", False):
+# ==============================
+# デバッグコマンド用関数
+# ==============================
 
-    # スレッドローカルで再入制御
-    _wrapper_state = threading.local()
+async def iter_players(select: str = "*", page_size: int = 500, **filters):
+    """プレイヤーを user_id のキーセットページングで順に返す（管理者タスクの全件走査用）
 
-    def update_player(*args, **kwargs):  # type: ignore[no-redef]
-        # 抽出できれば user_id をログに載せる
-        user_id = None
-        if args:
-            user_id = args[0]
-        elif "user_id" in kwargs:
-            user_id = kwargs.get("user_id")
+    1ページ分（page_size 行）しか保持しないので、プレイヤー数に関係なくメモリは一定。
+    filters は PostgREST のフィルタ（例: is_banned="eq.true"）。
+    """
+    url = f"{config.SUPABASE_URL}/rest/v1/players"
+    columns = select if select == "*" or "user_id" in select.split(",") else f"user_id,{select}"
+    last_user_id = None
+    while True:
+        params = {"select": columns, "order": "user_id.asc", "limit": str(page_size), **filters}
+        if last_user_id is not None:
+            params["user_id"] = f"gt.{last_user_id}"
+        response = await _request_with_retry(
+            "GET",
+            url,
+            headers=_get_headers(),
+            params=params,
+            op="admin:db.iter_players",
+            context={"after": last_user_id},
+        )
+        rows = response.json() or []
+        for row in rows:
+            yield row
+        if len(rows) < page_size:
+            return
+        last_user_id = rows[-1]["user_id"]
 
-        # すでに wrapper 内なら内部の呼び出しはログせず直接実行
-        if getattr(_wrapper_state, "in_update_player", False):
-            # 直接元の関数を呼ぶ（ログは出さない）
-            return _original_update_player(*args, **kwargs)
+async def get_all_players():
+    """全プレイヤーのリストを取得（管理者用）
 
-        # ログ出力して元関数を呼ぶ
-        _wrapper_state.in_update_player = True
-        try:
-            # 呼び出し元の簡易スタックを取得
-            try:
-                stack = inspect.stack()[1:6]  # 少数のフレームを取る
-                callers = " | ".join(f"{s.filename.split('/')[-1]}:{s.lineno}" for s in stack)
-            except Exception:
-                callers = "stack-unavailable"
-
-            if logger.isEnabledFor(logging.DEBUG):
-                logger.debug(
-                    "db.update_player called user=%s args=%s kwargs=%s callers=%s",
-                    user_id,
-                    args,
-                    kwargs,
-                    callers,
-                )
+    全件をメモリに載せるので、集計には get_admin_stats、走査には iter_players を使うこと。
+    """
+    try:
+        return [row async for row in iter_players()]
+    except Exception as e:
+        logger.error(f"Error getting all players: {e}")
+        return []
 
-            return _original_update_player(*args, **kwargs)
-        finally:
-            _wrapper_state.in_update_player = False
+async def _count_rows(table: str, params: dict, *, op: str) -> int:
+    """PostgREST の count=exact で行数だけを取得"""
+    headers = _get_headers()
+    headers["Prefer"] = "count=exact"
+    response = await _request_with_retry(
+        "GET",
+        f"{config.SUPABASE_URL}/rest/v1/{table}",
+        headers=headers,
+        params={**params, "limit": "1"},
+        op=op,
+    )
+    content_range = response.headers.get("Content-Range", "")
+    if content_range and "/" in content_range:
+        count_str = content_range.split("/")[1]
+        return int(count_str) if count_str != "*" else 0
+    return 0
+
+async def _compute_admin_stats_fallback(window_hours: int, top_n: int, zone_size: int) -> dict:
+    """RPC（admin_player_stats）が未作成の場合の集計（ページングで走査し、行は保持しない）"""
+    from datetime import datetime, timedelta, timezone
+
+    since = (datetime.now(timezone.utc) - timedelta(hours=window_hours)).isoformat()
+    total = active = banned = 0
+    histogram: dict[int, int] = {}
+    top: list[dict] = []
+    async for row in iter_players(select="user_id,name,distance,is_banned"):
+        distance = int(row.get("distance") or 0)
+        total += 1
+        active += 1 if distance > 0 else 0
+        banned += 1 if row.get("is_banned") else 0
+        zone = distance // max(zone_size, 1)
+        histogram[zone] = histogram.get(zone, 0) + 1
+        if top_n > 0:
+            top.append({"user_id": row.get("user_id"), "name": row.get("name"), "distance": distance})
+            if len(top) > top_n * 4:
+                top = sorted(top, key=lambda p: p["distance"], reverse=True)[:top_n]
+
+    return {
+        "total_players": total,
+        "active_players": active,
+        "active_in_window": await _count_rows(
+            "user_behavior_stats", {"select": "user_id", "last_active": f"gte.{since}"}, op="admin:db.admin_stats.active"
+        ),
+        "banned_players": banned,
+        "total_deaths": await _count_rows("death_history", {"select": "id"}, op="admin:db.admin_stats.deaths"),
+        "deaths_in_window": await _count_rows(
+            "death_history", {"select": "id", "died_at": f"gte.{since}"}, op="admin:db.admin_stats.deaths_window"
+        ),
+        "distance_histogram": [{"zone": z, "players": n} for z, n in sorted(histogram.items())],
+        "top_by_distance": sorted(top, key=lambda p: p["distance"], reverse=True)[:top_n],
+        "window_hours": window_hours,
+        "zone_size": zone_size,
+    }
 
-    # マーカーを付けて二重ラップを防ぐ
-    update_player._is_wrapped_logger = True  # type: ignore[attr-defined]
+# (window_hours, top_n, zone_size) -> (expires_at, stats)
+_ADMIN_STATS_CACHE: dict[tuple[int, int, int], tuple[float, dict]] = {}
+_ADMIN_STATS_RPC_MISSING = False
 
-    # 置き換え
-    globals()["update_player"] = update_player
+async def get_admin_stats(window_hours: int = 24, top_n: int = 5, zone_size: int = 1000, *, use_cache: bool = True) -> dict:
+    """管理者向けの集計（総数 / 期間内アクティブ / 1000m帯ヒストグラム / 死亡数 / 距離上位）
 
-else:
-    if config.VERBOSE_DEBUG:
-        logger.debug("db.update_player wrapper: original_update_player not found or already wrapped.")
+    Postgres 側の RPC（supabase_sql.sql の admin_player_stats）で集計し、
+    結果を ADMIN_STATS_CACHE_TTL 秒キャッシュする。RPC が無い環境では iter_players で集計する。
+    """
+    global _ADMIN_STATS_RPC_MISSING
+    import time
 
-# ==============================
-# デバッグコマンド用関数
-# ==============================
+    from runtime_settings import ADMIN_STATS_CACHE_TTL
 
-async def get_all_players():
-    """全プレイヤーのリストを取得（管理者用）"""
-    client = await get_client()
-    url = f"{config.SUPABASE_URL}/rest/v1/players"
-    params = {"select": "*"}
-    
-    try:
-        response = await client.get(url, headers=_get_headers(), params=params)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        logger.error(f"Error getting all players: {e}")
-        return []
+    key = (int(window_hours), int(top_n), int(zone_size))
+    cached = _ADMIN_STATS_CACHE.get(key)
+    if use_cache and cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    stats = None
+    if not _ADMIN_STATS_RPC_MISSING:
+        try:
+            response = await _request_with_retry(
+                "POST",
+                f"{config.SUPABASE_URL}/rest/v1/rpc/admin_player_stats",
+                headers=_get_headers(),
+                json={"active_window_hours": key[0], "top_n": key[1], "zone_size": key[2]},
+                op="admin:db.get_admin_stats",
+            )
+            stats = response.json()
+        except httpx.HTTPStatusError as e:
+            # 関数が未作成（PGRST202）のときだけ、以降はフォールバックで集計する。
+            # それ以外の 400 / 404 は一時的なものかもしれないので覚えずにそのまま返す
+            if (_extract_postgrest_error(e) or {}).get("code") != "PGRST202":
+                raise
+            _ADMIN_STATS_RPC_MISSING = True
+            logger.warning("db.get_admin_stats: RPC admin_player_stats unavailable; falling back to paged scan")
+
+    if stats is None:
+        stats = await _compute_admin_stats_fallback(*key)
+
+    _ADMIN_STATS_CACHE[key] = (time.monotonic() + ADMIN_STATS_CACHE_TTL, stats)
+    return stats
 
 async def ban_player(user_id):
     """プレイヤーをBAN"""
@@ -442,7 +566,7 @@ async def unban_player(user_id):
 
 async def is_player_banned(user_id):
     """プレイヤーがBANされているかチェック"""
-    player = await get_player(user_id)
+    player = await get_player(user_id, fields=("is_banned",))
     if player:
         return player.get("is_banned", False)
     return False
@@ -594,7 +718,6 @@ async def spend_vault_gold(user_id, amount):
 async def log_command(user_id: int, command: str, success: bool = True, metadata: Dict = None):
     """コマンド実行をログに記録"""
     from datetime import datetime, timezone
-    client = await get_client()
     url = f"{config.SUPABASE_URL}/rest/v1/command_logs"
 
     global _COMMAND_LOGS_SCHEMA_MODE
@@ -607,6 +730,12 @@ async def log_command(user_id: int, command: str, success: bool = True, metadata
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }
 
+    # スキーマが読めていれば、失敗を待たずにモードを決める
+    if _COMMAND_LOGS_SCHEMA_MODE is None:
+        required = schema.requires("command_logs", "command_name")
+        if required is not None:
+            _COMMAND_LOGS_SCHEMA_MODE = "legacy" if required else "new"
+
     # legacy (command_name NOT NULL) の場合は最初から合わせる
     if _COMMAND_LOGS_SCHEMA_MODE == "legacy":
         payload = dict(log_data)
@@ -615,11 +744,12 @@ async def log_command(user_id: int, command: str, success: bool = True, metadata
         payload = log_data
 
     try:
-        response = await client.post(url, headers=_get_headers(), json=payload)
-        response.raise_for_status()
+        await _request_with_retry("POST", url, headers=_get_headers(), json=payload, op="telemetry:db.log_command")
         if _COMMAND_LOGS_SCHEMA_MODE is None:
             _COMMAND_LOGS_SCHEMA_MODE = "new"
         return True
+    except RequestShed:
+        return False
     except Exception as e:
         # 旧スキーマ互換: command_name が NOT NULL の場合がある
         pg = _extract_postgrest_error(e)
@@ -633,8 +763,9 @@ async def log_command(user_id: int, command: str, success: bool = True, metadata
             legacy_payload = dict(log_data)
             legacy_payload["command_name"] = command
             try:
-                response2 = await client.post(url, headers=_get_headers(), json=legacy_payload)
-                response2.raise_for_status()
+                await _request_with_retry(
+                    "POST", url, headers=_get_headers(), json=legacy_payload, op="telemetry:db.log_command.legacy"
+                )
                 if config.VERBOSE_DEBUG:
                     logger.debug("command_logs: using legacy schema (command_name)")
                 return True
@@ -647,7 +778,6 @@ async def log_command(user_id: int, command: str, success: bool = True, metadata
 
 async def get_recent_command_logs(user_id: int, limit: int = 100) -> List[Dict]:
     """最近のコマンドログを取得"""
-    client = await get_client()
     url = f"{config.SUPABASE_URL}/rest/v1/command_logs"
     
     try:
@@ -657,8 +787,9 @@ async def get_recent_command_logs(user_id: int, limit: int = 100) -> List[Dict]:
             "order": "timestamp.desc",
             "limit": limit
         }
-        response = await client.get(url, headers=_get_headers(), params=params)
-        response.raise_for_status()
+        response = await _request_with_retry(
+            "GET", url, headers=_get_headers(), params=params, op="telemetry:db.get_recent_command_logs"
+        )
         
         # Convert timestamp strings to datetime objects
         from datetime import datetime
@@ -668,13 +799,14 @@ async def get_recent_command_logs(user_id: int, limit: int = 100) -> List[Dict]:
                 log["timestamp"] = datetime.fromisoformat(log["timestamp"].replace('Z', '+00:00'))
         
         return logs
+    except RequestShed:
+        return []
     except Exception as e:
         logger.error(f"Error getting command logs: {e}")
         return []
 
 async def get_total_command_count(user_id: int) -> int:
     """総コマンド実行数を取得"""
-    client = await get_client()
     url = f"{config.SUPABASE_URL}/rest/v1/command_logs"
     
     try:
@@ -682,9 +814,12 @@ async def get_total_command_count(user_id: int) -> int:
             "user_id": f"eq.{str(user_id)}",
             "select": "id"
         }
-        response = await client.get(url, headers=_get_headers(), params=params)
-        response.raise_for_status()
+        response = await _request_with_retry(
+            "GET", url, headers=_get_headers(), params=params, op="telemetry:db.get_total_command_count"
+        )
         return len(response.json())
+    except RequestShed:
+        return 0
     except Exception as e:
         logger.error(f"Error getting command count: {e}")
         return 0
@@ -692,7 +827,6 @@ async def get_total_command_count(user_id: int) -> int:
 async def log_anti_cheat_event(user_id: int, event_type: str, severity: str, score: int, details: Dict = None):
     """アンチチートイベントをログに記録"""
     from datetime import datetime, timezone
-    client = await get_client()
     url = f"{config.SUPABASE_URL}/rest/v1/anti_cheat_logs"
     
     event_data = {
@@ -703,11 +837,19 @@ async def log_anti_cheat_event(user_id: int, event_type: str, severity: str, sco
         "details": details or {},
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }
+    # 旧スキーマの必須列（スキーマが読めていれば）を最初から埋める
+    if schema.requires("anti_cheat_logs", "detection_type"):
+        event_data["detection_type"] = event_type
+    if schema.requires("anti_cheat_logs", "score"):
+        event_data["score"] = score
 
     try:
-        response = await client.post(url, headers=_get_headers(), json=event_data)
-        response.raise_for_status()
+        await _request_with_retry(
+            "POST", url, headers=_get_headers(), json=event_data, op="telemetry:db.log_anti_cheat_event"
+        )
         return True
+    except RequestShed:
+        return False
     except Exception as e:
         # 旧スキーマ互換: detection_type/score が NOT NULL の場合がある
         pg = _extract_postgrest_error(e)
@@ -726,8 +868,13 @@ async def log_anti_cheat_event(user_id: int, event_type: str, severity: str, sco
                 if needs_score:
                     legacy_payload["score"] = score
                 try:
-                    response2 = await client.post(url, headers=_get_headers(), json=legacy_payload)
-                    response2.raise_for_status()
+                    await _request_with_retry(
+                        "POST",
+                        url,
+                        headers=_get_headers(),
+                        json=legacy_payload,
+                        op="telemetry:db.log_anti_cheat_event.legacy",
+                    )
                     logger.warning("anti_cheat_logs: fell back to legacy columns")
                     return True
                 except Exception as e2:
@@ -759,10 +906,9 @@ async def get_recent_anti_cheat_logs(user_id: int, limit: int = 10) -> List[Dict
 async def update_behavior_stats(user_id: int):
     """ユーザーの行動統計を更新"""
     from datetime import datetime, timezone, timedelta
-    client = await get_client()
     
     try:
-        player = await get_player(user_id)
+        player = await get_player(user_id, fields=("upgrade_points", "equipped_weapon", "equipped_armor"))
         
         if not player:
             return False
@@ -810,14 +956,17 @@ async def update_behavior_stats(user_id: int):
 
         headers = _get_headers().copy()
         headers["Prefer"] = "return=representation,resolution=merge-duplicates"
-        response = await client.post(
+        await _request_with_retry(
+            "POST",
             url,
             headers=headers,
             params={"on_conflict": "user_id"},
             json=stats_data,
+            op="telemetry:db.update_behavior_stats",
         )
-        response.raise_for_status()
         return True
+    except RequestShed:
+        return False
     except Exception as e:
         logger.error(f"Error updating behavior stats: {_format_httpx_error(e)}")
         return False
@@ -846,6 +995,9 @@ async def ban_player(user_id: int, reason: str = "Violation of Terms"):
     
     try:
         await update_player(user_id, is_banned=True, ban_reason=reason)
+
+        from ban_cache import ban_cache
+        ban_cache.mark_banned(user_id)
         
         # BANログを記録
         await log_anti_cheat_event(
@@ -866,8 +1018,23 @@ async def unban_player(user_id: int):
     """プレイヤーのBANを解除"""
     try:
         await update_player(user_id, is_banned=False, ban_reason=None)
+
+        from ban_cache import ban_cache
+        ban_cache.mark_unbanned(user_id)
         logger.info(f"Unbanned user {user_id}")
         return True
     except Exception as e:
         logger.error(f"Error unbanning user {user_id}: {e}")
         return False
+
+
+# ジャーナルに残った書き込みの送信処理（write_journal.py）
+def _register_journal_handlers() -> None:
+    from write_journal import write_journal
+
+    write_journal.register("players.update", _replay_player_update)
+    write_journal.register("storage.insert", _send_storage_insert)
+    write_journal.register("death_history.insert", _send_death_history_insert)
+
+
+_register_journal_handlers()
@@ -0,0 +1,174 @@
+"""db 関数の呼び出し元プロファイラ（サンプリング）
+
+呼び出し元を知る手段は VERBOSE_DEBUG 時の update_player ラッパー（毎回 inspect.stack() を
+取る）しかなく、!move のように 1 コマンドで同じ関数を何十回も呼ぶ N+1 を探しにくかった。
+
+- db.py が公開している async 関数（db_part1 / db_part2）をすべて包む。db 内部同士の呼び出しは
+  モジュール内の元の関数を直接呼ぶので包まれない（= アプリ側からの呼び出しだけを数える）
+- DB_PROFILE_SAMPLE の割合で呼び出しを記録する。記録する呼び出しだけ sys._getframe(1) で
+  呼び出し元（ファイル:行 関数名）を取り、所要時間と受信バイト数（_request_with_retry が加算）を測る
+- (コマンド, db 関数, 呼び出し元) 毎に 回数 / 合計時間 / バイト数 を集計する。キーの数は
+  DB_PROFILE_MAX_KEYS までで、溢れた分は呼び出し元を "(other)" にまとめる
+- コマンド名は before_invoke（main.py）と永続 View の dispatcher が current_command に入れる
+
+!admin_dbprofile で多い順に表示する（回数などはサンプリング率で割り戻した推定値）。
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import os
+import random
+import sys
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from runtime_settings import DB_PROFILE_MAX_KEYS, DB_PROFILE_SAMPLE
+
+# 実行中のコマンド名（"move" / "view:treasure" など）
+current_command: contextvars.ContextVar[str] = contextvars.ContextVar("db_profile_command", default="-")
+# 記録中の db 呼び出しの受信バイト数（[bytes]。記録しない呼び出しと db 内部の入れ子では None）
+current_call: contextvars.ContextVar[Optional[list[int]]] = contextvars.ContextVar("db_profile_call", default=None)
+
+OTHER_SITE = "(other)"
+# create_task / gather 経由だと呼び出し元のフレームが asyncio になる
+_ASYNCIO_DIR = os.path.dirname(getattr(sys.modules.get("asyncio"), "__file__", "") or "")
+
+Key = tuple[str, str, str]
+
+
+class DBProfiler:
+    def __init__(self, sample_rate: float, max_keys: int):
+        self.sample_rate = min(1.0, max(0.0, sample_rate))
+        self.max_keys = max(1, max_keys)
+        # (command, func, site) -> [回数, 合計秒, バイト数]
+        self._counters: dict[Key, list[float]] = {}
+        self._site_names: dict[tuple[str, int, str], str] = {}
+        self.started_at = time.time()
+        self.calls = 0
+        self.sampled = 0
+
+    # -------------------------
+    # 記録
+    # -------------------------
+
+    def _site(self, frame: Any) -> str:
+        code = frame.f_code
+        key = (code.co_filename, frame.f_lineno, code.co_name)
+        site = self._site_names.get(key)
+        if site is None:
+            filename = code.co_filename
+            if _ASYNCIO_DIR and filename.startswith(_ASYNCIO_DIR):
+                site = "<task>"
+            else:
+                site = f"{os.path.basename(filename)}:{frame.f_lineno} {code.co_name}"
+            if len(self._site_names) < self.max_keys * 4:
+                self._site_names[key] = site
+        return site
+
+    def record(self, command: str, func: str, site: str, elapsed: float, nbytes: int) -> None:
+        key = (command, func, site)
+        counter = self._counters.get(key)
+        if counter is None:
+            if len(self._counters) >= self.max_keys:
+                key = (command, func, OTHER_SITE)
+                counter = self._counters.get(key)
+            if counter is None:
+                # "(other)" 用に 1 枠は残しておく
+                if len(self._counters) >= self.max_keys + 1:
+                    return
+                counter = self._counters[key] = [0, 0.0, 0]
+        counter[0] += 1
+        counter[1] += elapsed
+        counter[2] += nbytes
+
+    def wrap(self, func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        name = func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            self.calls += 1
+            # 入れ子（db 関数のコールバックから db 関数）や間引く呼び出しはそのまま通す
+            if current_call.get() is not None or random.random() >= self.sample_rate:
+                return await func(*args, **kwargs)
+
+            self.sampled += 1
+            site = self._site(sys._getframe(1))
+            cell = [0]
+            token = current_call.set(cell)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                current_call.reset(token)
+                self.record(current_command.get(), name, site, elapsed, cell[0])
+
+        wrapper.__db_profiled__ = True  # type: ignore[attr-defined]
+        return wrapper
+
+    # -------------------------
+    # 集計
+    # -------------------------
+
+    def top(self, limit: int = 10, sort: str = "time") -> list[dict[str, Any]]:
+        """多い順の上位（count / total_ms / bytes はサンプリング率で割り戻した推定値）"""
+        scale = 1.0 / self.sample_rate if self.sample_rate > 0 else 0.0
+        column = {"count": 0, "calls": 0, "bytes": 2}.get(sort, 1)
+        ranked = sorted(self._counters.items(), key=lambda item: item[1][column], reverse=True)
+        return [
+            {
+                "command": command,
+                "func": func,
+                "site": site,
+                "count": round(count * scale),
+                "total_ms": total * 1000 * scale,
+                "avg_ms": total * 1000 / count if count else 0.0,
+                "bytes": round(nbytes * scale),
+            }
+            for (command, func, site), (count, total, nbytes) in ranked[: max(1, limit)]
+        ]
+
+    def reset(self) -> None:
+        self._counters.clear()
+        self.started_at = time.time()
+        self.calls = 0
+        self.sampled = 0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "keys": len(self._counters),
+            "max_keys": self.max_keys,
+            "calls": self.calls,
+            "sampled": self.sampled,
+            "since": self.started_at,
+        }
+
+
+def add_response_bytes(nbytes: int) -> None:
+    """_request_with_retry から呼ぶ（記録中の呼び出しにだけ加算する）"""
+    cell = current_call.get()
+    if cell is not None:
+        cell[0] += nbytes
+
+
+def instrument(namespace: dict[str, Any], modules: tuple[str, ...]) -> int:
+    """namespace（db モジュールの globals）の async 関数のうち modules で定義されたものを包む"""
+    import inspect
+
+    wrapped = 0
+    for name, value in list(namespace.items()):
+        if name.startswith("_") or not inspect.iscoroutinefunction(value):
+            continue
+        if getattr(value, "__module__", None) not in modules or getattr(value, "__db_profiled__", False):
+            continue
+        namespace[name] = db_profiler.wrap(value)
+        wrapped += 1
+    return wrapped
+
+
+db_profiler = DBProfiler(DB_PROFILE_SAMPLE, DB_PROFILE_MAX_KEYS)
+
+__all__ = ["DBProfiler", "add_response_bytes", "current_command", "db_profiler", "instrument"]
@@ -0,0 +1,263 @@
+"""Supabase 向け HTTP リクエストの優先度スケジューラ
+
+!move の get_player（対話）、戦闘結果の書き込み、アンチチートのログ（テレメトリ）、
+管理者の全件走査が同じ httpx プールを取り合っていたため、ログが詰まると戦闘のターンが遅れた。
+
+- 優先度クラス: interactive / gameplay_write / telemetry / admin
+- 全体の同時実行数（SUPABASE_MAX_CONCURRENCY）と、クラス毎の同時実行数の上限
+- 空きが出たら、待ちのあるクラスから重み付き公平（stride scheduling）で次を選ぶ
+- 上位クラス（interactive / gameplay_write）の待ちが SUPABASE_SHED_BACKLOG を超えたら、
+  telemetry は即座に捨て（RequestShed）、admin は待ちが解消するまで後回しにする
+
+クラスは _request_with_retry の op に `"telemetry:db.log_command"` の形で付ける。
+付いていない要求（client.get 等の直接呼び出しを含む）は、GET なら interactive、それ以外は gameplay_write。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+
+INTERACTIVE = "interactive"
+GAMEPLAY_WRITE = "gameplay_write"
+TELEMETRY = "telemetry"
+ADMIN = "admin"
+
+PRIORITY_CLASSES = (INTERACTIVE, GAMEPLAY_WRITE, TELEMETRY, ADMIN)
+_HIGH_CLASSES = (INTERACTIVE, GAMEPLAY_WRITE)
+
+# _request_with_retry が設定する、実行中の要求のクラス
+current_class: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("db_priority_class", default=None)
+
+
+class RequestShed(Exception):
+    """高優先度の要求が詰まっているため、低優先度の要求を実行せずに捨てた"""
+
+
+def class_for_op(op: str) -> Optional[str]:
+    """op の `"<class>:"` 接頭辞からクラスを取り出す（無ければ None）"""
+    prefix, sep, _ = (op or "").partition(":")
+    return prefix if sep and prefix in PRIORITY_CLASSES else None
+
+
+def class_for_request(method: str) -> str:
+    return current_class.get() or (INTERACTIVE if method.upper() in ("GET", "HEAD") else GAMEPLAY_WRITE)
+
+
+def parse_class_map(raw: str, defaults: dict[str, int]) -> dict[str, int]:
+    """`"interactive=24,telemetry=4"` 形式の設定を読む（不正な値は既定値）"""
+    result = dict(defaults)
+    for part in (raw or "").split(","):
+        name, sep, value = part.partition("=")
+        name = name.strip()
+        if sep and name in result:
+            try:
+                result[name] = max(1, int(value))
+            except ValueError:
+                pass
+    return result
+
+
+class _ClassState:
+    __slots__ = ("limit", "weight", "pass_value", "running", "waiters", "served", "shed", "wait_total")
+
+    def __init__(self, limit: int, weight: int):
+        self.limit = limit
+        self.weight = weight
+        self.pass_value = 0.0
+        self.running = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.served = 0
+        self.shed = 0
+        self.wait_total = 0.0
+
+
+class RequestScheduler:
+    def __init__(
+        self,
+        *,
+        total: int,
+        limits: dict[str, int],
+        weights: dict[str, int],
+        shed_backlog: int,
+        telemetry_queue_max: int,
+    ):
+        self.total = max(1, int(total))
+        self.shed_backlog = max(1, int(shed_backlog))
+        self.telemetry_queue_max = max(1, int(telemetry_queue_max))
+        self._classes = {c: _ClassState(limits[c], weights[c]) for c in PRIORITY_CLASSES}
+        self._running = 0
+        # 最後に割り当てたクラスの仮想時間（アイドルから戻ったクラスをここに揃える）
+        self._vtime = 0.0
+
+    def _high_backlog(self) -> int:
+        return sum(len(self._classes[c].waiters) for c in _HIGH_CLASSES)
+
+    def _eligible(self, name: str) -> bool:
+        state = self._classes[name]
+        if not state.waiters or state.running >= state.limit:
+            return False
+        # 上位クラスが詰まっている間、admin は後回し
+        return not (name == ADMIN and self._high_backlog() >= self.shed_backlog)
+
+    def _dispatch(self) -> None:
+        while self._running < self.total:
+            candidates = [c for c in PRIORITY_CLASSES if self._eligible(c)]
+            if not candidates:
+                return
+            # 仮想時間（pass）が最小のクラスを選ぶ。同じなら優先度順
+            name = min(candidates, key=lambda c: self._classes[c].pass_value)
+            state = self._classes[name]
+            future = state.waiters.popleft()
+            if future.done():
+                continue
+            self._vtime = state.pass_value
+            state.pass_value += 1.0 / state.weight
+            state.running += 1
+            self._running += 1
+            future.set_result(None)
+
+    def _activate(self, state: _ClassState) -> None:
+        # しばらく待ちの無かったクラスが、溜まった「借り」で他を締め出さないよう仮想時間を揃える
+        state.pass_value = max(state.pass_value, self._vtime)
+
+    async def _acquire(self, name: str, timeout: Optional[float]) -> None:
+        state = self._classes[name]
+        if name == TELEMETRY and (
+            self._high_backlog() >= self.shed_backlog or len(state.waiters) >= self.telemetry_queue_max
+        ):
+            state.shed += 1
+            raise RequestShed(f"telemetry request shed (backlog={self._high_backlog()})")
+
+        if not state.waiters and not state.running:
+            self._activate(state)
+        future = asyncio.get_running_loop().create_future()
+        state.waiters.append(future)
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # 割り当て直後に取り消された: 枠を返す
+                self._release(name)
+            else:
+                future.cancel()
+                try:
+                    state.waiters.remove(future)
+                except ValueError:
+                    pass
+            raise
+        state.wait_total += time.monotonic() - started
+        state.served += 1
+
+    def _release(self, name: str) -> None:
+        self._classes[name].running -= 1
+        self._running -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, name: str, *, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        try:
+            await self._acquire(name, timeout)
+        except asyncio.TimeoutError:
+            raise httpx.PoolTimeout(f"db scheduler: no {name} slot within {timeout}s") from None
+        try:
+            yield
+        finally:
+            self._release(name)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self._running,
+            "total": self.total,
+            "classes": {
+                name: {
+                    "running": s.running,
+                    "waiting": len(s.waiters),
+                    "limit": s.limit,
+                    "weight": s.weight,
+                    "served": s.served,
+                    "shed": s.shed,
+                    "avg_wait_ms": round(s.wait_total / s.served * 1000, 1) if s.served else 0.0,
+                }
+                for name, s in self._classes.items()
+            },
+        }
+
+
+class PrioritizedTransport(httpx.AsyncBaseTransport):
+    """httpx のトランスポートを包み、送信前にスケジューラの枠を取る
+
+    breakers（db_breaker.BreakerBoard）を渡すと、対象テーブルのブレーカーが開いている要求は
+    枠を待たずに CircuitOpen で失敗させ、送った要求の結果をブレーカーに記録する。
+    """
+
+    def __init__(
+        self,
+        scheduler: RequestScheduler,
+        *,
+        wait_timeout: Optional[float] = None,
+        breakers: Any = None,
+        **transport_kwargs: Any,
+    ):
+        self.scheduler = scheduler
+        self.wait_timeout = wait_timeout
+        self.breakers = breakers
+        self._inner = httpx.AsyncHTTPTransport(**transport_kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        breaker = None
+        probe = False
+        if self.breakers is not None:
+            from db_breaker import breaker_key
+
+            breaker = self.breakers.get(breaker_key(str(request.url)))
+            probe = breaker.before_request()
+
+        recorded = False
+        try:
+            async with self.scheduler.slot(class_for_request(request.method), timeout=self.wait_timeout):
+                started = time.monotonic()
+                try:
+                    response = await self._inner.handle_async_request(request)
+                    # 本文まで読み切ってから枠を返す（同時実行数 = 実際に使っているコネクション数）
+                    await response.aread()
+                except Exception:
+                    if breaker is not None:
+                        breaker.record_response(None, time.monotonic() - started, probe=probe)
+                        recorded = True
+                    raise
+                if breaker is not None:
+                    breaker.record_response(response.status_code, time.monotonic() - started, probe=probe)
+                    recorded = True
+            return response
+        finally:
+            if probe and not recorded:
+                # 枠待ちのタイムアウト / 破棄 / 取り消し: バックエンドの状態は分からないので試行をやり直す
+                breaker.abandon_probe()
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+__all__ = [
+    "ADMIN",
+    "GAMEPLAY_WRITE",
+    "INTERACTIVE",
+    "PRIORITY_CLASSES",
+    "PrioritizedTransport",
+    "RequestScheduler",
+    "RequestShed",
+    "TELEMETRY",
+    "class_for_op",
+    "class_for_request",
+    "current_class",
+    "parse_class_map",
+]
@@ -0,0 +1,224 @@
+"""Supabase（PostgREST）のスキーマ情報
+
+これまでは書き込みが 400 で失敗してから列の不足（_MISSING_COLUMNS_BY_TABLE）や
+旧スキーマの NOT NULL 列（_COMMAND_LOGS_SCHEMA_MODE）を知っていたため、再起動のたびに
+最初の書き込みで失敗の往復が発生していた。
+
+起動時（cogs/schema.py）に PostgREST の OpenAPI 記述（GET /rest/v1/）を 1 回だけ読み、
+テーブル毎の列と必須列（NOT NULL かつ既定値なし）を覚える。結果は SCHEMA_CACHE_PATH に
+SCHEMA_CACHE_TTL 秒キャッシュするので、再起動時は通信しない。
+
+- _request_with_retry が POST/PATCH の本文から存在しない列を送信前に取り除く
+- キャッシュに無い列が来たら、取り除く前に 1 回だけ読み直す（マイグレーションで列を追加した
+  直後に、古いキャッシュのせいでその列の書き込み / select が黙って落ちないように）。
+  同じ列の読み直しは SCHEMA_REPROBE_INTERVAL 秒に 1 回まで
+- log_command / log_anti_cheat_event は旧スキーマの必須列を最初から埋める
+
+スキーマが読めない（OpenAPI が無効・権限不足など）ときは何もせず、従来の 400 からの検出に任せる。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger("rpgbot")
+
+
+def parse_openapi(spec: dict) -> dict[str, dict[str, frozenset[str]]]:
+    """OpenAPI（Swagger 2.0）の definitions からテーブル毎の列と必須列を取り出す"""
+    tables: dict[str, dict[str, frozenset[str]]] = {}
+    for name, definition in (spec.get("definitions") or {}).items():
+        if not isinstance(definition, dict):
+            continue
+        columns = frozenset((definition.get("properties") or {}).keys())
+        if not columns:
+            continue
+        tables[name] = {
+            "columns": columns,
+            "required": frozenset(c for c in definition.get("required") or [] if c in columns),
+        }
+    return tables
+
+
+class SchemaCache:
+    def __init__(self, path: str, ttl: float, reprobe_interval: float = 300.0):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.reprobe_interval = reprobe_interval
+        # (table, column) -> 最後にその列のために読み直した時刻
+        self._reprobed: dict[tuple[str, str], float] = {}
+        self._reprobe_lock: Optional[asyncio.Lock] = None
+        self.reprobes = 0
+        self._tables: dict[str, dict[str, frozenset[str]]] = {}
+        self.loaded_at = 0.0
+        self.source = "none"
+        self._dropped_logged: set[tuple[str, str]] = set()
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._tables)
+
+    # -------------------------
+    # 読み込み
+    # -------------------------
+
+    def _load_from_disk(self, url: str) -> bool:
+        if self.ttl <= 0:
+            return False
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning("schema cache unreadable: path=%s err=%s", self.path, e)
+            return False
+        if data.get("url") != url or time.time() - float(data.get("fetched_at") or 0) > self.ttl:
+            return False
+        self._tables = {
+            name: {"columns": frozenset(t.get("columns") or ()), "required": frozenset(t.get("required") or ())}
+            for name, t in (data.get("tables") or {}).items()
+        }
+        self.loaded_at = float(data["fetched_at"])
+        self.source = "disk"
+        return self.loaded
+
+    def _save_to_disk(self, url: str) -> None:
+        if self.ttl <= 0:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tables = {
+                name: {"columns": sorted(t["columns"]), "required": sorted(t["required"])}
+                for name, t in self._tables.items()
+            }
+            tmp.write_text(
+                json.dumps({"url": url, "fetched_at": self.loaded_at, "tables": tables}, ensure_ascii=False),
+                encoding="utf-8",
+            )
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.warning("schema cache write failed: path=%s err=%s", self.path, e)
+
+    async def load(self, *, force: bool = False) -> bool:
+        """ディスクのキャッシュ、無ければ OpenAPI からスキーマを読む（失敗しても例外は出さない）"""
+        import config
+        from db_http import _get_headers, _request_with_retry
+
+        url = config.SUPABASE_URL
+        if not force and self._load_from_disk(url):
+            logger.info("✅ schema loaded from cache: tables=%s", len(self._tables))
+            return True
+        try:
+            headers = _get_headers()
+            headers["Accept"] = "application/openapi+json"
+            response = await _request_with_retry(
+                "GET", f"{url}/rest/v1/", headers=headers, op="admin:db.schema_probe"
+            )
+            tables = parse_openapi(response.json())
+        except Exception as e:
+            logger.warning("schema probe failed; falling back to error-driven detection: err=%s", e)
+            return False
+        if not tables:
+            logger.warning("schema probe returned no tables; falling back to error-driven detection")
+            return False
+        self._tables = tables
+        self.loaded_at = time.time()
+        self.source = "openapi"
+        self._save_to_disk(url)
+        logger.info("✅ schema loaded from OpenAPI: tables=%s", len(tables))
+        return True
+
+    def _reprobe_due(self, table: str, columns: list[str]) -> list[str]:
+        now = time.monotonic()
+        return [
+            c
+            for c in columns
+            if (table, c) not in self._reprobed or now - self._reprobed[(table, c)] >= self.reprobe_interval
+        ]
+
+    async def ensure(self, table: str, columns: Any) -> None:
+        """columns にキャッシュに無い列があれば、取り除かれる前にスキーマを 1 回読み直す"""
+        known = self.columns(table)
+        if known is None or not columns:
+            return
+        unknown = [c for c in columns if c not in known]
+        if not unknown:
+            return
+        due = self._reprobe_due(table, unknown)
+        if not due:
+            return
+
+        if self._reprobe_lock is None:
+            self._reprobe_lock = asyncio.Lock()
+        async with self._reprobe_lock:
+            # 待っている間に別の呼び出しが読み直していれば、その結果を使う
+            known = self.columns(table) or frozenset()
+            due = self._reprobe_due(table, [c for c in due if c not in known])
+            if not due:
+                return
+            probed_at = time.monotonic()
+            for column in due:
+                self._reprobed[(table, column)] = probed_at
+            self.reprobes += 1
+            logger.info("schema cache missing columns; re-probing table=%s cols=%s", table, due)
+            if await self.load(force=True):
+                for column in due:
+                    if column in (self.columns(table) or ()):
+                        self._dropped_logged.discard((table, column))
+
+    # -------------------------
+    # 参照
+    # -------------------------
+
+    def columns(self, table: str) -> Optional[frozenset[str]]:
+        t = self._tables.get(table)
+        return t["columns"] if t is not None else None
+
+    def requires(self, table: str, column: str) -> Optional[bool]:
+        """列が必須（NOT NULL・既定値なし）か。テーブルが分からなければ None"""
+        t = self._tables.get(table)
+        return column in t["required"] if t is not None else None
+
+    def shape(self, table: str, payload: Any) -> Any:
+        """テーブルに存在しない列を本文から取り除く（スキーマ不明なら何もしない）"""
+        columns = self.columns(table)
+        if columns is None:
+            return payload
+        if isinstance(payload, list):
+            return [self.shape(table, row) for row in payload]
+        if not isinstance(payload, dict):
+            return payload
+        extra = payload.keys() - columns
+        if not extra:
+            return payload
+        for column in extra:
+            if (table, column) not in self._dropped_logged:
+                self._dropped_logged.add((table, column))
+                logger.warning("db: column not in schema; omitting from writes table=%s col=%s", table, column)
+        return {k: v for k, v in payload.items() if k in columns}
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "source": self.source,
+            "tables": len(self._tables),
+            "age_s": round(time.time() - self.loaded_at, 1) if self.loaded else None,
+            "reprobes": self.reprobes,
+        }
+
+
+def _create_schema_cache() -> SchemaCache:
+    from runtime_settings import SCHEMA_CACHE_PATH, SCHEMA_CACHE_TTL, SCHEMA_REPROBE_INTERVAL
+
+    return SchemaCache(SCHEMA_CACHE_PATH, SCHEMA_CACHE_TTL, SCHEMA_REPROBE_INTERVAL)
+
+
+schema = _create_schema_cache()
+
+__all__ = ["SchemaCache", "parse_openapi", "schema"]
@@ -10,10 +10,6 @@ from discord.ext import commands
 import db
 import logging
 from datetime import datetime, timedelta
-from typing import Optional
-import json
-import asyncio
-import copy
 
 logger = logging.getLogger("rpgbot")
 
@@ -23,97 +19,12 @@ logger = logging.getLogger("rpgbot")
 from runtime_settings import DEBUG_ADMIN_IDS as ADMIN_IDS
 
 # ==============================
-# エラーログストレージ
+# エラーログ / スナップショット（debug_state.py に分離）
 # ==============================
-class ErrorLogManager:
-    """エラーログを管理するクラス"""
-    def __init__(self, max_logs=100):
-        self.logs = []
-        self.max_logs = max_logs
-    
-    def add_error(self, error_type: str, message: str, user_id: Optional[int] = None, context: Optional[str] = None):
-        """エラーログを追加"""
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "type": error_type,
-            "message": message,
-            "user_id": user_id,
-            "context": context
-        }
-        self.logs.append(log_entry)
-        
-        # 最大数を超えたら古いものから削除
-        if len(self.logs) > self.max_logs:
-            self.logs = self.logs[-self.max_logs:]
-        
-        logger.error(f"[ErrorLog] {error_type}: {message} (User: {user_id}, Context: {context})")
-    
-    def get_recent_logs(self, limit: int = 10):
-        """最近のエラーログを取得"""
-        return self.logs[-limit:]
-    
-    def get_user_logs(self, user_id: int, limit: int = 5):
-        """特定ユーザーのエラーログを取得"""
-        user_logs = [log for log in self.logs if log.get("user_id") == user_id]
-        return user_logs[-limit:]
-    
-    def clear_logs(self):
-        """全ログをクリア"""
-        self.logs = []
-
-# グローバルエラーログマネージャー
-error_log_manager = ErrorLogManager()
-
-# ==============================
-# ユーザースナップショット管理
-# ==============================
-class SnapshotManager:
-    """ユーザーアクションのスナップショットを管理"""
-    def __init__(self):
-        self.snapshots = {}  # user_id: [snapshot1, snapshot2, ...]
-    
-    async def create_snapshot(self, user_id: int, action_type: str, player_data: dict):
-        """スナップショットを作成（ディープコピーで完全な独立性を確保）"""
-        if user_id not in self.snapshots:
-            self.snapshots[user_id] = []
-        
-        # ディープコピーで完全に独立したスナップショットを作成
-        # これにより、inventory、milestone_flags、equipped_weaponなどの
-        # ネストされた可変オブジェクトも完全にコピーされる
-        try:
-            # JSON経由でディープコピー（最も安全な方法）
-            player_data_copy = json.loads(json.dumps(player_data, default=str)) if player_data else None
-        except (TypeError, ValueError):
-            # JSON化できない場合はcopy.deepcopyを使用
-            player_data_copy = copy.deepcopy(player_data) if player_data else None
-        
-        snapshot = {
-            "timestamp": datetime.now().isoformat(),
-            "action_type": action_type,
-            "data": player_data_copy
-        }
-        
-        self.snapshots[user_id].append(snapshot)
-        
-        # 最大5個まで保持
-        if len(self.snapshots[user_id]) > 5:
-            self.snapshots[user_id] = self.snapshots[user_id][-5:]
-        
-        logger.info(f"Snapshot created (deep copy) for user {user_id}: {action_type}")
-    
-    def get_last_snapshot(self, user_id: int) -> Optional[dict]:
-        """最後のスナップショットを取得"""
-        if user_id in self.snapshots and len(self.snapshots[user_id]) > 0:
-            return self.snapshots[user_id][-1]
-        return None
-    
-    def remove_last_snapshot(self, user_id: int):
-        """最後のスナップショットを削除（ロールバック後）"""
-        if user_id in self.snapshots and len(self.snapshots[user_id]) > 0:
-            self.snapshots[user_id].pop()
-
-# グローバルスナップショットマネージャー
-snapshot_manager = SnapshotManager()
+from debug_state import ErrorLogManager, SnapshotManager, error_log_manager, snapshot_manager
+from bot_state import attach_bot_state
+import broadcast
+from ui.render_queue import render_queue
 
 # ==============================
 # 管理者チェックデコレーター
@@ -136,15 +47,8 @@ def admin_only():
 async def admin_stats(ctx: commands.Context):
     """システム統計を表示"""
     try:
-        # プレイヤー数をカウント
-        all_players = await db.get_all_players()
-        total_players = len(all_players) if all_players else 0
-        
-        # アクティブプレイヤー（距離>0）
-        active_players = len([p for p in all_players if p.get("distance", 0) > 0]) if all_players else 0
-        
-        # 最も進んでいるプレイヤー
-        max_distance_player = max(all_players, key=lambda p: p.get("distance", 0)) if all_players else None
+        # 集計はDB側（RPC）で行い、短時間キャッシュする（全プレイヤー行は取得しない）
+        stats = await db.get_admin_stats(window_hours=24, top_n=5)
         
         embed = discord.Embed(
             title="📊 システム統計",
@@ -152,17 +56,154 @@ async def admin_stats(ctx: commands.Context):
             timestamp=datetime.now()
         )
         
-        embed.add_field(name="総プレイヤー数", value=f"{total_players}人", inline=True)
-        embed.add_field(name="アクティブプレイヤー", value=f"{active_players}人", inline=True)
+        embed.add_field(name="総プレイヤー数", value=f"{stats.get('total_players', 0)}人", inline=True)
+        embed.add_field(name="アクティブプレイヤー", value=f"{stats.get('active_players', 0)}人", inline=True)
+        embed.add_field(name="24時間以内に活動", value=f"{stats.get('active_in_window', 0)}人", inline=True)
+        embed.add_field(name="BAN中", value=f"{stats.get('banned_players', 0)}人", inline=True)
+        embed.add_field(
+            name="死亡数",
+            value=f"{stats.get('total_deaths', 0)}回（24時間: {stats.get('deaths_in_window', 0)}回）",
+            inline=True
+        )
         embed.add_field(name="エラーログ数", value=f"{len(error_log_manager.logs)}件", inline=True)
         
-        if max_distance_player:
+        top_players = stats.get("top_by_distance") or []
+        if top_players:
             embed.add_field(
                 name="最遠到達プレイヤー",
-                value=f"{max_distance_player.get('name', 'Unknown')} - {max_distance_player.get('distance', 0)}m",
+                value="\n".join(
+                    f"{i}. {p.get('name') or 'Unknown'} - {p.get('distance', 0)}m"
+                    for i, p in enumerate(top_players, start=1)
+                ),
                 inline=False
             )
-        
+
+        histogram = stats.get("distance_histogram") or []
+        if histogram:
+            zone_size = int(stats.get("zone_size") or 1000)
+            embed.add_field(
+                name="距離帯別プレイヤー数",
+                value="\n".join(
+                    f"{row['zone'] * zone_size}〜{(row['zone'] + 1) * zone_size - 1}m: {row['players']}人"
+                    for row in histogram[:15]
+                ),
+                inline=False
+            )
+
+        render_stats = render_queue.stats()
+        embed.add_field(
+            name="メッセージ編集",
+            value=(
+                f"要求 {render_stats['requested']} / 送信 {render_stats['sent']} / "
+                f"まとめて省略 {render_stats['saved']} / 失敗 {render_stats['failed']} / 保留 {render_stats['queued']}"
+            ),
+            inline=False
+        )
+
+        snapshot_stats = snapshot_manager.stats()
+        embed.add_field(
+            name="スナップショット",
+            value=(
+                f"{snapshot_stats['users']}人 / {snapshot_stats['snapshots']}件 / "
+                f"{snapshot_stats['bytes'] / 1024:.0f}KB（退避 {snapshot_stats['spilled_users']}人）"
+            ),
+            inline=False
+        )
+
+        lease_stats = attach_bot_state(ctx.bot).stats()
+        embed.add_field(
+            name="処理中リース",
+            value=(
+                f"保持 {lease_stats['held']} / 待機 {lease_stats['waiting']}\n"
+                f"失効 {lease_stats['expired_total']} / 待ちタイムアウト {lease_stats['timeouts_total']}"
+            ),
+            inline=False
+        )
+
+        db_stats = db.request_scheduler.stats()
+        embed.add_field(
+            name=f"DB要求（実行中 {db_stats['running']}/{db_stats['total']}）",
+            value="\n".join(
+                f"{name}: 実行 {c['running']} / 待機 {c['waiting']} / 平均待ち {c['avg_wait_ms']}ms / 破棄 {c['shed']}"
+                for name, c in db_stats["classes"].items()
+            ),
+            inline=False
+        )
+
+        open_breakers = db.breakers.open_keys()
+        embed.add_field(
+            name="DBサーキットブレーカー" + ("（縮退モード）" if db.is_degraded() else ""),
+            value="\n".join(
+                f"{key}: {b['state']}（再試行まで {b['retry_after']}秒 / 拒否 {b['rejected_total']}）"
+                for key, b in db.breakers.stats().items()
+                if key in open_breakers
+            ) or "すべて正常",
+            inline=False
+        )
+
+        schema_stats = db.schema.stats()
+        embed.add_field(
+            name="DBスキーマ",
+            value=f"{schema_stats['source']} / {schema_stats['tables']}テーブル（取得から {schema_stats['age_s']}秒）",
+            inline=False
+        )
+
+        dedup_stats = db.idempotent_inserts.stats()
+        embed.add_field(
+            name="冪等キー",
+            value=f"RPC {dedup_stats['rpc']} / 対象 {dedup_stats['tables']}テーブル / 送信 {dedup_stats['wrapped']}件",
+            inline=False
+        )
+
+        from write_journal import write_journal
+
+        journal_stats = write_journal.stats()
+        embed.add_field(
+            name="書き込みジャーナル",
+            value=(
+                f"未送信 {journal_stats['pending']}件（後回し {journal_stats['deferred']}件 / {journal_stats['users']}人）\n"
+                f"再送 {journal_stats['replayed_total']} / 破棄 {journal_stats['dropped_total']} / "
+                f"起動時復元 {journal_stats['recovered_total']}"
+            ),
+            inline=False
+        )
+
+        from ui.persistent import view_state_store
+
+        view_stats = view_state_store.stats()
+        embed.add_field(
+            name="永続View",
+            value=(
+                f"{'有効' if view_stats['enabled'] else '無効'} / 保存中 {view_stats['stored']}件 / "
+                f"保存 {view_stats['saved']} / 復元 {view_stats['restored']} / 期限切れ {view_stats['expired']}"
+            ),
+            inline=False
+        )
+
+        import log_setup
+
+        log_stats = log_setup.stats()
+        embed.add_field(
+            name="ログ",
+            value=f"キュー出力 {'有効' if log_stats['queued'] else '無効'} / 間引き {log_stats['dropped']}件",
+            inline=False
+        )
+
+        from loop_watchdog import loop_watchdog
+
+        loop_health = loop_watchdog.health()
+        lag = loop_health["loop_lag_ms"]
+        slow = loop_watchdog.slow_callbacks[-1] if loop_watchdog.slow_callbacks else None
+        embed.add_field(
+            name="イベントループ",
+            value=(
+                f"{loop_health['status']} / 遅延 p50 {lag['p50']}ms / p95 {lag['p95']}ms / p99 {lag['p99']}ms / "
+                f"max {lag['max']}ms\n遅いコールバック {loop_health['slow_callbacks']}件"
+                + (f"（直近: {slow['ms']}ms {slow['handle']}）" if slow else "")
+            )[:1024],
+            inline=False
+        )
+
         await ctx.send(embed=embed)
         
     except Exception as e:
@@ -211,6 +252,47 @@ async def admin_clear_logs(ctx: commands.Context):
     error_log_manager.clear_logs()
     await ctx.send(f"✅ {log_count}件のエラーログをクリアしました。")
 
+@commands.command(name="admin_dbprofile")
+@admin_only()
+async def admin_dbprofile(ctx: commands.Context, limit: int = 10, sort: str = "time"):
+    """db 呼び出しの多い (コマンド, 関数, 呼び出し元) を表示（sort: time / count / bytes、reset で集計をクリア）"""
+    from db_profile import db_profiler
+
+    try:
+        if sort == "reset" or limit == 0:
+            db_profiler.reset()
+            await ctx.send("✅ DBプロファイルの集計をクリアしました。")
+            return
+
+        rows = db_profiler.top(min(max(limit, 1), 20), sort)
+        stats = db_profiler.stats()
+        since = datetime.fromtimestamp(stats["since"])
+        embed = discord.Embed(
+            title=f"🐢 DB呼び出しの上位 (sort={sort})",
+            description=(
+                f"記録率 {stats['sample_rate']:.0%} / 記録 {stats['sampled']}件 (全 {stats['calls']}件) / "
+                f"組 {stats['keys']}/{stats['max_keys']}\n回数・合計・バイトは記録率で割り戻した推定値"
+            ),
+            color=discord.Color.dark_teal(),
+            timestamp=since
+        )
+        if not rows:
+            embed.add_field(name="データなし", value="まだ記録された呼び出しはありません。", inline=False)
+        for i, row in enumerate(rows, 1):
+            embed.add_field(
+                name=f"{i}. {row['func']} ← {row['command']}"[:256],
+                value=(
+                    f"`{row['site']}`\n"
+                    f"{row['count']}回 / 合計 {row['total_ms']:.0f}ms / 平均 {row['avg_ms']:.1f}ms / {row['bytes'] / 1024:.1f}KiB"
+                )[:1024],
+                inline=False
+            )
+        embed.set_footer(text="集計開始")
+        await ctx.send(embed=embed)
+
+    except Exception as e:
+        await ctx.send(f"⚠️ DBプロファイルの取得に失敗しました: {e}")
+
 @commands.command(name="admin_ban")
 @admin_only()
 async def admin_ban(ctx: commands.Context, user_id: str):
@@ -375,6 +457,7 @@ async def rollback(ctx: commands.Context, force: str = None):
     
     try:
         # スナップショットを取得
+        await snapshot_manager.refresh_user(user_id)
         snapshot = snapshot_manager.get_last_snapshot(user_id)
         
         if not snapshot:
@@ -455,9 +538,10 @@ async def debug_status(ctx: commands.Context):
     
     try:
         # 処理状態を確認
-        processing_status = "処理中" if ctx.bot.user_processing.get(user_id) else "待機中"
+        processing_status = attach_bot_state(ctx.bot).describe(user_id)
         
         # 最後のスナップショット情報
+        await snapshot_manager.refresh_user(user_id)
         snapshot = snapshot_manager.get_last_snapshot(user_id)
         snapshot_info = "なし"
         if snapshot:
@@ -497,77 +581,75 @@ async def debug_status(ctx: commands.Context):
 # ==============================
 # お知らせ確認View
 # ==============================
+def _notice_progress_embed(job: "broadcast.BroadcastJob") -> discord.Embed:
+    """送信中 / 完了時の進捗Embed"""
+    if job.done:
+        title, color = "✅ お知らせ送信完了", discord.Color.green()
+    elif job.cancelled:
+        title, color = "⏸️ お知らせ送信を中断しました", discord.Color.orange()
+    else:
+        title, color = "📤 お知らせ送信中…", discord.Color.blue()
+
+    embed = discord.Embed(title=title, color=color, timestamp=datetime.now())
+    embed.add_field(name="進捗", value=f"{job.processed}/{job.total}", inline=True)
+    embed.add_field(name="送信成功", value=f"{len(job.sent)}件", inline=True)
+    embed.add_field(name="送信失敗", value=f"{len(job.failed)}件", inline=True)
+    embed.add_field(name="送信速度", value=f"{job.rate():.1f}件/秒", inline=True)
+    embed.add_field(name="送信メッセージ", value=job.message[:200], inline=False)
+
+    if job.done and job.failed and len(job.failed) <= 10:
+        failure_text = "\n".join(f"{channel_id}: {err[:50]}" for channel_id, err in job.failed.items())
+        embed.add_field(name="失敗詳細", value=failure_text, inline=False)
+    if not job.done:
+        embed.set_footer(text=f"ジョブID: {job.job_id}（中断時は !notice_resume {job.job_id} で再開）")
+    return embed
+
+
+async def _run_notice_job(bot: commands.Bot, job: "broadcast.BroadcastJob", progress_message: discord.Message) -> None:
+    """ジョブを実行し、progress_message を進捗でライブ更新する"""
+    async def _on_progress(current):
+        render_queue.submit(progress_message, embed=_notice_progress_embed(current), view=None)
+
+    await render_queue.edit(progress_message, embed=_notice_progress_embed(job), view=None)
+    await broadcast.run_broadcast(bot, job, on_progress=_on_progress)
+    await render_queue.edit(progress_message, embed=_notice_progress_embed(job), view=None)
+
+    for channel_id, err in list(job.failed.items())[:20]:
+        error_log_manager.add_error("NOTICE_SEND", err, None, f"channel: {channel_id}")
+    logger.info(f"Admin {job.admin_id} sent notice to {len(job.sent)} channels (job {job.job_id})")
+
+
 class NoticeConfirmView(discord.ui.View):
     def __init__(self, admin_id: int, message: str, bot: commands.Bot):
         super().__init__(timeout=300)
         self.admin_id = admin_id
         self.message = message
         self.bot = bot
+        self.started = False
     
     @discord.ui.button(label="📢 送信する", style=discord.ButtonStyle.primary)
     async def confirm_send(self, interaction: discord.Interaction, button: discord.ui.Button):
         if interaction.user.id != self.admin_id:
             return await interaction.response.send_message("これは管理者専用の操作です。", ephemeral=True)
+        # 二重クリックで配信ジョブが 2 本走らないよう、await の前に印を付ける
+        if self.started:
+            return await interaction.response.send_message("既に送信を開始しています。", ephemeral=True)
+        self.started = True
         
-        await interaction.response.defer()
+        for item in self.children:
+            item.disabled = True
+        self.stop()
+        await interaction.response.edit_message(view=self)
         
         try:
-            # RPGカテゴリを取得
-            guild = interaction.guild
-            category = discord.utils.get(guild.categories, name="RPG")
-            
-            if not category:
-                await interaction.followup.send("⚠️ RPGカテゴリが見つかりません。")
+            # 送信先をレジストリ（スレッド登録 + キャッシュ上のプレイヤーチャンネル）から作る
+            targets = await broadcast.collect_targets(self.bot)
+            if not targets:
+                await interaction.followup.send("⚠️ 送信先のプレイヤーチャンネル/スレッドが見つかりません。")
                 return
-            
-            # 成功/失敗カウンター
-            success_count = 0
-            failure_count = 0
-            failed_channels = []
-            
-            # RPGカテゴリ内の全チャンネルを検索
-            for channel in category.channels:
-                # チャンネルのトピックに "UserID:" が含まれているかチェック
-                if isinstance(channel, discord.TextChannel) and channel.topic and "UserID:" in channel.topic:
-                    try:
-                        # お知らせをEmbedで送信
-                        embed = discord.Embed(
-                            title="📢 運営からのお知らせ",
-                            description=self.message,
-                            color=discord.Color.blue(),
-                            timestamp=datetime.now()
-                        )
-                        embed.set_footer(text="イニシエダンジョン運営チーム")
-                        
-                        await channel.send(embed=embed)
-                        success_count += 1
-                        
-                        # レート制限（0.5秒待機）
-                        await asyncio.sleep(0.5)
-                        
-                    except Exception as e:
-                        failure_count += 1
-                        failed_channels.append(f"{channel.name}: {str(e)[:50]}")
-                        error_log_manager.add_error("NOTICE_SEND", str(e), None, f"channel: {channel.name}")
-            
-            # 結果を報告
-            result_embed = discord.Embed(
-                title="✅ お知らせ送信完了",
-                color=discord.Color.green(),
-                timestamp=datetime.now()
-            )
-            
-            result_embed.add_field(name="送信成功", value=f"{success_count}チャンネル", inline=True)
-            result_embed.add_field(name="送信失敗", value=f"{failure_count}チャンネル", inline=True)
-            result_embed.add_field(name="送信メッセージ", value=self.message[:200], inline=False)
-            
-            if failed_channels and len(failed_channels) <= 10:
-                failure_text = "\n".join(failed_channels)
-                result_embed.add_field(name="失敗詳細", value=failure_text, inline=False)
-            
-            await interaction.edit_original_response(embed=result_embed, view=None)
-            
-            logger.info(f"Admin {self.admin_id} sent notice to {success_count} channels")
+
+            job = broadcast.new_job(self.message, self.admin_id, targets)
+            await _run_notice_job(self.bot, job, interaction.message)
             
         except Exception as e:
             error_log_manager.add_error("NOTICE_CONFIRM", str(e), self.admin_id, "notice confirmation")
@@ -620,7 +702,7 @@ async def notice(ctx: commands.Context, *, message: str = None):
         
         confirm_embed.add_field(
             name="⚠️ 注意",
-            value="RPGカテゴリ内の全プレイヤーチャンネルに送信されます。\n送信後の取り消しはできません。",
+            value="全サーバーのプレイヤーチャンネル/冒険スレッドに送信されます。\n送信後の取り消しはできません。",
             inline=False
         )
         
@@ -631,6 +713,55 @@ async def notice(ctx: commands.Context, *, message: str = None):
         error_log_manager.add_error("NOTICE", str(e), ctx.author.id, "notice command")
         await ctx.send(f"⚠️ エラーが発生しました: {e}")
 
+
+@commands.command(name="notice_resume")
+@admin_only()
+async def notice_resume(ctx: commands.Context, job_id: str = None):
+    """中断されたお知らせ送信を未送信分から再開"""
+    job = broadcast.load_checkpoint(job_id) if job_id else next(iter(broadcast.list_unfinished_jobs()), None)
+    if job is None:
+        await ctx.send("ℹ️ 再開できるお知らせ送信はありません。")
+        return
+    if job.done:
+        await ctx.send(f"ℹ️ ジョブ `{job.job_id}` は送信完了済みです。")
+        return
+    if any(running.job_id == job.job_id for running in broadcast.running_jobs()):
+        await ctx.send(f"ℹ️ ジョブ `{job.job_id}` は送信中です。")
+        return
+
+    job.cancelled = False
+    try:
+        progress_message = await ctx.send(embed=_notice_progress_embed(job))
+        await _run_notice_job(ctx.bot, job, progress_message)
+    except Exception as e:
+        error_log_manager.add_error("NOTICE_RESUME", str(e), ctx.author.id, f"job: {job.job_id}")
+        await ctx.send(f"⚠️ お知らせ送信の再開に失敗しました: {e}")
+
+@commands.command(name="notice_status")
+@admin_only()
+async def notice_status(ctx: commands.Context):
+    """送信中 / 中断中のお知らせ送信を表示"""
+    running = broadcast.running_jobs()
+    running_ids = {job.job_id for job in running}
+    unfinished = [job for job in broadcast.list_unfinished_jobs() if job.job_id not in running_ids]
+    if not running and not unfinished:
+        await ctx.send("ℹ️ 送信中 / 中断中のお知らせはありません。")
+        return
+
+    embed = discord.Embed(title="📢 お知らせ送信状況", color=discord.Color.blue(), timestamp=datetime.now())
+    for job in running:
+        embed.add_field(
+            name=f"📤 送信中 `{job.job_id}`",
+            value=f"{job.processed}/{job.total}（失敗 {len(job.failed)}件・{job.rate():.1f}件/秒）",
+            inline=False
+        )
+    for job in unfinished[:10]:
+        embed.add_field(
+            name=f"⏸️ 中断 `{job.job_id}`",
+            value=f"{job.processed}/{job.total}（{job.created_at[:19]}）",
+            inline=False
+        )
+    await ctx.send(embed=embed)
         
 # ==============================
 # コマンド登録ヘルパー
@@ -641,18 +772,20 @@ def setup_debug_commands(bot: commands.Bot):
     bot.add_command(admin_stats)
     bot.add_command(admin_logs)
     bot.add_command(admin_clear_logs)
+    bot.add_command(admin_dbprofile)
     bot.add_command(admin_ban)
     bot.add_command(admin_unban)
     bot.add_command(admin_player)
     bot.add_command(admin_clear_processing)
     bot.add_command(admin_force_reset)
     bot.add_command(notice)
+    bot.add_command(notice_resume)
+    bot.add_command(notice_status)
     bot.add_command(rollback)
     bot.add_command(debug_status)
     
     # user_processingをbotに追加（存在しない場合）
-    if not hasattr(bot, 'user_processing'):
-        bot.user_processing = {}
+    attach_bot_state(bot)
     
     logger.info("✅ デバッグコマンドを登録しました")
 
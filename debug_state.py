@@ -0,0 +1,338 @@
+"""
+デバッグ用の共有状態（エラーログ / スナップショット）
+
+!move などのホットパスから参照されるため、コマンド実装（debug_commands.py）とは
+分けておき、管理者コマンドを遅延ロードしても常に利用できるようにする。
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from runtime_settings import SNAPSHOT_MAX_PER_USER, SNAPSHOT_MEMORY_BUDGET_MB, SNAPSHOT_SPILL_DIR
+
+logger = logging.getLogger("rpgbot")
+
+# ==============================
+# エラーログストレージ
+# ==============================
+class ErrorLogManager:
+    """エラーログを管理するクラス"""
+    def __init__(self, max_logs=100):
+        self.logs = []
+        self.max_logs = max_logs
+    
+    def add_error(self, error_type: str, message: str, user_id: Optional[int] = None, context: Optional[str] = None):
+        """エラーログを追加"""
+        log_entry = {
+            "timestamp": datetime.now().isoformat(),
+            "type": error_type,
+            "message": message,
+            "user_id": user_id,
+            "context": context
+        }
+        self.logs.append(log_entry)
+        
+        # 最大数を超えたら古いものから削除
+        if len(self.logs) > self.max_logs:
+            self.logs = self.logs[-self.max_logs:]
+        
+        logger.error(f"[ErrorLog] {error_type}: {message} (User: {user_id}, Context: {context})")
+    
+    def get_recent_logs(self, limit: int = 10):
+        """最近のエラーログを取得"""
+        return self.logs[-limit:]
+    
+    def get_user_logs(self, user_id: int, limit: int = 5):
+        """特定ユーザーのエラーログを取得"""
+        user_logs = [log for log in self.logs if log.get("user_id") == user_id]
+        return user_logs[-limit:]
+    
+    def clear_logs(self):
+        """全ログをクリア"""
+        self.logs = []
+
+# グローバルエラーログマネージャー
+error_log_manager = ErrorLogManager()
+
+# ==============================
+# ユーザースナップショット管理
+# ==============================
+#
+# !move のたびにプレイヤー行全体をディープコピーして 5 個ずつ永久に保持していたため、
+# 一度でも移動したユーザーの数だけメモリが増え続けていた。
+#
+# - 最新のスナップショットだけを完全な状態（head）で持ち、それより古いものは
+#   「1つ新しい状態から戻すための差分（逆差分）」として持つ
+# - 変化していない値は前回のスナップショットと共有する（コピーするのは変化した列だけ）
+# - 全ユーザー合計の概算サイズが SNAPSHOT_MEMORY_BUDGET_MB を超えたら、最近使われていない
+#   ユーザーから追い出す（SNAPSHOT_SPILL_DIR を指定するとディスクへ退避し、次回参照時に戻す）
+# - ロールバックは head に逆差分を順に適用して過去の状態を復元する
+#
+# 保持している値は共有されるため、取得した snapshot["data"] の中身は書き換えないこと。
+
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def _freeze_value(value):
+    """スナップショットに保持する値と概算サイズ（bytes）を返す"""
+    if isinstance(value, _SCALAR_TYPES):
+        return value, len(str(value)) + 8
+    try:
+        # JSON経由でディープコピー（ネストされた inventory / flags も独立させる）
+        encoded = json.dumps(value, default=str)
+        return json.loads(encoded), len(encoded)
+    except (TypeError, ValueError):
+        # JSON化できない場合はcopy.deepcopyを使用
+        return copy.deepcopy(value), len(repr(value))
+
+
+class _SnapshotHistory:
+    """1ユーザー分のスナップショット列（head + 逆差分）"""
+
+    __slots__ = ("head", "sizes", "meta", "diffs", "nbytes")
+
+    def __init__(self):
+        self.head: dict = {}
+        self.sizes: dict = {}
+        # 古い順のメタ情報（timestamp / action_type）。len(meta) がスナップショット数
+        self.meta: list = []
+        # diffs[i] は meta[i+1] の状態から meta[i] の状態へ戻す逆差分
+        self.diffs: list = []
+        self.nbytes = 0
+
+    def recount(self) -> int:
+        self.nbytes = sum(self.sizes.values()) + sum(d["bytes"] for d in self.diffs)
+        return self.nbytes
+
+    @staticmethod
+    def _apply(state: dict, sizes: dict | None, diff: dict) -> None:
+        for key in diff["unset"]:
+            state.pop(key, None)
+            if sizes is not None:
+                sizes.pop(key, None)
+        state.update(diff["set"])
+        if sizes is not None:
+            sizes.update(diff["sizes"])
+
+    def push(self, meta: dict, player_data: dict) -> int:
+        """新しい状態を head にし、直前の head への逆差分を積む。変化した列数を返す"""
+        head, sizes = {}, {}
+        back_set, back_sizes, back_unset = {}, {}, []
+        for key, value in player_data.items():
+            if key in self.head and self.head[key] == value:
+                # 変化なし: 前回の値をそのまま共有する
+                head[key] = self.head[key]
+                sizes[key] = self.sizes[key]
+                continue
+            head[key], sizes[key] = _freeze_value(value)
+            if key in self.head:
+                back_set[key] = self.head[key]
+                back_sizes[key] = self.sizes[key]
+            else:
+                back_unset.append(key)
+        for key in self.head.keys() - player_data.keys():
+            back_set[key] = self.head[key]
+            back_sizes[key] = self.sizes[key]
+
+        if self.meta:
+            self.diffs.append(
+                {"set": back_set, "sizes": back_sizes, "unset": back_unset, "bytes": sum(back_sizes.values())}
+            )
+        self.head, self.sizes = head, sizes
+        self.meta.append(meta)
+        return len(back_set) + len(back_unset)
+
+    def trim(self, max_snapshots: int) -> None:
+        while len(self.meta) > max_snapshots:
+            self.meta.pop(0)
+            if self.diffs:
+                self.diffs.pop(0)
+
+    def materialize(self, index: int) -> dict:
+        """index 番目（古い順）のスナップショットを head から逆差分を辿って復元する"""
+        state = dict(self.head)
+        for diff in reversed(self.diffs[index:]):
+            self._apply(state, None, diff)
+        return state
+
+    def pop(self) -> None:
+        """最新のスナップショットを捨て、1つ前を head に戻す"""
+        self.meta.pop()
+        if self.diffs:
+            self._apply(self.head, self.sizes, self.diffs.pop())
+        else:
+            self.head, self.sizes = {}, {}
+
+    def to_json(self) -> dict:
+        return {"head": self.head, "sizes": self.sizes, "meta": self.meta, "diffs": self.diffs}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "_SnapshotHistory":
+        history = cls()
+        history.head = data["head"]
+        history.sizes = data["sizes"]
+        history.meta = data["meta"]
+        history.diffs = data["diffs"]
+        history.recount()
+        return history
+
+
+class SnapshotManager:
+    """ユーザーアクションのスナップショットを管理"""
+    def __init__(
+        self,
+        max_snapshots: int = SNAPSHOT_MAX_PER_USER,
+        memory_budget_bytes: int = int(SNAPSHOT_MEMORY_BUDGET_MB * 1024 * 1024),
+        spill_dir: Optional[str] = SNAPSHOT_SPILL_DIR,
+    ):
+        self.max_snapshots = max(1, int(max_snapshots))
+        self.memory_budget_bytes = max(0, int(memory_budget_bytes))
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.snapshots: OrderedDict[int, _SnapshotHistory] = OrderedDict()  # user_id -> history（LRU順）
+        self._spilled: set[int] = set()
+        self._bytes = 0
+        self.evicted_total = 0
+        self.spilled_total = 0
+
+    # -------------------------
+    # LRU / メモリ予算
+    # -------------------------
+
+    def _spill_path(self, user_id: int) -> Path:
+        return self.spill_dir / f"{user_id}.json"
+
+    def _get_history(self, user_id: int) -> Optional[_SnapshotHistory]:
+        history = self.snapshots.get(user_id)
+        if history is not None:
+            self.snapshots.move_to_end(user_id)
+            return history
+        if user_id not in self._spilled:
+            return None
+
+        self._spilled.discard(user_id)
+        path = self._spill_path(user_id)
+        try:
+            history = _SnapshotHistory.from_json(json.loads(path.read_text(encoding="utf-8")))
+            path.unlink(missing_ok=True)
+        except Exception as e:
+            logger.warning("snapshot spill load failed: user_id=%s path=%s err=%s", user_id, path, e)
+            return None
+        self.snapshots[user_id] = history
+        self._bytes += history.nbytes
+        self._enforce_budget(user_id)
+        return history
+
+    def _drop_history(self, user_id: int) -> None:
+        history = self.snapshots.pop(user_id, None)
+        if history is not None:
+            self._bytes -= history.nbytes
+        if user_id in self._spilled:
+            self._spilled.discard(user_id)
+            if self.spill_dir is not None:
+                self._spill_path(user_id).unlink(missing_ok=True)
+
+    def _enforce_budget(self, keep_user_id: int) -> None:
+        if not self.memory_budget_bytes:
+            return
+        while self._bytes > self.memory_budget_bytes and len(self.snapshots) > 1:
+            user_id = next(iter(self.snapshots))
+            if user_id == keep_user_id:
+                self.snapshots.move_to_end(user_id)
+                continue
+            history = self.snapshots.pop(user_id)
+            self._bytes -= history.nbytes
+            self.evicted_total += 1
+            if self.spill_dir is None:
+                continue
+            try:
+                self.spill_dir.mkdir(parents=True, exist_ok=True)
+                self._spill_path(user_id).write_text(json.dumps(history.to_json(), default=str), encoding="utf-8")
+                self._spilled.add(user_id)
+                self.spilled_total += 1
+            except Exception as e:
+                logger.warning("snapshot spill failed: user_id=%s err=%s", user_id, e)
+
+    # -------------------------
+    # 公開API
+    # -------------------------
+
+    async def create_snapshot(self, user_id: int, action_type: str, player_data: dict):
+        """スナップショットを作成（前回から変化した列だけをコピーする）"""
+        history = self._get_history(user_id)
+        if history is None:
+            history = _SnapshotHistory()
+            self.snapshots[user_id] = history
+
+        meta = {"timestamp": datetime.now().isoformat(), "action_type": action_type}
+        before = history.nbytes
+        changed = history.push(meta, dict(player_data or {}))
+        history.trim(self.max_snapshots)
+        self._bytes += history.recount() - before
+        self._enforce_budget(user_id)
+
+        logger.debug("Snapshot created for user %s: %s (%s fields changed)", user_id, action_type, changed)
+
+    async def refresh_user(self, user_id: int) -> None:
+        """共有ストアから最新の履歴を取り直す（単一プロセスでは何もしない）"""
+        return None
+
+    def get_snapshot(self, user_id: int, steps_back: int = 0) -> Optional[dict]:
+        """steps_back 個前のスナップショットを取得（0 = 最新）"""
+        history = self._get_history(user_id)
+        if history is None or steps_back >= len(history.meta):
+            return None
+        index = len(history.meta) - 1 - steps_back
+        data = history.head if steps_back == 0 else history.materialize(index)
+        snapshot = dict(history.meta[index])
+        snapshot["data"] = dict(data) if data else None
+        return snapshot
+
+    def get_last_snapshot(self, user_id: int) -> Optional[dict]:
+        """最後のスナップショットを取得"""
+        return self.get_snapshot(user_id, 0)
+
+    def remove_last_snapshot(self, user_id: int):
+        """最後のスナップショットを削除（ロールバック後）"""
+        history = self._get_history(user_id)
+        if history is None:
+            return
+        history.pop()
+        if not history.meta:
+            self._drop_history(user_id)
+            return
+        before = history.nbytes
+        self._bytes += history.recount() - before
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self.snapshots),
+            "snapshots": sum(len(h.meta) for h in self.snapshots.values()),
+            "bytes": self._bytes,
+            "budget_bytes": self.memory_budget_bytes,
+            "spilled_users": len(self._spilled),
+            "evicted_total": self.evicted_total,
+            "spilled_total": self.spilled_total,
+        }
+
+def _create_snapshot_manager() -> SnapshotManager:
+    from cluster.client import get_client
+
+    # クラスタモードでは履歴をランチャーの状態サービスに置き、どのワーカーからもロールバックできるようにする
+    client = get_client()
+    if client is None:
+        return SnapshotManager()
+
+    from cluster.snapshots import ClusterSnapshotManager
+
+    return ClusterSnapshotManager(client)
+
+
+# グローバルスナップショットマネージャー
+snapshot_manager = _create_snapshot_manager()
@@ -10,6 +10,7 @@ import game
 from bot_state import attach_bot_state
 from emoji_rpg.view import EmojiRPGResult, EmojiRPGView
 from views import BattleView
+from ui.render_queue import render_queue
 
 
 def setup_emoji_command(bot: commands.Bot) -> None:
@@ -81,6 +82,7 @@ def setup_emoji_command(bot: commands.Bot) -> None:
                 async def restore_after_battle(outcome: str, enemy_hp: int, enemy_max_hp: int):
                     async def _restore():
                         # BattleView側の最終編集（ボタン無効化等）の後に上書きするため、少しだけ遅延
+                        # （描画キュー経由なので、保留中の戦闘フレームより後に送られる）
                         await asyncio.sleep(0.25)
                         try:
                             # 近接ボタン状態を再計算（位置は戦闘で変わらないが、UIだけ整える）
@@ -90,7 +92,7 @@ def setup_emoji_command(bot: commands.Bot) -> None:
                                 pass
                             embed = view.get_embed()
                             embed.set_footer(text=f"戦闘結果: {outcome} / 続きをどうぞ")
-                            await interaction.message.edit(embed=embed, view=view)
+                            await render_queue.edit(interaction.message, embed=embed, view=view)
                         except Exception:
                             pass
 
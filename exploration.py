@@ -16,6 +16,7 @@ Event Priority (高い順):
 1. BOSS: 1000m毎のボス戦
 2. SPECIAL: 500m毎の特殊イベント（鍛冶屋・商人）
 3. STORY: 250m毎のストーリーイベント
+   （1〜3 の距離は rpg/data/milestones.json → rpg.milestones の索引）
 4. CHOICE_STORY: 0.1%の選択肢分岐ストーリー
 5. TRAP_CHEST: 1%のトラップ宝箱
 6. CHEST: 9%の通常宝箱
@@ -75,50 +76,38 @@ async def determine_event(
     """
     
     # ==========================
-    # 優先度1: ボス戦（1000m毎）- 最優先
+    # 優先度1〜3: 距離マイルストーン（ボス 1000m毎 / 特殊 500m毎 / ストーリー 250m毎）
+    # rpg/data/milestones.json の索引から、今回通過したものを優先度順に取り出す
     # ==========================
-    boss_distances = [1000, 2000, 3000, 4000, 5000, 6000, 7000, 8000, 9000, 10000]
-    for boss_distance in boss_distances:
-        if passed_through(previous_distance, current_distance, boss_distance):
-            boss_stage = boss_distance // 1000
-            story_id = f"boss_pre_{boss_stage}"
-            
+    from rpg.milestones import get_index
+
+    for milestone in get_index().crossed(previous_distance, current_distance, kinds=("boss", "special", "story")):
+        if milestone.get("move_event") is False:
+            continue
+        kind = milestone["kind"]
+        if kind == "boss":
+            story_id = milestone["story_id"]
             return EventResult(
                 type="BOSS",
                 data={
-                    "boss_stage": boss_stage,
-                    "boss_distance": boss_distance,
+                    "boss_stage": milestone["boss_stage"],
+                    "boss_distance": milestone["distance"],
                     "story_id": story_id,
                     "story_shown": story_flags.get(story_id, False)
                 }
             )
-    
-    # ==========================
-    # 優先度2: 500m毎の特殊イベント（鍛冶屋・商人・レイドボス・ストーリー）
-    # ==========================
-    special_distances = [500, 1500, 2500, 3500, 4500, 5500, 6500, 7500, 8500, 9500]
-    for special_distance in special_distances:
-        if passed_through(previous_distance, current_distance, special_distance):
+        if kind == "special":
             return EventResult(
                 type="SPECIAL",
-                data={"special_distance": special_distance}
+                data={"special_distance": milestone["distance"]}
+            )
+        # 既読のストーリーは飛ばす
+        story_id = milestone["story_id"]
+        if story_id not in story_flags:
+            return EventResult(
+                type="STORY",
+                data={"story_id": story_id}
             )
-    
-    # ==========================
-    # 優先度3: 距離ベースストーリー（250m, 750m, 1250m, etc.）
-    # ==========================
-    story_distances = [250, 750, 1250, 1750, 2250, 2750, 3250, 3750, 4250, 4750, 
-                      5250, 5750, 6250, 6750, 7250, 7750, 8250, 8750, 9250, 9750]
-    for story_distance in story_distances:
-        if passed_through(previous_distance, current_distance, story_distance):
-            story_id = f"story_{story_distance}"
-            
-            # 既読チェック
-            if story_id not in story_flags:
-                return EventResult(
-                    type="STORY",
-                    data={"story_id": story_id}
-                )
     
     # ==========================
     # 優先度4: 超低確率で選択肢分岐ストーリー（0.1%）
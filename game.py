@@ -7,7 +7,8 @@ Why:
 - We keep `import game` working for the rest of the bot.
 
 How it works:
-- Load ITEMS_DATABASE / ENEMY_ZONES from rpg/data/*.json (single source of truth).
+- Load ITEMS_DATABASE / ENEMY_ZONES from rpg/data/*.json (single source of truth),
+  via the precompiled bundle (rpg/data/bundle.py) when it is up to date.
 - Import `legacy_game` for the rest of the logic.
 - Patch legacy globals so its functions use the loaded data.
 - Re-export legacy public symbols.
@@ -21,18 +22,18 @@ import legacy_game as _legacy
 
 
 def _load_items() -> dict[str, Any]:
-    from rpg.data.items import load_items
+    from rpg.data.bundle import load_game_data
 
-    data = load_items()
+    data = load_game_data().get("items")
     if not isinstance(data, dict) or not data:
         raise ValueError("rpg/data/items.json is empty or invalid")
     return data
 
 
 def _load_enemy_zones() -> dict[str, Any]:
-    from rpg.data.enemies import load_enemy_zones
+    from rpg.data.bundle import load_game_data
 
-    data = load_enemy_zones()
+    data = load_game_data().get("enemy_zones")
     if not isinstance(data, dict) or not data:
         raise ValueError("rpg/data/enemies.json is empty or invalid")
     return data
@@ -80,6 +80,7 @@ def setup_help_command(bot: commands.Bot) -> None:
         embed1.add_field(name="移動", value="`!move` / `!m`\nダンジョンを進む", inline=False)
         embed1.add_field(name="インベントリ", value="`!inventory` / `!inv`\n持ち物を見る", inline=False)
         embed1.add_field(name="ステータス", value="`!status` / `!s`\nHP/MP/装備などを見る", inline=False)
+        embed1.add_field(name="ランキング", value="`!ranking [distance|level|deaths] [global]`\n到達距離・レベル・死亡回数のランキング", inline=False)
         embed1.add_field(name="ヘルプ", value="`!help`\nこのヘルプを表示", inline=False)
         pages.append(embed1)
 
@@ -0,0 +1,113 @@
+"""起動時の import 時間プロファイル（`python -X importtime` 相当）
+
+main.py の先頭で `install()` しておくと、以降の import を sys.meta_path のフックで計測し、
+起動完了時に `report()` で self / cumulative の時間が大きいモジュールをログに出す。
+
+- self: そのモジュール自身の実行時間（子モジュールの import を除く）
+- cumulative: 子モジュールの import を含めた時間
+- 遅延ロードされたモジュールも、読み込まれた時点で記録に追加される
+
+IMPORT_PROFILE=0 で無効化できる。
+"""
+
+from __future__ import annotations
+
+import importlib.abc
+import logging
+import os
+import sys
+import time
+from typing import Any
+
+logger = logging.getLogger("rpgbot")
+
+# module name -> (self_us, cumulative_us, depth)
+_RECORDS: dict[str, tuple[int, int, int]] = {}
+_STACK: list[list[Any]] = []  # [name, started, child_us]
+_INSTALLED = False
+
+
+def enabled() -> bool:
+    return (os.getenv("IMPORT_PROFILE") or "1").strip().lower() not in {"0", "false", "no", "off"}
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """元の loader の exec_module を計測して委譲する"""
+
+    def __init__(self, name: str, loader: Any):
+        self._name = name
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        frame = [self._name, time.perf_counter(), 0]
+        _STACK.append(frame)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            _STACK.pop()
+            cumulative = int((time.perf_counter() - frame[1]) * 1_000_000)
+            self_us = max(0, cumulative - frame[2])
+            _RECORDS[self._name] = (self_us, cumulative, len(_STACK))
+            if _STACK:
+                _STACK[-1][2] += cumulative
+
+    def __getattr__(self, item):
+        # get_resource_reader / get_source など、元の loader の API はそのまま見せる
+        return getattr(self._loader, item)
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            loader = spec.loader
+            if loader is not None and hasattr(loader, "exec_module") and not isinstance(loader, _TimedLoader):
+                spec.loader = _TimedLoader(fullname, loader)
+            return spec
+        return None
+
+
+def install() -> None:
+    """以降の import の計測を開始する"""
+    global _INSTALLED
+    if _INSTALLED or not enabled():
+        return
+    sys.meta_path.insert(0, _ImportTimer())
+    _INSTALLED = True
+
+
+def records() -> dict[str, tuple[int, int, int]]:
+    return dict(_RECORDS)
+
+
+def report(limit: int = 20, *, by: str = "cumulative") -> str:
+    """計測結果を `-X importtime` と同じ列形式で整形する"""
+    index = 1 if by == "cumulative" else 0
+    rows = sorted(_RECORDS.items(), key=lambda kv: kv[1][index], reverse=True)[:limit]
+    lines = ["import time: self [us] | cumulative | imported package"]
+    for name, (self_us, cumulative_us, depth) in rows:
+        lines.append(f"import time: {self_us:>9} | {cumulative_us:>10} | {'  ' * depth}{name}")
+    return "\n".join(lines)
+
+
+def log_report(limit: int = 20) -> None:
+    if not _INSTALLED:
+        return
+    total_us = sum(cumulative for _, cumulative, depth in _RECORDS.values() if depth == 0)
+    logger.info(
+        "📦 import profile: %s modules, %.1fms total (top %s by cumulative)\n%s",
+        len(_RECORDS),
+        total_us / 1000,
+        limit,
+        report(limit),
+    )
+
+
+__all__ = ["install", "log_report", "records", "report"]
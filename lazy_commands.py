@@ -0,0 +1,156 @@
+"""コマンドの遅延ロード
+
+管理者/デバッグ系・絵文字RPG・死亡統計などの利用頻度が低いコマンド群は、
+起動時には「名前とエイリアスだけを持つスタブコマンド」を登録しておき、
+最初に呼ばれた時点で実装モジュールを import → 本来の setup_xxx(bot) で登録し直す。
+
+スタブが呼ばれたら同じメッセージから Context を作り直して再実行するので、
+引数の変換やチェック（check_ban / has_permissions 等）は本来のコマンドがそのまま行う。
+
+コマンド名は import せずに分かる必要があるため、ここに静的に列挙する。
+実装側でコマンドを追加/改名した場合はこの表も更新すること。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+import inspect
+import logging
+import time
+from dataclasses import dataclass, field
+
+from discord.ext import commands
+
+logger = logging.getLogger("rpgbot")
+
+
+@dataclass(frozen=True)
+class LazyCommandGroup:
+    """遅延ロードするコマンド群（module.setup(bot) で登録されるもの）"""
+
+    module: str
+    setup: str
+    commands: dict[str, tuple[str, ...]] = field(default_factory=dict)
+
+
+LAZY_COMMAND_GROUPS: dict[str, LazyCommandGroup] = {
+    "emoji": LazyCommandGroup(
+        module="emoji_commands",
+        setup="setup_emoji_command",
+        commands={"emoji": ()},
+    ),
+    "death": LazyCommandGroup(
+        module="death_commands",
+        setup="setup_death_commands",
+        commands={"death_stats": ("ds",), "death_history": ("dh",)},
+    ),
+    "debug": LazyCommandGroup(
+        module="debug_commands",
+        setup="setup_debug_commands",
+        commands={
+            "admin_stats": (),
+            "admin_logs": (),
+            "admin_clear_logs": (),
+            "admin_dbprofile": (),
+            "admin_ban": (),
+            "admin_unban": (),
+            "admin_player": (),
+            "admin_clear_processing": (),
+            "admin_force_reset": (),
+            "notice": (),
+            "notice_resume": (),
+            "notice_status": (),
+            "rollback": ("rb",),
+            "debug_status": (),
+        },
+    ),
+    "anti_cheat_admin": LazyCommandGroup(
+        module="admin_anti_cheat",
+        setup="setup_admin_commands",
+        commands={
+            "ac_review": (),
+            "ac_logs": (),
+            "ac_ban": (),
+            "ac_unban": (),
+            "ac_stats": (),
+            "ac_commands": (),
+        },
+    ),
+}
+
+_LOADED_GROUPS: set[str] = set()
+_LOAD_LOCKS: dict[str, asyncio.Lock] = {}
+
+
+def _remove_stubs(bot: commands.Bot, group: LazyCommandGroup) -> None:
+    for name in group.commands:
+        command = bot.get_command(name)
+        if command is not None and getattr(command, "__lazy_group__", None) is not None:
+            bot.remove_command(name)
+
+
+async def load_lazy_group(bot: commands.Bot, key: str) -> bool:
+    """コマンド群の実装を import して本登録する（登録済みなら何もしない）"""
+    if key in _LOADED_GROUPS:
+        return True
+
+    group = LAZY_COMMAND_GROUPS[key]
+    lock = _LOAD_LOCKS.setdefault(key, asyncio.Lock())
+    async with lock:
+        if key in _LOADED_GROUPS:
+            return True
+
+        started = time.perf_counter()
+        _remove_stubs(bot, group)
+        try:
+            module = importlib.import_module(group.module)
+            result = getattr(module, group.setup)(bot)
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            logger.exception("lazy command group load failed: group=%s module=%s", key, group.module)
+            # 失敗時はスタブを戻して、次の呼び出しで再試行できるようにする
+            register_lazy_group(bot, key)
+            return False
+
+        _LOADED_GROUPS.add(key)
+        logger.info(
+            "✅ Lazy commands loaded: %s (%s) in %.1fms",
+            key,
+            group.module,
+            (time.perf_counter() - started) * 1000,
+        )
+        return True
+
+
+def _make_stub(key: str, name: str, aliases: tuple[str, ...]) -> commands.Command:
+    async def _lazy_stub(ctx: commands.Context, *, _args: str = ""):
+        if not await load_lazy_group(ctx.bot, key):
+            await ctx.send("⚠️ コマンドの読み込みに失敗しました。しばらくしてからもう一度お試しください。")
+            return
+
+        # 本来のコマンドで同じメッセージを処理し直す
+        new_ctx = await ctx.bot.get_context(ctx.message)
+        if new_ctx.command is None or getattr(new_ctx.command, "__lazy_group__", None) is not None:
+            return
+        await ctx.bot.invoke(new_ctx)
+
+    command = commands.Command(_lazy_stub, name=name, aliases=list(aliases))
+    command.__lazy_group__ = key
+    return command
+
+
+def register_lazy_group(bot: commands.Bot, key: str) -> None:
+    """スタブコマンドを登録する（実装モジュールは import しない）"""
+    if key in _LOADED_GROUPS:
+        return
+
+    group = LAZY_COMMAND_GROUPS[key]
+    for name, aliases in group.commands.items():
+        if bot.get_command(name) is not None:
+            continue
+        bot.add_command(_make_stub(key, name, aliases))
+
+
+__all__ = ["LAZY_COMMAND_GROUPS", "LazyCommandGroup", "load_lazy_group", "register_lazy_group"]
@@ -0,0 +1,464 @@
+"""ランキング（距離 / レベル / 死亡回数）のメモリ上インデックス
+
+!ranking のたびに players を order=distance.desc で走査しないよう、
+上位 K 件をメトリクス毎・ギルド毎（+ 全体）にスキップリストで保持し、書き込み時に更新する。
+
+- 起動時: players を必要な列だけのキーセットページングで 1 回走査して構築する
+- 書き込み時: db.update_player / delete_player から on_player_update / on_player_delete が呼ばれ、
+  該当メトリクスのエントリを O(log n) で入れ替える
+- 上位から落ちたエントリの補充: 保持数（2K）が K を下回ったら、そのメトリクスだけ
+  メモリ上のスコア表（プレイヤー毎に数値 3 つ）から作り直す（DBには問い合わせない）
+- !ranking はこのインデックスだけを読む（DBには問い合わせない）
+
+ギルドの所属は、スレッド運用なら milestone_flags の _adventure_guild_id、
+チャンネル運用ならコマンド実行時（check_ban）に note_guild で覚えたギルドを使う。
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import random
+import time
+from typing import Any, Iterable, Iterator, Optional
+
+from runtime_settings import LEADERBOARD_SIZE
+
+logger = logging.getLogger("rpgbot")
+
+# metric -> players の列（先頭が優先）
+METRICS: dict[str, tuple[str, ...]] = {
+    "distance": ("distance",),
+    "level": ("level",),
+    "deaths": ("death_count",),
+}
+
+METRIC_LABELS: dict[str, str] = {
+    "distance": "到達距離",
+    "level": "レベル",
+    "deaths": "死亡回数",
+}
+
+# 起動時の走査で取得する列（milestone_flags は JSON パスでギルドIDだけ取る）
+_REBUILD_SELECT = "user_id,name,distance,level,death_count,game_cleared,guild_id:milestone_flags->>_adventure_guild_id"
+
+# これらの列が更新された時だけランキングを更新する
+WATCHED_COLUMNS = frozenset({"name", "game_cleared", "milestone_flags"}.union(*METRICS.values()))
+
+
+# ==============================
+# 順位アクセス可能なスキップリスト
+# ==============================
+
+class _SkipNode:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key: Any, level: int):
+        self.key = key
+        self.next: list[Optional[_SkipNode]] = [None] * level
+        self.width: list[int] = [1] * level
+
+
+class IndexableSkipList:
+    """昇順のスキップリスト。挿入 / 削除 / 順位指定の取得がいずれも O(log n)"""
+
+    MAX_LEVEL = 24
+
+    def __init__(self):
+        self._head = _SkipNode(None, self.MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < self.MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key: Any) -> None:
+        chain: list[_SkipNode] = [self._head] * self.MAX_LEVEL
+        steps = [0] * self.MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key < key:
+                steps[i] += node.width[i]
+                node = node.next[i]
+            chain[i] = node
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                chain[i] = self._head
+                self._head.width[i] = self._size + 1
+            self._level = level
+
+        new = _SkipNode(key, level)
+        walked = 0
+        for i in range(level):
+            prev = chain[i]
+            new.next[i] = prev.next[i]
+            prev.next[i] = new
+            new.width[i] = prev.width[i] - walked
+            prev.width[i] = walked + 1
+            walked += steps[i]
+        for i in range(level, self._level):
+            chain[i].width[i] += 1
+        self._size += 1
+
+    def remove(self, key: Any) -> bool:
+        chain: list[_SkipNode] = [self._head] * self.MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key < key:
+                node = node.next[i]
+            chain[i] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            return False
+
+        for i in range(self._level):
+            prev = chain[i]
+            if prev.next[i] is target:
+                prev.width[i] += target.width[i] - 1
+                prev.next[i] = target.next[i]
+            else:
+                prev.width[i] -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    def __getitem__(self, index: int) -> Any:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        node = self._head
+        remaining = index + 1
+        for i in range(self._level - 1, -1, -1):
+            while node.next[i] is not None and node.width[i] <= remaining:
+                remaining -= node.width[i]
+                node = node.next[i]
+        return node.key
+
+    def iter_from(self, index: int) -> Iterator[Any]:
+        if index >= self._size:
+            return
+        node = self._head
+        remaining = index
+        for i in range(self._level - 1, -1, -1):
+            while node.next[i] is not None and node.width[i] <= remaining:
+                remaining -= node.width[i]
+                node = node.next[i]
+        node = node.next[0]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+
+# ==============================
+# 上位 K 件
+# ==============================
+
+class TopK:
+    """スコア降順の上位エントリ（真の上位 len(self) 件であることを保つ）"""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._list = IndexableSkipList()
+        self._keys: dict[str, tuple[int, str]] = {}
+        # True の間は「該当するプレイヤー全員」を保持している（上位から落ちた人も補充不要）
+        self.complete = True
+
+    def __len__(self) -> int:
+        return len(self._list)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._keys
+
+    def _floor_key(self) -> Optional[tuple[int, str]]:
+        return self._list[-1] if len(self._list) else None
+
+    def update(self, user_id: str, score: int) -> None:
+        key = (-int(score), user_id)
+        old = self._keys.pop(user_id, None)
+        if old is not None:
+            self._list.remove(old)
+
+        floor = self._floor_key()
+        if not self.complete and floor is not None and key > floor:
+            # 保持範囲より下: 圏外（ここには入らない）
+            return
+        if not self.complete and floor is None and old is None:
+            return
+
+        self._list.insert(key)
+        self._keys[user_id] = key
+        while len(self._list) > self.capacity:
+            dropped = self._list[-1]
+            self._list.remove(dropped)
+            self._keys.pop(dropped[1], None)
+            self.complete = False
+
+    def remove(self, user_id: str) -> None:
+        key = self._keys.pop(user_id, None)
+        if key is not None:
+            self._list.remove(key)
+
+    def replace_all(self, rows: Iterable[tuple[str, int]], *, complete: bool) -> None:
+        self._list = IndexableSkipList()
+        self._keys = {}
+        self.complete = True
+        for user_id, score in rows:
+            self.update(user_id, score)
+        self.complete = self.complete and complete
+
+    def rank_of(self, user_id: str) -> Optional[int]:
+        key = self._keys.get(user_id)
+        if key is None:
+            return None
+        # 同点は user_id 順なので key の位置がそのまま順位
+        low, high = 0, len(self._list)
+        while low < high:
+            mid = (low + high) // 2
+            if self._list[mid] < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low + 1
+
+    def page(self, offset: int, limit: int) -> list[tuple[str, int]]:
+        rows = []
+        for neg_score, user_id in self._list.iter_from(offset):
+            rows.append((user_id, -neg_score))
+            if len(rows) >= limit:
+                break
+        return rows
+
+
+# ==============================
+# ランキング本体
+# ==============================
+
+def _score(row: dict, metric: str) -> Optional[int]:
+    for column in METRICS[metric]:
+        if column in row:
+            try:
+                return int(row.get(column) or 0)
+            except (TypeError, ValueError):
+                return 0
+    return None
+
+
+def _guild_from_flags(flags: Any) -> Optional[int]:
+    if not isinstance(flags, dict):
+        return None
+    raw = flags.get("_adventure_guild_id")
+    try:
+        return int(raw) if raw is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class Leaderboard:
+    def __init__(self, size: int = LEADERBOARD_SIZE):
+        self.size = max(1, int(size))
+        # 補充（作り直し）の回数を抑えるため、表示件数の 2 倍を保持する
+        self.capacity = self.size * 2
+        self._global: dict[str, TopK] = {m: TopK(self.capacity) for m in METRICS}
+        self._guilds: dict[int, dict[str, TopK]] = {}
+        self._user_guild: dict[str, int] = {}
+        self._scores: dict[str, dict[str, int]] = {}
+        self._names: dict[str, str] = {}
+        self._cleared: set[str] = set()
+        self.refills_total = 0
+        # 再構築中に届いた更新（user_id -> 更新内容 / 削除なら None）。走査結果に上書きで適用する
+        self._pending: Optional[dict[str, Optional[dict]]] = None
+        self.ready = False
+        self.last_rebuild_ms = 0.0
+
+    # -------------------------
+    # 参照
+    # -------------------------
+
+    def _board(self, metric: str, guild_id: Optional[int]) -> Optional[TopK]:
+        if guild_id is None:
+            return self._global[metric]
+        boards = self._guilds.get(int(guild_id))
+        return boards.get(metric) if boards else None
+
+    def page(self, metric: str, *, guild_id: Optional[int] = None, offset: int = 0, limit: int = 10) -> list[dict]:
+        board = self._board(metric, guild_id)
+        if board is None:
+            return []
+        limit = max(0, min(limit, self.size - offset))
+        return [
+            {
+                "rank": offset + i + 1,
+                "user_id": user_id,
+                "name": self._names.get(user_id),
+                "score": score,
+                "cleared": user_id in self._cleared,
+            }
+            for i, (user_id, score) in enumerate(board.page(offset, limit))
+        ]
+
+    def count(self, metric: str, *, guild_id: Optional[int] = None) -> int:
+        board = self._board(metric, guild_id)
+        return min(len(board), self.size) if board is not None else 0
+
+    def rank_of(self, metric: str, user_id: Any, *, guild_id: Optional[int] = None) -> Optional[int]:
+        board = self._board(metric, guild_id)
+        rank = board.rank_of(str(user_id)) if board is not None else None
+        return rank if rank is not None and rank <= self.size else None
+
+    # -------------------------
+    # 更新
+    # -------------------------
+
+    def _guild_boards(self, guild_id: int) -> dict[str, TopK]:
+        boards = self._guilds.get(guild_id)
+        if boards is None:
+            boards = {m: TopK(self.capacity) for m in METRICS}
+            self._guilds[guild_id] = boards
+        return boards
+
+    def _apply(self, user_id: str, row: dict) -> None:
+        if row.get("name"):
+            self._names[user_id] = str(row["name"])
+        if "game_cleared" in row:
+            if row.get("game_cleared"):
+                self._cleared.add(user_id)
+            else:
+                self._cleared.discard(user_id)
+
+        guild_id = _guild_from_flags(row.get("milestone_flags"))
+        if guild_id is None and row.get("guild_id"):
+            try:
+                guild_id = int(row["guild_id"])
+            except (TypeError, ValueError):
+                guild_id = None
+        if guild_id is not None:
+            self.note_guild(user_id, guild_id)
+
+        scores = self._scores.setdefault(user_id, {})
+        guild_boards = self._guilds.get(self._user_guild.get(user_id, -1))
+        for metric in METRICS:
+            score = _score(row, metric)
+            if score is None:
+                continue
+            scores[metric] = score
+            for board in (self._global[metric], guild_boards[metric] if guild_boards else None):
+                if board is None:
+                    continue
+                board.update(user_id, score)
+                if not board.complete and len(board) < self.size:
+                    self._refill(metric, None if board is self._global[metric] else self._user_guild[user_id])
+
+    def on_player_update(self, user_id: Any, payload: dict) -> None:
+        """db.update_player 成功後に呼ばれる"""
+        if not WATCHED_COLUMNS.intersection(payload):
+            return
+        user_id = str(user_id)
+        if self._pending is not None:
+            merged = self._pending.get(user_id) or {}
+            merged.update(payload)
+            self._pending[user_id] = merged
+        self._apply(user_id, payload)
+
+    def on_player_delete(self, user_id: Any) -> None:
+        user_id = str(user_id)
+        if self._pending is not None:
+            self._pending[user_id] = None
+        for board in self._global.values():
+            board.remove(user_id)
+        guild_id = self._user_guild.pop(user_id, None)
+        if guild_id is not None and guild_id in self._guilds:
+            for board in self._guilds[guild_id].values():
+                board.remove(user_id)
+        self._scores.pop(user_id, None)
+        self._names.pop(user_id, None)
+        self._cleared.discard(user_id)
+
+    def note_guild(self, user_id: Any, guild_id: Optional[int]) -> None:
+        """プレイヤーの所属ギルドを記録（変わった場合はギルド別ランキングを移す）"""
+        if guild_id is None:
+            return
+        user_id, guild_id = str(user_id), int(guild_id)
+        previous = self._user_guild.get(user_id)
+        if previous == guild_id:
+            return
+        self._user_guild[user_id] = guild_id
+        if previous is not None and previous in self._guilds:
+            for board in self._guilds[previous].values():
+                board.remove(user_id)
+        boards = self._guild_boards(guild_id)
+        for metric, score in self._scores.get(user_id, {}).items():
+            boards[metric].update(user_id, score)
+
+    # -------------------------
+    # 構築 / 補充
+    # -------------------------
+
+    async def rebuild(self) -> None:
+        """players を 1 回走査して全ランキングを作り直す"""
+        import db
+
+        started = time.perf_counter()
+        fresh = Leaderboard(self.size)
+        self._pending = {}
+        try:
+            async for row in db.iter_players(select=_REBUILD_SELECT, page_size=1000):
+                fresh._apply(str(row["user_id"]), row)
+            # 走査中の更新は走査結果より新しい
+            for user_id, payload in self._pending.items():
+                if payload is None:
+                    fresh.on_player_delete(user_id)
+                else:
+                    fresh._apply(user_id, payload)
+        finally:
+            self._pending = None
+
+        self._global, self._guilds = fresh._global, fresh._guilds
+        self._user_guild, self._scores = fresh._user_guild, fresh._scores
+        self._names, self._cleared = fresh._names, fresh._cleared
+        self.ready = True
+        self.last_rebuild_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            "✅ Leaderboard rebuilt: players=%s guilds=%s in %.0fms",
+            len(self._scores),
+            len(self._guilds),
+            self.last_rebuild_ms,
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "players": len(self._scores),
+            "guilds": len(self._guilds),
+            "refills_total": self.refills_total,
+            "last_rebuild_ms": round(self.last_rebuild_ms, 1),
+        }
+
+    def _refill(self, metric: str, guild_id: Optional[int]) -> None:
+        """保持数が K を下回った TopK を、メモリ上のスコア表から作り直す"""
+        board = self._board(metric, guild_id)
+        if board is None:
+            return
+        if guild_id is None:
+            candidates = self._scores.items()
+        else:
+            candidates = ((uid, self._scores.get(uid, {})) for uid, gid in self._user_guild.items() if gid == guild_id)
+        rows = [(uid, scores[metric]) for uid, scores in candidates if metric in scores]
+        top = heapq.nsmallest(self.capacity, rows, key=lambda row: (-row[1], row[0]))
+        board.replace_all(top, complete=len(rows) <= self.capacity)
+        self.refills_total += 1
+
+
+leaderboard = Leaderboard()
+
+__all__ = ["IndexableSkipList", "Leaderboard", "METRICS", "METRIC_LABELS", "TopK", "leaderboard"]
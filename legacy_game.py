@@ -4,6 +4,7 @@ import logging
 
 from rpg.combat import damage as _damage
 from rpg.combat.ability_effects import apply_ability_effects, get_enemy_type
+from rpg.data.drops import categorize_drops_by_zone
 
 # 戦闘計算（ATK/DEF）を views 側の直書きから共通化するためのヘルパー
 # ※既存挙動は config.DAMAGE_MODEL = "legacy" をデフォルトに維持
@@ -90,30 +91,23 @@ def calculate_physical_damage(attack: int, defense: int, rand_min: int, rand_max
     return _damage.calculate_physical_damage(attack, defense, rand_min, rand_max, model=model)
 
 ITEMS_DATABASE = {}
-
-# Prefer external data files when present (keeps legacy literals as fallback during migration).
-try:
-    from rpg.data.items import load_items as _load_items
-
-    _items = _load_items()
-    if isinstance(_items, dict) and _items:
-        ITEMS_DATABASE = _items
-except Exception:
-    # Keep legacy in-code ITEMS_DATABASE
-    pass
-
-
 ENEMY_ZONES = {}
+DROPS_BY_ZONE_AND_TYPE = {}
 
-# Prefer external data files when present (keeps legacy literals as fallback during migration).
+# 事前コンパイル済みバンドル（rpg/data/bundle.py）から一括で読み込む。
+# バンドルが古い/無い場合はソースJSONをパースしてフォールバックする。
 try:
-    from rpg.data.enemies import load_enemy_zones as _load_enemy_zones
-
-    _zones = _load_enemy_zones()
-    if isinstance(_zones, dict) and _zones:
-        ENEMY_ZONES = _zones
+    from rpg.data.bundle import load_game_data as _load_game_data
+
+    _game_data = _load_game_data()
+    if isinstance(_game_data.get("items"), dict) and _game_data["items"]:
+        ITEMS_DATABASE = _game_data["items"]
+    if isinstance(_game_data.get("enemy_zones"), dict) and _game_data["enemy_zones"]:
+        ENEMY_ZONES = _game_data["enemy_zones"]
+    if isinstance(_game_data.get("drops_by_zone_and_type"), dict):
+        DROPS_BY_ZONE_AND_TYPE = _game_data["drops_by_zone_and_type"]
 except Exception:
-    # Keep legacy in-code ENEMY_ZONES
+    # Keep legacy in-code ITEMS_DATABASE / ENEMY_ZONES
     pass
 
 
@@ -346,26 +340,29 @@ def get_boss(stage):
     return None
     
 
+# ボス / 特殊イベントの発生範囲（マイルストーン距離の±20m）
+MILESTONE_RANGE = 20
+
+
 def should_spawn_boss(distance):
-    if distance < 980:
-        return False
-    remainder = distance % 1000
-    # 980-1020の範囲（1000の±20）でボス発生
-    return remainder <= 20 or remainder >= 980
+    # 980-1020の範囲（1000の±20）でボス発生。距離は rpg/data/milestones.json の boss
+    from rpg.milestones import get_index
+
+    return get_index().near(distance, MILESTONE_RANGE, "boss") is not None
 
 def get_boss_stage(distance):
     """ボス戦の正しいステージ番号を取得（範囲ベース）"""
     return round(distance / 1000)
 
 def is_special_event_distance(distance):
-    if distance < 480:
+    # 480-520の範囲（500の±20）で特殊イベント発生（special は 1000m毎のボス距離を含まない）
+    from rpg.milestones import get_index
+
+    index = get_index()
+    if index.near(distance, MILESTONE_RANGE, "special") is None:
         return False
-    remainder = distance % 500
-    # 480-520の範囲（500の±20）で特殊イベント発生
-    in_event_range = remainder <= 20 or remainder >= 480
     # ただしボス範囲は除外
-    in_boss_range = should_spawn_boss(distance)
-    return in_event_range and not in_boss_range
+    return not should_spawn_boss(distance)
 
 def get_special_event_stage(distance):
     """特殊イベントの正しいステージ番号を取得（範囲ベース）"""
@@ -421,7 +418,11 @@ async def calculate_equipment_bonus(user_id):
     """装備中のアイテムから攻撃力・防御力ボーナスと特殊効果を計算"""
     import db
     equipped = await db.get_equipped_items(user_id)
+    return compute_equipment_bonus(equipped)
+
 
+def compute_equipment_bonus(equipped):
+    """装備スロット辞書（weapon/armor/shield）からボーナスを計算（DBアクセスなし）"""
     attack_bonus = 0
     defense_bonus = 0
     total_bonuses = {
@@ -474,30 +475,17 @@ async def calculate_equipment_bonus(user_id):
     }
 
 
-STORY_TRIGGERS = [
-    {"distance": 100, "story_id": "voice_1", "exact_match": False},
-    {"distance": 777, "story_id": "lucky_777", "exact_match": True},
-    {"distance": 250, "story_id": "story_250", "exact_match": False},
-    {"distance": 750, "story_id": "story_750", "exact_match": False},
-    {"distance": 1250, "story_id": "story_1250", "exact_match": False},
-    {"distance": 1750, "story_id": "story_1750", "exact_match": False},
-    {"distance": 2250, "story_id": "story_2250", "exact_match": False},
-    {"distance": 2750, "story_id": "story_2750", "exact_match": False},
-    {"distance": 3250, "story_id": "story_3250", "exact_match": False},
-    {"distance": 3750, "story_id": "story_3750", "exact_match": False},
-    {"distance": 4250, "story_id": "story_4250", "exact_match": False},
-    {"distance": 4750, "story_id": "story_4750", "exact_match": False},
-    {"distance": 5250, "story_id": "story_5250", "exact_match": False},
-    {"distance": 5750, "story_id": "story_5750", "exact_match": False},
-    {"distance": 6250, "story_id": "story_6250", "exact_match": False},
-    {"distance": 6750, "story_id": "story_6750", "exact_match": False},
-    {"distance": 7250, "story_id": "story_7250", "exact_match": False},
-    {"distance": 7750, "story_id": "story_7750", "exact_match": False},
-    {"distance": 8250, "story_id": "story_8250", "exact_match": False},
-    {"distance": 8750, "story_id": "story_8750", "exact_match": False},
-    {"distance": 9250, "story_id": "story_9250", "exact_match": False},
-    {"distance": 9750, "story_id": "story_9750", "exact_match": False},
-]
+def _story_triggers():
+    """ストーリートリガー（rpg/data/milestones.json の story。距離の昇順）"""
+    from rpg.milestones import get_index
+
+    return [
+        {"distance": m["distance"], "story_id": m["story_id"], "exact_match": bool(m.get("exact"))}
+        for m in get_index().of_kind("story")
+    ]
+
+
+STORY_TRIGGERS = _story_triggers()
 
 
 def apply_armor_effects(incoming_damage, armor_ability, defender_hp, max_hp, attacker_damage=0, attack_attribute="none"):
@@ -700,30 +688,25 @@ async def check_story_trigger(previous_distance, current_distance, user_id):
         トリガーされたストーリーID、またはNone
     """
     import db
-    from story import STORY_DATA
+    from rpg.data.bundle import load_game_data
+    from rpg.milestones import get_index
 
-    player = await db.get_player(user_id)
+    # 通過したトリガーを先に絞り込み、既読フラグは 1 回の取得で判定する
+    crossed = get_index().crossed(previous_distance, current_distance, kinds=("story",))
+    if not crossed:
+        return None
+
+    player = await db.get_player(user_id, fields=("story_flags",))
     if not player:
         return None
+    flags = player.get("story_flags") or {}
+    # story.STORY_DATA は空（stories/*.json に移動済み）なので、バンドルのストーリーで存在確認する
+    stories = load_game_data().get("stories") or {}
 
-    for trigger in STORY_TRIGGERS:
-        trigger_distance = trigger["distance"]
+    for trigger in crossed:
         story_id = trigger["story_id"]
-        exact_match = trigger.get("exact_match", False)
-
-        triggered = False
-        if exact_match:
-            triggered = (current_distance == trigger_distance)
-        else:
-            triggered = (previous_distance < trigger_distance <= current_distance)
-
-        if triggered:
-            story = STORY_DATA.get(story_id)
-            if not story:
-                continue
-
-            if not await db.get_story_flag(user_id, story_id):
-                return story_id
+        if story_id in stories and not flags.get(story_id, False):
+            return story_id
 
     return None
 
@@ -745,59 +728,10 @@ def get_exp_from_enemy(enemy_name, distance):
 
     return 10
 
-def categorize_drops_by_zone(zones, items_db):
-    """
-    ENEMY_ZONESのドロップアイテムを、アイテムタイプ別に分類し、階層ごとに集計する。
-    """
-    drops_by_zone_and_type = {}
-
-    for zone_key, zone_data in zones.items():
-        "ゾーンごとに結果を初期化"
-        drops_by_zone_and_type[zone_key] = {
-            "weapon": set(),
-            "armor": set(),
-            "potion": set(),
-            "material": set(),
-            "other": set() # noneやcoinsなど、タイプがないものを格納
-        }
-
-        "ENEMIESがリストであることを前提"
-        for enemy in zone_data.get("enemies", []): 
-            "dropsがリストであることを前提"
-            for drop in enemy.get("drops", []):
-                item_name = drop.get("item")
-
-                "'none' または 'coins' のような特殊ドロップはスキップまたは'other'に追加"
-                if item_name == "none" or item_name == "coins":
-                    if item_name == "coins":
-                        # 'none'は無視、'coins'は'other'に記録
-                        drops_by_zone_and_type[zone_key]["other"].add(item_name)
-                    continue
-
-                "ITEMS_DATABASEからアイテムタイプを取得"
-                item_info = items_db.get(item_name)
-
-                if item_info:
-                    item_type = item_info.get("type")
-                    if item_type in drops_by_zone_and_type[zone_key]:
-                        "該当するタイプセットにアイテム名を追加"
-                        drops_by_zone_and_type[zone_key][item_type].add(item_name)
-                    else:
-                        "定義されていないタイプは 'other' に追加"
-                        drops_by_zone_and_type[zone_key]["other"].add(item_name)
-                else:
-                    "ITEMS_DATABASEに見つからない場合は 'other' に追加"
-                    drops_by_zone_and_type[zone_key]["other"].add(item_name)
-
-        "setをリストに変換して、ソートする"
-        for item_type in drops_by_zone_and_type[zone_key]:
-            drops_by_zone_and_type[zone_key][item_type] = sorted(list(drops_by_zone_and_type[zone_key][item_type]))
-
-    return drops_by_zone_and_type
-
 "階層ごとにタイプ別ドロップアイテムを格納する新しい変数"
 "ENEMY_ZONESとITEMS_DATABASEが定義された後に実行されます。"
-DROPS_BY_ZONE_AND_TYPE = categorize_drops_by_zone(ENEMY_ZONES, ITEMS_DATABASE)
+if not DROPS_BY_ZONE_AND_TYPE:
+    DROPS_BY_ZONE_AND_TYPE = categorize_drops_by_zone(ENEMY_ZONES, ITEMS_DATABASE)
 
 "0-1000mのエリアでドロップする武器のリストを取得"
 weapon_drops_1 = DROPS_BY_ZONE_AND_TYPE["0-1000"]["weapon"]
@@ -0,0 +1,320 @@
+"""ログ出力の設定（キュー経由の非同期出力 + 高頻度ログの間引き）
+
+main.py はこれまでルートを DEBUG にし、同期の StreamHandler で stdout に書いていた。
+stdout（コンテナのログ収集のパイプ）が詰まると、書き込みの間イベントループ全体が止まる。
+
+- ルートには QueueHandler だけを付け、実際の書き込み（StreamHandler）は QueueListener の
+  スレッドで行う。ループ上で行うのはメッセージの組み立てとキューへの追加だけ
+- SamplingFilter で、同じ書式（logger 名 + 書式文字列）のログを LOG_RATE_WINDOW 秒毎に
+  LOG_RATE_LIMIT 件（WARNING は LOG_RATE_LIMIT_WARNING 件）までに抑える。ERROR 以上は常に出す。
+  抑えた件数は次に出たログに suppressed=N として付く
+- LOG_SAMPLE で logger 毎に INFO 以下を確率的に間引ける（例: rpgbot.cmd=0.1）
+- LOG_FORMAT=json で 1 行 1 JSON の出力にできる
+- 既定のレベルは INFO（RPG_LOG_LEVEL / LOG_LEVEL=DEBUG で従来の詳細ログ）
+
+ベンチマーク（ログ呼び出し 1 件あたりにループ側で使う時間）:
+    python -m log_setup [件数] [書き込み遅延µs]
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Any, Optional
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s - %(funcName)s:%(lineno)d - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# ライブラリのロガーは従来通り抑えめにする
+LIBRARY_LEVELS = {
+    "discord": logging.INFO,
+    "discord.http": logging.WARNING,
+    "httpx": logging.WARNING,
+    "httpcore": logging.WARNING,
+    "asyncio": logging.INFO,
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_sampling: Optional["SamplingFilter"] = None
+
+
+def parse_sample_rates(spec: str) -> dict[str, float]:
+    """"rpgbot.cmd=0.1,discord.gateway=0.5" → {logger 名: 残す割合}"""
+    rates: dict[str, float] = {}
+    for part in (spec or "").split(","):
+        name, sep, value = part.partition("=")
+        if not sep or not name.strip():
+            continue
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(value)))
+        except ValueError:
+            continue
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """高頻度のログを間引く（QueueHandler に付けるので、捨てるログはキューにも入らない）"""
+
+    def __init__(
+        self,
+        *,
+        rate_limit: int,
+        warning_limit: int,
+        window: float,
+        sample_rates: Optional[dict[str, float]] = None,
+    ):
+        super().__init__()
+        self.rate_limit = rate_limit
+        self.warning_limit = warning_limit
+        self.window = window
+        self.sample_rates = sample_rates or {}
+        # (logger 名, 書式文字列) -> [窓の開始時刻, 窓内の件数, 抑えた件数]
+        self._buckets: dict[tuple[str, Any], list[float]] = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _sample_rate(self, name: str) -> float:
+        if not self.sample_rates:
+            return 1.0
+        # 一番長く一致する logger 名の設定を使う（"rpgbot" と "rpgbot.cmd" なら後者）
+        while True:
+            rate = self.sample_rates.get(name)
+            if rate is not None:
+                return rate
+            name, dot, _ = name.rpartition(".")
+            if not dot:
+                return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        level = record.levelno
+        if level >= logging.ERROR:
+            return True
+
+        if level < logging.WARNING and self.sample_rates:
+            rate = self._sample_rate(record.name)
+            if rate < 1.0 and random.random() >= rate:
+                self.dropped += 1
+                return False
+
+        limit = self.warning_limit if level >= logging.WARNING else self.rate_limit
+        if limit <= 0:
+            return True
+
+        key = (record.name, record.msg)
+        now = record.created
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or now - bucket[0] >= self.window:
+                suppressed = int(bucket[2]) if bucket is not None else 0
+                self._buckets[key] = [now, 1, 0]
+                if len(self._buckets) > 10_000:
+                    self._prune(now)
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if bucket[1] < limit:
+                bucket[1] += 1
+                return True
+            bucket[2] += 1
+        self.dropped += 1
+        return False
+
+    def _prune(self, now: float) -> None:
+        # 書式文字列に値を埋め込んだ f-string のログでキーが増え続けないようにする
+        for key in [k for k, b in self._buckets.items() if now - b[0] >= self.window]:
+            del self._buckets[key]
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} (suppressed={suppressed})" if suppressed else text
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload: dict[str, Any] = {
+            "ts": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "func": record.funcName,
+            "line": record.lineno,
+            "msg": record.getMessage(),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            payload["suppressed"] = suppressed
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        if record.stack_info:
+            payload["stack"] = record.stack_info
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class LoopQueueHandler(logging.handlers.QueueHandler):
+    """ループ側ではメッセージの組み立てだけを行い、時刻の書式化と書き込みはリスナーに任せる"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 引数（dict など）が後で書き換わっても良いよう、ここで文字列にしておく。
+        # ルートのハンドラはこれだけなので、標準の prepare のようにレコードを複製しない
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_EXC_FORMATTER = logging.Formatter()
+
+
+def _make_formatter(fmt: str) -> logging.Formatter:
+    if fmt == "json":
+        return JsonFormatter()
+    return TextFormatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+
+
+def build_handler(
+    stream: Any,
+    *,
+    fmt: str = "text",
+    use_queue: bool = True,
+    sampling: Optional[SamplingFilter] = None,
+) -> tuple[logging.Handler, Optional[logging.handlers.QueueListener]]:
+    """ルートに付けるハンドラ（キュー経由なら QueueListener も返す。start は呼び出し側）"""
+    output = logging.StreamHandler(stream)
+    output.setFormatter(_make_formatter(fmt))
+    if not use_queue:
+        if sampling is not None:
+            output.addFilter(sampling)
+        return output, None
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = LoopQueueHandler(log_queue)
+    if sampling is not None:
+        handler.addFilter(sampling)
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    return handler, listener
+
+
+def configure_logging() -> logging.Logger:
+    """main.py の最初に 1 回だけ呼ぶ"""
+    global _listener, _sampling
+    from settings.runtime import (
+        LOG_FORMAT,
+        LOG_LEVEL,
+        LOG_QUEUE,
+        LOG_RATE_LIMIT,
+        LOG_RATE_LIMIT_WARNING,
+        LOG_RATE_WINDOW,
+        LOG_SAMPLE,
+    )
+
+    level = getattr(logging, LOG_LEVEL, logging.INFO)
+    sampling = SamplingFilter(
+        rate_limit=LOG_RATE_LIMIT,
+        warning_limit=LOG_RATE_LIMIT_WARNING,
+        window=LOG_RATE_WINDOW,
+        sample_rates=parse_sample_rates(LOG_SAMPLE),
+    )
+    handler, listener = build_handler(sys.stderr, fmt=LOG_FORMAT, use_queue=LOG_QUEUE, sampling=sampling)
+
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    if listener is not None:
+        listener.start()
+        _listener = listener
+        # 終了時にキューに残ったログを書き出す
+        atexit.register(stop_logging)
+
+    logger = logging.getLogger("rpgbot")
+    logger.setLevel(level)
+    for name, lib_level in LIBRARY_LEVELS.items():
+        logging.getLogger(name).setLevel(lib_level)
+    _sampling = sampling
+    return logger
+
+
+def stats() -> dict[str, Any]:
+    """間引いたログの件数など（!admin_stats 用）"""
+    return {
+        "queued": _listener is not None,
+        "dropped": _sampling.dropped if _sampling is not None else 0,
+    }
+
+
+def stop_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _bench(count: int, delay_us: float) -> None:
+    """同期 StreamHandler とキュー経由で、ログ 1 件あたりに呼び出し側が使う時間を比べる"""
+    import asyncio
+    import io
+    import os
+
+    class _SlowStream(io.TextIOBase):
+        # 詰まり気味の stdout パイプを模した書き込み先
+        def write(self, s: str) -> int:
+            if delay_us:
+                time.sleep(delay_us / 1_000_000)
+            return len(s)
+
+    def run(use_queue: bool, fmt: str, sampling: bool) -> float:
+        bench_logger = logging.getLogger(f"bench.{use_queue}.{fmt}.{sampling}")
+        bench_logger.propagate = False
+        bench_logger.setLevel(logging.INFO)
+        filt = SamplingFilter(rate_limit=20, warning_limit=50, window=10) if sampling else None
+        handler, listener = build_handler(_SlowStream(), fmt=fmt, use_queue=use_queue, sampling=filt)
+        bench_logger.addHandler(handler)
+        if listener is not None:
+            listener.start()
+
+        async def emit() -> float:
+            started = time.perf_counter()
+            for i in range(count):
+                bench_logger.info("cmd.start user=%s cmd=%s content=%r", i % 50, "move", "!move")
+                if i % 100 == 0:
+                    await asyncio.sleep(0)
+            return time.perf_counter() - started
+
+        try:
+            return asyncio.run(emit())
+        finally:
+            if listener is not None:
+                listener.stop()
+            bench_logger.removeHandler(handler)
+
+    print(f"records={count} write_delay={delay_us}us pid={os.getpid()}")
+    for label, use_queue, fmt, sampling in (
+        ("sync StreamHandler (before)", False, "text", False),
+        ("QueueHandler", True, "text", False),
+        ("QueueHandler + json", True, "json", False),
+        ("QueueHandler + sampling", True, "text", True),
+    ):
+        elapsed = run(use_queue, fmt, sampling)
+        print(f"{label:30s} loop time {elapsed * 1000:8.1f}ms  ({elapsed / count * 1_000_000:6.1f}us/record)")
+
+
+if __name__ == "__main__":
+    _bench(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20_000,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 20.0,
+    )
@@ -0,0 +1,246 @@
+"""イベントループの遅延の監視（スケジューリング遅延の計測 + 遅いコールバックの記録）
+
+ゲートウェイ / View / httpx / 不正検知はすべて 1 つのループ上で動くが、ループが止まっても
+（SnapshotManager の json.dumps による複製、大きな Counter の構築、同期のログ書き込みなど）
+それを知る手段が無く、/health は常に OK を返していた。
+
+- 計測タスク: LOOP_LAG_INTERVAL 秒毎に sleep し、予定より何 ms 遅れて起きたかを直近
+  LOOP_LAG_WINDOW 件だけ保持する（p50 / p95 / p99 / max）
+- 遅いコールバック: asyncio の slow_callback_duration はデバッグモード（コルーチンの生成元の
+  記録などで重い）でしか働かないため、Handle._run を包んでループのスレッドで実行される
+  コールバックの所要時間を測る。LOOP_SLOW_CALLBACK_MS を超えたものは、対象（タスク名 /
+  コールバック）と所要時間を記録する。スタックは止まっている最中に監視スレッドが
+  sys._current_frames() から取る（終わった後ではどこで止まっていたか分からないため）
+- health(): 直近 LOOP_LAG_DEGRADED_WINDOW 件の p75 が上限を超えていれば（= 4 回に 1 回より多く遅れて
+  いれば）degraded。一度だけの停止（max）では degraded にしない。/health は degraded でも 200 を返す（ホスティング側の再起動を招かないよう、
+  本当に止まっているかは /health 自体が応答しないことで分かる）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import asyncio.events
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Optional
+
+logger = logging.getLogger("rpgbot")
+
+
+def _describe(handle: asyncio.Handle) -> str:
+    # asyncio.base_events._format_handle と同じ（タスクの 1 ステップならタスクを表示する）
+    callback = getattr(handle, "_callback", None)
+    task = getattr(callback, "__self__", None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        name = getattr(coro, "__qualname__", None) or repr(coro)
+        return f"Task {task.get_name()} {name}"
+    return repr(handle)
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoopWatchdog:
+    def __init__(
+        self,
+        *,
+        interval: float,
+        window: int,
+        slow_callback: float,
+        keep: int,
+        stack_limit: int,
+        degraded_lag: float,
+        degraded_window: int,
+    ):
+        self.interval = interval
+        self.slow_callback = slow_callback
+        self.stack_limit = stack_limit
+        self.degraded_lag = degraded_lag
+        self.degraded_window = max(1, degraded_window)
+        self._lags: collections.deque[float] = collections.deque(maxlen=max(1, window))
+        self.slow_callbacks: collections.deque[dict[str, Any]] = collections.deque(maxlen=max(1, keep))
+        self.slow_total = 0
+
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        # 実行中のコールバック (連番, 開始時刻)。ループのスレッドが書き、監視スレッドが読む
+        self._running: Optional[tuple[int, float]] = None
+        self._seq = 0
+        self._stacks: dict[int, str] = {}
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._original_run: Any = None
+
+    # -------------------------
+    # 開始 / 停止
+    # -------------------------
+
+    def start(self) -> None:
+        """ループ上で呼ぶ（cogs/loop_watchdog.py の setup）"""
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._task = loop.create_task(self._measure_loop(), name="loop-watchdog")
+        if self.slow_callback > 0:
+            # デバッグモード（PYTHONASYNCIODEBUG=1）で動かしたときの asyncio 自身の警告も同じ閾値にする
+            loop.slow_callback_duration = self.slow_callback
+            self._install_hook()
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_stacks, name="loop-watchdog", daemon=True)
+            self._sampler.start()
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._stop.set()
+        self._sampler = None
+        if self._original_run is not None:
+            asyncio.events.Handle._run = self._original_run  # type: ignore[method-assign]
+            self._original_run = None
+
+    # -------------------------
+    # スケジューリング遅延
+    # -------------------------
+
+    async def _measure_loop(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self._lags.append(max(0.0, time.monotonic() - expected))
+
+    # -------------------------
+    # 遅いコールバック
+    # -------------------------
+
+    def _install_hook(self) -> None:
+        if self._original_run is not None:
+            return
+        original = asyncio.events.Handle._run
+        watchdog = self
+        get_ident = threading.get_ident
+        perf_counter = time.perf_counter
+
+        def _run(handle: asyncio.Handle) -> None:
+            # 別スレッドのループ（asyncio.run をスレッドで使う箇所など）は測らない
+            if get_ident() != watchdog._loop_thread:
+                return original(handle)
+            watchdog._seq += 1
+            seq = watchdog._seq
+            started = perf_counter()
+            watchdog._running = (seq, started)
+            try:
+                return original(handle)
+            finally:
+                watchdog._running = None
+                elapsed = perf_counter() - started
+                if elapsed >= watchdog.slow_callback:
+                    watchdog._record_slow(handle, seq, elapsed)
+                elif watchdog._stacks:
+                    watchdog._stacks.pop(seq, None)
+
+        self._original_run = original
+        asyncio.events.Handle._run = _run  # type: ignore[method-assign]
+
+    def _sample_stacks(self) -> None:
+        """閾値を超えて実行中のコールバックのスタックを 1 回だけ取る（監視スレッド）"""
+        tick = max(0.01, self.slow_callback / 2)
+        captured = 0
+        while not self._stop.wait(tick):
+            running = self._running
+            if running is None:
+                continue
+            seq, started = running
+            if seq == captured or time.perf_counter() - started < self.slow_callback:
+                continue
+            frame = sys._current_frames().get(self._loop_thread or 0)
+            if frame is None:
+                continue
+            captured = seq
+            self._stacks[seq] = "".join(traceback.format_stack(frame, limit=self.stack_limit))
+            del frame
+
+    def _record_slow(self, handle: asyncio.Handle, seq: int, elapsed: float) -> None:
+        self.slow_total += 1
+        stack = self._stacks.pop(seq, None)
+        event = {
+            "at": time.time(),
+            "ms": round(elapsed * 1000, 1),
+            "handle": _describe(handle),
+            "stack": stack,
+        }
+        self.slow_callbacks.append(event)
+        logger.warning(
+            "slow event loop callback: %.1fms %s%s",
+            event["ms"],
+            event["handle"],
+            f"\n{stack}" if stack else "",
+        )
+
+    # -------------------------
+    # 集計
+    # -------------------------
+
+    def lag_ms(self) -> dict[str, float]:
+        ordered = sorted(self._lags)
+        return {
+            "p50": round(_percentile(ordered, 0.50) * 1000, 1),
+            "p95": round(_percentile(ordered, 0.95) * 1000, 1),
+            "p99": round(_percentile(ordered, 0.99) * 1000, 1),
+            "max": round((ordered[-1] if ordered else 0.0) * 1000, 1),
+            "samples": len(ordered),
+        }
+
+    def recent_lag(self) -> float:
+        """直近 degraded_window 件の p75（秒）。1 回だけの停止では上がらない"""
+        recent = list(self._lags)[-self.degraded_window:]
+        return _percentile(sorted(recent), 0.75)
+
+    def health(self) -> dict[str, Any]:
+        """/health 用（遅延が続いていれば status="degraded"）"""
+        recent = self.recent_lag()
+        return {
+            "status": "degraded" if recent > self.degraded_lag else "ok",
+            "running": self._task is not None,
+            "loop_lag_ms": self.lag_ms(),
+            "recent_p75_ms": round(recent * 1000, 1),
+            "slow_callbacks": self.slow_total,
+        }
+
+
+def _build() -> LoopWatchdog:
+    from settings.runtime import (
+        LOOP_LAG_DEGRADED_MS,
+        LOOP_LAG_DEGRADED_WINDOW,
+        LOOP_LAG_INTERVAL,
+        LOOP_LAG_WINDOW,
+        LOOP_SLOW_CALLBACK_KEEP,
+        LOOP_SLOW_CALLBACK_MS,
+        LOOP_SLOW_CALLBACK_STACK,
+    )
+
+    return LoopWatchdog(
+        interval=LOOP_LAG_INTERVAL,
+        window=LOOP_LAG_WINDOW,
+        slow_callback=LOOP_SLOW_CALLBACK_MS / 1000,
+        keep=LOOP_SLOW_CALLBACK_KEEP,
+        stack_limit=LOOP_SLOW_CALLBACK_STACK,
+        degraded_lag=LOOP_LAG_DEGRADED_MS / 1000,
+        degraded_window=LOOP_LAG_DEGRADED_WINDOW,
+    )
+
+
+loop_watchdog = _build()
+
+__all__ = ["LoopWatchdog", "loop_watchdog"]
@@ -1,29 +1,18 @@
 import os
 import logging  # ← 最初
 
-_level_name = (os.getenv("RPG_LOG_LEVEL") or os.getenv("LOG_LEVEL") or "DEBUG").strip().upper()
-_level = getattr(logging, _level_name, logging.DEBUG)
-
-logging.basicConfig(
-    level=_level,
-    format='%(asctime)s [%(levelname)s] %(name)s - %(funcName)s:%(lineno)d - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    handlers=[
-        logging.StreamHandler(),
-    ]
-)
-
-logger = logging.getLogger("rpgbot")
-logger.setLevel(_level)
+# ログはキュー経由で別スレッドから出力する（レベル / 形式 / 間引きは log_setup.py と settings.runtime）
+import log_setup
 
-logging.getLogger("discord").setLevel(logging.INFO)
-logging.getLogger("discord.http").setLevel(logging.WARNING)
-logging.getLogger("httpx").setLevel(logging.WARNING)
-logging.getLogger("httpcore").setLevel(logging.WARNING)
-logging.getLogger("asyncio").setLevel(logging.INFO)
+logger = log_setup.configure_logging()
+cmd_logger = logging.getLogger("rpgbot.cmd")
 
 logger.info("✅ ロギング設定完了")
 
+# 起動時の import 時間を計測（起動完了時にレポートをログ出力。IMPORT_PROFILE=0 で無効）
+import import_profile
+import_profile.install()
+
 import discord
 from discord.ext import commands
 import random
@@ -32,6 +21,7 @@ import os
 from pathlib import Path
 from aiohttp import web
 import db
+import db_profile
 from db import get_player
 import views
 from views import (
@@ -45,38 +35,46 @@ from views import (
     TrapChestView
 )
 import game
-from story import StoryView
-import death_system
-from titles import get_title_rarity_emoji, RARITY_COLORS
 import anti_cheat
-import admin_notifications
-import admin_anti_cheat
 
 from bot_state import attach_bot_state
-from bot_utils import check_ban
+from bot_utils import DegradedModeError, check_ban
+from ui.render_queue import render_queue
 
+import cluster
 from help_commands import setup_help_command
-from death_commands import setup_death_commands
-from emoji_commands import setup_emoji_command
+from lazy_commands import register_lazy_group
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 # NOTE: discord.py の標準 help コマンドと衝突しないように無効化し、自前 !help を提供する
-bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
+# クラスタモード（python -m cluster）では、ランチャーから割り当てられたシャードだけを担当する
+_cluster = cluster.worker_config()
+if _cluster is not None:
+    bot = commands.AutoShardedBot(
+        command_prefix="!",
+        intents=intents,
+        help_command=None,
+        shard_ids=list(_cluster.shard_ids),
+        shard_count=_cluster.shard_count,
+    )
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
 
 # cogs 側から参照できるように共有状態を bot にぶら下げる
-user_processing, user_locks = attach_bot_state(bot)
+user_processing = attach_bot_state(bot)
 
 # commands split out of main.py (keep main.py under 1000 lines)
+# 利用頻度の低いコマンド群はスタブだけ登録し、初回実行時に実装を import する
 setup_help_command(bot)
-setup_death_commands(bot)
-setup_emoji_command(bot)
+register_lazy_group(bot, "death")
+register_lazy_group(bot, "emoji")
 
 # main.py 内で snapshot_manager を参照している箇所があるため、
-# debug_commands を extension(cog) としてロードする場合でもシンボルだけ確保する。
+# debug コマンド（遅延ロード）とは別に debug_state から共有状態だけ取得する。
 try:
-    from debug_commands import snapshot_manager  # type: ignore
+    from debug_state import snapshot_manager  # type: ignore
 except Exception:
     class _NoopSnapshotManager:
         async def create_snapshot(self, *args, **kwargs):
@@ -85,13 +83,6 @@ except Exception:
     snapshot_manager = _NoopSnapshotManager()
 
 
-def get_user_lock(user_id: int) -> asyncio.Lock:
-    """ユーザー別ロックを取得（なければ作成）"""
-    if user_id not in user_locks:
-        user_locks[user_id] = asyncio.Lock()
-    return user_locks[user_id]
-
-
 def _ctx_debug_fields(ctx: commands.Context) -> dict:
     guild_id = getattr(getattr(ctx, "guild", None), "id", None)
     channel_id = getattr(getattr(ctx, "channel", None), "id", None)
@@ -107,11 +98,16 @@ def _ctx_debug_fields(ctx: commands.Context) -> dict:
 
 @bot.before_invoke
 async def _log_command_start(ctx: commands.Context):
+    # db 呼び出しの集計（!admin_dbprofile）にコマンド名を付ける
+    db_profile.current_command.set(ctx.command.qualified_name if ctx.command else "-")
+    # 本番（INFO）では引数の組み立ても省く
+    if not cmd_logger.isEnabledFor(logging.DEBUG):
+        return
     fields = _ctx_debug_fields(ctx)
     content = getattr(getattr(ctx, "message", None), "content", None)
     if content and len(content) > 400:
         content = content[:400] + "..."
-    logger.debug(
+    cmd_logger.debug(
         "cmd.start user=%s guild=%s channel=%s message=%s cmd=%s content=%r",
         fields["user"],
         fields["guild"],
@@ -124,8 +120,10 @@ async def _log_command_start(ctx: commands.Context):
 
 @bot.after_invoke
 async def _log_command_end(ctx: commands.Context):
+    if not cmd_logger.isEnabledFor(logging.DEBUG):
+        return
     fields = _ctx_debug_fields(ctx)
-    logger.debug(
+    cmd_logger.debug(
         "cmd.end user=%s guild=%s channel=%s message=%s cmd=%s",
         fields["user"],
         fields["guild"],
@@ -140,6 +138,10 @@ async def on_command_error(ctx: commands.Context, error: Exception):
     # command not found はノイズになりやすいので抑制
     if isinstance(error, commands.CommandNotFound):
         return
+    # DB障害中（縮退モード）: ユーザーに案内するだけで、エラーとしては記録しない
+    if isinstance(error, DegradedModeError):
+        await ctx.send(str(error), delete_after=15)
+        return
 
     fields = _ctx_debug_fields(ctx)
     logger.exception(
@@ -162,14 +164,15 @@ async def on_ready():
 @bot.command(name="move", aliases=["m"])
 @check_ban()
 async def move(ctx: commands.Context):
+    from story import StoryView  # ストーリー系は初回使用時に読み込む
+
     user = ctx.author
 
-    # 処理中チェック
-    if user_processing.get(user.id):
+    # 処理中チェック（直前の処理が終わるまで少しだけ順番待ちする）
+    if not await user_processing.acquire(user.id, "move"):
         await ctx.send("⚠️ 別の処理が実行中です。完了するまでお待ちください。", delete_after=5)
         return
 
-    user_processing[user.id] = True
     view_delegated = False
 
     try:
@@ -274,19 +277,12 @@ async def move(ctx: commands.Context):
                 "choice_fairy_spring",
             ]
 
-            available_choice_stories = []
-            for sid in choice_story_ids:
-                if not await db.get_story_flag(user.id, sid):
-                    available_choice_stories.append(sid)
+            # 既読フラグは 1 回だけ取得（ボス前 / 選択肢ストーリーを個別に読まない）
+            flags_row = await db.get_player(user.id, fields=("story_flags",))
+            story_flags = flags_row.get("story_flags") if flags_row else None
+            story_flags = dict(story_flags) if isinstance(story_flags, dict) else {}
 
-            story_flags = (
-                player.get("story_flags", {})
-                if isinstance(player.get("story_flags", {}), dict)
-                else {}
-            )
-            for stage in range(1, 11):
-                story_id = f"boss_pre_{stage}"
-                story_flags[story_id] = await db.get_story_flag(user.id, story_id)
+            available_choice_stories = [sid for sid in choice_story_ids if not story_flags.get(sid, False)]
 
             event = await exploration.determine_event(
                 current_distance=total_distance,
@@ -302,7 +298,7 @@ async def move(ctx: commands.Context):
                 color=discord.Color.dark_grey(),
             )
             embed.set_footer(text=f"📏 現在の距離: {total_distance}m")
-            await exploring_msg.edit(content=None, embed=embed)
+            await render_queue.edit(exploring_msg, content=None, embed=embed)
             return
 
         # ==========================
@@ -340,7 +336,7 @@ async def move(ctx: commands.Context):
                             color=discord.Color.purple(),
                         )
 
-                    await exploring_msg.edit(content=None, embed=embed)
+                    await render_queue.edit(exploring_msg, content=None, embed=embed)
                     await asyncio.sleep(2)
 
                     view = StoryView(
@@ -365,7 +361,7 @@ async def move(ctx: commands.Context):
                             description=f"**{boss['name']}** が目の前に現れた！\n\nこれが最後の戦いだ…",
                             color=discord.Color.dark_gold(),
                         )
-                        await exploring_msg.edit(content=None, embed=embed)
+                        await render_queue.edit(exploring_msg, content=None, embed=embed)
                         await asyncio.sleep(3)
 
                         view = await FinalBossBattleView.create(
@@ -380,7 +376,7 @@ async def move(ctx: commands.Context):
                             description=f"**{boss['name']}** が目の前に立ちはだかる！",
                             color=discord.Color.dark_red(),
                         )
-                        await exploring_msg.edit(content=None, embed=embed)
+                        await render_queue.edit(exploring_msg, content=None, embed=embed)
                         await asyncio.sleep(2)
 
                         view = await BossBattleView.create(
@@ -397,7 +393,7 @@ async def move(ctx: commands.Context):
                 description="500m地点に到達した！\n何か特別なことが起こりそうだ…",
                 color=discord.Color.gold()
             )
-            await exploring_msg.edit(content=None, embed=embed)
+            await render_queue.edit(exploring_msg, content=None, embed=embed)
             await asyncio.sleep(2)
             
             special_embed = discord.Embed(
@@ -409,7 +405,7 @@ async def move(ctx: commands.Context):
             
             view = SpecialEventView(user.id, user_processing, special_distance)
             view.message = exploring_msg
-            await exploring_msg.edit(content=None, embed=special_embed, view=view)
+            await render_queue.edit(exploring_msg, content=None, embed=special_embed, view=view)
             view_delegated = True
             return
         
@@ -420,7 +416,7 @@ async def move(ctx: commands.Context):
                 description="不思議な出来事が起こる予感…",
                 color=discord.Color.purple()
             )
-            await exploring_msg.edit(content=None, embed=embed)
+            await render_queue.edit(exploring_msg, content=None, embed=embed)
             await asyncio.sleep(2)
             
             view = StoryView(user.id, story_id, user_processing)
@@ -435,7 +431,7 @@ async def move(ctx: commands.Context):
                 description="運命の分岐点が現れた…",
                 color=discord.Color.gold()
             )
-            await exploring_msg.edit(content=None, embed=embed)
+            await render_queue.edit(exploring_msg, content=None, embed=embed)
             await asyncio.sleep(2)
             
             view = StoryView(user.id, story_id, user_processing)
@@ -452,7 +448,7 @@ async def move(ctx: commands.Context):
             embed.set_footer(text=f"📏 現在の距離: {total_distance}m")
             view = TrapChestView(user.id, user_processing, player)
             view.message = exploring_msg
-            await exploring_msg.edit(content=None, embed=embed, view=view)
+            await render_queue.edit(exploring_msg, content=None, embed=embed, view=view)
             view_delegated = True
             return
         
@@ -465,13 +461,13 @@ async def move(ctx: commands.Context):
             embed.set_footer(text=f"📏 現在の距離: {total_distance}m")
             view = TreasureView(user.id, user_processing)
             view.message = exploring_msg
-            await exploring_msg.edit(content=None, embed=embed, view=view)
+            await render_queue.edit(exploring_msg, content=None, embed=embed, view=view)
             view_delegated = True
             return
         
         elif event.type == "BATTLE":
             enemy = game.get_random_enemy(total_distance)
-            await exploring_msg.edit(content="⚔️ 敵が現れた！ 戦闘開始！")
+            await render_queue.edit(exploring_msg, content="⚔️ 敵が現れた！ 戦闘開始！")
             view = await BattleView.create(ctx, player_data, enemy, user_processing)
             await view.send_initial_embed()
             view_delegated = True
@@ -484,7 +480,7 @@ async def move(ctx: commands.Context):
                 color=discord.Color.dark_grey()
             )
             embed.set_footer(text=f"📏 現在の距離: {total_distance}m")
-            await exploring_msg.edit(content=None, embed=embed)
+            await render_queue.edit(exploring_msg, content=None, embed=embed)
     finally:
         # Viewに委譲していない場合のみクリア（View自身がクリアする責任を持つ）
         if not view_delegated:
@@ -496,7 +492,7 @@ async def move(ctx: commands.Context):
 @check_ban()
 async def inventory(ctx):
     # 処理中チェック
-    if user_processing.get(ctx.author.id):
+    if not await user_processing.wait_idle(ctx.author.id):
         await ctx.send("⚠️ 別の処理が実行中です。完了するまでお待ちください。", delete_after=5)
         return
 
@@ -520,7 +516,7 @@ async def inventory(ctx):
 async def status(ctx):
     try:
         # 他処理中チェック
-        if 'user_processing' in globals() and user_processing.get(ctx.author.id):
+        if not await user_processing.wait_idle(ctx.author.id):
             await ctx.send("⚠️ 別の処理が実行中です。完了するまでお待ちください。", delete_after=5)
             return
 
@@ -571,10 +567,8 @@ async def status(ctx):
         embed.add_field(name="装備鎧", value=equipped["armor"], inline=True)
         embed.add_field(name="装備盾", value=equipped["shield"], inline=True)
 
-        # 装備変更UIを追加
-        player_with_id = player.copy()
-        player_with_id["user_id"] = ctx.author.id
-        equip_view = views.EquipmentSelectView(player_with_id)
+        # 装備変更UIを追加（PlayerState は user_id を含むのでそのまま渡す）
+        equip_view = views.EquipmentSelectView(player)
 
         await ctx.send(embed=embed, view=equip_view)
 
@@ -587,7 +581,7 @@ async def status(ctx):
 @bot.command(aliases=["up"])
 @check_ban()
 async def upgrade(ctx):
-    if user_processing.get(ctx.author.id):
+    if not await user_processing.wait_idle(ctx.author.id):
         await ctx.send("⚠️ 別の処理が実行中です。完了するまでお待ちください。", delete_after=5)
         return
 
@@ -650,7 +644,7 @@ async def upgrade(ctx):
 @bot.command(aliases=["bup"])
 @check_ban()
 async def buy_upgrade(ctx, upgrade_type: int):
-    if user_processing.get(ctx.author.id):
+    if not await user_processing.wait_idle(ctx.author.id):
         await ctx.send("⚠️ 別の処理が実行中です。完了するまでお待ちください。", delete_after=5)
         return
 
@@ -706,7 +700,11 @@ import asyncio
 from aiohttp import web
 
 async def health_check(request):
-    return web.Response(text="OK", status=200)
+    # ループの遅延が続いていれば status="degraded"（loop_watchdog.py）。
+    # 503 にするとホスティング側が再起動してしまうので、degraded でも 200 を返す
+    from loop_watchdog import loop_watchdog
+
+    return web.json_response(loop_watchdog.health())
 
 async def run_health_server():
     app = web.Application()
@@ -741,8 +739,8 @@ async def main():
     # Startup validation: external stories JSON (warn by default, strict if STORY_VALIDATION_STRICT=1)
     try:
         strict = (os.getenv("STORY_VALIDATION_STRICT", "0").strip() in {"1", "true", "True", "yes", "YES"})
-        import story as _story
-        _story.validate_external_story_files(strict=strict)
+        from rpg.data.bundle import validate_story_files
+        validate_story_files(strict=strict)
     except Exception:
         # Strict mode will raise; in non-strict we still avoid crashing startup.
         logger.exception("story validation failed")
@@ -771,6 +769,7 @@ async def main():
     else:
         logger.info("ℹ️ ヘルスチェックサーバーは無効化されています (ENABLE_HEALTH_SERVER=0)")
 
+    import_profile.log_report()
     logger.info("🤖 Discord BOTを起動します...")
     async with bot:
         await bot.start(token)
@@ -3,13 +3,14 @@ from __future__ import annotations
 import discord
 from discord.ext import commands
 
+from bot_state import attach_bot_state
 from bot_utils import check_ban
 from db import get_player
 from views import ResetConfirmView
 
 
 def setup_player_commands(bot: commands.Bot):
-    user_processing = getattr(bot, "user_processing", {})
+    user_processing = attach_bot_state(bot)
 
     @bot.command(name="reset", aliases=["r"])
     @check_ban()
@@ -18,7 +19,7 @@ def setup_player_commands(bot: commands.Bot):
         user = ctx.author
         user_id = str(user.id)
 
-        if user_processing.get(user.id):
+        if not await user_processing.wait_idle(user.id):
             await ctx.send("⚠️ 別の処理が実行中です。完了するまでお待ちください。", delete_after=5)
             return
 
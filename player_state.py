@@ -0,0 +1,262 @@
+"""players テーブルの 1 行を表す型
+
+get_player はこれまで `select=*` の dict を返し、呼び出し側が `.copy()` や `Counter(inventory)` を
+その都度作っていた。PlayerState は応答を 1 回だけ解釈して __slots__ に持つ。
+
+- 既知の列はスロット（dict を持たない）、未知の列だけ _extra に入れる
+- JSON の列（story_flags など）は dict に、inventory は個数付きの Inventory に 1 回だけ変換する
+- dict と同じように使える（MutableMapping）ので、既存の `player.get("hp", 50)` や
+  `player["hp"] = ...` はそのまま動く。select で取得しなかった列は「無いキー」になる
+
+get_player(user_id, fields=...) で必要な列だけを取得できる（PostgREST の select= 射影）。
+"""
+
+from __future__ import annotations
+
+import json
+from collections import Counter
+from collections.abc import Iterable, Iterator, Mapping, MutableMapping
+from typing import Any, Optional
+
+# 既知の列（スロットになる）。"def" はキーワードだが getattr/setattr では使える
+COLUMNS: tuple[str, ...] = (
+    "user_id",
+    "name",
+    "level",
+    "exp",
+    "hp",
+    "max_hp",
+    "mp",
+    "max_mp",
+    "atk",
+    "def",
+    "gold",
+    "distance",
+    "current_floor",
+    "current_stage",
+    "inventory",
+    "equipped_weapon",
+    "equipped_armor",
+    "equipped_shield",
+    "upgrade_points",
+    "initial_hp_upgrade",
+    "initial_mp_upgrade",
+    "coin_gain_upgrade",
+    "atk_upgrade",
+    "def_upgrade",
+    "coin_multiplier",
+    "death_count",
+    "total_deaths",
+    "game_cleared",
+    "mp_stunned",
+    "is_banned",
+    "ban_reason",
+    "active_title_id",
+    "unlocked_skills",
+    "secret_weapon_ids",
+    "story_flags",
+    "milestone_flags",
+    "boss_defeated_flags",
+    "tutorial_flags",
+)
+
+# JSON オブジェクトの列 / JSON 配列の列（文字列で返ってきた場合は解釈する）
+JSON_OBJECT_COLUMNS = frozenset({"story_flags", "milestone_flags", "boss_defeated_flags", "tutorial_flags"})
+JSON_ARRAY_COLUMNS = frozenset({"unlocked_skills", "secret_weapon_ids"})
+
+_COLUMN_SET = frozenset(COLUMNS)
+
+
+def select_clause(fields: Optional[Iterable[str]]) -> str:
+    """get_player の fields を PostgREST の select= に変換（None なら全列）"""
+    if not fields:
+        return "*"
+    # user_id は行の識別（View の本人確認など）に常に使うので含める
+    return ",".join(dict.fromkeys(("user_id", *fields)))
+
+
+class Inventory(Counter):
+    """所持品（{アイテム名: 個数} の多重集合）
+
+    保存形式は JSON オブジェクト {"薬草": 3}。旧形式のリスト ["薬草", "薬草", "薬草"] も読める
+    （次の書き込みでオブジェクトに置き換わる）。個数 0 のアイテムはキーごと消す。
+    list と同じ書き方（append / remove / count / in）も使えるが、反復は種類ごとに 1 回になる。
+    """
+
+    @classmethod
+    def parse(cls, value: Any) -> "Inventory":
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                return cls()
+        inventory = cls()
+        if isinstance(value, Mapping):
+            for item, count in value.items():
+                try:
+                    count = int(count)
+                except (TypeError, ValueError):
+                    continue
+                if item and count > 0:
+                    inventory[str(item)] = count
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                if item:
+                    inventory[str(item)] += 1
+        return inventory
+
+    def append(self, item: str) -> None:
+        self[item] += 1
+
+    def remove(self, item: str) -> None:
+        count = self.get(item, 0)
+        if count <= 0:
+            raise ValueError(f"{item!r} not in inventory")
+        if count == 1:
+            del self[item]
+        else:
+            self[item] = count - 1
+
+    def count(self, item: str) -> int:
+        return self.get(item, 0)
+
+    def shortfall(self, delta: Mapping[str, int]) -> Optional[str]:
+        """delta を適用すると個数が負になるアイテム（無ければ None）"""
+        for item, change in delta.items():
+            if self.get(item, 0) + change < 0:
+                return item
+        return None
+
+    def apply(self, delta: Mapping[str, int]) -> None:
+        """delta（{アイテム名: ±個数}）を適用する。先に shortfall で確認すること"""
+        for item, change in delta.items():
+            count = self.get(item, 0) + change
+            if count > 0:
+                self[item] = count
+            else:
+                self.pop(item, None)
+
+
+def _parse(column: str, value: Any) -> Any:
+    if column == "inventory":
+        return Inventory.parse(value)
+    if isinstance(value, str) and (column in JSON_OBJECT_COLUMNS or column in JSON_ARRAY_COLUMNS):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return value
+    if column in JSON_OBJECT_COLUMNS and value is None:
+        return {}
+    if column in JSON_ARRAY_COLUMNS and value is None:
+        return []
+    return value
+
+
+class PlayerState(MutableMapping):
+    __slots__ = COLUMNS + ("_extra",)
+
+    def __init__(self, row: Optional[Mapping[str, Any]] = None):
+        self._extra: Optional[dict[str, Any]] = None
+        if row:
+            for key, value in row.items():
+                self[key] = value
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> "PlayerState":
+        return row if isinstance(row, cls) else cls(row)
+
+    # -------------------------
+    # Mapping
+    # -------------------------
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _COLUMN_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in _COLUMN_SET:
+            setattr(self, key, _parse(key, value))
+            return
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in _COLUMN_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+            return
+        if self._extra is None or key not in self._extra:
+            raise KeyError(key)
+        del self._extra[key]
+
+    def __iter__(self) -> Iterator[str]:
+        for column in COLUMNS:
+            if hasattr(self, column):
+                yield column
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key: object) -> bool:
+        if key in _COLUMN_SET:
+            return hasattr(self, key)  # type: ignore[arg-type]
+        return self._extra is not None and key in self._extra
+
+    def get(self, key: str, default: Any = None) -> Any:
+        # Mapping.get は KeyError を経由するので、よく呼ばれる既知の列は直接引く
+        if key in _COLUMN_SET:
+            return getattr(self, key, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def copy(self) -> "PlayerState":
+        clone = PlayerState()
+        for column in COLUMNS:
+            if hasattr(self, column):
+                setattr(clone, column, getattr(self, column))
+        if self._extra:
+            clone._extra = dict(self._extra)
+        return clone
+
+    def to_dict(self) -> dict[str, Any]:
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return f"PlayerState(user_id={self.get('user_id')!r}, fields={len(self)})"
+
+    # -------------------------
+    # よく使う値
+    # -------------------------
+
+    @property
+    def uid(self) -> Optional[int]:
+        """Discord のユーザーID（int）"""
+        user_id = self.get("user_id")
+        return int(user_id) if user_id is not None else None
+
+    @property
+    def item_counts(self) -> Inventory:
+        """所持品の個数（inventory を取得していなければ空）"""
+        return self.get("inventory") or Inventory()
+
+
+def item_counts(player: Optional[Mapping[str, Any]]) -> Inventory:
+    """PlayerState でも dict でも所持品の個数を返す"""
+    return Inventory.parse((player or {}).get("inventory"))
+
+
+__all__ = ["COLUMNS", "Inventory", "PlayerState", "item_counts", "select_clause"]
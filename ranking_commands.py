@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import discord
+from discord.ext import commands
+
+from bot_utils import check_ban
+from leaderboard import METRIC_LABELS, leaderboard
+
+PAGE_SIZE = 10
+
+_METRIC_ALIASES = {
+    "distance": "distance",
+    "dist": "distance",
+    "d": "distance",
+    "距離": "distance",
+    "level": "level",
+    "lv": "level",
+    "l": "level",
+    "レベル": "level",
+    "deaths": "deaths",
+    "death": "deaths",
+    "死亡": "deaths",
+}
+
+_GLOBAL_SCOPES = {"global", "all", "g", "全体"}
+
+_UNITS = {"distance": "m", "level": "", "deaths": "回"}
+
+
+def _format_score(metric: str, score: int) -> str:
+    if metric == "level":
+        return f"Lv.{score}"
+    return f"{score:,}{_UNITS[metric]}"
+
+
+def build_ranking_embed(metric: str, guild: discord.Guild | None, page: int, author_id: int) -> discord.Embed:
+    """ランキング索引（メモリ）から 1 ページ分の Embed を作る"""
+    guild_id = guild.id if guild is not None else None
+    total = leaderboard.count(metric, guild_id=guild_id)
+    pages = max(1, -(-total // PAGE_SIZE))
+    scope = guild.name if guild is not None else "全体"
+
+    embed = discord.Embed(
+        title=f"🏅 ランキング（{METRIC_LABELS[metric]}・{scope}） {page + 1}/{pages}",
+        color=discord.Color.gold(),
+    )
+    rows = leaderboard.page(metric, guild_id=guild_id, offset=page * PAGE_SIZE, limit=PAGE_SIZE)
+    if not rows:
+        embed.description = "まだランキングに載っているプレイヤーがいません。" if leaderboard.ready else "ランキングを集計中です。少し待ってからもう一度試してください。"
+    else:
+        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+        lines = []
+        for row in rows:
+            badge = " 🏆" if row["cleared"] else ""
+            name = row["name"] or f"ID:{row['user_id']}"
+            mark = medals.get(row["rank"]) or f"`{row['rank']:>3}`"
+            lines.append(f"{mark} **{name}**{badge} — {_format_score(metric, row['score'])}")
+        embed.description = "\n".join(lines)
+
+    rank = leaderboard.rank_of(metric, author_id, guild_id=guild_id)
+    embed.set_footer(text=f"あなたの順位: {rank}位" if rank else f"あなたは上位{leaderboard.size}位圏外です")
+    return embed
+
+
+class RankingPaginationView(discord.ui.View):
+    def __init__(self, author_id: int, metric: str, guild: discord.Guild | None):
+        super().__init__(timeout=120)
+        self.author_id = author_id
+        self.metric = metric
+        self.guild = guild
+        self.index = 0
+        self.message: discord.Message | None = None
+        self._sync_buttons()
+
+    def _page_count(self) -> int:
+        total = leaderboard.count(self.metric, guild_id=self.guild.id if self.guild is not None else None)
+        return max(1, -(-total // PAGE_SIZE))
+
+    def _sync_buttons(self) -> None:
+        self.back_button.disabled = self.index <= 0
+        self.next_button.disabled = self.index >= (self._page_count() - 1)
+
+    def current_embed(self) -> discord.Embed:
+        return build_ranking_embed(self.metric, self.guild, self.index, self.author_id)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        user = getattr(interaction, "user", None)
+        if user is None:
+            return False
+        if user.id != self.author_id:
+            try:
+                await interaction.response.send_message(
+                    "このランキングはコマンド実行者のみ操作できます。",
+                    ephemeral=True,
+                )
+            except Exception:
+                pass
+            return False
+        return True
+
+    async def on_timeout(self) -> None:
+        for child in self.children:
+            if isinstance(child, discord.ui.Button):
+                child.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except Exception:
+                pass
+
+    @discord.ui.button(label="BACK", style=discord.ButtonStyle.secondary)
+    async def back_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.index > 0:
+            self.index -= 1
+        self._sync_buttons()
+        await interaction.response.edit_message(embed=self.current_embed(), view=self)
+
+    @discord.ui.button(label="NEXT", style=discord.ButtonStyle.primary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.index < self._page_count() - 1:
+            self.index += 1
+        self._sync_buttons()
+        await interaction.response.edit_message(embed=self.current_embed(), view=self)
+
+
+def setup_ranking_commands(bot: commands.Bot) -> None:
+    @bot.command(name="ranking", aliases=["rank", "lb"])
+    @check_ban()
+    async def ranking(ctx: commands.Context, metric: str = "distance", scope: str = ""):
+        """ランキングを表示（DBには問い合わせず、メモリ上の索引を読む）"""
+        key = _METRIC_ALIASES.get(metric.lower())
+        if key is None:
+            # `!ranking global` のように指標を省略した場合
+            if metric.lower() in _GLOBAL_SCOPES:
+                key, scope = "distance", metric
+            else:
+                await ctx.send("⚠️ 指標は `distance` / `level` / `deaths` のいずれかを指定してください。", delete_after=10)
+                return
+
+        guild = None if scope.lower() in _GLOBAL_SCOPES else ctx.guild
+        view = RankingPaginationView(ctx.author.id, key, guild)
+        view.message = await ctx.send(embed=view.current_embed(), view=view)
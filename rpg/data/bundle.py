@@ -0,0 +1,286 @@
+"""Precompiled game-data bundle.
+
+起動時に items.json / enemies.json / milestones.json / ストーリーJSON をそれぞれ（しかも複数回）
+パースし、ドロップ索引（DROPS_BY_ZONE_AND_TYPE）も毎回計算していたため、
+ビルド時にまとめて 1 ファイルへ事前コンパイルする。
+
+- ソースの内容ハッシュ（+ BUNDLE_VERSION）をキーにした pickle を 1 回読むだけで起動できる
+- ハッシュが一致しない / 壊れている / 無い場合はソースをパースしてフォールバック
+- フォールバック時は（可能なら）バンドルを書き直す
+
+ビルド:
+    python -m rpg.data.bundle
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger("rpgbot")
+
+# 形式を変えたら上げる（古いバンドルはハッシュ不一致として扱われる）
+BUNDLE_VERSION = 2
+
+_DATA_DIR = Path(__file__).resolve().parent
+_ROOT_DIR = _DATA_DIR.parent.parent
+
+BUNDLE_PATH = Path(os.getenv("GAME_DATA_BUNDLE_PATH") or (_DATA_DIR / "game_data.bundle"))
+
+_GAME_DATA_CACHE: dict[str, Any] | None = None
+
+
+def source_paths() -> list[Path]:
+    """バンドルに含めるソースファイル（順序固定）"""
+    paths = [_DATA_DIR / "items.json", _DATA_DIR / "enemies.json", _DATA_DIR / "milestones.json"]
+
+    top = _ROOT_DIR / "stories.json"
+    if top.exists():
+        paths.append(top)
+    stories_dir = _ROOT_DIR / "stories"
+    if stories_dir.exists() and stories_dir.is_dir():
+        paths.extend(sorted(stories_dir.glob("*.json")))
+    return paths
+
+
+def _relpath(path: Path) -> str:
+    try:
+        return path.relative_to(_ROOT_DIR).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def content_hash(paths: list[Path] | None = None) -> str:
+    """ソースの内容ハッシュ（パス + バイト列 + BUNDLE_VERSION）"""
+    h = hashlib.sha256(f"v{BUNDLE_VERSION}".encode())
+    for path in paths if paths is not None else source_paths():
+        h.update(_relpath(path).encode("utf-8"))
+        h.update(b"\0")
+        try:
+            h.update(path.read_bytes())
+        except OSError:
+            h.update(b"<missing>")
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _load_story_files(paths: list[Path]) -> list[dict[str, Any]]:
+    """ストーリーJSONを 1 回だけパースし、検証用にファイル単位で保持する"""
+    files: list[dict[str, Any]] = []
+    for path in paths:
+        entry: dict[str, Any] = {"path": str(path), "data": None, "error": None}
+        try:
+            entry["data"] = json.loads(path.read_text(encoding="utf-8"))
+        except Exception as e:
+            entry["error"] = str(e)
+        files.append(entry)
+    return files
+
+
+def _merge_stories(story_files: list[dict[str, Any]]) -> dict[str, Any]:
+    """stories.json → stories/*.json の順にマージ（後勝ち）"""
+    merged: dict[str, Any] = {}
+    for entry in story_files:
+        path = entry["path"]
+        if entry["error"] is not None:
+            logger.warning("⚠️ ストーリーJSONの読み込みに失敗: %s (%s)", path, entry["error"])
+            continue
+
+        data = entry["data"]
+        stories = data.get("stories") if isinstance(data, dict) else None
+        if not isinstance(stories, dict):
+            logger.warning("⚠️ ストーリーJSON形式が不正: %s（トップレベルに 'stories' dict が必要）", path)
+            continue
+
+        for story_id, story_def in stories.items():
+            if isinstance(story_id, str) and isinstance(story_def, dict):
+                merged[story_id] = story_def
+    return merged
+
+
+def compile_sources(paths: list[Path] | None = None, *, digest: str | None = None) -> dict[str, Any]:
+    """ソースをパースしてバンドル内容を組み立てる"""
+    from rpg.data.drops import categorize_drops_by_zone
+    from rpg.data.enemies import load_enemy_zones
+    from rpg.data.items import load_items
+    from rpg.data.milestones import load_milestones
+
+    paths = paths if paths is not None else source_paths()
+    items = load_items()
+    enemy_zones = load_enemy_zones()
+    story_files = _load_story_files([p for p in paths if p.parent != _DATA_DIR])
+
+    return {
+        "version": BUNDLE_VERSION,
+        "hash": digest or content_hash(paths),
+        "items": items,
+        "enemy_zones": enemy_zones,
+        "drops_by_zone_and_type": categorize_drops_by_zone(enemy_zones, items),
+        "milestones": load_milestones(),
+        "story_files": story_files,
+        "stories": _merge_stories(story_files),
+    }
+
+
+def write_bundle(data: dict[str, Any], path: Path = BUNDLE_PATH) -> None:
+    """一時ファイル経由でアトミックに書き込む"""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+    os.replace(tmp, path)
+
+
+def _read_bundle(path: Path, expected_hash: str) -> dict[str, Any] | None:
+    try:
+        data = pickle.loads(path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("game data bundle unreadable; falling back to sources: path=%s err=%s", path, e)
+        return None
+
+    if not isinstance(data, dict) or data.get("version") != BUNDLE_VERSION or data.get("hash") != expected_hash:
+        logger.info("game data bundle is stale; falling back to sources: path=%s", path)
+        return None
+    return data
+
+
+def validate_story_files(*, strict: bool = False) -> bool:
+    """Validate external story JSON files at startup.
+
+    - Checks JSON parse
+    - Checks top-level structure: {"stories": {story_id: {...}}}
+    - Minimal type checks for each story definition
+
+    By default (strict=False), logs errors and returns False.
+    In strict mode, raises ValueError on any error.
+    """
+
+    errors: list[str] = []
+
+    # JSONは起動時に一度だけパースされ、バンドルにファイル単位で保持されている
+    story_files = load_game_data().get("story_files") or []
+    paths = [entry["path"] for entry in story_files]
+
+    for entry in story_files:
+        path = entry["path"]
+        if entry.get("error") is not None:
+            errors.append(f"{path}: JSON parse failed: {entry['error']}")
+            continue
+        data = entry.get("data")
+
+        if not isinstance(data, dict):
+            errors.append(f"{path}: top-level must be an object")
+            continue
+
+        stories = data.get("stories")
+        if not isinstance(stories, dict):
+            errors.append(f"{path}: top-level 'stories' must be an object")
+            continue
+
+        for story_id, story_def in stories.items():
+            if not isinstance(story_id, str) or not story_id:
+                errors.append(f"{path}: story id must be non-empty string")
+                continue
+            if not isinstance(story_def, dict):
+                errors.append(f"{path}: story '{story_id}' must be an object")
+                continue
+
+            nodes = story_def.get("nodes")
+            lines = story_def.get("lines")
+            if nodes is None and lines is None:
+                # allow empty story, but warn
+                errors.append(f"{path}: story '{story_id}' must have 'nodes' or 'lines'")
+                continue
+
+            if nodes is not None and not isinstance(nodes, dict):
+                errors.append(f"{path}: story '{story_id}': 'nodes' must be an object")
+                continue
+
+            if lines is not None and not isinstance(lines, list):
+                errors.append(f"{path}: story '{story_id}': 'lines' must be a list")
+                continue
+
+            if isinstance(nodes, dict):
+                for node_id, node_def in nodes.items():
+                    if not isinstance(node_id, str) or not node_id:
+                        errors.append(f"{path}: story '{story_id}': node id must be string")
+                        continue
+                    if not isinstance(node_def, dict):
+                        errors.append(f"{path}: story '{story_id}': node '{node_id}' must be an object")
+                        continue
+                    node_lines = node_def.get("lines")
+                    if node_lines is not None and not isinstance(node_lines, list):
+                        errors.append(f"{path}: story '{story_id}': node '{node_id}': 'lines' must be a list")
+
+    if errors:
+        logger.error("❌ Story validation failed (%s issues)", len(errors))
+        for msg in errors:
+            logger.error(" - %s", msg)
+        if strict:
+            raise ValueError("Story validation failed; see logs")
+        return False
+
+    logger.info("✅ Story validation OK (%s files)", len(paths))
+    return True
+
+
+def build_bundle(path: Path = BUNDLE_PATH) -> dict[str, Any]:
+    """ソースからバンドルを作って書き出す（ビルドステップ用）"""
+    data = compile_sources()
+    write_bundle(data, path)
+    return data
+
+
+def load_game_data() -> dict[str, Any]:
+    """ゲームデータを取得（プロセス内で 1 回だけ読み込む）"""
+    global _GAME_DATA_CACHE
+    if _GAME_DATA_CACHE is not None:
+        return _GAME_DATA_CACHE
+
+    started = time.perf_counter()
+    paths = source_paths()
+    digest = content_hash(paths)
+
+    data = _read_bundle(BUNDLE_PATH, digest)
+    source = "bundle"
+    if data is None:
+        source = "sources"
+        data = compile_sources(paths, digest=digest)
+        if (os.getenv("GAME_DATA_BUNDLE_AUTOWRITE") or "1").strip().lower() not in {"0", "false", "no", "off"}:
+            try:
+                write_bundle(data, BUNDLE_PATH)
+            except Exception as e:
+                logger.warning("game data bundle write failed: path=%s err=%s", BUNDLE_PATH, e)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info("game data loaded from %s in %.1fms (hash=%s)", source, elapsed_ms, digest[:12])
+    data["source"] = source
+    data["load_ms"] = elapsed_ms
+    _GAME_DATA_CACHE = data
+    return data
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    t0 = time.perf_counter()
+    compile_sources()
+    parse_ms = (time.perf_counter() - t0) * 1000
+
+    bundle = build_bundle()
+
+    t1 = time.perf_counter()
+    _read_bundle(BUNDLE_PATH, content_hash())
+    load_ms = (time.perf_counter() - t1) * 1000
+
+    print(
+        f"built {BUNDLE_PATH} hash={bundle['hash'][:12]} "
+        f"stories={len(bundle['stories'])} items={len(bundle['items'])} "
+        f"parse_sources={parse_ms:.1f}ms load_bundle={load_ms:.1f}ms"
+    )
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+
+def categorize_drops_by_zone(zones, items_db):
+    """
+    ENEMY_ZONESのドロップアイテムを、アイテムタイプ別に分類し、階層ごとに集計する。
+    """
+    drops_by_zone_and_type = {}
+
+    for zone_key, zone_data in zones.items():
+        "ゾーンごとに結果を初期化"
+        drops_by_zone_and_type[zone_key] = {
+            "weapon": set(),
+            "armor": set(),
+            "potion": set(),
+            "material": set(),
+            "other": set() # noneやcoinsなど、タイプがないものを格納
+        }
+
+        "ENEMIESがリストであることを前提"
+        for enemy in zone_data.get("enemies", []): 
+            "dropsがリストであることを前提"
+            for drop in enemy.get("drops", []):
+                item_name = drop.get("item")
+
+                "'none' または 'coins' のような特殊ドロップはスキップまたは'other'に追加"
+                if item_name == "none" or item_name == "coins":
+                    if item_name == "coins":
+                        # 'none'は無視、'coins'は'other'に記録
+                        drops_by_zone_and_type[zone_key]["other"].add(item_name)
+                    continue
+
+                "ITEMS_DATABASEからアイテムタイプを取得"
+                item_info = items_db.get(item_name)
+
+                if item_info:
+                    item_type = item_info.get("type")
+                    if item_type in drops_by_zone_and_type[zone_key]:
+                        "該当するタイプセットにアイテム名を追加"
+                        drops_by_zone_and_type[zone_key][item_type].add(item_name)
+                    else:
+                        "定義されていないタイプは 'other' に追加"
+                        drops_by_zone_and_type[zone_key]["other"].add(item_name)
+                else:
+                    "ITEMS_DATABASEに見つからない場合は 'other' に追加"
+                    drops_by_zone_and_type[zone_key]["other"].add(item_name)
+
+        "setをリストに変換して、ソートする"
+        for item_type in drops_by_zone_and_type[zone_key]:
+            drops_by_zone_and_type[zone_key][item_type] = sorted(list(drops_by_zone_and_type[zone_key][item_type]))
+
+    return drops_by_zone_and_type
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+# 同じ距離に複数ある場合の優先度（小さいほど優先）。JSON の priorities で上書きできる
+DEFAULT_PRIORITIES = {"boss": 1, "special": 2, "story": 3, "skill": 4}
+
+
+def _data_path() -> Path:
+    return Path(__file__).resolve().parent / "milestones.json"
+
+
+def load_milestones() -> list[dict[str, Any]]:
+    """Load distance milestones from JSON.
+
+    Each entry has at least "distance" (m) and "kind" (boss / special / story / skill).
+    Optional keys:
+    - "exact": true  -> only when the move ends exactly on the distance
+    - "move_event": false -> not used by !move's event selection (story triggers only)
+
+    Entries are returned sorted by (distance, priority) with "priority" filled in.
+    """
+    data = json.loads(_data_path().read_text(encoding="utf-8"))
+    if not isinstance(data, dict) or not isinstance(data.get("milestones"), list):
+        raise ValueError("milestones.json must be an object with a 'milestones' list")
+
+    priorities = {**DEFAULT_PRIORITIES, **(data.get("priorities") or {})}
+    milestones: list[dict[str, Any]] = []
+    for entry in data["milestones"]:
+        if not isinstance(entry, dict) or not isinstance(entry.get("distance"), int) or not entry.get("kind"):
+            raise ValueError(f"invalid milestone: {entry!r}")
+        kind = str(entry["kind"])
+        milestones.append({**entry, "kind": kind, "priority": int(entry.get("priority", priorities.get(kind, 99)))})
+    milestones.sort(key=lambda m: (m["distance"], m["priority"]))
+    return milestones
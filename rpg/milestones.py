@@ -0,0 +1,90 @@
+"""距離マイルストーンの索引（ボス・特殊イベント・ストーリー・距離スキル）
+
+これまで距離の閾値は exploration.determine_event（ボス / 500m / 250m のリスト）、
+legacy_game.STORY_TRIGGERS、progression.DISTANCE_SKILLS、should_spawn_boss の剰余計算に
+別々に書かれており、!move の度にそれぞれを先頭から線形に走査していた。
+
+ここでは rpg/data/milestones.json（ゲームデータのバンドル経由）から 1 つのソート済み配列を作り、
+(前回の距離, 今回の距離] に入るマイルストーンを二分探索で取り出す（O(log n + 該当数)）。
+同じ移動で複数通過した場合は (優先度, 距離) の順に返すので、呼び出し側は先頭から見ればよい。
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from typing import Any, Iterable, Optional
+
+Milestone = dict[str, Any]
+
+
+class MilestoneIndex:
+    def __init__(self, milestones: Iterable[Milestone]):
+        entries = sorted(milestones, key=lambda m: (m["distance"], m.get("priority", 99)))
+        self._entries: tuple[Milestone, ...] = tuple(entries)
+        self._distances: tuple[int, ...] = tuple(m["distance"] for m in entries)
+
+        by_kind: dict[str, list[Milestone]] = {}
+        for m in entries:
+            by_kind.setdefault(m["kind"], []).append(m)
+        self._by_kind = {kind: tuple(items) for kind, items in by_kind.items()}
+        self._kind_distances = {kind: tuple(m["distance"] for m in items) for kind, items in self._by_kind.items()}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _slice(self, kind: Optional[str]) -> tuple[tuple[Milestone, ...], tuple[int, ...]]:
+        if kind is None:
+            return self._entries, self._distances
+        return self._by_kind.get(kind, ()), self._kind_distances.get(kind, ())
+
+    def of_kind(self, kind: str) -> tuple[Milestone, ...]:
+        """kind のマイルストーン（距離の昇順）"""
+        return self._by_kind.get(kind, ())
+
+    def crossed(self, previous: int, current: int, kinds: Optional[Iterable[str]] = None) -> list[Milestone]:
+        """previous < 距離 <= current のマイルストーンを (優先度, 距離) 順で返す
+
+        exact なもの（lucky_777 など）は current がちょうどその距離のときだけ含める。
+        """
+        if current <= previous:
+            return []
+        wanted = frozenset(kinds) if kinds is not None else None
+        lo = bisect_right(self._distances, previous)
+        hi = bisect_right(self._distances, current)
+        hits = [
+            m
+            for m in self._entries[lo:hi]
+            if (wanted is None or m["kind"] in wanted) and (not m.get("exact") or m["distance"] == current)
+        ]
+        hits.sort(key=lambda m: (m.get("priority", 99), m["distance"]))
+        return hits
+
+    def upto(self, distance: int, kind: str) -> tuple[Milestone, ...]:
+        """distance 以下の kind のマイルストーン（距離の昇順）"""
+        entries, distances = self._slice(kind)
+        return entries[: bisect_right(distances, distance)]
+
+    def near(self, distance: int, radius: int, kind: str) -> Optional[Milestone]:
+        """distance から ±radius 以内にある kind のマイルストーン（最も近いもの）"""
+        entries, distances = self._slice(kind)
+        lo = bisect_left(distances, distance - radius)
+        hi = bisect_right(distances, distance + radius)
+        if lo >= hi:
+            return None
+        return min(entries[lo:hi], key=lambda m: abs(m["distance"] - distance))
+
+
+_INDEX: Optional[MilestoneIndex] = None
+
+
+def get_index() -> MilestoneIndex:
+    """ゲームデータからプロセス内で 1 回だけ索引を作る"""
+    global _INDEX
+    if _INDEX is None:
+        from rpg.data.bundle import load_game_data
+
+        _INDEX = MilestoneIndex(load_game_data().get("milestones") or ())
+    return _INDEX
+
+
+__all__ = ["Milestone", "MilestoneIndex", "get_index"]
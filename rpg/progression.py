@@ -0,0 +1,124 @@
+"""レベルアップと距離スキル解放の計算（DB アクセスなし）
+
+db.add_exp はこれまで 1 レベル毎に PATCH + get_player を行い、距離スキルは !move の度に
+10 個の閾値すべてで unlock_skill（get + patch）を呼んでいた。
+
+ここでは (現在の状態, 獲得EXP, 移動前後の距離) から最終レベル・ステータス上昇・
+新しく解放されるスキルを O(1) で求め、呼び出し側は結果の updates を 1 回で書き込む。
+距離スキルの閾値は rpg/data/milestones.json（kind="skill"）にある。
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Any, Mapping, Optional
+
+from rpg.milestones import get_index
+
+# レベル L から L+1 に必要なEXP = EXP_PER_LEVEL * L
+EXP_PER_LEVEL = 100
+
+# 1 レベル毎のステータス上昇
+LEVEL_UP_GAINS = {"hp": 5, "max_hp": 5, "atk": 1, "def": 1}
+
+DEFAULT_SKILLS = ("体当たり",)
+
+_DEFAULTS = {"level": 1, "exp": 0, "hp": 50, "max_hp": 50, "atk": 5, "def": 2}
+
+
+def required_exp(level: int) -> int:
+    """レベルアップに必要なEXP"""
+    return level * EXP_PER_LEVEL
+
+
+def _exp_for_levels(level: int, count: int) -> int:
+    """level から count レベル上げるのに必要なEXPの合計"""
+    return EXP_PER_LEVEL * (count * level + count * (count - 1) // 2)
+
+
+def levels_gained(level: int, exp: int) -> int:
+    """level で exp を持っているときに上がるレベル数（閉じた式 + 端数の補正）"""
+    if exp < required_exp(level):
+        return 0
+    # k^2 + (2L-1)k - 2q <= 0 の最大の整数 k（q = exp // EXP_PER_LEVEL）
+    b = 2 * level - 1
+    q = exp // EXP_PER_LEVEL
+    k = max(0, (math.isqrt(b * b + 8 * q) - b) // 2)
+    while _exp_for_levels(level, k + 1) <= exp:
+        k += 1
+    while k > 0 and _exp_for_levels(level, k) > exp:
+        k -= 1
+    return k
+
+
+def distance_skills() -> tuple[tuple[int, str], ...]:
+    """距離（m）で解放されるスキル（距離の昇順）"""
+    return tuple((m["distance"], m["skill"]) for m in get_index().of_kind("skill"))
+
+
+def skills_unlocked_at(distance: int) -> tuple[str, ...]:
+    """distance までに解放されているはずの距離スキル"""
+    return tuple(m["skill"] for m in get_index().upto(distance, "skill"))
+
+
+@dataclass
+class Progress:
+    level: int
+    exp: int
+    level_ups: list[dict[str, int]] = field(default_factory=list)
+    new_skills: list[str] = field(default_factory=list)
+    updates: dict[str, Any] = field(default_factory=dict)
+
+
+def progress(
+    state: Mapping[str, Any],
+    exp_gain: int = 0,
+    old_distance: Optional[int] = None,
+    new_distance: Optional[int] = None,
+) -> Progress:
+    """EXP獲得と移動の結果をまとめて計算する
+
+    state は players の行（level / exp / hp / max_hp / atk / def / unlocked_skills のうち必要な列）。
+    updates には書き込むべき列だけが入る（EXP も距離も変わらなければ空）。
+    スキルは new_distance までの閾値のうち、まだ持っていないものを解放する（取りこぼしも拾う）。
+    """
+    level = int(state.get("level") or _DEFAULTS["level"])
+    exp = int(state.get("exp") or 0) + int(exp_gain or 0)
+    updates: dict[str, Any] = {}
+
+    gained = levels_gained(level, exp) if exp_gain else 0
+    level_ups = [
+        {"new_level": level + i, "hp_gain": LEVEL_UP_GAINS["hp"], "atk_gain": LEVEL_UP_GAINS["atk"], "def_gain": LEVEL_UP_GAINS["def"]}
+        for i in range(1, gained + 1)
+    ]
+    if gained:
+        exp -= _exp_for_levels(level, gained)
+        level += gained
+        updates["level"] = level
+        for column, gain in LEVEL_UP_GAINS.items():
+            updates[column] = int(state.get(column, _DEFAULTS[column]) or 0) + gain * gained
+    if exp_gain:
+        updates["exp"] = exp
+
+    new_skills: list[str] = []
+    if new_distance is not None and (old_distance is None or new_distance > old_distance):
+        owned = state.get("unlocked_skills")
+        owned = list(owned) if isinstance(owned, list) else list(DEFAULT_SKILLS)
+        new_skills = [skill for skill in skills_unlocked_at(new_distance) if skill not in owned]
+        if new_skills:
+            updates["unlocked_skills"] = owned + new_skills
+
+    return Progress(level=level, exp=exp, level_ups=level_ups, new_skills=new_skills, updates=updates)
+
+
+__all__ = [
+    "EXP_PER_LEVEL",
+    "LEVEL_UP_GAINS",
+    "Progress",
+    "distance_skills",
+    "levels_gained",
+    "progress",
+    "required_exp",
+    "skills_unlocked_at",
+]
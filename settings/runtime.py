@@ -83,3 +83,210 @@ SELECT_MAX_POTION_OPTIONS: int = int(os.getenv("SELECT_MAX_POTION_OPTIONS") or 1
 # 表示用の文字数トリム（Embed/Select description）
 DESC_TRIM_SHORT: int = int(os.getenv("DESC_TRIM_SHORT") or 80)
 DESC_TRIM_LONG: int = int(os.getenv("DESC_TRIM_LONG") or 100)
+
+
+# -------------------------
+# Battle session
+# -------------------------
+
+# 戦闘中の状態はメモリ上で保持し、このターン数ごとにDBへチェックポイントを書き込む（0で無効）
+BATTLE_CHECKPOINT_TURNS: int = int(os.getenv("BATTLE_CHECKPOINT_TURNS") or 5)
+
+
+# -------------------------
+# Discord message edits
+# -------------------------
+
+# 同じチャンネルへのメッセージ編集の最小間隔（秒）。間に届いた編集は最新状態にまとめる
+MESSAGE_EDIT_MIN_INTERVAL: float = float(os.getenv("MESSAGE_EDIT_MIN_INTERVAL") or 0.25)
+# 送信前に後続の編集を待つ時間（秒）。ボタン再有効化などの直後の編集を同じPATCHにまとめる
+MESSAGE_EDIT_LINGER: float = float(os.getenv("MESSAGE_EDIT_LINGER") or 0.05)
+
+
+# -------------------------
+# Ban cache
+# -------------------------
+
+# DBを直接書き換えたBAN（Web管理画面など）をメモリ上のBANキャッシュへ取り込む間隔（秒、0で無効）
+BAN_CACHE_RECONCILE_INTERVAL: float = float(os.getenv("BAN_CACHE_RECONCILE_INTERVAL") or 300)
+
+
+# -------------------------
+# Per-user concurrency (user_processing)
+# -------------------------
+
+# 処理中リースの最大保持時間（秒）。View が解除し忘れてもこの時間で自動的に失効する（0で無期限）
+USER_LEASE_MAX_HOLD: float = float(os.getenv("USER_LEASE_MAX_HOLD") or 1800)
+# 他の処理が実行中の時に、順番待ちで待つ最大時間（秒）。超えたら「実行中です」と案内する
+USER_LEASE_QUEUE_TIMEOUT: float = float(os.getenv("USER_LEASE_QUEUE_TIMEOUT") or 5)
+# デバッグ表示用に保持する「直近に解放されたリース」の件数（LRU）
+USER_LEASE_HISTORY_SIZE: int = int(os.getenv("USER_LEASE_HISTORY_SIZE") or 1000)
+
+
+# -------------------------
+# Rollback snapshots (!rollback)
+# -------------------------
+
+# ユーザー毎に保持するスナップショット数
+SNAPSHOT_MAX_PER_USER: int = int(os.getenv("SNAPSHOT_MAX_PER_USER") or 5)
+# 全ユーザー合計のスナップショット概算サイズの上限（MB）。超えたら最近使われていないユーザーから追い出す（0で無制限）
+SNAPSHOT_MEMORY_BUDGET_MB: float = float(os.getenv("SNAPSHOT_MEMORY_BUDGET_MB") or 16)
+# 追い出したスナップショットを退避するディレクトリ（空なら退避せず破棄）
+SNAPSHOT_SPILL_DIR: str = (os.getenv("SNAPSHOT_SPILL_DIR") or "").strip()
+
+
+# -------------------------
+# Notice broadcast (!notice)
+# -------------------------
+
+# 同時に送信するチャンネル数
+BROADCAST_CONCURRENCY: int = int(os.getenv("BROADCAST_CONCURRENCY") or 16)
+# 全体の送信レート（件/秒）。Discord のグローバル上限（50 req/s）より少し低くする
+BROADCAST_GLOBAL_RATE: float = float(os.getenv("BROADCAST_GLOBAL_RATE") or 40)
+# 進捗チェックポイントの書き出し間隔（秒）
+BROADCAST_CHECKPOINT_INTERVAL: float = float(os.getenv("BROADCAST_CHECKPOINT_INTERVAL") or 5)
+# 進捗チェックポイントの保存先（!notice_resume で再開に使う）
+BROADCAST_STATE_DIR: str = (os.getenv("BROADCAST_STATE_DIR") or ".broadcasts").strip()
+
+
+# -------------------------
+# Admin stats (!admin_stats)
+# -------------------------
+
+# 集計RPC（admin_player_stats）の結果をキャッシュする秒数
+ADMIN_STATS_CACHE_TTL: float = float(os.getenv("ADMIN_STATS_CACHE_TTL") or 60)
+
+
+# -------------------------
+# Leaderboard (!ranking)
+# -------------------------
+
+# ランキングの表示件数（メトリクス・ギルド毎に、この 2 倍をメモリ上に保持する）
+LEADERBOARD_SIZE: int = int(os.getenv("LEADERBOARD_SIZE") or 100)
+
+
+# -------------------------
+# Guild settings / adventure threads
+# -------------------------
+
+# guild_settings をメモリにキャッシュする秒数（設定変更時は即時に更新される）
+GUILD_SETTINGS_CACHE_TTL: float = float(os.getenv("GUILD_SETTINGS_CACHE_TTL") or 300)
+# アーカイブ済みスレッド / 削除済みスレッドIDをそれぞれ保持する上限
+THREAD_CACHE_SIZE: int = int(os.getenv("THREAD_CACHE_SIZE") or 10000)
+
+
+# -------------------------
+# Degraded mode (Supabase outage)
+# -------------------------
+
+# players のブレーカーが開いている間も、最後に読んだプレイヤー状態を返せるよう保持する人数
+DEGRADED_PLAYER_CACHE_SIZE: int = int(os.getenv("DEGRADED_PLAYER_CACHE_SIZE") or 5000)
+# 縮退モード中も実行できる（書き込みを伴わない）コマンド
+DEGRADED_READONLY_COMMANDS: frozenset[str] = frozenset(
+    c.strip()
+    for c in (os.getenv("DEGRADED_READONLY_COMMANDS") or "status,inventory,help,ranking").split(",")
+    if c.strip()
+)
+
+
+# -------------------------
+# Write journal (write_journal.py)
+# -------------------------
+
+# 書き込みを送信前にローカルへ記録し、一時的な失敗は後で送り直す（0 で無効）
+JOURNAL_ENABLED: bool = (os.getenv("JOURNAL_ENABLED", "1").strip() not in {"0", "false", "False", "no", "NO"})
+# ジャーナルファイル（クラスタモードでは末尾にワーカー番号が付く）
+JOURNAL_PATH: str = (os.getenv("JOURNAL_PATH") or ".journal/writes.jsonl").strip()
+# この間に来た追記をまとめて fsync する（ミリ秒）
+JOURNAL_FSYNC_INTERVAL_MS: float = float(os.getenv("JOURNAL_FSYNC_INTERVAL_MS") or 2)
+# 未送信が無くなったとき、ファイルがこのサイズ以上なら切り詰める
+JOURNAL_COMPACT_BYTES: int = int(os.getenv("JOURNAL_COMPACT_BYTES") or 1024 * 1024)
+# リプレイが一時的に失敗したときの待ち時間の上限（秒）
+JOURNAL_REPLAY_MAX_DELAY: float = float(os.getenv("JOURNAL_REPLAY_MAX_DELAY") or 30)
+
+
+# -------------------------
+# Schema introspection (db_schema.py)
+# -------------------------
+
+# 起動時に読んだ PostgREST のスキーマ（OpenAPI）の保存先
+SCHEMA_CACHE_PATH: str = (os.getenv("SCHEMA_CACHE_PATH") or ".cache/supabase_schema.json").strip()
+# 保存したスキーマを使い回す秒数（0 で毎回読み直し、保存しない）
+SCHEMA_CACHE_TTL: float = float(os.getenv("SCHEMA_CACHE_TTL") or 6 * 3600)
+# キャッシュに無い列を書き込み / select しようとしたとき、同じ列でスキーマを読み直す最短間隔（秒）
+SCHEMA_REPROBE_INTERVAL: float = float(os.getenv("SCHEMA_REPROBE_INTERVAL") or 300)
+
+
+# -------------------------
+# Cluster mode (python -m cluster)
+# -------------------------
+
+# ワーカープロセス数（1 以下なら従来通り main.py を単一プロセスで起動する）
+CLUSTER_WORKERS: int = int(os.getenv("CLUSTER_WORKERS") or 1)
+# 総シャード数（0 なら Discord の推奨値を /gateway/bot から取得する）
+CLUSTER_SHARD_COUNT: int = int(os.getenv("CLUSTER_SHARD_COUNT") or 0)
+# ランチャーが提供するロック/状態サービスの Unix ソケット
+CLUSTER_STATE_SOCKET: str = (os.getenv("CLUSTER_STATE_SOCKET") or "/tmp/rpgbot-state.sock").strip()
+# ワーカーがヘルス/メトリクスを報告する間隔（秒）。3 回分報告が無いワーカーは異常とみなす
+CLUSTER_REPORT_INTERVAL: float = float(os.getenv("CLUSTER_REPORT_INTERVAL") or 10)
+
+
+# -------------------------
+# Persistent views (ui/persistent.py)
+# -------------------------
+
+# 宝箱 / 特殊イベント / ストーリーの View を再起動後も押せるようにする（0 で従来の常駐 View）
+PERSISTENT_VIEWS: bool = (os.getenv("PERSISTENT_VIEWS", "1").strip() not in {"0", "false", "False", "no", "NO"})
+# View の状態の保存先（SQLite）
+VIEW_STATE_PATH: str = (os.getenv("VIEW_STATE_PATH") or ".cache/view_state.sqlite3").strip()
+# 期限切れの状態を掃除する間隔（秒）
+VIEW_STATE_PURGE_INTERVAL: float = float(os.getenv("VIEW_STATE_PURGE_INTERVAL") or 60)
+
+
+# -------------------------
+# Logging (log_setup.py)
+# -------------------------
+
+# ルートと rpgbot のログレベル（本番は INFO。調査時だけ DEBUG にする）
+LOG_LEVEL: str = (os.getenv("RPG_LOG_LEVEL") or os.getenv("LOG_LEVEL") or "INFO").strip().upper()
+# text（従来の 1 行形式）/ json（1 行 1 JSON。ログ基盤に流す場合）
+LOG_FORMAT: str = (os.getenv("LOG_FORMAT") or "text").strip().lower()
+# 出力をキュー経由で別スレッドに任せる（0 でイベントループ上で直接書く従来の動作）
+LOG_QUEUE: bool = (os.getenv("LOG_QUEUE", "1").strip() not in {"0", "false", "False", "no", "NO"})
+# 同じ書式（logger + メッセージの書式文字列）の INFO 以下を LOG_RATE_WINDOW 秒に何件まで出すか（0 で無制限）
+LOG_RATE_LIMIT: int = int(os.getenv("LOG_RATE_LIMIT") or 20)
+# WARNING の上限（同じ失敗が大量に出る場合用。ERROR 以上は制限しない。0 で無制限）
+LOG_RATE_LIMIT_WARNING: int = int(os.getenv("LOG_RATE_LIMIT_WARNING") or 50)
+LOG_RATE_WINDOW: float = float(os.getenv("LOG_RATE_WINDOW") or 10)
+# logger 毎の間引き率（例: "rpgbot.cmd=0.1,discord.gateway=0.5"）。INFO 以下にだけ適用する
+LOG_SAMPLE: str = (os.getenv("LOG_SAMPLE") or "").strip()
+
+
+# -------------------------
+# DB profiler (db_profile.py)
+# -------------------------
+
+# db 関数の呼び出しを記録する割合（0〜1。0 で記録しない。集計値はこの割合で割り戻して表示する）
+DB_PROFILE_SAMPLE: float = float(os.getenv("DB_PROFILE_SAMPLE") or 0.1)
+# (コマンド, db 関数, 呼び出し元) の組を何種類まで持つか（溢れた分は呼び出し元 "(other)" にまとめる）
+DB_PROFILE_MAX_KEYS: int = int(os.getenv("DB_PROFILE_MAX_KEYS") or 1000)
+
+
+# -------------------------
+# Event loop watchdog (loop_watchdog.py)
+# -------------------------
+
+# ループの遅延の計測と遅いコールバックの記録（0 で無効。/health は従来通り常に ok）
+LOOP_WATCHDOG: bool = (os.getenv("LOOP_WATCHDOG", "1").strip() not in {"0", "false", "False", "no", "NO"})
+# 遅延を測る間隔（秒）と、パーセンタイルに使う直近の件数（既定は 0.5 秒 x 120 件 = 直近 1 分）
+LOOP_LAG_INTERVAL: float = float(os.getenv("LOOP_LAG_INTERVAL") or 0.5)
+LOOP_LAG_WINDOW: int = int(os.getenv("LOOP_LAG_WINDOW") or 120)
+# これより長く実行されたコールバックを記録する（ms。0 で記録しない）
+LOOP_SLOW_CALLBACK_MS: float = float(os.getenv("LOOP_SLOW_CALLBACK_MS") or 100)
+# 記録を何件残すか / スタックを何フレームまで取るか
+LOOP_SLOW_CALLBACK_KEEP: int = int(os.getenv("LOOP_SLOW_CALLBACK_KEEP") or 20)
+LOOP_SLOW_CALLBACK_STACK: int = int(os.getenv("LOOP_SLOW_CALLBACK_STACK") or 15)
+# /health を degraded にする遅延（ms）: 直近 LOOP_LAG_DEGRADED_WINDOW 件（既定は 0.5 秒 x 20 件 = 10 秒）の
+# p75 がこれを超えたとき。一度だけの停止では degraded にしない（/health は degraded でも 200）
+LOOP_LAG_DEGRADED_MS: float = float(os.getenv("LOOP_LAG_DEGRADED_MS") or 250)
+LOOP_LAG_DEGRADED_WINDOW: int = int(os.getenv("LOOP_LAG_DEGRADED_WINDOW") or 20)
@@ -1,10 +1,11 @@
 ﻿import discord
 from discord.ui import View, button
-import json
 import logging
-from pathlib import Path
 from typing import Any, Optional
 
+from player_state import Inventory
+from ui.persistent import PersistentView, interaction_context
+
 logger = logging.getLogger("rpgbot")
 
 
@@ -14,86 +15,11 @@ _EXTERNAL_STORIES_CACHE: Optional[dict[str, Any]] = None
 def validate_external_story_files(*, strict: bool = False) -> bool:
     """Validate external story JSON files at startup.
 
-    - Checks JSON parse
-    - Checks top-level structure: {"stories": {story_id: {...}}}
-    - Minimal type checks for each story definition
-
-    By default (strict=False), logs errors and returns False.
-    In strict mode, raises ValueError on any error.
+    Implementation lives in rpg.data.bundle (so startup can validate without importing story).
     """
+    from rpg.data.bundle import validate_story_files
 
-    errors: list[str] = []
-    base_dir = Path(__file__).resolve().parent
-
-    paths: list[Path] = []
-    top = base_dir / "stories.json"
-    if top.exists():
-        paths.append(top)
-    stories_dir = base_dir / "stories"
-    if stories_dir.exists() and stories_dir.is_dir():
-        paths.extend(sorted(stories_dir.glob("*.json")))
-
-    for path in paths:
-        try:
-            data = json.loads(path.read_text(encoding="utf-8"))
-        except Exception as e:
-            errors.append(f"{path}: JSON parse failed: {e}")
-            continue
-
-        if not isinstance(data, dict):
-            errors.append(f"{path}: top-level must be an object")
-            continue
-
-        stories = data.get("stories")
-        if not isinstance(stories, dict):
-            errors.append(f"{path}: top-level 'stories' must be an object")
-            continue
-
-        for story_id, story_def in stories.items():
-            if not isinstance(story_id, str) or not story_id:
-                errors.append(f"{path}: story id must be non-empty string")
-                continue
-            if not isinstance(story_def, dict):
-                errors.append(f"{path}: story '{story_id}' must be an object")
-                continue
-
-            nodes = story_def.get("nodes")
-            lines = story_def.get("lines")
-            if nodes is None and lines is None:
-                # allow empty story, but warn
-                errors.append(f"{path}: story '{story_id}' must have 'nodes' or 'lines'")
-                continue
-
-            if nodes is not None and not isinstance(nodes, dict):
-                errors.append(f"{path}: story '{story_id}': 'nodes' must be an object")
-                continue
-
-            if lines is not None and not isinstance(lines, list):
-                errors.append(f"{path}: story '{story_id}': 'lines' must be a list")
-                continue
-
-            if isinstance(nodes, dict):
-                for node_id, node_def in nodes.items():
-                    if not isinstance(node_id, str) or not node_id:
-                        errors.append(f"{path}: story '{story_id}': node id must be string")
-                        continue
-                    if not isinstance(node_def, dict):
-                        errors.append(f"{path}: story '{story_id}': node '{node_id}' must be an object")
-                        continue
-                    node_lines = node_def.get("lines")
-                    if node_lines is not None and not isinstance(node_lines, list):
-                        errors.append(f"{path}: story '{story_id}': node '{node_id}': 'lines' must be a list")
-
-    if errors:
-        logger.error("❌ Story validation failed (%s issues)", len(errors))
-        for msg in errors:
-            logger.error(" - %s", msg)
-        if strict:
-            raise ValueError("Story validation failed; see logs")
-        return False
-
-    logger.info("✅ Story validation OK (%s files)", len(paths))
-    return True
+    return validate_story_files(strict=strict)
 
 
 def _load_external_stories() -> dict[str, Any]:
@@ -101,43 +27,17 @@ def _load_external_stories() -> dict[str, Any]:
 
     - `stories.json` (プロジェクトルート/このファイルと同階層) をサポート
     - `stories/*.json` もあればマージ
+    - パース/マージ済みの結果は rpg/data/bundle.py のバンドルから取得する
     """
     global _EXTERNAL_STORIES_CACHE
     if _EXTERNAL_STORIES_CACHE is not None:
         return _EXTERNAL_STORIES_CACHE
 
-    merged: dict[str, Any] = {}
-    base_dir = Path(__file__).resolve().parent
-
-    def load_one(path: Path) -> None:
-        try:
-            data = json.loads(path.read_text(encoding="utf-8"))
-        except Exception as e:
-            logger.warning("⚠️ ストーリーJSONの読み込みに失敗: %s (%s)", path, e, exc_info=True)
-            return
-
-        stories = data.get("stories") if isinstance(data, dict) else None
-        if not isinstance(stories, dict):
-            logger.warning("⚠️ ストーリーJSON形式が不正: %s（トップレベルに 'stories' dict が必要）", path)
-            return
-
-        for story_id, story_def in stories.items():
-            if isinstance(story_id, str) and isinstance(story_def, dict):
-                merged[story_id] = story_def
-
-    # 1) stories.json
-    top = base_dir / "stories.json"
-    if top.exists():
-        load_one(top)
-
-    # 2) stories/*.json
-    stories_dir = base_dir / "stories"
-    if stories_dir.exists() and stories_dir.is_dir():
-        for p in sorted(stories_dir.glob("*.json")):
-            load_one(p)
+    from rpg.data.bundle import load_game_data
 
-    _EXTERNAL_STORIES_CACHE = merged
-    return merged
+    merged = load_game_data().get("stories")
+    _EXTERNAL_STORIES_CACHE = merged if isinstance(merged, dict) else {}
+    return _EXTERNAL_STORIES_CACHE
 
 
 def _normalize_story_definition(raw: dict[str, Any]) -> dict[str, Any]:
@@ -219,7 +119,7 @@ async def _eval_conditions(user_id: int, conditions: Any) -> bool:
 
     state = await _story_get_state(user_id)
     story_flags = state.get("story_flags", {}) if isinstance(state.get("story_flags", {}), dict) else {}
-    inventory = state.get("inventory", []) if isinstance(state.get("inventory", []), list) else []
+    inventory = Inventory.parse(state.get("inventory"))
     gold = int(state.get("gold", 0) or 0)
 
     atk = int(state.get("atk", 0) or 0)
@@ -292,7 +192,12 @@ async def _apply_effects(user_id: int, effects: Any) -> str:
     import db
     state = await _story_get_state(user_id)
     story_flags = state.get("story_flags", {}) if isinstance(state.get("story_flags", {}), dict) else {}
-    inventory = state.get("inventory", []) if isinstance(state.get("inventory", []), list) else []
+    inventory = Inventory.parse(state.get("inventory"))
+    gold = int(state.get("gold", 0) or 0)
+
+    # 所持品とゴールドの増減は最後に apply_inventory_delta で 1 回だけ反映する
+    item_delta: dict[str, int] = {}
+    gold_delta = 0
 
     reward_lines: list[str] = []
 
@@ -307,20 +212,25 @@ async def _apply_effects(user_id: int, effects: Any) -> str:
                 once = bool(eff.get("once"))
                 if once and item in inventory:
                     continue
-                await db.add_item_to_inventory(user_id, item)
                 inventory.append(item)
+                item_delta[item] = item_delta.get(item, 0) + 1
                 reward_lines.append(f"📦 **{item}** を手に入れた！")
 
         elif etype == "inventory.remove":
             item = str(eff.get("item") or "")
             if item:
-                await db.remove_item_from_inventory(user_id, item)
+                # 持っていない場合は従来通り何もしない
+                if item in inventory:
+                    inventory.remove(item)
+                    item_delta[item] = item_delta.get(item, 0) - 1
                 reward_lines.append(f"📦 **{item}** を失った…")
 
         elif etype == "gold.add":
             amount = int(eff.get("amount") or 0)
             if amount:
-                await db.add_gold(user_id, amount)
+                # 所持金より多く減らす場合は 0 まで
+                amount = max(amount, -(gold + gold_delta))
+                gold_delta += amount
                 sign = "+" if amount > 0 else ""
                 reward_lines.append(f"💰 {sign}{amount}G")
 
@@ -360,6 +270,9 @@ async def _apply_effects(user_id: int, effects: Any) -> str:
         else:
             continue
 
+    if item_delta or gold_delta:
+        await db.apply_inventory_delta(user_id, item_delta, gold_delta)
+
     return "\n".join(reward_lines)
 
 
@@ -410,7 +323,11 @@ async def _apply_next_after_minigame(
 
 STORY_DATA = {}  # moved to stories/_builtin_stories.json
 
-class StoryView(View):
+class StoryView(PersistentView):
+    persistent_kind = "story"
+    # 従来もタイムアウトで user_processing を解除していない
+    release_on_expire = False
+
     def __init__(self, user_id: int, story_id: str, user_processing: dict, callback_data: dict = None, node_id: str = None):
         super().__init__(timeout=300)
         self.user_id = user_id
@@ -426,6 +343,21 @@ class StoryView(View):
         self.current_node_id = node_id or story.get("start_node", "start")
         self._load_current_node()
 
+    def persistent_state(self):
+        # ボス戦前のストーリー（callback_data に ctx を持つ）は常駐 View のまま
+        if self.callback_data:
+            return None
+        return {"story_id": self.story_id, "node_id": self.current_node_id, "page": self.current_page}
+
+    @classmethod
+    async def restore(cls, user_id: int, state: dict, interaction: discord.Interaction):
+        from bot_state import attach_bot_state
+
+        view = cls(user_id, str(state.get("story_id")), attach_bot_state(interaction.client), node_id=state.get("node_id"))
+        view.current_page = int(state.get("page", 0))
+        view.ctx = interaction_context(interaction)
+        return view
+
     def _load_current_node(self):
         node = self._story_def.get("nodes", {}).get(self.current_node_id)
         if not isinstance(node, dict):
@@ -271,6 +271,231 @@ alter table if exists public.user_behavior_stats
 alter table if exists public.user_behavior_stats
   add column if not exists last_updated timestamptz;
 
+-- ============================================================
+-- admin_player_stats (aggregate RPC for !admin_stats)
+-- ============================================================
+-- Used by db.py: /rest/v1/rpc/admin_player_stats
+-- 全プレイヤー行をBOTに転送せず、集計結果だけを jsonb で返す。
+
+create index if not exists players_distance_idx on public.players (distance desc);
+create index if not exists death_history_died_at_idx on public.death_history (died_at desc);
+
+create or replace function public.admin_player_stats(
+  active_window_hours integer default 24,
+  top_n integer default 5,
+  zone_size integer default 1000
+)
+returns jsonb
+language sql
+stable
+as $$
+  with window_start as (
+    select now() - make_interval(hours => greatest(active_window_hours, 1)) as ts
+  )
+  select jsonb_build_object(
+    'total_players', (select count(*) from public.players),
+    'active_players', (select count(*) from public.players where coalesce(distance, 0) > 0),
+    'active_in_window', (
+      select count(*) from public.user_behavior_stats, window_start
+      where last_active >= window_start.ts
+    ),
+    'banned_players', (select count(*) from public.players where is_banned),
+    'total_deaths', (select count(*) from public.death_history),
+    'deaths_in_window', (
+      select count(*) from public.death_history, window_start
+      where died_at >= window_start.ts
+    ),
+    'distance_histogram', coalesce((
+      select jsonb_agg(jsonb_build_object('zone', zone, 'players', players) order by zone)
+      from (
+        select (coalesce(distance, 0) / greatest(zone_size, 1)) as zone, count(*) as players
+        from public.players
+        group by 1
+      ) z
+    ), '[]'::jsonb),
+    'top_by_distance', coalesce((
+      select jsonb_agg(jsonb_build_object('user_id', user_id, 'name', name, 'distance', distance))
+      from (
+        select user_id, name, coalesce(distance, 0) as distance
+        from public.players
+        order by distance desc nulls last
+        limit greatest(top_n, 0)
+      ) t
+    ), '[]'::jsonb),
+    'window_hours', active_window_hours,
+    'zone_size', zone_size,
+    'generated_at', now()
+  );
+$$;
+
+-- ============================================================
+-- request_dedup / idempotent_insert (idempotency keys for inserts)
+-- ============================================================
+-- Used by db.py: /rest/v1/rpc/idempotent_insert
+-- タイムアウトや 5xx の後のリトライ（およびジャーナルの再送）で、実は成功していた INSERT を
+-- 二重に適用しないため、クライアントが生成したキーを記録し、同じキーは最初の結果を返す。
+-- キーの記録と INSERT は同じトランザクションで行う。古いキーは呼び出しの一部で掃除する。
+
+create table if not exists public.request_dedup (
+  key text primary key,
+  op text not null,
+  response jsonb,
+  created_at timestamptz not null default now()
+);
+
+create index if not exists request_dedup_created_at_idx on public.request_dedup (created_at);
+
+create or replace function public.idempotent_insert(
+  p_key text,
+  p_table text,
+  p_rows jsonb
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v_columns text;
+  v_result jsonb;
+begin
+  insert into public.request_dedup (key, op) values (p_key, p_table)
+  on conflict (key) do nothing;
+  if not found then
+    -- 適用済み（同時に来た同じキーは、先の呼び出しのコミットを待ってからここに来る）
+    select response into v_result from public.request_dedup where key = p_key;
+    return coalesce(v_result, '[]'::jsonb);
+  end if;
+
+  if jsonb_typeof(p_rows) = 'object' then
+    p_rows := jsonb_build_array(p_rows);
+  end if;
+
+  -- 本文にある列だけを INSERT する（無い列は既定値のまま）
+  select string_agg(quote_ident(k), ', ')
+    into v_columns
+    from (select distinct jsonb_object_keys(r) as k from jsonb_array_elements(p_rows) r) c;
+
+  execute format(
+    'with ins as (insert into public.%1$I (%2$s) select %2$s from jsonb_populate_recordset(null::public.%1$I, $1) returning *) '
+    'select coalesce(jsonb_agg(to_jsonb(ins)), ''[]''::jsonb) from ins',
+    p_table, v_columns
+  ) using p_rows into v_result;
+
+  update public.request_dedup set response = v_result where key = p_key;
+
+  if random() < 0.001 then
+    delete from public.request_dedup where created_at < now() - interval '3 days';
+  end if;
+  return v_result;
+end;
+$$;
+
+-- ============================================================
+-- players.inventory as a counted multiset + apply_inventory_delta
+-- ============================================================
+-- Used by db.py: /rest/v1/rpc/apply_inventory_delta
+-- 所持品は {"薬草": 3} 形式（旧形式 ["薬草","薬草","薬草"] は BOT 側でも読めるが、ここで一括変換する）。
+-- 売却・合成・ストーリー効果・ドロップの増減とゴールドの増減を、行ロックの中で検証して 1 回で反映する。
+-- 個数やゴールドが足りない場合は何も変更せず {"ok": false, "reason": ...} を返す。
+-- p_key を渡すと request_dedup で同じ要求の二重適用を防ぐ（リトライ用）。
+
+do $$
+begin
+  if exists (
+    select 1 from information_schema.columns
+    where table_schema = 'public' and table_name = 'players' and column_name = 'inventory'
+      and data_type <> 'jsonb'
+  ) then
+    alter table public.players alter column inventory type jsonb using to_jsonb(inventory);
+  end if;
+end $$;
+
+update public.players p
+set inventory = coalesce((
+  select jsonb_object_agg(item, n)
+  from (
+    select value #>> '{}' as item, count(*) as n
+    from jsonb_array_elements(p.inventory)
+    where value #>> '{}' is not null and value #>> '{}' <> ''
+    group by 1
+  ) s
+), '{}'::jsonb)
+where jsonb_typeof(p.inventory) = 'array';
+
+create or replace function public.apply_inventory_delta(
+  p_user_id text,
+  p_delta jsonb,
+  p_gold_delta bigint default 0,
+  p_key text default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v_inventory jsonb;
+  v_gold bigint;
+  v_item text;
+  v_change bigint;
+  v_count bigint;
+  v_result jsonb;
+begin
+  if p_key is not null then
+    insert into public.request_dedup (key, op) values (p_key, 'apply_inventory_delta')
+    on conflict (key) do nothing;
+    if not found then
+      select response into v_result from public.request_dedup where key = p_key;
+      return v_result;
+    end if;
+  end if;
+
+  select inventory, coalesce(gold, 0) into v_inventory, v_gold
+  from public.players where user_id = p_user_id
+  for update;
+
+  if not found then
+    v_result := jsonb_build_object('ok', false, 'reason', 'no_player');
+  else
+    if v_inventory is null or jsonb_typeof(v_inventory) not in ('object', 'array') then
+      v_inventory := '{}'::jsonb;
+    elsif jsonb_typeof(v_inventory) = 'array' then
+      select coalesce(jsonb_object_agg(item, n), '{}'::jsonb) into v_inventory
+      from (
+        select value #>> '{}' as item, count(*) as n
+        from jsonb_array_elements(v_inventory)
+        where value #>> '{}' is not null and value #>> '{}' <> ''
+        group by 1
+      ) s;
+    end if;
+
+    for v_item, v_change in select key, value::bigint from jsonb_each_text(coalesce(p_delta, '{}'::jsonb)) loop
+      v_count := coalesce((v_inventory ->> v_item)::bigint, 0) + v_change;
+      if v_count < 0 then
+        v_result := jsonb_build_object('ok', false, 'reason', 'insufficient_items', 'item', v_item);
+        exit;
+      elsif v_count = 0 then
+        v_inventory := v_inventory - v_item;
+      else
+        v_inventory := jsonb_set(v_inventory, array[v_item], to_jsonb(v_count));
+      end if;
+    end loop;
+
+    if v_result is null and v_gold + coalesce(p_gold_delta, 0) < 0 then
+      v_result := jsonb_build_object('ok', false, 'reason', 'insufficient_gold');
+    end if;
+
+    if v_result is null then
+      v_gold := v_gold + coalesce(p_gold_delta, 0);
+      update public.players set inventory = v_inventory, gold = v_gold where user_id = p_user_id;
+      v_result := jsonb_build_object('ok', true, 'inventory', v_inventory, 'gold', v_gold);
+    end if;
+  end if;
+
+  if p_key is not null then
+    update public.request_dedup set response = v_result where key = p_key;
+  end if;
+  return v_result;
+end;
+$$;
+
 commit;
 
 -- ============================================================
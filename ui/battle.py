@@ -5,7 +5,7 @@ import asyncio
 import game
 import config
 import logging
-from discord.ui import View, button, Select
+from discord.ui import button, Select
 from db import get_player, update_player, delete_player
 import death_system
 from titles import get_title_rarity_emoji, get_title_rarity_color
@@ -21,8 +21,91 @@ from ui.events import FinalBossClearView
 
 logger = logging.getLogger("rpgbot")
 from ui.common import handle_death_with_triggers, finalize_view_on_timeout
+from ui.battle_session import BattleSession
+from ui.persistent import PersistentView, interaction_context
+from ui.render_queue import render_queue
+
+
+class BattleViewBase(PersistentView):
+    """戦闘 View の共通部分（デプロイ / 再起動をまたいで戦闘を続ける）
+
+    プロセス内では keep_live で同じインスタンス（ターンをまたぐ _battle_lock と BattleSession）に
+    クリックを渡す。再起動後の最初のクリックでは、保存した敵 / プレイヤー / セッション
+    （未書き戻しの HP や獲得品を含む）から作り直す。戦闘後のフック（post_battle_hook）は
+    保存できないので、フック付きの戦闘は従来通り常駐 View のまま動く。
+    """
+
+    keep_live = True
+    skill_select_id = "skill_select"
+
+    @property
+    def user_id(self) -> int:
+        return self.session.user_id
+
+    def battle_state(self) -> dict | None:
+        """敵の状態など（サブクラスで実装。None なら保存しない）"""
+        raise NotImplementedError
+
+    @classmethod
+    def from_state(cls, ctx, state: dict, user_processing: dict):
+        raise NotImplementedError
+
+    def persistent_state(self):
+        state = self.battle_state()
+        if state is None:
+            return None
+        return {**state, "player": dict(self.player), "session": self.session.snapshot()}
+
+    def persistent_finished(self) -> bool:
+        return self.session.closed
+
+    @classmethod
+    async def restore(cls, user_id: int, state: dict, interaction: discord.Interaction):
+        from bot_state import attach_bot_state
+
+        view = cls.from_state(interaction_context(interaction), state, attach_bot_state(interaction.client))
+        # 装備ボーナスは保存した player に反映済みなので _async_init は通さない
+        view.session = BattleSession.from_snapshot(user_id, state.get("session") or {})
+        if "user_id" in view.player:
+            view._add_skill_select()
+        view.message = interaction.message
+        return view
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # 作り直した View の ctx.author は押した人になるので、戦闘の持ち主かはここで確かめる
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("これはあなたの戦闘ではありません！", ephemeral=True)
+            return False
+        return True
+
+    def _add_skill_select(self):
+        unlocked_skills = self.session.unlocked_skills
+        if not unlocked_skills:
+            return
+        skill_options = []
+        for skill_id in unlocked_skills[:SELECT_MAX_OPTIONS]:
+            skill_info = game.get_skill_info(skill_id)
+            if skill_info:
+                skill_options.append(discord.SelectOption(
+                    label=skill_info["name"],
+                    description=f"MP:{skill_info['mp_cost']} - {skill_info['description'][:50]}",
+                    value=skill_id
+                ))
+
+        if skill_options:
+            skill_select = discord.ui.Select(
+                placeholder="スキルを選択",
+                options=skill_options,
+                custom_id=self.skill_select_id
+            )
+            skill_select.callback = self.use_skill
+            self.add_item(skill_select)
+
+
+class FinalBossBattleView(BattleViewBase):
+    persistent_kind = "final_boss_battle"
+    skill_select_id = "final_skill_select"
 
-class FinalBossBattleView(View):
     def __init__(self, ctx, player, boss, user_processing: dict, boss_stage: int):
         super().__init__(timeout=None)
         self.ctx = ctx
@@ -33,6 +116,7 @@ class FinalBossBattleView(View):
         self.user_processing = user_processing
         self.boss_stage = boss_stage
         self._battle_lock = asyncio.Lock()
+        self.session = BattleSession(ctx.author.id, None)  # _async_init で読み込む
 
     @classmethod
     async def create(cls, ctx, player, boss, user_processing: dict, boss_stage: int):
@@ -41,10 +125,21 @@ class FinalBossBattleView(View):
         await instance._async_init()
         return instance
 
+    def battle_state(self):
+        return {"boss": self.boss, "boss_stage": self.boss_stage, "boss_max_hp": getattr(self, "_boss_max_hp", None)}
+
+    @classmethod
+    def from_state(cls, ctx, state: dict, user_processing: dict):
+        view = cls(ctx, state["player"], state["boss"], user_processing, int(state["boss_stage"]))
+        if state.get("boss_max_hp") is not None:
+            view._boss_max_hp = int(state["boss_max_hp"])
+        return view
+
     async def _async_init(self):
         """Async initialization logic"""
+        self.session = await BattleSession.load(self.player.get("user_id", self.ctx.author.id))
         if "user_id" in self.player:
-            fresh_player = await db.get_player(self.player["user_id"])
+            fresh_player = self.session.get_player()
             if fresh_player:
                 self.player.update({
                     "hp": fresh_player.get("hp", self.player.get("hp", 50)),
@@ -55,30 +150,11 @@ class FinalBossBattleView(View):
                     "defense": fresh_player.get("def", self.player.get("defense", 2))
                 })
             
-            equipment_bonus = await game.calculate_equipment_bonus(self.player["user_id"])
+            equipment_bonus = self.session.equipment_bonus
             self.player["attack"] = self.player.get("attack", 5) + equipment_bonus["attack_bonus"]
             self.player["defense"] = self.player.get("defense", 2) + equipment_bonus["defense_bonus"]
 
-            unlocked_skills = await db.get_unlocked_skills(self.player["user_id"])
-            if unlocked_skills:
-                skill_options = []
-                for skill_id in unlocked_skills[:SELECT_MAX_OPTIONS]:
-                    skill_info = game.get_skill_info(skill_id)
-                    if skill_info:
-                        skill_options.append(discord.SelectOption(
-                            label=skill_info["name"],
-                            description=f"MP:{skill_info['mp_cost']} - {skill_info['description'][:50]}",
-                            value=skill_id
-                        ))
-
-                if skill_options:
-                    skill_select = discord.ui.Select(
-                        placeholder="スキルを選択",
-                        options=skill_options,
-                        custom_id="final_skill_select"
-                    )
-                    skill_select.callback = self.use_skill
-                    self.add_item(skill_select)
+            self._add_skill_select()
 
     async def send_initial_embed(self):
         embed = await self.create_battle_embed()
@@ -98,7 +174,7 @@ class FinalBossBattleView(View):
         max_mp = None
         max_hp = int(self.player.get("max_hp", player_hp) or player_hp or 0)
         if "user_id" in self.player:
-            player_data = await db.get_player(self.player["user_id"])
+            player_data = self.session.get_player()
             if player_data:
                 mp = int(player_data.get("mp", 20) or 20)
                 max_mp = int(player_data.get("max_mp", 20) or 20)
@@ -209,7 +285,8 @@ class FinalBossBattleView(View):
         if text:
             log_text = self._format_battle_log(text)
             embed.description += f"\n\n— 戦闘ログ —\n{log_text}"
-        await self.message.edit(embed=embed, view=self)
+        # 描画キュー経由で送る（送信待ちの古いフレームは最新の状態にまとめられる）
+        render_queue.submit(self.message, embed=embed, view=self)
 
     # =====================================
     # ✨ スキル使用
@@ -227,10 +304,10 @@ class FinalBossBattleView(View):
                 # ボタンを即座に無効化
                 for child in self.children:
                     child.disabled = True
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
 
                 # ✅ プレイヤーデータを最新化
-                fresh_player_data = await db.get_player(interaction.user.id)
+                fresh_player_data = self.session.get_player()
                 if fresh_player_data:
                     self.player["hp"] = fresh_player_data.get("hp", self.player["hp"])
                     self.player["mp"] = fresh_player_data.get("mp", self.player.get("mp", 20))
@@ -240,7 +317,7 @@ class FinalBossBattleView(View):
                     # ✅ 装備ボーナスを再計算してattackとdefenseを更新
                     base_atk = fresh_player_data.get("atk", 5)
                     base_def = fresh_player_data.get("def", 2)
-                    equipment_bonus = await game.calculate_equipment_bonus(interaction.user.id)
+                    equipment_bonus = self.session.equipment_bonus
                     self.player["attack"] = base_atk + equipment_bonus["attack_bonus"]
                     self.player["defense"] = base_def + equipment_bonus["defense_bonus"]
                     if config.VERBOSE_DEBUG:
@@ -253,13 +330,13 @@ class FinalBossBattleView(View):
                             self.player["attack"],
                         )
 
-                if await db.is_mp_stunned(interaction.user.id):
-                    await db.set_mp_stunned(interaction.user.id, False)
+                if self.session.is_mp_stunned():
+                    self.session.set_mp_stunned(False)
                     await interaction.response.send_message("⚠️ MP枯渇で行動不能！\n『嘘だろ!?』\n次のターンから行動可能になります。", ephemeral=True)
                     # ボタンを再有効化
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return
 
                 skill_id = interaction.data['values'][0]
@@ -268,28 +345,28 @@ class FinalBossBattleView(View):
                 if not skill_info:
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return await interaction.response.send_message("⚠️ スキル情報が見つかりません。", ephemeral=True)
 
-                player_data = await db.get_player(interaction.user.id)
+                player_data = self.session.get_player()
                 current_mp = player_data.get("mp", 20)
                 mp_cost = skill_info["mp_cost"]
 
                 if current_mp < mp_cost:
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return await interaction.response.send_message(f"⚠️ MPが足りません！（必要: {mp_cost}, 現在: {current_mp}）", ephemeral=True)
 
-                if not await db.consume_mp(interaction.user.id, mp_cost):
+                if not self.session.consume_mp(mp_cost):
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return await interaction.response.send_message("⚠️ MP消費に失敗しました。", ephemeral=True)
 
-                player_data = await db.get_player(interaction.user.id)
+                player_data = self.session.get_player()
                 if player_data and player_data.get("mp", 0) == 0:
-                    await db.set_mp_stunned(interaction.user.id, True)
+                    self.session.set_mp_stunned(True)
 
                 text = f"✨ **{skill_info['name']}** を使用！（MP -{mp_cost}）\n"
 
@@ -300,22 +377,23 @@ class FinalBossBattleView(View):
                     text += f"⚔️ {skill_damage} のダメージを与えた！"
 
                     if self.boss["hp"] <= 0:
-                        await db.update_player(interaction.user.id, hp=self.player["hp"])
+                        await self.session.commit_turn(self.player["hp"])
                         distance = self.player.get("distance", 0)
                         drop_result = game.get_enemy_drop(self.boss["name"], distance)
 
                         drop_text = ""
                         if drop_result:
                             if drop_result["type"] == "coins":
-                                await db.add_gold(interaction.user.id, drop_result["amount"])
+                                self.session.add_gold(drop_result["amount"])
                                 drop_text = f"\n💰 **{drop_result['amount']}コイン** を手に入れた！"
                             elif drop_result["type"] == "item":
-                                await db.add_item_to_inventory(interaction.user.id, drop_result["name"])
+                                self.session.add_item(drop_result["name"])
                                 drop_text = f"\n🎁 **{drop_result['name']}** を手に入れた！"
 
                         await self.update_embed(text + "\n🏆 敵を倒した！" + drop_text)
+                        await self.session.close()
                         self.disable_all_items()
-                        await self.message.edit(view=self)
+                        render_queue.submit(self.message, view=self)
                         if self.ctx.author.id in self.user_processing:
                             self.user_processing[self.ctx.author.id] = False
                         await interaction.response.defer()
@@ -327,6 +405,7 @@ class FinalBossBattleView(View):
                     text += f"\n敵の反撃！ {enemy_dmg} のダメージを受けた！"
 
                     if self.player["hp"] <= 0:
+                        self.session.discard()
                         death_result = await handle_death_with_triggers(
                             self.ctx if hasattr(self, 'ctx') else interaction.channel,
                             interaction.user.id, 
@@ -338,8 +417,9 @@ class FinalBossBattleView(View):
                             await self.update_embed(text + f"\n💀 あなたは倒れた…\n\n🔄 リスタート\n📍 アップグレードポイント: +{death_result['points']}pt")
                         else:
                             await self.update_embed(text + "\n💀 あなたは倒れた…")
+                        await self.session.close()
                         self.disable_all_items()
-                        await self.message.edit(view=self)
+                        render_queue.submit(self.message, view=self)
                         if self.ctx.author.id in self.user_processing:
                             self.user_processing[self.ctx.author.id] = False
                         await interaction.response.defer()
@@ -353,12 +433,12 @@ class FinalBossBattleView(View):
                     actual_heal = self.player["hp"] - old_hp
                     text += f"💚 HP+{actual_heal} 回復した！"
 
-                await db.update_player(interaction.user.id, hp=self.player["hp"])
+                await self.session.commit_turn(self.player["hp"])
                 await self.update_embed(text)
                 # ボタンを再有効化
                 for child in self.children:
                     child.disabled = False
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
                 await interaction.response.defer()
             
             except Exception as e:
@@ -367,7 +447,7 @@ class FinalBossBattleView(View):
                 for child in self.children:
                     child.disabled = False
                 try:
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     if not interaction.response.is_done():
                         await interaction.response.send_message("⚠️ エラーが発生しました。もう一度お試しください。", ephemeral=True)
                 except:
@@ -389,15 +469,15 @@ class FinalBossBattleView(View):
                 # ボタンを即座に無効化
                 for child in self.children:
                     child.disabled = True
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
 
-                if await db.is_mp_stunned(interaction.user.id):
-                    await db.set_mp_stunned(interaction.user.id, False)
+                if self.session.is_mp_stunned():
+                    self.session.set_mp_stunned(False)
                     text = "⚠️ MP枯渇で行動不能…次のターンから行動可能になります。"
                     await self.update_embed(text)
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return
 
                 # プレイヤー攻撃
@@ -405,7 +485,7 @@ class FinalBossBattleView(View):
 
                 # ability効果を適用
                 enemy_type = "boss"
-                equipment_bonus = await game.calculate_equipment_bonus(self.player["user_id"]) if "user_id" in self.player else {}
+                equipment_bonus = self.session.equipment_bonus
                 weapon_ability = equipment_bonus.get("weapon_ability", "")
 
                 ability_result = game.apply_ability_effects(base_damage, weapon_ability, self.player["hp"], enemy_type)
@@ -436,14 +516,14 @@ class FinalBossBattleView(View):
 
                 if self.boss["hp"] <= 0:
                     # HPを保存
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     await db.set_boss_defeated(interaction.user.id, self.boss_stage)
 
                     reward_gold = random.randint(
                         balance_settings.REWARD_GOLD_BOSS_MIN,
                         balance_settings.REWARD_GOLD_BOSS_MAX,
                     )
-                    await db.add_gold(interaction.user.id, reward_gold)
+                    self.session.add_gold(reward_gold)
 
                     embed = discord.Embed(
                         title="🎉 ダンジョンクリア！",
@@ -451,48 +531,49 @@ class FinalBossBattleView(View):
                         color=discord.Color.gold()
                     )
 
+                    await self.session.close()
                     self.disable_all_items()
 
                     # ラスボスクリア時の選択Viewを表示（攻撃ログは1拍置いてから結果表示）
                     await self._staged_update(first_text=player_text, second_text=None, first_delay=1.0)
                     clear_view = await FinalBossClearView.create(interaction.user.id, self.ctx, self.user_processing, self.boss_stage)
-                    await interaction.message.edit(embed=embed, view=clear_view)
+                    await render_queue.edit(interaction.message, embed=embed, view=clear_view)
                     return
 
                 # 怯み効果で敵がスキップ
                 if ability_result.get("enemy_flinch", False):
                     text = player_text + "\nラスボスは怯んで動けない！"
                     # HPを保存
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     await self._staged_update(first_text=text, second_text=None, first_delay=1.0)
 
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return
 
                 # 凍結効果で敵がスキップ
                 if ability_result.get("enemy_freeze", False):
                     text = player_text + "\nラスボスは凍りついて動けない！"
                     # HPを保存
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     await self._staged_update(first_text=text, second_text=None, first_delay=1.0)
 
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return
 
                 # 麻痺効果で敵がスキップ
                 if ability_result.get("paralyze", False):
                     text = player_text + "\nラスボスは麻痺して動けない！"
                     # HPを保存
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     await self._staged_update(first_text=text, second_text=None, first_delay=1.0)
 
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return
 
                 # ラスボス反撃
@@ -525,14 +606,14 @@ class FinalBossBattleView(View):
                     if armor_result["counter_damage"] > 0:
                         self.boss["hp"] -= armor_result["counter_damage"]
                         if self.boss["hp"] <= 0:
-                            await db.update_player(interaction.user.id, hp=self.player["hp"])
+                            await self.session.commit_turn(self.player["hp"])
                             text += "\n反撃でラスボスを倒した！"
                             await db.set_boss_defeated(interaction.user.id, self.boss_stage)
                             reward_gold = random.randint(
                                 balance_settings.REWARD_GOLD_BOSS_MIN,
                                 balance_settings.REWARD_GOLD_BOSS_MAX,
                             )
-                            await db.add_gold(interaction.user.id, reward_gold)
+                            self.session.add_gold(reward_gold)
                             embed = discord.Embed(
                                 title="🎉 ダンジョンクリア！",
                                 description=f"反撃で **{self.boss['name']}** を倒した！\n\n🏆 ダンジョンを踏破した――\n💰 {reward_gold}ゴールドを手に入れた！",
@@ -543,8 +624,9 @@ class FinalBossBattleView(View):
                                 value="インベントリから1つアイテムを選んで倉庫に保管できます。\n次回 `!start` 時に倉庫から取り出せます。", 
                                 inline=False
                             )
+                            await self.session.close()
                             self.disable_all_items()
-                            await interaction.message.edit(embed=embed, view=None)
+                            await render_queue.edit(interaction.message, embed=embed, view=None)
                             await self._staged_update(first_text=text, second_text=None, first_delay=1.0)
 
                             storage_view = await FinalBossClearView.create(interaction.user.id, self.ctx, self.user_processing, self.boss_stage)
@@ -560,14 +642,14 @@ class FinalBossBattleView(View):
                     if armor_result["reflect_damage"] > 0:
                         self.boss["hp"] -= armor_result["reflect_damage"]
                         if self.boss["hp"] <= 0:
-                            await db.update_player(interaction.user.id, hp=self.player["hp"])
+                            await self.session.commit_turn(self.player["hp"])
                             text += "\n反射ダメージでラスボスを倒した！"
                             await db.set_boss_defeated(interaction.user.id, self.boss_stage)
                             reward_gold = random.randint(
                                 balance_settings.REWARD_GOLD_BOSS_MIN,
                                 balance_settings.REWARD_GOLD_BOSS_MAX,
                             )
-                            await db.add_gold(interaction.user.id, reward_gold)
+                            self.session.add_gold(reward_gold)
                             embed = discord.Embed(
                                 title="🎉 ダンジョンクリア！",
                                 description=f"反射ダメージで **{self.boss['name']}** を倒した！\n\n🏆 ダンジョンを制覇した！\n💰 {reward_gold}ゴールドを手に入れた！",
@@ -578,8 +660,9 @@ class FinalBossBattleView(View):
                                 value="インベントリから1つアイテムを選んで倉庫に保管できます。\n次回 `!start` 時に倉庫から取り出せます。", 
                                 inline=False
                             )
+                            await self.session.close()
                             self.disable_all_items()
-                            await interaction.message.edit(embed=embed, view=None)
+                            await render_queue.edit(interaction.message, embed=embed, view=None)
                             await self._staged_update(first_text=text, second_text=None, first_delay=1.0)
 
                             storage_view = await FinalBossClearView.create(interaction.user.id, self.ctx, self.user_processing, self.boss_stage)
@@ -600,6 +683,7 @@ class FinalBossBattleView(View):
                         self.player["hp"] = 1
                         text += "\n蘇生効果で生き残った！"
                     else:
+                        self.session.discard()
                         death_result = await handle_death_with_triggers(
                             self.ctx if hasattr(self, 'ctx') else interaction.channel,
                             interaction.user.id, 
@@ -613,26 +697,27 @@ class FinalBossBattleView(View):
                             )
                         else:
                             await self.update_embed(text + "\n💀 あなたは倒れた…")
+                        await self.session.close()
                         self.disable_all_items()
-                        await self.message.edit(view=self)
+                        render_queue.submit(self.message, view=self)
                         if self.ctx.author.id in self.user_processing:
                             self.user_processing[self.ctx.author.id] = False
                         return
 
                 # HPを保存
-                await db.update_player(interaction.user.id, hp=self.player["hp"])
+                await self.session.commit_turn(self.player["hp"])
                 await self._staged_update(first_text=player_text, second_text=text, first_delay=1.0, second_delay=0.5)
 
                 for child in self.children:
                     child.disabled = False
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
                 return
             except Exception as e:
                 logger.exception("[FinalBossBattleView] fight error: %s", e)
                 for child in self.children:
                     child.disabled = False
                 try:
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                 except Exception:
                     pass
                 return
@@ -652,14 +737,14 @@ class FinalBossBattleView(View):
                 self.boss["hp"] -= armor_result["counter_damage"]
                 if self.boss["hp"] <= 0:
                     # HPを保存
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     text += "\n反撃でラスボスを倒した！"
                     await db.set_boss_defeated(interaction.user.id, self.boss_stage)
                     reward_gold = random.randint(
                         balance_settings.REWARD_GOLD_BOSS_MIN,
                         balance_settings.REWARD_GOLD_BOSS_MAX,
                     )
-                    await db.add_gold(interaction.user.id, reward_gold)
+                    self.session.add_gold(reward_gold)
                     embed = discord.Embed(
                         title="🎉 ダンジョンクリア！",
                         description=f"反撃で **{self.boss['name']}** を倒した！\n\n🏆 ダンジョンを踏破した――\n💰 {reward_gold}ゴールドを手に入れた！",
@@ -670,8 +755,9 @@ class FinalBossBattleView(View):
                         value="インベントリから1つアイテムを選んで倉庫に保管できます。\n次回 `!start` 時に倉庫から取り出せます。", 
                         inline=False
                     )
+                    await self.session.close()
                     self.disable_all_items()
-                    await interaction.message.edit(embed=embed, view=None)
+                    await render_queue.edit(interaction.message, embed=embed, view=None)
                     # 反撃/反射で勝利した場合も、ログを1回だけ見せてから結果へ
                     await self._staged_update(first_text=text, second_text=None, first_delay=1.0)
 
@@ -690,14 +776,14 @@ class FinalBossBattleView(View):
                 self.boss["hp"] -= armor_result["reflect_damage"]
                 if self.boss["hp"] <= 0:
                     # HPを保存
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     text += "\n反射ダメージでラスボスを倒した！"
                     await db.set_boss_defeated(interaction.user.id, self.boss_stage)
                     reward_gold = random.randint(
                         balance_settings.REWARD_GOLD_BOSS_MIN,
                         balance_settings.REWARD_GOLD_BOSS_MAX,
                     )
-                    await db.add_gold(interaction.user.id, reward_gold)
+                    self.session.add_gold(reward_gold)
                     embed = discord.Embed(
                         title="🎉 ダンジョンクリア！",
                         description=f"反射ダメージで **{self.boss['name']}** を倒した！\n\n🏆 ダンジョンを制覇した！\n💰 {reward_gold}ゴールドを手に入れた！",
@@ -708,8 +794,9 @@ class FinalBossBattleView(View):
                         value="インベントリから1つアイテムを選んで倉庫に保管できます。\n次回 `!start` 時に倉庫から取り出せます。", 
                         inline=False
                     )
+                    await self.session.close()
                     self.disable_all_items()
-                    await interaction.message.edit(embed=embed, view=None)
+                    await render_queue.edit(interaction.message, embed=embed, view=None)
                     await self._staged_update(first_text=text, second_text=None, first_delay=1.0)
 
                     # アイテム持ち帰りViewを表示
@@ -735,6 +822,7 @@ class FinalBossBattleView(View):
                     await interaction.response.defer()
 
                     # 死亡処理 + トリガーチェック
+                    self.session.discard()
                     death_result = await handle_death_with_triggers(
                         self.ctx,
                         interaction.user.id,
@@ -762,8 +850,9 @@ class FinalBossBattleView(View):
                     else:
                         await self.update_embed(text + "\n💀 あなたは倒れた…")
 
+                    await self.session.close()
                     self.disable_all_items()
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
 
                     if self.ctx.author.id in self.user_processing:
                         self.user_processing[self.ctx.author.id] = False
@@ -771,13 +860,13 @@ class FinalBossBattleView(View):
 
             # 生存している場合
             # HPを保存
-            await db.update_player(interaction.user.id, hp=self.player["hp"])
+            await self.session.commit_turn(self.player["hp"])
             await self._staged_update(first_text=player_text, second_text=text, first_delay=1.0, second_delay=0.5)
 
             # ✅ 修正: ボタンを再有効化
             for child in self.children:
                 child.disabled = False
-            await self.message.edit(view=self)
+            render_queue.submit(self.message, view=self)
 
     @button(label="防御", style=discord.ButtonStyle.secondary, emoji="🛡️")
     async def defend(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -793,7 +882,7 @@ class FinalBossBattleView(View):
             # ボタンを即座に無効化
             for child in self.children:
                 child.disabled = True
-            await self.message.edit(view=self)
+            render_queue.submit(self.message, view=self)
 
         reduction = random.randint(
             balance_settings.DAMAGE_REDUCTION_HIGH_MIN,
@@ -812,6 +901,7 @@ class FinalBossBattleView(View):
             await interaction.response.defer()
 
             # 死亡処理 + トリガーチェック
+            self.session.discard()
             death_result = await handle_death_with_triggers(
                 self.ctx,
                 interaction.user.id,
@@ -839,32 +929,37 @@ class FinalBossBattleView(View):
             else:
                 await self.update_embed(text + "\n💀 あなたは倒れた…")
 
+            await self.session.close()
             self.disable_all_items()
-            await self.message.edit(view=self)
+            render_queue.submit(self.message, view=self)
 
             if self.ctx.author.id in self.user_processing:
                 self.user_processing[self.ctx.author.id] = False
             return
 
         # 生存している場合
-        await db.update_player(interaction.user.id, hp=self.player["hp"])
+        await self.session.commit_turn(self.player["hp"])
         await self._staged_update(first_text=first_text, second_text=text, first_delay=1.0, second_delay=0.5)
 
         for child in self.children:
             child.disabled = False
-        await self.message.edit(view=self)
+        render_queue.submit(self.message, view=self)
 
     def disable_all_items(self):
         for item in self.children:
             item.disabled = True
 
     async def on_timeout(self):
+        await self.session.close()
         await finalize_view_on_timeout(self, user_processing=self.user_processing, user_id=getattr(self.ctx.author, "id", None))
 
 # ==============================
 # ボス戦View
 # ==============================
-class BossBattleView(View):
+class BossBattleView(BattleViewBase):
+    persistent_kind = "boss_battle"
+    skill_select_id = "boss_skill_select"
+
     def __init__(self, ctx, player, boss, user_processing: dict, boss_stage: int):
         super().__init__(timeout=None)
         self.ctx = ctx
@@ -874,6 +969,7 @@ class BossBattleView(View):
         self.user_processing = user_processing
         self.boss_stage = boss_stage
         self._battle_lock = asyncio.Lock()
+        self.session = BattleSession(ctx.author.id, None)  # _async_init で読み込む
 
     @classmethod
     async def create(cls, ctx, player, boss, user_processing: dict, boss_stage: int):
@@ -882,6 +978,16 @@ class BossBattleView(View):
         await instance._async_init()
         return instance
 
+    def battle_state(self):
+        return {"boss": self.boss, "boss_stage": self.boss_stage, "boss_max_hp": getattr(self, "_boss_max_hp", None)}
+
+    @classmethod
+    def from_state(cls, ctx, state: dict, user_processing: dict):
+        view = cls(ctx, state["player"], state["boss"], user_processing, int(state["boss_stage"]))
+        if state.get("boss_max_hp") is not None:
+            view._boss_max_hp = int(state["boss_max_hp"])
+        return view
+
     async def _async_init(self):
         """Async initialization logic"""
         fresh_boss = game.get_boss(self.boss_stage)
@@ -897,8 +1003,9 @@ class BossBattleView(View):
                     self.boss.get("def"),
                 )
         
+        self.session = await BattleSession.load(self.player.get("user_id", self.ctx.author.id))
         if "user_id" in self.player:
-            fresh_player = await db.get_player(self.player["user_id"])
+            fresh_player = self.session.get_player()
             if fresh_player:
                 self.player.update({
                     "hp": fresh_player.get("hp", self.player.get("hp", 50)),
@@ -909,30 +1016,11 @@ class BossBattleView(View):
                     "defense": fresh_player.get("def", self.player.get("defense", 2))
                 })
             
-            equipment_bonus = await game.calculate_equipment_bonus(self.player["user_id"])
+            equipment_bonus = self.session.equipment_bonus
             self.player["attack"] = self.player.get("attack", 5) + equipment_bonus["attack_bonus"]
             self.player["defense"] = self.player.get("defense", 2) + equipment_bonus["defense_bonus"]
 
-            unlocked_skills = await db.get_unlocked_skills(self.player["user_id"])
-            if unlocked_skills:
-                skill_options = []
-                for skill_id in unlocked_skills[:SELECT_MAX_OPTIONS]:
-                    skill_info = game.get_skill_info(skill_id)
-                    if skill_info:
-                        skill_options.append(discord.SelectOption(
-                            label=skill_info["name"],
-                            description=f"MP:{skill_info['mp_cost']} - {skill_info['description'][:50]}",
-                            value=skill_id
-                        ))
-
-                if skill_options:
-                    skill_select = discord.ui.Select(
-                        placeholder="スキルを選択",
-                        options=skill_options,
-                        custom_id="boss_skill_select"
-                    )
-                    skill_select.callback = self.use_skill
-                    self.add_item(skill_select)
+            self._add_skill_select()
 
     async def send_initial_embed(self):
         embed = await self.create_battle_embed()
@@ -952,7 +1040,7 @@ class BossBattleView(View):
         max_mp = None
         max_hp = int(self.player.get("max_hp", player_hp) or player_hp or 0)
         if "user_id" in self.player:
-            player_data = await db.get_player(self.player["user_id"])
+            player_data = self.session.get_player()
             if player_data:
                 mp = int(player_data.get("mp", 20) or 20)
                 max_mp = int(player_data.get("max_mp", 20) or 20)
@@ -1053,7 +1141,8 @@ class BossBattleView(View):
         if text:
             log_text = self._format_battle_log(text)
             embed.description += f"\n\n— 戦闘ログ —\n{log_text}"
-        await self.message.edit(embed=embed, view=self)
+        # 描画キュー経由で送る（送信待ちの古いフレームは最新の状態にまとめられる）
+        render_queue.submit(self.message, embed=embed, view=self)
 
     # =====================================
     # ✨ スキル使用
@@ -1071,10 +1160,10 @@ class BossBattleView(View):
                 # ボタンを即座に無効化
                 for child in self.children:
                     child.disabled = True
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
 
                 # ✅ プレイヤーデータを最新化
-                fresh_player_data = await db.get_player(interaction.user.id)
+                fresh_player_data = self.session.get_player()
                 if fresh_player_data:
                     self.player["hp"] = fresh_player_data.get("hp", self.player["hp"])
                     self.player["mp"] = fresh_player_data.get("mp", self.player.get("mp", 20))
@@ -1084,7 +1173,7 @@ class BossBattleView(View):
                     # ✅ 装備ボーナスを再計算してattackとdefenseを更新
                     base_atk = fresh_player_data.get("atk", 5)
                     base_def = fresh_player_data.get("def", 2)
-                    equipment_bonus = await game.calculate_equipment_bonus(interaction.user.id)
+                    equipment_bonus = self.session.equipment_bonus
                     self.player["attack"] = base_atk + equipment_bonus["attack_bonus"]
                     self.player["defense"] = base_def + equipment_bonus["defense_bonus"]
                     if config.VERBOSE_DEBUG:
@@ -1097,13 +1186,13 @@ class BossBattleView(View):
                             self.player["attack"],
                         )
 
-                if await db.is_mp_stunned(interaction.user.id):
-                    await db.set_mp_stunned(interaction.user.id, False)
+                if self.session.is_mp_stunned():
+                    self.session.set_mp_stunned(False)
                     await interaction.response.send_message("⚠️ MP枯渇で行動不能！\n『嘘だろ!?』\n次のターンから行動可能になります。", ephemeral=True)
                     # ボタンを再有効化
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return
 
                 skill_id = interaction.data['values'][0]
@@ -1112,28 +1201,28 @@ class BossBattleView(View):
                 if not skill_info:
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return await interaction.response.send_message("⚠️ スキル情報が見つかりません。", ephemeral=True)
 
-                player_data = await db.get_player(interaction.user.id)
+                player_data = self.session.get_player()
                 current_mp = player_data.get("mp", 20)
                 mp_cost = skill_info["mp_cost"]
 
                 if current_mp < mp_cost:
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return await interaction.response.send_message(f"⚠️ MPが足りません！（必要: {mp_cost}, 現在: {current_mp}）", ephemeral=True)
 
-                if not await db.consume_mp(interaction.user.id, mp_cost):
+                if not self.session.consume_mp(mp_cost):
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return await interaction.response.send_message("⚠️ MP消費に失敗しました。", ephemeral=True)
 
-                player_data = await db.get_player(interaction.user.id)
+                player_data = self.session.get_player()
                 if player_data and player_data.get("mp", 0) == 0:
-                    await db.set_mp_stunned(interaction.user.id, True)
+                    self.session.set_mp_stunned(True)
 
                 text = f"✨ **{skill_info['name']}** を使用！（MP -{mp_cost}）\n"
 
@@ -1144,22 +1233,23 @@ class BossBattleView(View):
                     text += f"⚔️ {skill_damage} のダメージを与えた！"
 
                     if self.boss["hp"] <= 0:
-                        await db.update_player(interaction.user.id, hp=self.player["hp"])
+                        await self.session.commit_turn(self.player["hp"])
                         distance = self.player.get("distance", 0)
                         drop_result = game.get_enemy_drop(self.boss["name"], distance)
 
                         drop_text = ""
                         if drop_result:
                             if drop_result["type"] == "coins":
-                                await db.add_gold(interaction.user.id, drop_result["amount"])
+                                self.session.add_gold(drop_result["amount"])
                                 drop_text = f"\n💰 **{drop_result['amount']}コイン** を手に入れた！"
                             elif drop_result["type"] == "item":
-                                await db.add_item_to_inventory(interaction.user.id, drop_result["name"])
+                                self.session.add_item(drop_result["name"])
                                 drop_text = f"\n🎁 **{drop_result['name']}** を手に入れた！"
 
                         await self.update_embed(text + "\n🏆 敵を倒した！" + drop_text)
+                        await self.session.close()
                         self.disable_all_items()
-                        await self.message.edit(view=self)
+                        render_queue.submit(self.message, view=self)
                         if self.ctx.author.id in self.user_processing:
                             self.user_processing[self.ctx.author.id] = False
                         await interaction.response.defer()
@@ -1171,6 +1261,7 @@ class BossBattleView(View):
                     text += f"\n敵の反撃！ {enemy_dmg} のダメージを受けた！"
 
                     if self.player["hp"] <= 0:
+                        self.session.discard()
                         death_result = await handle_death_with_triggers(
                             self.ctx if hasattr(self, 'ctx') else interaction.channel,
                             interaction.user.id, 
@@ -1182,8 +1273,9 @@ class BossBattleView(View):
                             await self.update_embed(text + f"\n💀 あなたは倒れた…\n\n🔄 リスタート\n📍 アップグレードポイント: +{death_result['points']}pt")
                         else:
                             await self.update_embed(text + "\n💀 あなたは倒れた…")
+                        await self.session.close()
                         self.disable_all_items()
-                        await self.message.edit(view=self)
+                        render_queue.submit(self.message, view=self)
                         if self.ctx.author.id in self.user_processing:
                             self.user_processing[self.ctx.author.id] = False
                         await interaction.response.defer()
@@ -1197,12 +1289,12 @@ class BossBattleView(View):
                     actual_heal = self.player["hp"] - old_hp
                     text += f"💚 HP+{actual_heal} 回復した！"
 
-                await db.update_player(interaction.user.id, hp=self.player["hp"])
+                await self.session.commit_turn(self.player["hp"])
                 await self.update_embed(text)
                 # ボタンを再有効化
                 for child in self.children:
                     child.disabled = False
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
                 await interaction.response.defer()
             
             except Exception as e:
@@ -1211,7 +1303,7 @@ class BossBattleView(View):
                 for child in self.children:
                     child.disabled = False
                 try:
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     if not interaction.response.is_done():
                         await interaction.response.send_message("⚠️ エラーが発生しました。もう一度お試しください。", ephemeral=True)
                 except:
@@ -1231,15 +1323,15 @@ class BossBattleView(View):
             try:
                 for child in self.children:
                     child.disabled = True
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
 
-                if await db.is_mp_stunned(interaction.user.id):
-                    await db.set_mp_stunned(interaction.user.id, False)
+                if self.session.is_mp_stunned():
+                    self.session.set_mp_stunned(False)
                     text = "⚠️ MP枯渇で行動不能…\n『嘘だろ!?』\n次のターンから行動可能になります。"
                     await self.update_embed(text)
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return
 
                 # プレイヤー攻撃
@@ -1247,7 +1339,7 @@ class BossBattleView(View):
 
                 # ability効果を適用
                 enemy_type = "boss"
-                equipment_bonus = await game.calculate_equipment_bonus(self.player["user_id"]) if "user_id" in self.player else {}
+                equipment_bonus = self.session.equipment_bonus
                 weapon_ability = equipment_bonus.get("weapon_ability", "")
                 ability_result = game.apply_ability_effects(base_damage, weapon_ability, self.player["hp"], enemy_type)
 
@@ -1273,14 +1365,14 @@ class BossBattleView(View):
 
                 # 勝利
                 if self.boss["hp"] <= 0:
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     await db.set_boss_defeated(interaction.user.id, self.boss_stage)
 
                     reward_gold = random.randint(
                         balance_settings.REWARD_GOLD_NORMAL_MIN,
                         balance_settings.REWARD_GOLD_NORMAL_MAX,
                     )
-                    await db.add_gold(interaction.user.id, reward_gold)
+                    self.session.add_gold(reward_gold)
 
                     try:
                         notify_channel = interaction.client.get_channel(NOTIFY_CHANNEL_ID) if NOTIFY_CHANNEL_ID else None
@@ -1293,8 +1385,9 @@ class BossBattleView(View):
 
                     text = player_text + f"\n\n🏆 ボスを倒した！\n💰 {reward_gold}ゴールドを手に入れた！"
                     await self._staged_update(first_text=player_text, second_text=text, first_delay=1.0, second_delay=0.5)
+                    await self.session.close()
                     self.disable_all_items()
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
 
                     story_id = f"boss_post_{self.boss_stage}"
                     if not await db.get_story_flag(interaction.user.id, story_id):
@@ -1311,32 +1404,32 @@ class BossBattleView(View):
                 # 敵がスキップ
                 if ability_result.get("enemy_flinch", False):
                     text = player_text + "\n敵は怯んで動けない！"
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     await self._staged_update(first_text=text, second_text=None, first_delay=1.0)
 
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return
 
                 if ability_result.get("enemy_freeze", False):
                     text = player_text + "\n敵は凍りついて動けない！"
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     await self._staged_update(first_text=text, second_text=None, first_delay=1.0)
 
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return
 
                 if ability_result.get("paralyze", False):
                     text = player_text + "\n敵は麻痺して動けない！"
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     await self._staged_update(first_text=text, second_text=None, first_delay=1.0)
 
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return
 
                 # ボス反撃
@@ -1368,17 +1461,18 @@ class BossBattleView(View):
                     if armor_result["counter_damage"] > 0:
                         self.boss["hp"] -= armor_result["counter_damage"]
                         if self.boss["hp"] <= 0:
-                            await db.update_player(interaction.user.id, hp=self.player["hp"])
+                            await self.session.commit_turn(self.player["hp"])
                             text += "\n反撃でボスを倒した！"
                             await db.set_boss_defeated(interaction.user.id, self.boss_stage)
                             reward_gold = random.randint(
                                 balance_settings.REWARD_GOLD_NORMAL_MIN,
                                 balance_settings.REWARD_GOLD_NORMAL_MAX,
                             )
-                            await db.add_gold(interaction.user.id, reward_gold)
+                            self.session.add_gold(reward_gold)
                             await self.update_embed(text + f"\n💰 {reward_gold}ゴールドを手に入れた！")
+                            await self.session.close()
                             self.disable_all_items()
-                            await self.message.edit(view=self)
+                            render_queue.submit(self.message, view=self)
 
                             story_id = f"boss_post_{self.boss_stage}"
                             if not await db.get_story_flag(interaction.user.id, story_id):
@@ -1396,17 +1490,18 @@ class BossBattleView(View):
                     if armor_result["reflect_damage"] > 0:
                         self.boss["hp"] -= armor_result["reflect_damage"]
                         if self.boss["hp"] <= 0:
-                            await db.update_player(interaction.user.id, hp=self.player["hp"])
+                            await self.session.commit_turn(self.player["hp"])
                             text += "\n反射ダメージでボスを倒した！"
                             await db.set_boss_defeated(interaction.user.id, self.boss_stage)
                             reward_gold = random.randint(
                                 balance_settings.REWARD_GOLD_NORMAL_MIN,
                                 balance_settings.REWARD_GOLD_NORMAL_MAX,
                             )
-                            await db.add_gold(interaction.user.id, reward_gold)
+                            self.session.add_gold(reward_gold)
                             await self.update_embed(text + f"\n💰 {reward_gold}ゴールドを手に入れた！")
+                            await self.session.close()
                             self.disable_all_items()
-                            await self.message.edit(view=self)
+                            render_queue.submit(self.message, view=self)
 
                             story_id = f"boss_post_{self.boss_stage}"
                             if not await db.get_story_flag(interaction.user.id, story_id):
@@ -1429,6 +1524,7 @@ class BossBattleView(View):
                         self.player["hp"] = 1
                         text += "\n蘇生効果で生き残った！"
                     else:
+                        self.session.discard()
                         death_result = await handle_death_with_triggers(
                             self.ctx if hasattr(self, 'ctx') else interaction.channel,
                             interaction.user.id,
@@ -1456,20 +1552,21 @@ class BossBattleView(View):
                         else:
                             await self.update_embed(text + "\n💀 あなたは倒れた…")
 
+                        await self.session.close()
                         self.disable_all_items()
-                        await self.message.edit(view=self)
+                        render_queue.submit(self.message, view=self)
 
                         if self.ctx.author.id in self.user_processing:
                             self.user_processing[self.ctx.author.id] = False
                         return
 
                 # 継続
-                await db.update_player(interaction.user.id, hp=self.player["hp"])
+                await self.session.commit_turn(self.player["hp"])
                 await self._staged_update(first_text=player_text, second_text=text, first_delay=1.0, second_delay=0.5)
 
                 for child in self.children:
                     child.disabled = False
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
                 return
 
             except Exception as e:
@@ -1477,7 +1574,7 @@ class BossBattleView(View):
                 for child in self.children:
                     child.disabled = False
                 try:
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                 except Exception:
                     pass
                 return
@@ -1496,7 +1593,7 @@ class BossBattleView(View):
             try:
                 for child in self.children:
                     child.disabled = True
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
 
                 reduction = random.randint(
                     balance_settings.DAMAGE_REDUCTION_MID_MIN,
@@ -1511,6 +1608,7 @@ class BossBattleView(View):
                 text = f"{first_text}\nボスの攻撃で {enemy_dmg} のダメージを受けた！"
 
                 if self.player["hp"] <= 0:
+                    self.session.discard()
                     death_result = await handle_death_with_triggers(
                         self.ctx if hasattr(self, 'ctx') else interaction.channel,
                         interaction.user.id,
@@ -1525,18 +1623,19 @@ class BossBattleView(View):
                     else:
                         await self.update_embed(text + "\n💀 あなたは倒れた…")
 
+                    await self.session.close()
                     self.disable_all_items()
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     if self.ctx.author.id in self.user_processing:
                         self.user_processing[self.ctx.author.id] = False
                     return
 
-                await db.update_player(interaction.user.id, hp=self.player["hp"])
+                await self.session.commit_turn(self.player["hp"])
                 await self._staged_update(first_text=first_text, second_text=text, first_delay=1.0, second_delay=0.5)
 
                 for child in self.children:
                     child.disabled = False
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
                 return
 
             except Exception as e:
@@ -1544,7 +1643,7 @@ class BossBattleView(View):
                 for child in self.children:
                     child.disabled = False
                 try:
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                 except Exception:
                     pass
                 return
@@ -1554,14 +1653,17 @@ class BossBattleView(View):
             item.disabled = True
 
     async def on_timeout(self):
+        await self.session.close()
         await finalize_view_on_timeout(self, user_processing=self.user_processing, user_id=getattr(self.ctx.author, "id", None))
 
 #戦闘Embed
 import discord
-from discord.ui import View, button, Select
+from discord.ui import button, Select
 import random
 
-class BattleView(View):
+class BattleView(BattleViewBase):
+    persistent_kind = "battle"
+
     def __init__(self, ctx, player, enemy, user_processing: dict, post_battle_hook=None, enemy_max_hp: int | None = None, allow_flee: bool = True):
         super().__init__(timeout=None)
         self.ctx = ctx
@@ -1570,6 +1672,7 @@ class BattleView(View):
         self.message = None
         self.user_processing = user_processing
         self._battle_lock = asyncio.Lock()  # アトミックなロック機構
+        self.session = BattleSession(ctx.author.id, None)  # _async_init で読み込む
         self._post_battle_hook = post_battle_hook
         self._enemy_max_hp = int(enemy_max_hp) if enemy_max_hp is not None else int(enemy.get("hp", 0) or 0)
         self._allow_flee = bool(allow_flee)
@@ -1588,11 +1691,32 @@ class BattleView(View):
         await instance._async_init()
         return instance
 
+    def battle_state(self):
+        # ストーリー戦闘のフックは保存できない
+        if self._post_battle_hook:
+            return None
+        return {"enemy": self.enemy, "enemy_max_hp": self._enemy_max_hp, "allow_flee": self._allow_flee}
+
+    @classmethod
+    def from_state(cls, ctx, state: dict, user_processing: dict):
+        return cls(
+            ctx,
+            state["player"],
+            state["enemy"],
+            user_processing,
+            enemy_max_hp=state.get("enemy_max_hp"),
+            allow_flee=bool(state.get("allow_flee", True)),
+        )
+
     async def _maybe_finish_story_battle(self, outcome: str) -> bool:
         """ストーリー駆動の戦闘なら、勝敗に応じてフックを呼ぶ。"""
         if not self._post_battle_hook:
             return False
 
+        # フック側がDBからHPを読む/回復させるため、先に戦闘結果を書き戻す
+        self.session.set_hp(self.player["hp"])
+        await self.session.close()
+
         try:
             await self._post_battle_hook(
                 outcome=outcome,
@@ -1608,31 +1732,13 @@ class BattleView(View):
 
     async def _async_init(self):
         """Async initialization logic"""
+        self.session = await BattleSession.load(self.player.get("user_id", self.ctx.author.id))
         if "user_id" in self.player:
-            equipment_bonus = await game.calculate_equipment_bonus(self.player["user_id"])
+            equipment_bonus = self.session.equipment_bonus
             self.player["attack"] = self.player.get("attack", 10) + equipment_bonus["attack_bonus"]
             self.player["defense"] = self.player.get("defense", 5) + equipment_bonus["defense_bonus"]
 
-            unlocked_skills = await db.get_unlocked_skills(self.player["user_id"])
-            if unlocked_skills:
-                skill_options = []
-                for skill_id in unlocked_skills[:SELECT_MAX_OPTIONS]:
-                    skill_info = game.get_skill_info(skill_id)
-                    if skill_info:
-                        skill_options.append(discord.SelectOption(
-                            label=skill_info["name"],
-                            description=f"MP:{skill_info['mp_cost']} - {skill_info['description'][:50]}",
-                            value=skill_id
-                        ))
-
-                if skill_options:
-                    skill_select = discord.ui.Select(
-                        placeholder="スキルを選択",
-                        options=skill_options,
-                        custom_id="skill_select"
-                    )
-                    skill_select.callback = self.use_skill
-                    self.add_item(skill_select)
+            self._add_skill_select()
 
     async def send_initial_embed(self):
         embed = await self.create_battle_embed()
@@ -1652,7 +1758,7 @@ class BattleView(View):
         max_mp = None
         max_hp = int(self.player.get("max_hp", player_hp) or player_hp or 0)
         if "user_id" in self.player:
-            player_data = await db.get_player(self.player["user_id"])
+            player_data = self.session.get_player()
             if player_data:
                 mp = int(player_data.get("mp", 20) or 20)
                 max_mp = int(player_data.get("max_mp", 20) or 20)
@@ -1775,7 +1881,8 @@ class BattleView(View):
             log_text = self._format_battle_log(text)
             # 余白＋見出しで「直近ログ感」を上げる
             embed.description += f"\n\n— 戦闘ログ —\n{log_text}"
-        await self.message.edit(embed=embed, view=self)
+        # 描画キュー経由で送る（送信待ちの古いフレームは最新の状態にまとめられる）
+        render_queue.submit(self.message, embed=embed, view=self)
 
     # =====================================
     # ✨ スキル使用
@@ -1793,10 +1900,10 @@ class BattleView(View):
                 # ボタンを即座に無効化
                 for child in self.children:
                     child.disabled = True
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
 
                 # ✅ プレイヤーデータを最新化
-                fresh_player_data = await db.get_player(interaction.user.id)
+                fresh_player_data = self.session.get_player()
                 if fresh_player_data:
                     self.player["hp"] = fresh_player_data.get("hp", self.player["hp"])
                     self.player["mp"] = fresh_player_data.get("mp", self.player.get("mp", 20))
@@ -1806,7 +1913,7 @@ class BattleView(View):
                     # ✅ 装備ボーナスを再計算してattackとdefenseを更新
                     base_atk = fresh_player_data.get("atk", 5)
                     base_def = fresh_player_data.get("def", 2)
-                    equipment_bonus = await game.calculate_equipment_bonus(interaction.user.id)
+                    equipment_bonus = self.session.equipment_bonus
                     self.player["attack"] = base_atk + equipment_bonus["attack_bonus"]
                     self.player["defense"] = base_def + equipment_bonus["defense_bonus"]
                     if config.VERBOSE_DEBUG:
@@ -1819,13 +1926,13 @@ class BattleView(View):
                             self.player["attack"],
                         )
 
-                if await db.is_mp_stunned(interaction.user.id):
-                    await db.set_mp_stunned(interaction.user.id, False)
+                if self.session.is_mp_stunned():
+                    self.session.set_mp_stunned(False)
                     await interaction.response.send_message("⚠️ MP枯渇で行動不能！\n『嘘だろ!?』\n次のターンから行動可能になります。", ephemeral=True)
                     # ボタンを再有効化
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return
 
                 skill_id = interaction.data['values'][0]
@@ -1834,28 +1941,28 @@ class BattleView(View):
                 if not skill_info:
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return await interaction.response.send_message("⚠️ スキル情報が見つかりません。", ephemeral=True)
 
-                player_data = await db.get_player(interaction.user.id)
+                player_data = self.session.get_player()
                 current_mp = player_data.get("mp", 20)
                 mp_cost = skill_info["mp_cost"]
 
                 if current_mp < mp_cost:
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return await interaction.response.send_message(f"⚠️ MPが足りません！（必要: {mp_cost}, 現在: {current_mp}）", ephemeral=True)
 
-                if not await db.consume_mp(interaction.user.id, mp_cost):
+                if not self.session.consume_mp(mp_cost):
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return await interaction.response.send_message("⚠️ MP消費に失敗しました。", ephemeral=True)
 
-                player_data = await db.get_player(interaction.user.id)
+                player_data = self.session.get_player()
                 if player_data and player_data.get("mp", 0) == 0:
-                    await db.set_mp_stunned(interaction.user.id, True)
+                    self.session.set_mp_stunned(True)
 
                 text = f"✨ **{skill_info['name']}** を使用！（MP -{mp_cost}）\n"
 
@@ -1867,29 +1974,31 @@ class BattleView(View):
 
                     if self.enemy["hp"] <= 0:
                         if await self._maybe_finish_story_battle("win"):
+                            await self.session.close()
                             self.disable_all_items()
-                            await self.message.edit(view=self)
+                            render_queue.submit(self.message, view=self)
                             if self.ctx.author.id in self.user_processing:
                                 self.user_processing[self.ctx.author.id] = False
                             await interaction.response.defer()
                             return
 
-                        await db.update_player(interaction.user.id, hp=self.player["hp"])
+                        await self.session.commit_turn(self.player["hp"])
                         distance = self.player.get("distance", 0)
                         drop_result = game.get_enemy_drop(self.enemy["name"], distance)
 
                         drop_text = ""
                         if drop_result:
                             if drop_result["type"] == "coins":
-                                await db.add_gold(interaction.user.id, drop_result["amount"])
+                                self.session.add_gold(drop_result["amount"])
                                 drop_text = f"\n💰 **{drop_result['amount']}コイン** を手に入れた！"
                             elif drop_result["type"] == "item":
-                                await db.add_item_to_inventory(interaction.user.id, drop_result["name"])
+                                self.session.add_item(drop_result["name"])
                                 drop_text = f"\n🎁 **{drop_result['name']}** を手に入れた！"
 
                         await self.update_embed(text + "\n🏆 敵を倒した！" + drop_text)
+                        await self.session.close()
                         self.disable_all_items()
-                        await self.message.edit(view=self)
+                        render_queue.submit(self.message, view=self)
                         if self.ctx.author.id in self.user_processing:
                             self.user_processing[self.ctx.author.id] = False
                         await interaction.response.defer()
@@ -1904,20 +2013,22 @@ class BattleView(View):
                         if await self._maybe_finish_story_battle("lose"):
                             # ストーリー駆動戦闘でも、致死ターンのHP/ログを反映してから終了する
                             try:
-                                await db.update_player(interaction.user.id, hp=self.player["hp"])
+                                await self.session.commit_turn(self.player["hp"])
                             except Exception:
                                 pass
                             try:
                                 await self.update_embed(text)
                             except Exception:
                                 pass
+                            await self.session.close()
                             self.disable_all_items()
-                            await self.message.edit(view=self)
+                            render_queue.submit(self.message, view=self)
                             if self.ctx.author.id in self.user_processing:
                                 self.user_processing[self.ctx.author.id] = False
                             await interaction.response.defer()
                             return
 
+                        self.session.discard()
                         death_result = await handle_death_with_triggers(
                             self.ctx if hasattr(self, 'ctx') else interaction.channel,
                             interaction.user.id, 
@@ -1929,8 +2040,9 @@ class BattleView(View):
                             await self.update_embed(text + f"\n💀 あなたは倒れた…\n\n🔄 リスタート\n📍 アップグレードポイント: +{death_result['points']}pt")
                         else:
                             await self.update_embed(text + "\n💀 あなたは倒れた…")
+                        await self.session.close()
                         self.disable_all_items()
-                        await self.message.edit(view=self)
+                        render_queue.submit(self.message, view=self)
                         if self.ctx.author.id in self.user_processing:
                             self.user_processing[self.ctx.author.id] = False
                         await interaction.response.defer()
@@ -1944,12 +2056,12 @@ class BattleView(View):
                     actual_heal = self.player["hp"] - old_hp
                     text += f"💚 HP+{actual_heal} 回復した！"
 
-                await db.update_player(interaction.user.id, hp=self.player["hp"])
+                await self.session.commit_turn(self.player["hp"])
                 await self.update_embed(text)
                 # ボタンを再有効化
                 for child in self.children:
                     child.disabled = False
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
                 await interaction.response.defer()
             
             except Exception as e:
@@ -1958,7 +2070,7 @@ class BattleView(View):
                 for child in self.children:
                     child.disabled = False
                 try:
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     if not interaction.response.is_done():
                         await interaction.response.send_message("⚠️ エラーが発生しました。もう一度お試しください。", ephemeral=True)
                 except:
@@ -1985,10 +2097,10 @@ class BattleView(View):
                 # ボタンを即座に無効化
                 for child in self.children:
                     child.disabled = True
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
 
                 # ✅ プレイヤーデータを最新化
-                fresh_player_data = await db.get_player(interaction.user.id)
+                fresh_player_data = self.session.get_player()
                 if fresh_player_data:
                     self.player["hp"] = fresh_player_data.get("hp", self.player["hp"])
                     self.player["max_hp"] = fresh_player_data.get("max_hp", self.player.get("max_hp", 50))
@@ -1996,7 +2108,7 @@ class BattleView(View):
                     # ✅ 装備ボーナスを再計算してattackとdefenseを更新
                     base_atk = fresh_player_data.get("atk", 5)
                     base_def = fresh_player_data.get("def", 2)
-                    equipment_bonus = await game.calculate_equipment_bonus(interaction.user.id)
+                    equipment_bonus = self.session.equipment_bonus
                     self.player["attack"] = base_atk + equipment_bonus["attack_bonus"]
                     self.player["defense"] = base_def + equipment_bonus["defense_bonus"]
                     if config.VERBOSE_DEBUG:
@@ -2012,14 +2124,14 @@ class BattleView(View):
                         )
 
                 # MP枯渇チェック
-                if await db.is_mp_stunned(interaction.user.id):
-                    await db.set_mp_stunned(interaction.user.id, False)
+                if self.session.is_mp_stunned():
+                    self.session.set_mp_stunned(False)
                     text = "⚠️ MP枯渇で行動不能…\n『嘘だろ!?』\n次のターンから行動可能になります。"
                     await self.update_embed(text)
                     # ボタンを再有効化
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     return
 
                 # プレイヤー攻撃
@@ -2027,7 +2139,7 @@ class BattleView(View):
 
                 # ability効果を適用
                 enemy_type = game.get_enemy_type(self.enemy["name"])
-                equipment_bonus = await game.calculate_equipment_bonus(self.player["user_id"]) if "user_id" in self.player else {}
+                equipment_bonus = self.session.equipment_bonus
                 weapon_ability = equipment_bonus.get("weapon_ability", "")
 
                 ability_result = game.apply_ability_effects(base_damage, weapon_ability, self.player["hp"], enemy_type)
@@ -2059,14 +2171,15 @@ class BattleView(View):
                 # 勝利チェック
                 if self.enemy["hp"] <= 0:
                     if await self._maybe_finish_story_battle("win"):
+                        await self.session.close()
                         self.disable_all_items()
-                        await self.message.edit(view=self)
+                        render_queue.submit(self.message, view=self)
                         if self.ctx.author.id in self.user_processing:
                             self.user_processing[self.ctx.author.id] = False
                         return
 
                     # HPを保存
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
 
                     # ドロップアイテムを取得
                     distance = self.player.get("distance", 0)
@@ -2075,12 +2188,12 @@ class BattleView(View):
                     drop_text = ""
                     if drop_result:
                         if drop_result["type"] == "coins":
-                            await db.add_gold(interaction.user.id, drop_result["amount"])
+                            self.session.add_gold(drop_result["amount"])
                             drop_text = f"\n💰 **{drop_result['amount']}コイン** を手に入れた！"
                         elif drop_result["name"] == "none":
                             drop_text = f"\n **敵は何も落とさなかった...**"
                         elif drop_result["type"] == "item":
-                            await db.add_item_to_inventory(interaction.user.id, drop_result["name"])
+                            self.session.add_item(drop_result["name"])
                             drop_text = f"\n🎁 **{drop_result['name']}** を手に入れた！"
 
                     await self._staged_update(
@@ -2089,8 +2202,9 @@ class BattleView(View):
                         first_delay=1.0,
                         second_delay=0.5,
                     )
+                    await self.session.close()
                     self.disable_all_items()
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     if self.ctx.author.id in self.user_processing:
                         self.user_processing[self.ctx.author.id] = False
                         # ロックはasync withで自動解放される
@@ -2100,13 +2214,13 @@ class BattleView(View):
                 if ability_result.get("enemy_flinch", False):
                     combined = player_text + "\n敵は怯んで動けない！"
                     # HPを保存
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     await self._staged_update(first_text=player_text, second_text=combined, first_delay=1.0, second_delay=0.5)
 
                     # ✅ ボタンを再有効化
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
 
                     # ロックはasync withで自動解放される
                     return
@@ -2115,13 +2229,13 @@ class BattleView(View):
                 if ability_result.get("enemy_freeze", False):
                     combined = player_text + "\n敵は凍りついて動けない！"
                     # HPを保存
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     await self._staged_update(first_text=player_text, second_text=combined, first_delay=1.0, second_delay=0.5)
 
                     # ✅ ボタンを再有効化
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
 
                     # ロックはasync withで自動解放される
                     return
@@ -2130,13 +2244,13 @@ class BattleView(View):
                 if ability_result.get("paralyze", False):
                     combined = player_text + "\n敵は麻痺して動けない！"
                     # HPを保存
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     await self._staged_update(first_text=player_text, second_text=combined, first_delay=1.0, second_delay=0.5)
 
                     # ✅ ボタンを再有効化
                     for child in self.children:
                         child.disabled = False
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
 
                     # ロックはasync withで自動解放される
                     return
@@ -2173,11 +2287,12 @@ class BattleView(View):
                         self.enemy["hp"] -= armor_result["counter_damage"]
                         if self.enemy["hp"] <= 0:
                             # HPを保存
-                            await db.update_player(interaction.user.id, hp=self.player["hp"])
+                            await self.session.commit_turn(self.player["hp"])
                             text += "\n反撃で敵を倒した！"
                             await self.update_embed(text)
+                            await self.session.close()
                             self.disable_all_items()
-                            await self.message.edit(view=self)
+                            render_queue.submit(self.message, view=self)
                             if self.ctx.author.id in self.user_processing:
                                 self.user_processing[self.ctx.author.id] = False
                             # ロックはasync with‌で自動解放される
@@ -2188,11 +2303,12 @@ class BattleView(View):
                         self.enemy["hp"] -= armor_result["reflect_damage"]
                         if self.enemy["hp"] <= 0:
                             # HPを保存
-                            await db.update_player(interaction.user.id, hp=self.player["hp"])
+                            await self.session.commit_turn(self.player["hp"])
                             text += "\n反射ダメージで敵を倒した！"
                             await self.update_embed(text)
+                            await self.session.close()
                             self.disable_all_items()
-                            await self.message.edit(view=self)
+                            render_queue.submit(self.message, view=self)
                             if self.ctx.author.id in self.user_processing:
                                 self.user_processing[self.ctx.author.id] = False
                             # ロックはasync withで自動解放される
@@ -2211,7 +2327,7 @@ class BattleView(View):
                         if await self._maybe_finish_story_battle("lose"):
                             # ストーリー駆動戦闘でも、致死ターンのHP/ログを反映してから終了する
                             try:
-                                await db.update_player(interaction.user.id, hp=self.player["hp"])
+                                await self.session.commit_turn(self.player["hp"])
                             except Exception:
                                 pass
                             try:
@@ -2223,13 +2339,15 @@ class BattleView(View):
                                 )
                             except Exception:
                                 pass
+                            await self.session.close()
                             self.disable_all_items()
-                            await self.message.edit(view=self)
+                            render_queue.submit(self.message, view=self)
                             if self.ctx.author.id in self.user_processing:
                                 self.user_processing[self.ctx.author.id] = False
                             return
 
                         # 死亡処理（HPリセット、距離リセット、アップグレードポイント付与）
+                        self.session.discard()
                         death_result = await handle_death_with_triggers(
                             self.ctx if hasattr(self, 'ctx') else interaction.channel,
                             interaction.user.id, 
@@ -2251,15 +2369,16 @@ class BattleView(View):
                                 first_delay=1.0,
                                 second_delay=0.5,
                             )
+                        await self.session.close()
                         self.disable_all_items()
-                        await self.message.edit(view=self)
+                        render_queue.submit(self.message, view=self)
                         if self.ctx.author.id in self.user_processing:
                             self.user_processing[self.ctx.author.id] = False
                         # ロックはasync withで自動解放される
                         return
 
                 # HPを保存（戦闘継続時）
-                await db.update_player(interaction.user.id, hp=self.player["hp"])
+                await self.session.commit_turn(self.player["hp"])
                 await self._staged_update(
                     first_text=player_text,
                     second_text=text,
@@ -2269,7 +2388,7 @@ class BattleView(View):
                 # ボタンを再有効化
                 for child in self.children:
                     child.disabled = False
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
             
             except Exception as e:
                 logger.exception("[BattleView] fight error: %s", e)
@@ -2277,7 +2396,7 @@ class BattleView(View):
                 for child in self.children:
                     child.disabled = False
                 try:
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                 except:
                     pass
 
@@ -2301,16 +2420,16 @@ class BattleView(View):
                 # ボタンを即座に無効化
                 for child in self.children:
                     child.disabled = True
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
 
                 # ✅ プレイヤーデータを最新化
-                fresh_player_data = await db.get_player(interaction.user.id)
+                fresh_player_data = self.session.get_player()
                 if fresh_player_data:
                     self.player["hp"] = fresh_player_data.get("hp", self.player["hp"])
                     
                     # ✅ 装備ボーナスを再計算してdefenseを更新
                     base_def = fresh_player_data.get("def", 2)
-                    equipment_bonus = await game.calculate_equipment_bonus(interaction.user.id)
+                    equipment_bonus = self.session.equipment_bonus
                     self.player["defense"] = base_def + equipment_bonus["defense_bonus"]
                     if config.VERBOSE_DEBUG:
                         logger.debug(
@@ -2337,20 +2456,22 @@ class BattleView(View):
                     if await self._maybe_finish_story_battle("lose"):
                         # ストーリー駆動戦闘でも、致死ターンのHP/ログを反映してから終了する
                         try:
-                            await db.update_player(interaction.user.id, hp=self.player["hp"])
+                            await self.session.commit_turn(self.player["hp"])
                         except Exception:
                             pass
                         try:
                             await self.update_embed(text)
                         except Exception:
                             pass
+                        await self.session.close()
                         self.disable_all_items()
-                        await self.message.edit(view=self)
+                        render_queue.submit(self.message, view=self)
                         if self.ctx.author.id in self.user_processing:
                             self.user_processing[self.ctx.author.id] = False
                         return
 
                     # 死亡処理
+                    self.session.discard()
                     death_result = await handle_death_with_triggers(
                         self.ctx if hasattr(self, 'ctx') else interaction.channel,
                         interaction.user.id, 
@@ -2362,19 +2483,20 @@ class BattleView(View):
                         await self.update_embed(text + f"\n💀 あなたは倒れた…\n\n🔄 リスタート\n📍 アップグレードポイント: +{death_result['points']}pt")
                     else:
                         await self.update_embed(text + "\n💀 あなたは倒れた…")
+                    await self.session.close()
                     self.disable_all_items()
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     if self.ctx.author.id in self.user_processing:
                         self.user_processing[self.ctx.author.id] = False
                     return
 
                 # HPを保存
-                await db.update_player(interaction.user.id, hp=self.player["hp"])
+                await self.session.commit_turn(self.player["hp"])
                 await self._staged_update(first_text=first_text, second_text=text, first_delay=1.0, second_delay=0.5)
                 # ボタンを再有効化
                 for child in self.children:
                     child.disabled = False
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
             
             except Exception as e:
                 logger.exception("[BattleView] defend error: %s", e)
@@ -2382,7 +2504,7 @@ class BattleView(View):
                 for child in self.children:
                     child.disabled = False
                 try:
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                 except:
                     pass
 
@@ -2406,16 +2528,16 @@ class BattleView(View):
                 # ボタンを即座に無効化
                 for child in self.children:
                     child.disabled = True
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
 
                 # ✅ プレイヤーデータを最新化
-                fresh_player_data = await db.get_player(interaction.user.id)
+                fresh_player_data = self.session.get_player()
                 if fresh_player_data:
                     self.player["hp"] = fresh_player_data.get("hp", self.player["hp"])
                     
                     # ✅ 装備ボーナスを再計算してdefenseを更新
                     base_def = fresh_player_data.get("def", 2)
-                    equipment_bonus = await game.calculate_equipment_bonus(interaction.user.id)
+                    equipment_bonus = self.session.equipment_bonus
                     self.player["defense"] = base_def + equipment_bonus["defense_bonus"]
                     logger.debug(
                         "battle.run: refresh hp=%s def=%s+%s=%s",
@@ -2430,11 +2552,12 @@ class BattleView(View):
                 # 逃走確率
                 if random.randint(1, 100) <= balance_settings.FLEE_CHANCE_PERCENT:
                     # 逃走成功 - HPを保存
-                    await db.update_player(interaction.user.id, hp=self.player["hp"])
+                    await self.session.commit_turn(self.player["hp"])
                     text = "🏃‍♂️ うまく逃げ切れた！\n『戦っとけば良かったかな――。』"
+                    await self.session.close()
                     self.disable_all_items()
                     await self._staged_update(first_text=first_text, second_text=text, first_delay=1.0, second_delay=0.5)
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                     if self.ctx.author.id in self.user_processing:
                         self.user_processing[self.ctx.author.id] = False
                 else:
@@ -2446,6 +2569,7 @@ class BattleView(View):
                     # ★修正: 死亡判定を先に行い、条件分岐で適切なEmbed表示
                     if self.player["hp"] <= 0:
                         # 死亡処理
+                        self.session.discard()
                         death_result = await handle_death_with_triggers(
                             self.ctx if hasattr(self, 'ctx') else interaction.channel,
                             interaction.user.id, 
@@ -2457,20 +2581,21 @@ class BattleView(View):
                             text = f"逃げられなかった！ 敵の攻撃で {enemy_dmg} のダメージ！\n💀 あなたは倒れた…\n\n🔄 リスタート\n📍 アップグレードポイント: +{death_result['points']}pt"
                         else:
                             text = f"逃げられなかった！ 敵の攻撃で {enemy_dmg} のダメージ！\n💀 あなたは倒れた…"
+                        await self.session.close()
                         self.disable_all_items()
                         await self._staged_update(first_text=first_text, second_text=text, first_delay=1.0, second_delay=0.5)
-                        await self.message.edit(view=self)
+                        render_queue.submit(self.message, view=self)
                         if self.ctx.author.id in self.user_processing:
                             self.user_processing[self.ctx.author.id] = False
                     else:
                         # HPを保存（生存時）
-                        await db.update_player(interaction.user.id, hp=self.player["hp"])
+                        await self.session.commit_turn(self.player["hp"])
                         text = f"逃げられなかった！ 敵の攻撃で {enemy_dmg} のダメージ！"
                         await self._staged_update(first_text=first_text, second_text=text, first_delay=1.0, second_delay=0.5)
                         # ボタンを再有効化
                         for child in self.children:
                             child.disabled = False
-                        await self.message.edit(view=self)
+                        render_queue.submit(self.message, view=self)
             
             except Exception as e:
                 logger.exception("battle.run error: %s", e)
@@ -2478,7 +2603,7 @@ class BattleView(View):
                 for child in self.children:
                     child.disabled = False
                 try:
-                    await self.message.edit(view=self)
+                    render_queue.submit(self.message, view=self)
                 except:
                     pass
 
@@ -2490,12 +2615,12 @@ class BattleView(View):
         if interaction.user.id != self.ctx.author.id:
             return await interaction.response.send_message("これはあなたの戦闘ではありません！", ephemeral=True)
 
-        # ✅ 最新のプレイヤーデータを取得
-        self.player = await db.get_player(self.ctx.author.id)
-        if not self.player:
+        # ✅ 最新のプレイヤーデータを取得（戦闘セッションから）
+        player_data = self.session.get_player()
+        if not player_data:
             return await interaction.response.send_message("プレイヤーデータが見つかりません", ephemeral=True)
 
-        items = self.player.get("inventory", [])
+        items = player_data.get("inventory", [])
         if not items:
             return await interaction.response.send_message("使えるアイテムがありません！", ephemeral=True)
 
@@ -2570,7 +2695,7 @@ class BattleView(View):
                 return await select_interaction.response.send_message("これはあなたの戦闘ではありません！", ephemeral=True)
 
             # ✅ プレイヤーデータを再取得（アイテム所持確認のため）
-            fresh_player_data = await db.get_player(select_interaction.user.id)
+            fresh_player_data = self.session.get_player()
             if not fresh_player_data:
                 return await select_interaction.response.send_message("プレイヤーデータが見つかりません。", ephemeral=True)
             
@@ -2623,8 +2748,8 @@ class BattleView(View):
                 actual_mp_heal = new_mp - current_mp
                 self.player['mp'] = new_mp
                 
-                await db.remove_item_from_inventory(self.ctx.author.id, item_name)
-                await db.update_player(self.ctx.author.id, mp=new_mp)
+                self.session.remove_item(item_name)
+                self.session.set_mp(new_mp)
                 
                 text = f"✨ **{item_name}** を使用した！\nMP +{actual_mp_heal} 回復！"
             
@@ -2647,8 +2772,8 @@ class BattleView(View):
                 actual_heal = new_hp - current_hp
                 self.player['hp'] = new_hp
 
-                await db.remove_item_from_inventory(self.ctx.author.id, item_name)
-                await db.update_player(self.ctx.author.id, hp=new_hp)
+                self.session.remove_item(item_name)
+                self.session.set_hp(new_hp)
 
                 text = f"✨ **{item_name}** を使用した！\nHP +{actual_heal} 回復！"
                 
@@ -2659,6 +2784,7 @@ class BattleView(View):
             text += f"\n敵の攻撃！ {enemy_dmg} のダメージを受けた！"
 
             if self.player["hp"] <= 0:
+                self.session.discard()
                 death_result = await handle_death_with_triggers(
                     self.ctx, 
                     self.ctx.author.id, 
@@ -2670,16 +2796,17 @@ class BattleView(View):
                     text += f"\n\n💀 あなたは倒れた…\n\n⭐ {death_result['points']}アップグレードポイントを獲得！\n（死亡回数: {death_result['death_count']}回）"
                 else:
                     text += "\n💀 あなたは倒れた…"
+                await self.session.close()
                 self.disable_all_items()
                 await self.update_embed(text)
-                await self.message.edit(view=self)
+                render_queue.submit(self.message, view=self)
                 if self.ctx.author.id in self.user_processing:
                     self.user_processing[self.ctx.author.id] = False
                 await select_interaction.response.defer()
                 return
 
             # HPを保存（生存時）
-            await db.update_player(self.ctx.author.id, hp=self.player["hp"])
+            await self.session.commit_turn(self.player["hp"])
             await self.update_embed(text)
             await select_interaction.response.defer()
         
@@ -2693,6 +2820,7 @@ class BattleView(View):
             item.disabled = True
 
     async def on_timeout(self):
+        await self.session.close()
         await finalize_view_on_timeout(self, user_processing=self.user_processing, user_id=getattr(self.ctx.author, "id", None))
 
 
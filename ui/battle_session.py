@@ -0,0 +1,264 @@
+"""戦闘セッション（メモリ上のプレイヤー状態 + 戦闘終了時の一括書き戻し）
+
+戦闘中は 1 ボタン押下ごとに get_player / 装備ボーナス再計算 / MP枯渇フラグ確認 /
+HP の PATCH が走っていたため、10ターンの戦闘で 30 回以上 DB を叩いていた。
+
+BattleSession は `_async_init` で 1 回だけプレイヤーを読み込み、以降のターンは
+このオブジェクトだけを書き換える。DB へは以下のタイミングでまとめて書き戻す。
+
+- 戦闘終了時（勝利 / 逃走 / ストーリー戦闘のフック呼び出し前）
+- View のタイムアウト時
+- BATTLE_CHECKPOINT_TURNS ターン毎のチェックポイント（クラッシュ対策）
+
+死亡時は db.handle_player_death が HP/MP/所持品をまとめてリセットするため、
+`discard()` で保留中の変更を破棄してから死亡処理に渡す。
+
+所持品とゴールドは絶対値ではなく増減として溜め、db.apply_inventory_delta で書き戻す
+（戦闘中に別の経路で増えた分を上書きしないように）。
+
+未書き戻しの変更は snapshot() で戦闘 View の保存状態（ui/persistent.py）に含めるので、
+再起動をまたいでも from_snapshot() で続きから書き戻せる。
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+import db
+import game
+from player_state import Inventory
+from runtime_settings import BATTLE_CHECKPOINT_TURNS
+
+logger = logging.getLogger("rpgbot")
+
+
+class BattleSession:
+    """1 回の戦闘で使うプレイヤー状態のキャッシュ。"""
+
+    def __init__(self, user_id: int, player: dict[str, Any] | None):
+        self.user_id = int(user_id)
+        self.player: dict[str, Any] = dict(player or {})
+        self.equipment_bonus: dict[str, Any] = game.compute_equipment_bonus(
+            db.equipped_items_from_player(self.player)
+        )
+        skills = self.player.get("unlocked_skills")
+        self.unlocked_skills: list[str] = list(skills) if isinstance(skills, list) else ["体当たり"]
+
+        self.player["inventory"] = Inventory.parse(self.player.get("inventory"))
+        self._item_delta: dict[str, int] = {}
+        self._gold_delta = 0
+
+        self.turns = 0
+        self.closed = False
+        self._dirty: set[str] = set()
+
+    @classmethod
+    async def load(cls, user_id: int) -> "BattleSession":
+        """プレイヤー行を 1 回だけ取得してセッションを作成"""
+        player = await db.get_player(user_id)
+        return cls(user_id, player)
+
+    @classmethod
+    def from_snapshot(cls, user_id: int, snapshot: dict[str, Any]) -> "BattleSession":
+        """snapshot() から作り直す（再起動後に戦闘を続ける場合）"""
+        session = cls(user_id, snapshot.get("player"))
+        session._item_delta = {str(item): int(change) for item, change in (snapshot.get("item_delta") or {}).items()}
+        session._gold_delta = int(snapshot.get("gold_delta") or 0)
+        session.turns = int(snapshot.get("turns") or 0)
+        session._dirty = set(snapshot.get("dirty") or ())
+        return session
+
+    def snapshot(self) -> dict[str, Any]:
+        """JSON にできる状態（プレイヤー行と未書き戻しの変更）"""
+        return {
+            "player": self.player,
+            "item_delta": self._item_delta,
+            "gold_delta": self._gold_delta,
+            "turns": self.turns,
+            "dirty": sorted(self._dirty),
+        }
+
+    # -------------------------
+    # 読み取り
+    # -------------------------
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self.player.get("user_id"))
+
+    @property
+    def hp(self) -> int:
+        return int(self.player.get("hp", 50) or 0)
+
+    @property
+    def max_hp(self) -> int:
+        return int(self.player.get("max_hp", 50) or 50)
+
+    @property
+    def mp(self) -> int:
+        return int(self.player.get("mp", 20) or 0)
+
+    @property
+    def max_mp(self) -> int:
+        return int(self.player.get("max_mp", 20) or 20)
+
+    @property
+    def attack(self) -> int:
+        return int(self.player.get("atk", 5) or 0) + int(self.equipment_bonus.get("attack_bonus", 0) or 0)
+
+    @property
+    def defense(self) -> int:
+        return int(self.player.get("def", 2) or 0) + int(self.equipment_bonus.get("defense_bonus", 0) or 0)
+
+    @property
+    def inventory(self) -> Inventory:
+        return self.player["inventory"]
+
+    def get_player(self) -> dict[str, Any] | None:
+        """db.get_player の代わりに使う（戦闘中の最新状態を返す）"""
+        return self.player if self.loaded else None
+
+    def is_mp_stunned(self) -> bool:
+        return bool(self.player.get("mp_stunned", False))
+
+    # -------------------------
+    # 書き込み（メモリのみ）
+    # -------------------------
+
+    def _set(self, key: str, value: Any) -> None:
+        if self.player.get(key) != value:
+            self.player[key] = value
+            self._dirty.add(key)
+
+    def set_hp(self, hp: int) -> None:
+        self._set("hp", max(0, int(hp)))
+
+    def set_mp(self, mp: int) -> None:
+        self._set("mp", max(0, min(self.max_mp, int(mp))))
+
+    def set_mp_stunned(self, stunned: bool) -> None:
+        self._set("mp_stunned", bool(stunned))
+
+    def consume_mp(self, amount: int) -> bool:
+        """MPを消費（db.consume_mp と同じく MP=0 で行動不能フラグを立てる）"""
+        if self.mp < amount:
+            return False
+        self.set_mp(self.mp - amount)
+        if self.mp == 0:
+            self.set_mp_stunned(True)
+        return True
+
+    def add_gold(self, amount: int) -> None:
+        self.player["gold"] = int(self.player.get("gold", 0) or 0) + int(amount)
+        self._gold_delta += int(amount)
+
+    def add_item(self, item_name: str) -> None:
+        if not item_name or item_name == "none":
+            return
+        self.inventory.append(item_name)
+        self._item_delta[item_name] = self._item_delta.get(item_name, 0) + 1
+
+    def remove_item(self, item_name: str) -> bool:
+        if item_name not in self.inventory:
+            return False
+        self.inventory.remove(item_name)
+        self._item_delta[item_name] = self._item_delta.get(item_name, 0) - 1
+        return True
+
+    # -------------------------
+    # 書き戻し
+    # -------------------------
+
+    @property
+    def pending(self) -> dict[str, Any]:
+        return {key: self.player.get(key) for key in sorted(self._dirty)}
+
+    async def commit_turn(self, hp: int) -> None:
+        """ターン終了時の HP を反映してターンを進める"""
+        self.set_hp(hp)
+        await self.end_turn()
+
+    async def end_turn(self) -> None:
+        """1ターン終了。一定ターン毎にチェックポイントを書き込む"""
+        self.turns += 1
+        if BATTLE_CHECKPOINT_TURNS > 0 and self.turns % BATTLE_CHECKPOINT_TURNS == 0:
+            await self.flush(reason="checkpoint")
+
+    async def flush(self, *, reason: str = "end") -> None:
+        """保留中の変更を 1 回の update_player（所持品 / ゴールドは apply_inventory_delta）で書き戻す"""
+        if self.closed or not self.loaded:
+            return
+
+        item_delta = {item: change for item, change in self._item_delta.items() if change}
+        if item_delta or self._gold_delta:
+            try:
+                if await db.apply_inventory_delta(self.user_id, item_delta, self._gold_delta) is None:
+                    await self._apply_gains_only(item_delta, self._gold_delta, reason)
+                self._item_delta.clear()
+                self._gold_delta = 0
+            except Exception as e:
+                logger.warning(
+                    "battle_session.flush inventory failed: user_id=%s reason=%s err=%s", self.user_id, reason, e
+                )
+
+        payload = self.pending
+        if payload:
+            try:
+                await db.update_player(self.user_id, **payload)
+                self._dirty.clear()
+            except Exception as e:
+                logger.warning(
+                    "battle_session.flush failed: user_id=%s reason=%s keys=%s err=%s",
+                    self.user_id,
+                    reason,
+                    sorted(payload.keys()),
+                    e,
+                )
+                return
+
+        logger.debug(
+            "battle_session.flush: user_id=%s reason=%s turns=%s keys=%s",
+            self.user_id,
+            reason,
+            self.turns,
+            sorted(payload.keys()),
+        )
+
+    async def _apply_gains_only(self, item_delta: dict[str, int], gold_delta: int, reason: str) -> None:
+        """増減がまとめて拒否された（戦闘中に別の経路で消費済みなど）ときは、獲得分だけを書き戻す"""
+        gains = {item: change for item, change in item_delta.items() if change > 0}
+        gold_gain = max(0, gold_delta)
+        dropped = {item: change for item, change in item_delta.items() if change < 0}
+        logger.warning(
+            "battle_session.flush inventory rejected; keeping gains only: user_id=%s reason=%s "
+            "gains=%s gold=%s dropped=%s dropped_gold=%s",
+            self.user_id,
+            reason,
+            gains,
+            gold_gain,
+            dropped,
+            min(0, gold_delta),
+        )
+        if not gains and not gold_gain:
+            return
+        if await db.apply_inventory_delta(self.user_id, gains, gold_gain) is None:
+            logger.error(
+                "battle_session.flush loot lost: user_id=%s reason=%s gains=%s gold=%s",
+                self.user_id,
+                reason,
+                gains,
+                gold_gain,
+            )
+
+    async def close(self) -> None:
+        """最終書き戻しを行い、以降の書き込みを止める"""
+        await self.flush(reason="end")
+        self.closed = True
+
+    def discard(self) -> None:
+        """保留中の変更を捨てる（死亡処理でまとめてリセットされる場合）"""
+        self._dirty.clear()
+        self._item_delta.clear()
+        self._gold_delta = 0
+        self.closed = True
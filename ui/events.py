@@ -4,9 +4,10 @@ import random
 import asyncio
 import game
 import logging
-from discord.ui import View, button, Select
+from discord.ui import button, Select
 from db import get_player, update_player, delete_player
 import death_system
+from player_state import item_counts as player_item_counts
 from titles import get_title_rarity_emoji, get_title_rarity_color
 from runtime_settings import (
     NOTIFY_CHANNEL_ID,
@@ -15,15 +16,27 @@ from runtime_settings import (
     VIEW_TIMEOUT_SHORT,
 )
 from ui.common import finalize_view_on_timeout
+from ui.persistent import PersistentView
 
 logger = logging.getLogger("rpgbot")
-class SpecialEventView(View):
+class SpecialEventView(PersistentView):
+    persistent_kind = "special_event"
+
     def __init__(self, user_id: int, user_processing: dict, distance: int):
         super().__init__(timeout=VIEW_TIMEOUT_SHORT)
         self.user_id = user_id
         self.user_processing = user_processing
         self.distance = distance
 
+    def persistent_state(self):
+        return {"distance": self.distance}
+
+    @classmethod
+    async def restore(cls, user_id: int, state: dict, interaction: discord.Interaction):
+        from bot_state import attach_bot_state
+
+        return cls(user_id, attach_bot_state(interaction.client), int(state.get("distance", 0)))
+
     @button(label="🔨 鍛冶屋", style=discord.ButtonStyle.primary)
     async def blacksmith_event(self, interaction: discord.Interaction, button: discord.ui.Button):
         if interaction.user.id != self.user_id:
@@ -42,11 +55,7 @@ class SpecialEventView(View):
             await interaction.edit_original_response(embed=embed, view=None)
             return
 
-        inventory = player.get("inventory", [])
-        materials = {}
-        for item in inventory:
-            if item in game.MATERIAL_PRICES:
-                materials[item] = materials.get(item, 0) + 1
+        materials = {item: count for item, count in player_item_counts(player).items() if item in game.MATERIAL_PRICES}
 
         if not materials:
             embed = discord.Embed(
@@ -82,11 +91,7 @@ class SpecialEventView(View):
             await interaction.edit_original_response(embed=embed, view=None)
             return
 
-        inventory = player.get("inventory", [])
-        materials = {}
-        for item in inventory:
-            if item in game.MATERIAL_PRICES:
-                materials[item] = materials.get(item, 0) + 1
+        materials = {item: count for item, count in player_item_counts(player).items() if item in game.MATERIAL_PRICES}
 
         if not materials:
             embed = discord.Embed(
@@ -157,7 +162,6 @@ class SpecialEventView(View):
 # ==============================
 # ラスボスクリア時のアイテム持ち帰りView
 # ==============================
-from collections import Counter
 
 class FinalBossClearView(discord.ui.View):
     def __init__(self, user_id: int, ctx, user_processing: dict, boss_stage: int):
@@ -180,12 +184,12 @@ class FinalBossClearView(discord.ui.View):
         clear_result = await db.handle_boss_clear(self.user_id)
 
         # インベントリからアイテム選択プルダウンを作成
-        player = await db.get_player(self.user_id)
+        player = await db.get_player(self.user_id, fields=("inventory",))
         inventory = player.get("inventory", []) if player else []
 
         if inventory:
             # アイテムをカウント（集約）
-            item_counts = Counter(inventory)
+            item_counts = player_item_counts(player)
             
             # アイテムを選択肢に変換（最大25個）
             options = []
@@ -10,7 +10,6 @@ import death_system
 from titles import get_title_rarity_emoji, get_title_rarity_color
 from runtime_settings import VIEW_TIMEOUT_LONG
 from ui.storage import StorageSelectView
-from story import StoryView
 
 logger = logging.getLogger("rpgbot")
 class NameRequestView(discord.ui.View):
@@ -82,6 +81,8 @@ class NameModal(discord.ui.Modal):
             await self.channel.send(embed=embed, view=storage_view)
         else:
             # 倉庫が空の場合：まずは相方ストーリー（みはり）を開始
+            from story import StoryView
+
             view = StoryView(self.user_id, "start_mihari", user_processing={})
             await view.send_story(interaction)
 
@@ -4,9 +4,11 @@ import random
 import asyncio
 import game
 import logging
+from collections.abc import Mapping
 from discord.ui import View, button, Select
 from db import get_player, update_player, delete_player
 import death_system
+from player_state import item_counts as player_item_counts
 from titles import get_title_rarity_emoji, get_title_rarity_color
 from runtime_settings import (
     DESC_TRIM_LONG,
@@ -25,13 +27,11 @@ def status_embed(player):
     embed.add_field(name="所持金", value=f'{player.get("gold", 0)}G')
     return embed
 
-from collections import Counter
-
 class InventorySelectView(discord.ui.View):
     def __init__(self, player):
         super().__init__(timeout=VIEW_TIMEOUT_SHORT)
         self.player = player
-        self.user_id = player.get("user_id") if isinstance(player, dict) else None
+        self.user_id = player.get("user_id") if isinstance(player, Mapping) else None
         inventory = player.get("inventory", [])
 
         if not inventory:
@@ -45,7 +45,7 @@ class InventorySelectView(discord.ui.View):
             self.add_item(select)
         else:
             # アイテムをカウント（集約）
-            item_counts = Counter(inventory)
+            item_counts = player_item_counts(player)
             
             # アイテムを種類別に分類
             potions = []
@@ -193,13 +193,12 @@ class InventorySelectView(discord.ui.View):
             return await interaction.response.send_message("アイテム情報が見つかりません。", ephemeral=True)
 
         # 所持数を取得
-        inventory = self.player.get("inventory", [])
-        item_count = inventory.count(item_name)
+        item_count = player_item_counts(self.player)[item_name]
 
         # アイテムタイプ別処理
         if item_info['type'] == 'potion':
             # 回復薬使用
-            player = await get_player(interaction.user.id)
+            player = await get_player(interaction.user.id, fields=("hp", "max_hp", "mp", "max_mp"))
             if not player:
                 return await interaction.response.send_message("プレイヤーデータが見つかりません。", ephemeral=True)
 
@@ -300,18 +299,15 @@ class InventorySelectView(discord.ui.View):
             )
 
 
-from collections import Counter
-
 class EquipmentSelectView(discord.ui.View):
     """装備変更用View"""
     def __init__(self, player):
         super().__init__(timeout=VIEW_TIMEOUT_SHORT)
         self.player = player
-        self.user_id = player.get("user_id") if isinstance(player, dict) else None
-        inventory = player.get("inventory", [])
+        self.user_id = player.get("user_id") if isinstance(player, Mapping) else None
 
         # アイテムをカウント（集約）
-        item_counts = Counter(inventory)
+        item_counts = player_item_counts(player)
 
         # 武器リストと鎧リストと盾リスト
         weapons = []
@@ -0,0 +1,403 @@
+"""再起動をまたぐ View（persistent-view モード）
+
+宝箱・特殊イベント・ストーリーの View はメッセージ毎にメモリへ常駐し、タイムアウト用のタスクを
+持っていた。再起動（デプロイ）でまとめて消えるのでボタンが反応しなくなり、開いたままの
+メッセージが多いほどメモリも増える。
+
+- PersistentView を継承した View は、送信時にボタン / セレクトの custom_id を
+  `rpv:{kind}:{user_id}:{session_id}:{index}` に書き換え、状態（persistent_state）を
+  ViewStateStore（SQLite）に保存する。送信後の View はすぐに stop() してメモリから外す
+- ボタンが押されると、bot.add_dynamic_items で登録した PersistentViewDispatcher が custom_id を
+  解釈し、保存した状態から View を作り直して（restore）、押されたボタンのコールバックを呼ぶ
+- 状態は View のタイムアウトと同じ秒数で期限切れになる。期限切れの掃除（cogs/persistent_views.py）で
+  従来の on_timeout と同じく user_processing を解除する。解除するのは送信時に保持していたリース
+  （token を状態に保存する）がまだ残っている場合だけで、その後に取られた別のリースは解除しない
+- keep_live の View（戦闘）は、プロセスが生きている間は同じインスタンスにクリックを渡す
+  （ターンをまたぐロックやセッションを保つため）。作り直すのは再起動後の最初のクリックだけ
+
+状態を JSON にできない View（ctx などを持つもの）は persistent_state で None を返せば、
+その View だけ従来通りメモリ上の View として動く。PERSISTENT_VIEWS=0 で全体を無効にできる。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, ClassVar, Optional
+
+import discord
+
+from db_profile import current_command
+from runtime_settings import PERSISTENT_VIEWS, VIEW_STATE_PATH, VIEW_TIMEOUT_LONG
+from user_concurrency import UserConcurrency
+
+logger = logging.getLogger("rpgbot")
+
+PREFIX = "rpv"
+CUSTOM_ID_TEMPLATE = rf"{PREFIX}:(?P<kind>[a-z_]+):(?P<user_id>\d+):(?P<session_id>[0-9a-f]{{16}}):(?P<index>\d+)"
+
+EXPIRED_MESSAGE = "⌛ この操作は期限切れです。もう一度コマンドを実行してください。"
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def encode_custom_id(kind: str, user_id: int, session_id: str, index: int) -> str:
+    return f"{PREFIX}:{kind}:{int(user_id)}:{session_id}:{int(index)}"
+
+
+def interaction_context(interaction: discord.Interaction) -> SimpleNamespace:
+    """作り直した View 用の ctx 相当（ctx.send / ctx.author / ctx.channel）"""
+    channel = interaction.channel
+    return SimpleNamespace(
+        author=interaction.user,
+        channel=channel,
+        guild=interaction.guild,
+        bot=interaction.client,
+        send=channel.send if channel is not None else None,
+    )
+
+
+class ViewStateStore:
+    """View の状態（session_id → kind / user_id / 期限 / JSON）を SQLite に保存する"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self.saved = 0
+        self.restored = 0
+        self.expired = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            # WAL + synchronous=NORMAL: 1 件の書き込みは fsync を待たない（数十µs）
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS view_state ("
+                " session_id TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " user_id INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " state TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS view_state_expires ON view_state (expires_at)")
+            self._conn = conn
+        return self._conn
+
+    def put(self, session_id: str, kind: str, user_id: int, state: dict[str, Any], ttl: float) -> None:
+        payload = json.dumps(state, ensure_ascii=False, separators=(",", ":"))
+        self._connect().execute(
+            "INSERT OR REPLACE INTO view_state (session_id, kind, user_id, expires_at, state) VALUES (?, ?, ?, ?, ?)",
+            (session_id, kind, int(user_id), time.time() + ttl, payload),
+        )
+        self.saved += 1
+
+    def get(self, session_id: str) -> Optional[tuple[str, int, dict[str, Any]]]:
+        """(kind, user_id, state)。無い / 期限切れなら None"""
+        row = self._connect().execute(
+            "SELECT kind, user_id, state FROM view_state WHERE session_id = ? AND expires_at > ?",
+            (session_id, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        state = _loads(row[2])
+        if state is None:
+            return None
+        return row[0], int(row[1]), state
+
+    def delete(self, session_id: str) -> None:
+        self._connect().execute("DELETE FROM view_state WHERE session_id = ?", (session_id,))
+
+    def purge_expired(self) -> list[tuple[str, str, int, Optional[str]]]:
+        """期限切れの状態を消し、消した (session_id, kind, user_id, リースの token) を返す"""
+        conn = self._connect()
+        now = time.time()
+        rows = conn.execute(
+            "SELECT session_id, kind, user_id, state FROM view_state WHERE expires_at <= ?", (now,)
+        ).fetchall()
+        if rows:
+            conn.execute("DELETE FROM view_state WHERE expires_at <= ?", (now,))
+            self.expired += len(rows)
+        return [
+            (session_id, kind, int(user_id), (_loads(state) or {}).get("_lease"))
+            for session_id, kind, user_id, state in rows
+        ]
+
+    def count(self) -> int:
+        return int(self._connect().execute("SELECT COUNT(*) FROM view_state").fetchone()[0])
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": PERSISTENT_VIEWS,
+            "stored": self.count() if self._conn is not None else 0,
+            "saved": self.saved,
+            "restored": self.restored,
+            "expired": self.expired,
+        }
+
+
+def _loads(payload: str) -> Optional[dict[str, Any]]:
+    try:
+        state = json.loads(payload)
+    except ValueError:
+        return None
+    return state if isinstance(state, dict) else {}
+
+
+view_state_store = ViewStateStore(VIEW_STATE_PATH)
+
+# kind → PersistentView のサブクラス
+_REGISTRY: dict[str, type["PersistentView"]] = {}
+# session_id → 常駐させている keep_live の View
+_LIVE: dict[str, "PersistentView"] = {}
+
+
+class PersistentView(discord.ui.View):
+    """状態から作り直せる View の基底クラス
+
+    サブクラスは persistent_kind を決め、persistent_state（状態の dict。None なら常駐 View のまま）と
+    restore（状態から View を作る classmethod）を実装する。ボタンの並びは状態だけで決まること
+    （押されたボタンは並び順の index で探す）。
+    """
+
+    persistent_kind: ClassVar[str] = ""
+    # 期限切れで user_processing を解除するか（従来の on_timeout と同じ動作）
+    release_on_expire: ClassVar[bool] = True
+    # プロセス内では同じインスタンスを使い続けるか（作り直すのは再起動後だけ）
+    keep_live: ClassVar[bool] = False
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        if cls.persistent_kind:
+            _REGISTRY[cls.persistent_kind] = cls
+
+    _session_id: Optional[str] = None
+    _persisted = False
+    # 最初に保存したときに保持していた user_processing のリース
+    _lease_token: Optional[str] = None
+
+    def persistent_state(self) -> Optional[dict[str, Any]]:
+        return {}
+
+    def persistent_finished(self) -> bool:
+        """True なら状態を消す（戦闘の決着など、もう押されることの無い View）"""
+        return False
+
+    @classmethod
+    async def restore(
+        cls, user_id: int, state: dict[str, Any], interaction: discord.Interaction
+    ) -> "PersistentView":
+        raise NotImplementedError
+
+    def _persist(self) -> bool:
+        if not PERSISTENT_VIEWS or not self.persistent_kind:
+            return False
+        state = self.persistent_state()
+        if state is None:
+            return False
+        user_id = getattr(self, "user_id", None)
+        if user_id is None:
+            return False
+
+        if self._session_id is None:
+            if self.persistent_finished():
+                return False
+            self._session_id = new_session_id()
+            lease_token = getattr(getattr(self, "user_processing", None), "lease_token", None)
+            self._lease_token = lease_token(user_id) if lease_token is not None else None
+        elif self.persistent_finished():
+            forget(self._session_id)
+            return False
+        # 無効化したボタン（「素材が無い」など）も並び順の index で覚えておく
+        items = [item for item in self.children if item.is_dispatchable()]
+        disabled = [i for i, item in enumerate(items) if getattr(item, "disabled", False)]
+        if disabled:
+            state = {**state, "_disabled": disabled}
+        if self._lease_token:
+            state = {**state, "_lease": self._lease_token}
+        try:
+            view_state_store.put(
+                self._session_id, self.persistent_kind, user_id, state, self.timeout or VIEW_TIMEOUT_LONG
+            )
+        except Exception as e:
+            # 保存できなければこのメッセージは常駐 View として動かす
+            # （rpv: の custom_id のままだと dispatcher とも一致してしまうので付け直す）
+            logger.warning("persistent view save failed: kind=%s err=%s", self.persistent_kind, e)
+            if _LIVE.get(self._session_id) is self:
+                # 常駐中の View は dispatcher から届くので custom_id はそのまま（状態は前回保存したもの）
+                return True
+            for item in self.children:
+                if item.is_dispatchable() and str(item.custom_id).startswith(f"{PREFIX}:"):
+                    item.custom_id = os.urandom(16).hex()
+            return False
+
+        for index, item in enumerate(items):
+            item.custom_id = encode_custom_id(self.persistent_kind, user_id, self._session_id, index)
+        return True
+
+    def to_components(self) -> list[dict[str, Any]]:
+        # 送信 / 編集の度に呼ばれる（custom_id の付与と状態の保存）
+        self._persisted = self._persist()
+        return super().to_components()
+
+    def _start_listening_from_store(self, store: Any) -> None:
+        super()._start_listening_from_store(store)
+        if self._persisted:
+            # 押されるまで View を持たない（押されたら dispatcher が状態から作り直す）。
+            # keep_live の View は dispatcher がこのインスタンスに渡す
+            if self.keep_live:
+                _LIVE[self._session_id] = self
+            asyncio.get_running_loop().call_soon(self.stop)
+
+
+def forget(session_id: str) -> None:
+    """状態と常駐中の View を消す"""
+    _LIVE.pop(session_id, None)
+    try:
+        view_state_store.delete(session_id)
+    except Exception as e:
+        logger.warning("persistent view delete failed: session_id=%s err=%s", session_id, e)
+
+
+async def _reply_expired(interaction: discord.Interaction) -> None:
+    try:
+        await interaction.response.send_message(EXPIRED_MESSAGE, ephemeral=True)
+    except discord.HTTPException:
+        pass
+    if interaction.message is not None:
+        try:
+            await interaction.message.edit(view=None)
+        except discord.HTTPException:
+            pass
+
+
+async def dispatch(interaction: discord.Interaction, kind: str, user_id: int, session_id: str, index: int) -> None:
+    """保存した状態から View を作り直し、押されたボタン / セレクトのコールバックを呼ぶ"""
+    cls = _REGISTRY.get(kind)
+    record = view_state_store.get(session_id) if cls is not None else None
+    if record is None or record[0] != kind or record[1] != user_id:
+        _LIVE.pop(session_id, None)
+        await _reply_expired(interaction)
+        return
+
+    current_command.set(f"view:{kind}")
+    disabled: set[int] = set()
+    view = _LIVE.get(session_id)
+    if view is None:
+        state = record[2]
+        disabled = set(state.pop("_disabled", ()))
+        lease_token = state.pop("_lease", None)
+        view = await cls.restore(user_id, state, interaction)
+        view._session_id = session_id
+        view._lease_token = lease_token
+        view_state_store.restored += 1
+        # 作り直した View も保持しない（コールバック内の再描画では状態の保存だけ行う）
+        view.stop()
+        if cls.keep_live:
+            _LIVE[session_id] = view
+
+    items = [item for item in view.children if item.is_dispatchable()]
+    for i in disabled:
+        if i < len(items) and hasattr(items[i], "disabled"):
+            items[i].disabled = True
+    if index >= len(items) or index in disabled:
+        await _reply_expired(interaction)
+        return
+    item = items[index]
+    item._refresh_state(interaction, interaction.data)  # セレクトの values など
+
+    try:
+        if not await view.interaction_check(interaction):
+            return
+        await item.callback(interaction)
+    except Exception as e:
+        await view.on_error(interaction, e, item)
+
+
+class PersistentViewDispatcher(discord.ui.DynamicItem[discord.ui.Item], template=CUSTOM_ID_TEMPLATE):
+    """rpv: で始まる custom_id をまとめて受ける（View 毎の常駐は不要）"""
+
+    def __init__(self, item: discord.ui.Item, *, kind: str, user_id: int, session_id: str, index: int):
+        super().__init__(item)
+        self.kind = kind
+        self.user_id = user_id
+        self.session_id = session_id
+        self.index = index
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Item, match, /):
+        return cls(
+            item,
+            kind=match["kind"],
+            user_id=int(match["user_id"]),
+            session_id=match["session_id"],
+            index=int(match["index"]),
+        )
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        await dispatch(interaction, self.kind, self.user_id, self.session_id, self.index)
+
+
+def release_expired(user_processing: UserConcurrency) -> int:
+    """期限切れの状態を消し、対象ユーザーの user_processing を解除する
+
+    解除するのは保存時に記録したリースがまだ保持されている場合だけ（再起動後や、
+    その後の別のコマンドが取ったリースは token が違うので解除しない）。
+    """
+    # 決着が付いたのに状態が残っている常駐 View（view=None で消したメッセージなど）
+    for session_id, view in list(_LIVE.items()):
+        if view.persistent_finished():
+            forget(session_id)
+
+    released = 0
+    for session_id, kind, user_id, lease_token in view_state_store.purge_expired():
+        _LIVE.pop(session_id, None)
+        cls = _REGISTRY.get(kind)
+        if cls is None or not cls.release_on_expire or not lease_token:
+            continue
+        if user_processing.release_if_token(user_id, lease_token):
+            released += 1
+    return released
+
+
+async def purge_loop(user_processing: Any, interval: float) -> None:
+    """期限切れの掃除を interval 秒毎に行う（cogs/persistent_views.py が起動する）"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            released = release_expired(user_processing)
+            if released:
+                logger.debug("persistent views expired: released=%s", released)
+        except Exception as e:
+            logger.warning("persistent view purge failed: %s", e)
+
+
+__all__ = [
+    "CUSTOM_ID_TEMPLATE",
+    "PersistentView",
+    "PersistentViewDispatcher",
+    "ViewStateStore",
+    "dispatch",
+    "encode_custom_id",
+    "forget",
+    "interaction_context",
+    "purge_loop",
+    "release_expired",
+    "view_state_store",
+]
@@ -0,0 +1,173 @@
+"""Discord メッセージ編集のコアレッサ（メッセージ毎の描画キュー）
+
+戦闘の 1 ターンは「ボタン無効化 → 段階表示 2 回 → ボタン再有効化」で 3〜4 回の
+PATCH を Discord に送っていた。負荷時にはチャンネル単位のレート制限に当たり、
+同じチャンネルの全員が待たされる。
+
+- メッセージID毎に保留中の変更（content / embed / view など）を 1 つにマージし、
+  常に「最新の状態」だけを送る
+- チャンネル単位で最小送信間隔（MESSAGE_EDIT_MIN_INTERVAL）を守る
+- 送信待ちの間に届いた新しいフレームは古いフレームを上書きする（中間フレームを捨てる）
+- 直後に続く編集をまとめるため、送信前に MESSAGE_EDIT_LINGER 秒だけ待つ
+
+View オブジェクトは送信時点の状態でシリアライズされるため、
+`view=self` を複数回渡しても最後のボタン状態が反映される。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any
+
+from runtime_settings import MESSAGE_EDIT_LINGER, MESSAGE_EDIT_MIN_INTERVAL
+
+logger = logging.getLogger("rpgbot")
+
+
+class _PendingRender:
+    __slots__ = ("message", "fields", "waiters", "task")
+
+    def __init__(self, message: Any):
+        self.message = message
+        self.fields: dict[str, Any] = {}
+        self.waiters: list[asyncio.Future] = []
+        self.task: asyncio.Task | None = None
+
+
+class MessageRenderQueue:
+    """メッセージ毎に編集をまとめ、チャンネル毎に送信間隔を制御する。"""
+
+    def __init__(self, *, min_interval: float = MESSAGE_EDIT_MIN_INTERVAL, linger: float = MESSAGE_EDIT_LINGER):
+        self.min_interval = max(0.0, float(min_interval))
+        self.linger = max(0.0, float(linger))
+        self._pending: dict[int, _PendingRender] = {}
+        self._channel_locks: dict[int, asyncio.Lock] = {}
+        self._channel_last_sent: dict[int, float] = {}
+
+        self.requested = 0
+        self.sent = 0
+        self.failed = 0
+        self.saved = 0  # 保留中フレームへのマージで省略できた編集回数
+
+    # -------------------------
+    # 公開API
+    # -------------------------
+
+    def submit(self, message: Any, **fields: Any) -> None:
+        """編集を予約して即座に戻る（失敗はログのみ）"""
+        self._enqueue(message, fields, None)
+
+    async def edit(self, message: Any, **fields: Any) -> None:
+        """編集を予約し、その内容を含むフレームが送信されるまで待つ"""
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(message, fields, future)
+        await future
+
+    async def drain(self, message: Any) -> None:
+        """指定メッセージの保留中フレームが送信されるまで待つ"""
+        entry = self._pending.get(self._message_key(message))
+        if entry is not None and entry.task is not None:
+            await asyncio.shield(entry.task)
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for entry in self._pending.values() if entry.fields)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "requested": self.requested,
+            "sent": self.sent,
+            "failed": self.failed,
+            "saved": self.saved,
+            "queued": self.queued,
+        }
+
+    # -------------------------
+    # 内部処理
+    # -------------------------
+
+    @staticmethod
+    def _message_key(message: Any) -> int:
+        message_id = getattr(message, "id", None)
+        return int(message_id) if message_id is not None else id(message)
+
+    @staticmethod
+    def _channel_key(message: Any) -> int:
+        channel = getattr(message, "channel", None)
+        channel_id = getattr(channel, "id", None)
+        return int(channel_id) if channel_id is not None else 0
+
+    def _enqueue(self, message: Any, fields: dict[str, Any], future: asyncio.Future | None) -> None:
+        self.requested += 1
+        key = self._message_key(message)
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = _PendingRender(message)
+            self._pending[key] = entry
+
+        if entry.fields:
+            self.saved += 1
+        entry.message = message
+        entry.fields.update(fields)
+        if future is not None:
+            entry.waiters.append(future)
+
+        if entry.task is None or entry.task.done():
+            entry.task = asyncio.create_task(self._drain(key, entry))
+
+    async def _drain(self, key: int, entry: _PendingRender) -> None:
+        channel_key: int | None = None
+        try:
+            while entry.fields:
+                channel_key = self._channel_key(entry.message)
+                lock = self._channel_locks.setdefault(channel_key, asyncio.Lock())
+                async with lock:
+                    if self.linger:
+                        await asyncio.sleep(self.linger)
+                    wait = self._channel_last_sent.get(channel_key, 0.0) + self.min_interval - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+
+                    # 待っている間に届いたフレームもここでまとめて送る
+                    fields, entry.fields = entry.fields, {}
+                    waiters, entry.waiters = entry.waiters, []
+                    try:
+                        await entry.message.edit(**fields)
+                        self.sent += 1
+                        for waiter in waiters:
+                            if not waiter.done():
+                                waiter.set_result(None)
+                    except Exception as e:
+                        self.failed += 1
+                        if waiters:
+                            for waiter in waiters:
+                                if not waiter.done():
+                                    waiter.set_exception(e)
+                        else:
+                            logger.warning("render_queue: message edit failed: message_id=%s err=%s", key, e)
+                    finally:
+                        self._channel_last_sent[channel_key] = time.monotonic()
+        finally:
+            if self._pending.get(key) is entry and not entry.fields:
+                self._pending.pop(key, None)
+            if channel_key is not None:
+                # 送信間隔を過ぎてもそのチャンネルに保留が無ければ、ロックと送信時刻を捨てる
+                asyncio.get_running_loop().call_later(self.min_interval, self._evict_channel, channel_key)
+
+    def _evict_channel(self, channel_key: int) -> None:
+        lock = self._channel_locks.get(channel_key)
+        if lock is not None and lock.locked():
+            return
+        if time.monotonic() - self._channel_last_sent.get(channel_key, 0.0) < self.min_interval:
+            return
+        if any(self._channel_key(entry.message) == channel_key for entry in self._pending.values()):
+            return
+        self._channel_locks.pop(channel_key, None)
+        self._channel_last_sent.pop(channel_key, None)
+
+
+render_queue = MessageRenderQueue()
+
+__all__ = ["MessageRenderQueue", "render_queue"]
@@ -8,6 +8,7 @@ from discord.ui import View, button, Select
 from db import get_player, update_player, delete_player
 import death_system
 from titles import get_title_rarity_emoji, get_title_rarity_color
+from adventure_threads import adventure_threads
 from runtime_settings import VIEW_TIMEOUT_MEDIUM
 
 logger = logging.getLogger("rpgbot")
@@ -105,16 +106,11 @@ class ResetFinalConfirmView(discord.ui.View):
         # 1) 保存済み thread_id を最優先で削除
         if guild and stored_thread_id:
             try:
-                thread = guild.get_thread(stored_thread_id)
-                if thread is None:
-                    try:
-                        ch = await guild.fetch_channel(stored_thread_id)
-                        thread = ch if isinstance(ch, discord.Thread) else None
-                    except Exception:
-                        thread = None
+                thread = await adventure_threads.fetch_thread(guild, stored_thread_id)
 
                 if thread is not None:
                     await thread.delete(reason="User reset")
+                    adventure_threads.mark_dead(stored_thread_id)
                     thread_deleted = True
                     logger.debug("reset: deleted stored thread_id=%s", stored_thread_id)
                 else:
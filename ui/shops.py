@@ -5,7 +5,7 @@ import asyncio
 import game
 import logging
 from discord.ui import View, button, Select
-from db import get_player, update_player, delete_player
+from db import update_player, delete_player
 import death_system
 from titles import get_title_rarity_emoji, get_title_rarity_color
 from runtime_settings import DESC_TRIM_LONG, SELECT_MAX_OPTIONS, VIEW_TIMEOUT_SHORT
@@ -92,17 +92,11 @@ class BlacksmithView(discord.ui.View):
         if not recipe:
             return await interaction.response.send_message("⚠️ レシピ情報が見つかりません。", ephemeral=True)
 
-        player = await get_player(interaction.user.id)
-        if not player:
-            return await interaction.response.send_message("⚠️ プレイヤーデータが見つかりません。", ephemeral=True)
-
-        # 素材を消費
-        for material, required_count in recipe["materials"].items():
-            for _ in range(required_count):
-                await db.remove_item_from_inventory(interaction.user.id, material)
-
-        # アイテムを追加
-        await db.add_item_to_inventory(interaction.user.id, recipe_name)
+        # 素材の消費と完成品の追加を 1 回で反映（素材が足りなければ何も変わらない）
+        delta = {material: -required_count for material, required_count in recipe["materials"].items()}
+        delta[recipe_name] = delta.get(recipe_name, 0) + 1
+        if await db.apply_inventory_delta(interaction.user.id, delta) is None:
+            return await interaction.response.send_message("⚠️ 素材が足りません。", ephemeral=True)
 
         # アイテムデータベースに登録（存在しない場合）
         if recipe_name not in game.ITEMS_DATABASE:
@@ -215,10 +209,8 @@ class MaterialMerchantView(discord.ui.View):
         price = game.MATERIAL_PRICES.get(material, 10)
         total_price = price * count
 
-        for _ in range(count):
-            await db.remove_item_from_inventory(interaction.user.id, material)
-
-        await db.add_gold(interaction.user.id, total_price)
+        if await db.apply_inventory_delta(interaction.user.id, {material: -count}, total_price) is None:
+            return await interaction.response.send_message("⚠️ 素材が足りません。", ephemeral=True)
 
         embed = discord.Embed(
             title="✅ 売却完了！",
@@ -242,13 +234,11 @@ class MaterialMerchantView(discord.ui.View):
             price = game.MATERIAL_PRICES.get(material, 10)
             total_price = price * count
             total_gold += total_price
-
-            for _ in range(count):
-                await db.remove_item_from_inventory(interaction.user.id, material)
-
             sold_items.append(f"{material} x{count} = {total_price}G")
 
-        await db.add_gold(interaction.user.id, total_gold)
+        delta = {material: -count for material, count in self.materials.items()}
+        if await db.apply_inventory_delta(interaction.user.id, delta, total_gold) is None:
+            return await interaction.response.send_message("⚠️ 素材が足りません。", ephemeral=True)
 
         sold_text = "\n".join(sold_items)
 
@@ -9,7 +9,6 @@ from db import get_player, update_player, delete_player
 import death_system
 from titles import get_title_rarity_emoji, get_title_rarity_color
 from runtime_settings import SELECT_MAX_OPTIONS, VIEW_TIMEOUT_LONG
-from story import StoryView
 
 logger = logging.getLogger("rpgbot")
 class StorageSelectView(discord.ui.View):
@@ -79,6 +78,8 @@ class StorageSelectView(discord.ui.View):
             )
             await interaction.response.edit_message(embed=embed, view=None)
 
+            from story import StoryView
+
             view = StoryView(self.user_id, "start_mihari", user_processing={})
             await view.send_story(interaction)
             return
@@ -107,6 +108,8 @@ class StorageSelectView(discord.ui.View):
             )
             await interaction.response.edit_message(embed=embed, view=None)
 
+            from story import StoryView
+
             view = StoryView(self.user_id, "start_mihari", user_processing={})
             await view.send_story(interaction)
         else:
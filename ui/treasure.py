@@ -4,22 +4,31 @@ import random
 import asyncio
 import game
 import logging
-from discord.ui import View, button, Select
+from discord.ui import button, Select
 from db import get_player, update_player, delete_player
 import death_system
 from titles import get_title_rarity_emoji, get_title_rarity_color
 from runtime_settings import NOTIFY_CHANNEL_ID, VIEW_TIMEOUT_TREASURE
 from settings.balance import TREASURE_COIN_MAX, TREASURE_COIN_MIN, TREASURE_RARE_CHANCE
 from ui.common import finalize_view_on_timeout
+from ui.persistent import PersistentView
 
 logger = logging.getLogger("rpgbot")
-class TreasureView(View):
+class TreasureView(PersistentView):
+    persistent_kind = "treasure"
+
     def __init__(self, user_id: int, user_processing: dict):
         super().__init__(timeout=VIEW_TIMEOUT_TREASURE)
         self.user_id = user_id
         self.user_processing = user_processing
         self.message = None
 
+    @classmethod
+    async def restore(cls, user_id: int, state: dict, interaction: discord.Interaction):
+        from bot_state import attach_bot_state
+
+        return cls(user_id, attach_bot_state(interaction.client))
+
     # ==============================
     # 「開ける」ボタン
     # ==============================
@@ -210,7 +219,9 @@ class TreasureView(View):
 # ==============================
 # トラップ宝箱View
 # ==============================
-class TrapChestView(View):
+class TrapChestView(PersistentView):
+    persistent_kind = "trap_chest"
+
     def __init__(self, user_id: int, user_processing: dict, player: dict):
         super().__init__(timeout=VIEW_TIMEOUT_TREASURE)
         self.user_id = user_id
@@ -218,6 +229,13 @@ class TrapChestView(View):
         self.player = player
         self.message = None
 
+    @classmethod
+    async def restore(cls, user_id: int, state: dict, interaction: discord.Interaction):
+        from bot_state import attach_bot_state
+
+        # player は handle_trap で読み直すので保存しない
+        return cls(user_id, attach_bot_state(interaction.client), None)
+
     @button(label="開ける", style=discord.ButtonStyle.danger)
     async def open_trap_chest(self, interaction: discord.Interaction, button: discord.ui.Button):
         if interaction.user.id != self.user_id:
@@ -0,0 +1,297 @@
+"""ユーザー単位の同時実行制御（リース方式）
+
+これまでは bot に 2 つの素の dict をぶら下げていた。
+
+- user_processing: 「処理中」フラグ。View が解除し忘れると固まり、!admin_clear_processing で外すしかなかった
+- user_locks: get_user_lock が作る asyncio.Lock。どちらも一度来たユーザーの分だけ増え続ける
+
+UserConcurrency はこれを「リース」に置き換える。
+
+- リースは保持中のユーザー分だけ存在する（解除したら消える）ので、メモリはアクティブ数に比例する
+- 最大保持時間（USER_LEASE_MAX_HOLD）を過ぎたリースは自動的に失効する（固まったユーザーが自然復帰する）
+- 取得待ちはユーザー毎の FIFO キューで、USER_LEASE_QUEUE_TIMEOUT 秒まで順番に待つ
+  （「別の処理が実行中です」で即座に弾かず、直前の処理が終われば続けて実行する）
+- 失効/解放の記録は LRU で上限（USER_LEASE_HISTORY_SIZE）付きで保持する
+
+互換性のため MutableMapping として振る舞う（既存コードの
+`user_processing[uid] = True / False` や `user_processing.get(uid)` がそのまま動く）。
+True の代入は待たずにリースを取得（更新）し、False の代入 / del は解放になる。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Iterator
+
+from runtime_settings import USER_LEASE_HISTORY_SIZE, USER_LEASE_MAX_HOLD, USER_LEASE_QUEUE_TIMEOUT
+
+logger = logging.getLogger("rpgbot")
+
+
+class Lease:
+    __slots__ = ("user_id", "owner", "token", "acquired_at", "expires_at", "detached")
+
+    def __init__(self, user_id: int, owner: str, max_hold: float):
+        self.user_id = user_id
+        self.owner = owner
+        # 同じユーザーの別のリースと区別する（延長しても変わらない）
+        self.token = uuid.uuid4().hex[:12]
+        self.acquired_at = time.monotonic()
+        self.detached = False
+        self.renew(max_hold)
+
+    def expired(self, now: float | None = None) -> bool:
+        return (now if now is not None else time.monotonic()) >= self.expires_at
+
+    def renew(self, max_hold: float) -> None:
+        self.expires_at = time.monotonic() + max_hold if max_hold > 0 else float("inf")
+
+    def detach(self) -> None:
+        """`hold()` を抜けても解放しない（View にリースを引き継ぐ時に使う）"""
+        self.detached = True
+
+
+def _key(user_id: Any) -> int:
+    try:
+        return int(user_id)
+    except (TypeError, ValueError):
+        return hash(user_id)
+
+
+class UserConcurrency(MutableMapping):
+    """ユーザー毎に 1 つだけ保持できるリースを管理する。"""
+
+    def __init__(
+        self,
+        *,
+        max_hold: float = USER_LEASE_MAX_HOLD,
+        queue_timeout: float = USER_LEASE_QUEUE_TIMEOUT,
+        history_size: int = USER_LEASE_HISTORY_SIZE,
+    ):
+        self.max_hold = float(max_hold)
+        self.queue_timeout = float(queue_timeout)
+        self.history_size = max(0, int(history_size))
+        self._leases: dict[int, Lease] = {}
+        self._waiters: dict[int, deque[asyncio.Future]] = {}
+        # 直近に解放/失効したリース（デバッグ表示用、LRUで上限付き）
+        self._history: OrderedDict[int, tuple[str, str, float]] = OrderedDict()
+
+        self.acquired_total = 0
+        self.expired_total = 0
+        self.timeouts_total = 0
+        self.wait_seconds_total = 0.0
+
+    # -------------------------
+    # 取得 / 解放
+    # -------------------------
+
+    def _active(self, key: int) -> Lease | None:
+        lease = self._leases.get(key)
+        if lease is not None and lease.expired():
+            self.expired_total += 1
+            logger.warning(
+                "user lease expired: user_id=%s owner=%s held=%.0fs",
+                key,
+                lease.owner,
+                time.monotonic() - lease.acquired_at,
+            )
+            self._release(key, reason="expired")
+            return None
+        return lease
+
+    def _grant(self, key: int, owner: str) -> Lease:
+        lease = Lease(key, owner, self.max_hold)
+        self._leases[key] = lease
+        self.acquired_total += 1
+        return lease
+
+    def _release(self, key: int, *, reason: str = "released", record: bool = True) -> None:
+        lease = self._leases.pop(key, None)
+        if lease is None:
+            return
+        if record and self.history_size:
+            self._history[key] = (lease.owner, reason, time.time())
+            self._history.move_to_end(key)
+            while len(self._history) > self.history_size:
+                self._history.popitem(last=False)
+        self._wake_next(key)
+
+    def _wake_next(self, key: int) -> None:
+        # 先頭の待機者だけを起こす（取得は起こされた側が行う）
+        waiters = self._waiters.get(key)
+        if waiters and not waiters[0].done():
+            waiters[0].set_result(None)
+
+    def is_busy(self, user_id: Any) -> bool:
+        return self._active(_key(user_id)) is not None
+
+    def try_acquire(self, user_id: Any, owner: str = "") -> Lease | None:
+        """待たずに取得する（保持中なら None）"""
+        key = _key(user_id)
+        if self._active(key) is not None or self._waiters.get(key):
+            return None
+        return self._grant(key, owner)
+
+    async def acquire(self, user_id: Any, owner: str = "", *, timeout: float | None = None) -> Lease | None:
+        """FIFO で順番を待って取得する（timeout 秒以内に取れなければ None）"""
+        lease = self.try_acquire(user_id, owner)
+        if lease is not None:
+            return lease
+
+        key = _key(user_id)
+        budget = self.queue_timeout if timeout is None else float(timeout)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + budget
+        future = loop.create_future()
+        waiters = self._waiters.setdefault(key, deque())
+        waiters.append(future)
+        try:
+            while True:
+                current = self._active(key)
+                if current is None and waiters[0] is future:
+                    return self._grant(key, owner)
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.timeouts_total += 1
+                    return None
+                # 保持中のリースが失効する時刻にも起きて確認する
+                if current is not None:
+                    remaining = min(remaining, max(0.0, current.expires_at - time.monotonic()))
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+                if future.done():
+                    # 起こされたが先に取られていた場合は、同じ順番のまま待ち直す
+                    index = waiters.index(future)
+                    future = loop.create_future()
+                    waiters[index] = future
+        finally:
+            self.wait_seconds_total += loop.time() - started
+            was_head = bool(waiters) and waiters[0] is future
+            try:
+                waiters.remove(future)
+            except ValueError:
+                pass
+            if not waiters:
+                if self._waiters.get(key) is waiters:
+                    self._waiters.pop(key, None)
+            elif was_head and key not in self._leases:
+                self._wake_next(key)
+
+    async def wait_idle(self, user_id: Any, *, timeout: float | None = None) -> bool:
+        """保持中のリースが解放されるのを待つ（取得はしない）"""
+        lease = await self.acquire(user_id, "wait_idle", timeout=timeout)
+        if lease is None:
+            return False
+        self._release(lease.user_id, record=False)
+        return True
+
+    def release(self, user_id: Any) -> None:
+        self._release(_key(user_id))
+
+    def lease_token(self, user_id: Any) -> str | None:
+        """保持中のリースの token（保持していなければ None）"""
+        lease = self._active(_key(user_id))
+        return lease.token if lease is not None else None
+
+    def release_if_token(self, user_id: Any, token: str) -> bool:
+        """保持中のリースが token のものなら解放する（後から取られた別のリースは解放しない）"""
+        key = _key(user_id)
+        lease = self._active(key)
+        if lease is None or lease.token != token:
+            return False
+        self._release(key)
+        return True
+
+    @asynccontextmanager
+    async def hold(self, user_id: Any, owner: str = "", *, timeout: float | None = None) -> AsyncIterator[Lease | None]:
+        """`async with manager.hold(uid, "move") as lease:` の形で使う。
+
+        取得できなければ lease は None。`lease.detach()` すると抜けても解放せず、
+        View 側（タイムアウト時の finalize_view_on_timeout 等）の解放に任せる。
+        """
+        lease = await self.acquire(user_id, owner, timeout=timeout)
+        try:
+            yield lease
+        finally:
+            if lease is not None and not lease.detached and self._leases.get(lease.user_id) is lease:
+                self._release(lease.user_id)
+
+    # -------------------------
+    # MutableMapping 互換（user_processing dict の置き換え）
+    # -------------------------
+
+    def __getitem__(self, user_id: Any) -> bool:
+        if self._active(_key(user_id)) is None:
+            raise KeyError(user_id)
+        return True
+
+    def __setitem__(self, user_id: Any, value: Any) -> None:
+        key = _key(user_id)
+        if value:
+            lease = self._active(key)
+            if lease is None:
+                self._grant(key, "flag")
+            else:
+                # 既に保持中なら期限を延ばす
+                lease.renew(self.max_hold)
+        else:
+            self._release(key)
+
+    def __delitem__(self, user_id: Any) -> None:
+        key = _key(user_id)
+        if key not in self._leases:
+            raise KeyError(user_id)
+        self._release(key)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._leases))
+
+    def __len__(self) -> int:
+        return len(self._leases)
+
+    # -------------------------
+    # メトリクス
+    # -------------------------
+
+    def sweep(self) -> int:
+        """失効済みリースをまとめて解放する"""
+        now = time.monotonic()
+        expired = [key for key, lease in self._leases.items() if lease.expired(now)]
+        for key in expired:
+            self._active(key)
+        return len(expired)
+
+    def describe(self, user_id: Any) -> str:
+        key = _key(user_id)
+        lease = self._active(key)
+        if lease is not None:
+            return f"処理中（{lease.owner or '不明'}・{time.monotonic() - lease.acquired_at:.0f}秒）"
+        last = self._history.get(key)
+        if last is not None:
+            return f"待機中（直前: {last[0] or '不明'} / {last[1]}）"
+        return "待機中"
+
+    def stats(self) -> dict[str, Any]:
+        self.sweep()
+        return {
+            "held": len(self._leases),
+            "waiting": sum(len(q) for q in self._waiters.values()),
+            "acquired_total": self.acquired_total,
+            "expired_total": self.expired_total,
+            "timeouts_total": self.timeouts_total,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "history": len(self._history),
+        }
+
+
+__all__ = ["Lease", "UserConcurrency"]
@@ -0,0 +1,416 @@
+"""ゲーム進行の書き込みのローカル先行書き込みジャーナル（write-ahead journal）
+
+Supabase が一時的に応答しないと、update_player / add_to_storage / record_death_history などの書き込みが
+View に例外として伝わる（進行が失われる）か、ログだけ出して False を返していた。
+
+- 書き込みは送信前に冪等キー付きでジャーナル（JSON Lines）へ追記し、fsync してから送る。
+  fsync は JOURNAL_FSYNC_INTERVAL_MS の間に来た追記をまとめて 1 回行う（グループコミット）
+- 送信に成功したら完了を追記する。一時的な失敗（ネットワーク / タイムアウト / 429 / 5xx /
+  ブレーカーが開いている）なら「後で送る」に回し、呼び出し元にはローカルディスクの速さで成功を返す
+- 後回しの書き込みはリプレイヤーが順番に送り直す（同じユーザーの書き込みは追記順を守る）
+- 起動時（cogs/journal.py）に、前回クラッシュで残った未完了の書き込みを読み戻して送り直す
+- 4xx（恒久的な失敗）はリプレイしても通らないので、エラーログに内容を残して破棄する
+
+書き込みの種類（kind）毎の送信処理は db_part1 / db_part2 が register() で登録する。
+送信処理は (entry, replay) を受け取り、失敗時は例外を投げる。
+
+players.update は値の上書き（PATCH）なので何度送っても同じ結果になる。
+挿入系は entry.key を冪等キーとして送る（db_idempotency）ので、完了の記録が fsync される前に
+クラッシュして再送しても重複しない。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger("rpgbot")
+
+# submit() が「ジャーナルに記録し、送信は後回しにした」ことを表す
+DEFERRED = object()
+
+
+@dataclass
+class JournalEntry:
+    seq: int
+    key: str
+    kind: str
+    user_id: str
+    data: dict[str, Any]
+    created_at: float = field(default_factory=time.time)
+    deferred: bool = False
+
+    def to_line(self) -> bytes:
+        record = {
+            "seq": self.seq,
+            "key": self.key,
+            "kind": self.kind,
+            "user_id": self.user_id,
+            "data": self.data,
+            "ts": self.created_at,
+        }
+        return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+Handler = Callable[[JournalEntry, bool], Awaitable[Any]]
+
+
+def is_transient(exc: BaseException) -> bool:
+    """後で送り直せば通る見込みのある失敗か"""
+    from db_http import CircuitOpen, _should_retry
+
+    return isinstance(exc, CircuitOpen) or _should_retry(exc)
+
+
+class WriteJournal:
+    def __init__(
+        self,
+        path: str,
+        *,
+        fsync_interval: float,
+        compact_bytes: int,
+        replay_max_delay: float,
+        enabled: bool = True,
+    ):
+        self.path = Path(path)
+        self.fsync_interval = fsync_interval
+        self.compact_bytes = compact_bytes
+        self.replay_max_delay = replay_max_delay
+        self.enabled = enabled
+
+        self._handlers: dict[str, Handler] = {}
+        self._pending: OrderedDict[int, JournalEntry] = OrderedDict()
+        self._user_pending: dict[str, int] = {}
+        self._fd: Optional[int] = None
+        self._bytes = 0
+        self._seq = 0
+        self._sync_waiters: list[asyncio.Future] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._replay_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+        self.deferred_total = 0
+        self.replayed_total = 0
+        self.dropped_total = 0
+        self.recovered_total = 0
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    # -------------------------
+    # ファイル
+    # -------------------------
+
+    def _open(self) -> None:
+        """既存のジャーナルを読み戻し、未完了の書き込みだけを残して開き直す"""
+        if self._fd is not None:
+            return
+        entries: dict[int, JournalEntry] = {}
+        if self.path.exists():
+            with self.path.open("rb") as f:
+                for raw in f:
+                    try:
+                        record = json.loads(raw)
+                    except ValueError:
+                        continue  # クラッシュで途中まで書かれた行
+                    if "done" in record:
+                        entries.pop(int(record["done"]), None)
+                    elif "seq" in record:
+                        entries[int(record["seq"])] = JournalEntry(
+                            seq=int(record["seq"]),
+                            key=str(record.get("key") or ""),
+                            kind=str(record["kind"]),
+                            user_id=str(record["user_id"]),
+                            data=record.get("data") or {},
+                            created_at=float(record.get("ts") or 0),
+                            deferred=True,
+                        )
+
+        # 未完了分だけで書き直す（アトミックに置き換える）
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        lines = [entry.to_line() for _, entry in sorted(entries.items())]
+        with tmp.open("wb") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._bytes = sum(len(line) for line in lines)
+        for seq, entry in sorted(entries.items()):
+            self._track(entry)
+            self._seq = max(self._seq, seq)
+        self.recovered_total += len(entries)
+        if entries:
+            logger.warning("📒 write journal: recovered %s unsent writes from %s", len(entries), self.path)
+
+    def _write(self, line: bytes) -> None:
+        os.write(self._fd, line)
+        self._bytes += len(line)
+
+    async def _sync(self) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._sync_waiters.append(future)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        await future
+
+    async def _flush_loop(self) -> None:
+        while self._sync_waiters:
+            # 少し待って、その間に来た追記をまとめて fsync する
+            await asyncio.sleep(self.fsync_interval)
+            waiters, self._sync_waiters = self._sync_waiters, []
+            try:
+                await asyncio.to_thread(os.fsync, self._fd)
+            except Exception as e:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                continue
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    def _compact(self) -> None:
+        # 未完了が無ければ中身は不要: 先頭から捨てる
+        if not self._pending and self._bytes >= self.compact_bytes and not self._sync_waiters:
+            os.ftruncate(self._fd, 0)
+            self._bytes = 0
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    # -------------------------
+    # 記録
+    # -------------------------
+
+    def _track(self, entry: JournalEntry) -> None:
+        self._pending[entry.seq] = entry
+        self._user_pending[entry.user_id] = self._user_pending.get(entry.user_id, 0) + 1
+
+    def _untrack(self, entry: JournalEntry) -> bool:
+        if self._pending.pop(entry.seq, None) is None:
+            return False
+        remaining = self._user_pending.get(entry.user_id, 1) - 1
+        if remaining > 0:
+            self._user_pending[entry.user_id] = remaining
+        else:
+            self._user_pending.pop(entry.user_id, None)
+        return True
+
+    async def append(self, kind: str, user_id, data: dict[str, Any]) -> JournalEntry:
+        """書き込みを記録して fsync を待つ（同じユーザーの未完了があれば、送信は後回しにする）"""
+        self._open()
+        self._seq += 1
+        uid = str(user_id)
+        entry = JournalEntry(seq=self._seq, key=uuid.uuid4().hex, kind=kind, user_id=uid, data=dict(data))
+        # 先行する書き込みが未完了なら、順序を守るためリプレイヤーに任せる
+        entry.deferred = self._user_pending.get(uid, 0) > 0
+        self._write(entry.to_line())
+        self._track(entry)
+        try:
+            await self._sync()
+        except asyncio.CancelledError:
+            # 呼び出し元が取り消された: 記録は済んでいるので送信はリプレイヤーに任せる
+            self._defer(entry)
+            raise
+        except Exception:
+            self._untrack(entry)
+            raise
+        if entry.deferred:
+            self._defer(entry)
+        return entry
+
+    def complete(self, entry: JournalEntry) -> None:
+        """送信済み（または破棄）を記録。完了の fsync は待たない（失われても再送は冪等キーで識別できる）"""
+        if not self._untrack(entry):
+            return
+        self._write((json.dumps({"done": entry.seq}) + "\n").encode("utf-8"))
+        self._compact()
+        if self._wakeup is not None:
+            # 同じユーザーの後続が送れるようになった
+            self._wakeup.set()
+
+    def _defer(self, entry: JournalEntry) -> None:
+        if not entry.deferred:
+            entry.deferred = True
+        self.deferred_total += 1
+        self._ensure_replayer()
+        self._wakeup.set()
+
+    async def submit(self, kind: str, user_id, data: dict[str, Any]) -> Any:
+        """記録してから送る。一時的な失敗なら DEFERRED を返す（恒久的な失敗は例外のまま）"""
+        handler = self._handlers[kind]
+        if not self.enabled:
+            return await handler(JournalEntry(0, "", kind, str(user_id), dict(data)), False)
+        try:
+            entry = await self.append(kind, user_id, data)
+        except OSError as e:
+            # ディスクに書けないなら、ジャーナル無しで従来通り送る
+            logger.error("write journal unavailable (%s); sending without journal", e)
+            return await handler(JournalEntry(0, "", kind, str(user_id), dict(data)), False)
+        if entry.deferred:
+            return DEFERRED
+
+        try:
+            result = await handler(entry, False)
+        except asyncio.CancelledError:
+            # 送れたかどうか分からない: 上書き / 冪等キー付きの挿入なので再送しても同じ結果になる
+            self._defer(entry)
+            raise
+        except Exception as e:
+            if is_transient(e):
+                logger.warning("write deferred to journal: kind=%s user_id=%s err=%s", kind, user_id, e)
+                self._defer(entry)
+                return DEFERRED
+            self.complete(entry)
+            raise
+        self.complete(entry)
+        return result
+
+    # -------------------------
+    # 参照
+    # -------------------------
+
+    def has_pending(self, user_id) -> bool:
+        return str(user_id) in self._user_pending
+
+    def pending_for(self, user_id, kind: str) -> list[JournalEntry]:
+        uid = str(user_id)
+        if uid not in self._user_pending:
+            return []
+        return [e for e in self._pending.values() if e.user_id == uid and e.kind == kind]
+
+    # -------------------------
+    # リプレイ
+    # -------------------------
+
+    def _ensure_replayer(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._replay_task is None or self._replay_task.done():
+            self._replay_task = asyncio.create_task(self._replay_loop())
+
+    def _next_replayable(self) -> Optional[JournalEntry]:
+        blocked: set[str] = set()
+        for entry in self._pending.values():
+            if entry.user_id in blocked:
+                continue
+            if entry.deferred:
+                return entry
+            # 直接送信中の書き込みより後ろは待つ
+            blocked.add(entry.user_id)
+        return None
+
+    async def _replay_loop(self) -> None:
+        delay = 0.0
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                entry = self._next_replayable()
+                if entry is None:
+                    break
+                handler = self._handlers.get(entry.kind)
+                if handler is None:
+                    logger.error("write journal: no handler for kind=%s; dropping key=%s", entry.kind, entry.key)
+                    self.dropped_total += 1
+                    self.complete(entry)
+                    continue
+                try:
+                    await handler(entry, True)
+                except Exception as e:
+                    if is_transient(e):
+                        delay = min(self.replay_max_delay, max(1.0, delay * 2))
+                        logger.debug("write journal replay postponed %.0fs: kind=%s err=%s", delay, entry.kind, e)
+                        await asyncio.sleep(delay)
+                        continue
+                    logger.error(
+                        "write journal: dropping rejected write kind=%s user_id=%s key=%s data=%s err=%s",
+                        entry.kind,
+                        entry.user_id,
+                        entry.key,
+                        json.dumps(entry.data, ensure_ascii=False)[:500],
+                        e,
+                    )
+                    self.dropped_total += 1
+                    self.complete(entry)
+                    continue
+                delay = 0.0
+                self.replayed_total += 1
+                self.complete(entry)
+
+    async def start(self) -> None:
+        """起動時のリカバリ: 前回の未完了分を読み戻して送り直す"""
+        if not self.enabled:
+            return
+        self._open()
+        self._ensure_replayer()
+        if self._pending:
+            self._wakeup.set()
+
+    async def stop(self) -> None:
+        for task in (self._replay_task, self._flush_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        # 未完了分はファイルに残り、次回起動時に送り直される
+        self.close()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "deferred": sum(1 for e in self._pending.values() if e.deferred),
+            "users": len(self._user_pending),
+            "bytes": self._bytes,
+            "deferred_total": self.deferred_total,
+            "replayed_total": self.replayed_total,
+            "dropped_total": self.dropped_total,
+            "recovered_total": self.recovered_total,
+        }
+
+
+def _journal_path() -> str:
+    from runtime_settings import JOURNAL_PATH
+
+    import cluster
+
+    worker = cluster.worker_config()
+    # クラスタモードではワーカー毎に別ファイル
+    return f"{JOURNAL_PATH}.{worker.worker_id}" if worker is not None else JOURNAL_PATH
+
+
+def _create_write_journal() -> WriteJournal:
+    from runtime_settings import (
+        JOURNAL_COMPACT_BYTES,
+        JOURNAL_ENABLED,
+        JOURNAL_FSYNC_INTERVAL_MS,
+        JOURNAL_REPLAY_MAX_DELAY,
+    )
+
+    return WriteJournal(
+        _journal_path(),
+        fsync_interval=JOURNAL_FSYNC_INTERVAL_MS / 1000,
+        compact_bytes=JOURNAL_COMPACT_BYTES,
+        replay_max_delay=JOURNAL_REPLAY_MAX_DELAY,
+        enabled=JOURNAL_ENABLED,
+    )
+
+
+write_journal = _create_write_journal()
+
+__all__ = ["DEFERRED", "JournalEntry", "WriteJournal", "is_transient", "write_journal"]